@@ -1,4 +1,6 @@
 from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from fastapi import HTTPException
@@ -49,6 +51,41 @@ if engine:
 else:
     SessionLocal = None
 
+def to_async_url(database_url: str):
+    """Map a sync DATABASE_URL to its async driver (asyncpg for Postgres, aiosqlite for SQLite)"""
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite")
+    if backend in ("postgresql", "postgres"):
+        url = url.set(drivername="postgresql+asyncpg")
+        # asyncpg takes "ssl" where libpq/psycopg2 take "sslmode"
+        sslmode = url.query.get("sslmode")
+        if sslmode:
+            url = url.difference_update_query(["sslmode"]).update_query_dict({"ssl": sslmode})
+        return url
+    raise ValueError(f"No async driver configured for {backend}")
+
+# Async engine for the request path, so database latency never blocks the
+# event loop. The sync engine above stays for scripts and migrations.
+async_engine = None
+AsyncSessionLocal = None
+if USE_DATABASE:
+    try:
+        async_url = to_async_url(DATABASE_URL)
+        async_engine = create_async_engine(
+            async_url,
+            pool_pre_ping=True,
+            pool_size=10,
+            max_overflow=20,
+            connect_args={"timeout": 5} if async_url.get_backend_name() == "postgresql" else {}
+        )
+        AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+    except Exception as e:
+        print(f"⚠ Warning: Could not configure async database engine: {e}")
+        async_engine = None
+        AsyncSessionLocal = None
+
 # Base class for models
 Base = declarative_base()
 
@@ -62,3 +99,8 @@ def get_db():
     finally:
         db.close()
 
+async def shutdown_database():
+    """Close the async engine's pooled connections"""
+    if async_engine is not None:
+        await async_engine.dispose()
+
@@ -1,39 +1,48 @@
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.models.db_models import Order, AgentSession, ConversationMessage
 from typing import Dict, Any, Optional, List
 from datetime import datetime
 import uuid
 
+def order_from_data(order_data: Dict[str, Any]) -> Order:
+    """Build an Order row from parsed order data"""
+    return Order(
+        order_id=order_data.get("order_id", f"ORDER-{uuid.uuid4().hex[:8]}"),
+        customer_name=order_data.get("customer", {}).get("name", ""),
+        customer_cpr=order_data.get("customer", {}).get("cpr", ""),
+        customer_mobile=order_data.get("customer", {}).get("mobile", ""),
+        order_type=order_data.get("order_type", "new_line"),
+        line_type=order_data.get("line_details", {}).get("type", "mobile"),
+        line_number=order_data.get("line_details", {}).get("number"),
+        sub_number=order_data.get("line_details", {}).get("sub_number"),
+        device_name=order_data.get("device", {}).get("name") if order_data.get("device") else None,
+        device_variant=order_data.get("device", {}).get("variant") if order_data.get("device") else None,
+        device_color=order_data.get("device", {}).get("color") if order_data.get("device") else None,
+        plan_name=order_data.get("plan", {}).get("name") if order_data.get("plan") else None,
+        plan_commitment=order_data.get("plan", {}).get("selected_commitment") if order_data.get("plan") else None,
+        financial_type=order_data.get("financial", {}).get("type", "INSTALLMENT"),
+        monthly_payment=order_data.get("financial", {}).get("monthly", 0.0),
+        advance_payment=order_data.get("financial", {}).get("advance", 0.0),
+        upfront_payment=order_data.get("financial", {}).get("upfront", 0.0),
+        vat=order_data.get("financial", {}).get("vat", 0.0),
+        total_payment=order_data.get("financial", {}).get("total", 0.0),
+        accessories=order_data.get("accessories", []),
+        order_data=order_data
+    )
+
 class DatabaseService:
     def __init__(self, db: Session):
         self.db = db
+        # Identity map of session_id -> AgentSession.id, so messages and
+        # updates insert/update by primary key instead of looking the session up
+        self._session_ids: Dict[str, str] = {}
     
     # Order operations
     def create_order(self, order_data: Dict[str, Any]) -> Order:
         """Create a new order in the database"""
-        order = Order(
-            order_id=order_data.get("order_id", f"ORDER-{uuid.uuid4().hex[:8]}"),
-            customer_name=order_data.get("customer", {}).get("name", ""),
-            customer_cpr=order_data.get("customer", {}).get("cpr", ""),
-            customer_mobile=order_data.get("customer", {}).get("mobile", ""),
-            order_type=order_data.get("order_type", "new_line"),
-            line_type=order_data.get("line_details", {}).get("type", "mobile"),
-            line_number=order_data.get("line_details", {}).get("number"),
-            sub_number=order_data.get("line_details", {}).get("sub_number"),
-            device_name=order_data.get("device", {}).get("name") if order_data.get("device") else None,
-            device_variant=order_data.get("device", {}).get("variant") if order_data.get("device") else None,
-            device_color=order_data.get("device", {}).get("color") if order_data.get("device") else None,
-            plan_name=order_data.get("plan", {}).get("name") if order_data.get("plan") else None,
-            plan_commitment=order_data.get("plan", {}).get("selected_commitment") if order_data.get("plan") else None,
-            financial_type=order_data.get("financial", {}).get("type", "INSTALLMENT"),
-            monthly_payment=order_data.get("financial", {}).get("monthly", 0.0),
-            advance_payment=order_data.get("financial", {}).get("advance", 0.0),
-            upfront_payment=order_data.get("financial", {}).get("upfront", 0.0),
-            vat=order_data.get("financial", {}).get("vat", 0.0),
-            total_payment=order_data.get("financial", {}).get("total", 0.0),
-            accessories=order_data.get("accessories", []),
-            order_data=order_data
-        )
+        order = order_from_data(order_data)
         self.db.add(order)
         self.db.commit()
         self.db.refresh(order)
@@ -45,7 +54,7 @@ class DatabaseService:
     
     def get_order_by_db_id(self, id: str) -> Optional[Order]:
         """Get order by database id"""
-        return self.db.query(Order).filter(Order.id == id).first()
+        return self.db.get(Order, id)
     
     # Session operations
     def create_session(self, order_id: str, session_id: str) -> AgentSession:
@@ -63,58 +72,209 @@ class DatabaseService:
         self.db.add(session)
         self.db.commit()
         self.db.refresh(session)
+        self._session_ids[session_id] = session.id
         return session
     
     def get_session(self, session_id: str) -> Optional[AgentSession]:
         """Get session by session_id"""
-        return self.db.query(AgentSession).filter(AgentSession.session_id == session_id).first()
+        session = self.db.query(AgentSession).filter(AgentSession.session_id == session_id).first()
+        if session:
+            self._session_ids[session_id] = session.id
+        return session
     
-    def update_session(self, session_id: str, updates: Dict[str, Any]) -> Optional[AgentSession]:
-        """Update session"""
-        session = self.get_session(session_id)
-        if not session:
-            return None
-        
-        for key, value in updates.items():
-            if hasattr(session, key):
-                setattr(session, key, value)
+    def session_pk(self, session_id: str, session_db_id: Optional[str] = None) -> Optional[str]:
+        """Resolve a session's primary key: given by the caller, cached, or one SELECT"""
+        if session_db_id is None:
+            session_db_id = self._session_ids.get(session_id)
+        if session_db_id is None:
+            session_db_id = self.db.query(AgentSession.id).filter(
+                AgentSession.session_id == session_id
+            ).scalar()
+        if session_db_id is not None:
+            self._session_ids[session_id] = session_db_id
+        return session_db_id
+    
+    def update_session(self, session_id: str, updates: Dict[str, Any],
+                       session_db_id: Optional[str] = None) -> bool:
+        """Update session columns by primary key; False if the session does not exist"""
+        session_db_id = self.session_pk(session_id, session_db_id)
+        if session_db_id is None:
+            return False
         
+        values = {key: value for key, value in updates.items() if hasattr(AgentSession, key)}
+        self.db.execute(update(AgentSession).where(AgentSession.id == session_db_id).values(**values))
         self.db.commit()
-        self.db.refresh(session)
-        return session
+        return True
     
-    def end_session(self, session_id: str) -> Optional[AgentSession]:
+    def end_session(self, session_id: str, session_db_id: Optional[str] = None) -> bool:
         """End a session"""
         return self.update_session(session_id, {
             "is_active": False,
             "ended_at": datetime.utcnow()
-        })
+        }, session_db_id)
     
     # Message operations
-    def add_message(self, session_id: str, role: str, content: str, state: str) -> ConversationMessage:
+    def add_message(self, session_id: str, role: str, content: str, state: str,
+                    session_db_id: Optional[str] = None) -> ConversationMessage:
         """Add a conversation message"""
-        session = self.get_session(session_id)
-        if not session:
+        session_db_id = self.session_pk(session_id, session_db_id)
+        if session_db_id is None:
             raise ValueError(f"Session {session_id} not found")
         
         message = ConversationMessage(
-            session_id=session.id,
+            session_id=session_db_id,
             role=role,
             content=content,
             state=state
         )
         self.db.add(message)
         self.db.commit()
-        self.db.refresh(message)
         return message
     
-    def get_session_messages(self, session_id: str) -> List[ConversationMessage]:
-        """Get all messages for a session"""
-        session = self.get_session(session_id)
-        if not session:
+    def get_session_messages(self, session_id: str, session_db_id: Optional[str] = None,
+                             offset: int = 0, limit: Optional[int] = None) -> List[ConversationMessage]:
+        """Get a session's messages, oldest first (all of them, or one page)"""
+        session_db_id = self.session_pk(session_id, session_db_id)
+        if session_db_id is None:
             return []
         
         return self.db.query(ConversationMessage).filter(
-            ConversationMessage.session_id == session.id
-        ).order_by(ConversationMessage.timestamp).all()
+            ConversationMessage.session_id == session_db_id
+        ).order_by(ConversationMessage.timestamp).offset(offset).limit(limit).all()
+    
+    def count_session_messages(self, session_id: str, session_db_id: Optional[str] = None) -> Optional[int]:
+        """Number of messages in a session, None if the session does not exist"""
+        session_db_id = self.session_pk(session_id, session_db_id)
+        if session_db_id is None:
+            return None
+        
+        return self.db.query(func.count(ConversationMessage.id)).filter(
+            ConversationMessage.session_id == session_db_id
+        ).scalar()
 
+class AsyncDatabaseService:
+    """DatabaseService for the async engine (AsyncSessionLocal), used on the request path"""
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self._session_ids: Dict[str, str] = {}  # session_id -> AgentSession.id
+    
+    # Order operations
+    async def create_order(self, order_data: Dict[str, Any]) -> Order:
+        """Create a new order in the database"""
+        order = order_from_data(order_data)
+        self.db.add(order)
+        await self.db.commit()
+        return order
+    
+    async def get_order_by_id(self, order_id: str) -> Optional[Order]:
+        """Get order by order_id"""
+        return await self.db.scalar(select(Order).where(Order.order_id == order_id).limit(1))
+    
+    async def get_order_by_db_id(self, id: str) -> Optional[Order]:
+        """Get order by database id"""
+        return await self.db.get(Order, id)
+    
+    # Session operations
+    async def create_session(self, order_id: str, session_id: str) -> AgentSession:
+        """Create a new agent session"""
+        order = await self.get_order_by_db_id(order_id)
+        if not order:
+            raise ValueError(f"Order with id {order_id} not found")
+        
+        session = AgentSession(
+            session_id=session_id,
+            order_id=order.id,
+            state="INIT",
+            is_active=True
+        )
+        self.db.add(session)
+        await self.db.commit()
+        self._session_ids[session_id] = session.id
+        return session
+    
+    async def get_session(self, session_id: str) -> Optional[AgentSession]:
+        """Get session by session_id"""
+        session = await self.db.scalar(
+            select(AgentSession).where(AgentSession.session_id == session_id).limit(1)
+        )
+        if session:
+            self._session_ids[session_id] = session.id
+        return session
+    
+    async def session_pk(self, session_id: str, session_db_id: Optional[str] = None) -> Optional[str]:
+        """Resolve a session's primary key: given by the caller, cached, or one SELECT"""
+        if session_db_id is None:
+            session_db_id = self._session_ids.get(session_id)
+        if session_db_id is None:
+            session_db_id = await self.db.scalar(
+                select(AgentSession.id).where(AgentSession.session_id == session_id)
+            )
+        if session_db_id is not None:
+            self._session_ids[session_id] = session_db_id
+        return session_db_id
+    
+    async def update_session(self, session_id: str, updates: Dict[str, Any],
+                             session_db_id: Optional[str] = None) -> bool:
+        """Update session columns by primary key; False if the session does not exist"""
+        session_db_id = await self.session_pk(session_id, session_db_id)
+        if session_db_id is None:
+            return False
+        
+        values = {key: value for key, value in updates.items() if hasattr(AgentSession, key)}
+        await self.db.execute(update(AgentSession).where(AgentSession.id == session_db_id).values(**values))
+        await self.db.commit()
+        return True
+    
+    async def end_session(self, session_id: str, session_db_id: Optional[str] = None) -> bool:
+        """End a session"""
+        return await self.update_session(session_id, {
+            "is_active": False,
+            "ended_at": datetime.utcnow()
+        }, session_db_id)
+    
+    # Message operations
+    async def add_message(self, session_id: str, role: str, content: str, state: str,
+                          session_db_id: Optional[str] = None) -> ConversationMessage:
+        """Add a conversation message"""
+        session_db_id = await self.session_pk(session_id, session_db_id)
+        if session_db_id is None:
+            raise ValueError(f"Session {session_id} not found")
+        
+        message = ConversationMessage(
+            session_id=session_db_id,
+            role=role,
+            content=content,
+            state=state
+        )
+        self.db.add(message)
+        await self.db.commit()
+        return message
+    
+    async def get_session_messages(self, session_id: str, session_db_id: Optional[str] = None,
+                                   offset: int = 0, limit: Optional[int] = None) -> List[ConversationMessage]:
+        """Get a session's messages, oldest first (all of them, or one page)"""
+        session_db_id = await self.session_pk(session_id, session_db_id)
+        if session_db_id is None:
+            return []
+        
+        result = await self.db.scalars(
+            select(ConversationMessage)
+            .where(ConversationMessage.session_id == session_db_id)
+            .order_by(ConversationMessage.timestamp)
+            .offset(offset)
+            .limit(limit)
+        )
+        return list(result)
+    
+    async def count_session_messages(self, session_id: str,
+                                     session_db_id: Optional[str] = None) -> Optional[int]:
+        """Number of messages in a session, None if the session does not exist"""
+        session_db_id = await self.session_pk(session_id, session_db_id)
+        if session_db_id is None:
+            return None
+        
+        return await self.db.scalar(
+            select(func.count(ConversationMessage.id))
+            .where(ConversationMessage.session_id == session_db_id)
+        )
@@ -1,23 +1,52 @@
-from fastapi import FastAPI, UploadFile, File, WebSocket, WebSocketDisconnect
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import FastAPI, UploadFile, File, WebSocket, WebSocketDisconnect, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import uvicorn
 from dotenv import load_dotenv
 import os
 import logging
+import secrets
 
 from app.routers import pdf_parser, voice_agent, websocket_handler
-from app.database import USE_DATABASE
+from app.database import USE_DATABASE, shutdown_database
+from app.services.db_writer import startup_db_writer, shutdown_db_writer
+from app.services.llm_client import startup_llm_client, shutdown_llm_client
+from app.services.metrics import metrics
+from app.services.pdf_pool import startup_pdf_pool, shutdown_pdf_pool
+from app.services.session_store import startup_session_store, shutdown_session_store
+from app.services.vendor_io import startup_vendor_io, shutdown_vendor_io
 
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# /metrics is only served to callers presenting this token ("Authorization: Bearer <token>")
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled Claude client per worker, shared by every agent session
+    await startup_llm_client()
+    await startup_pdf_pool()
+    await startup_vendor_io()
+    await startup_session_store()
+    await startup_db_writer()
+    yield
+    await shutdown_db_writer()
+    await shutdown_session_store()
+    await shutdown_database()
+    await shutdown_pdf_pool()
+    await shutdown_vendor_io()
+    await shutdown_llm_client()
+
 app = FastAPI(
     title="Zain Bahrain AI Voice Agent",
     description="AI-powered voice agent for order processing",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -55,6 +84,16 @@ async def health_check():
         "database_enabled": USE_DATABASE
     }
 
+@app.get("/metrics")
+async def get_metrics(authorization: Optional[str] = Header(None)):
+    """Per-worker performance counters, gauges and timings (needs METRICS_TOKEN)"""
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not secrets.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid metrics token",
+                            headers={"WWW-Authenticate": "Bearer"})
+    return metrics.snapshot()
+
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000))
     reload = os.getenv("APP_ENV", "development") == "development"
@@ -1,11 +1,19 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException
 from fastapi.responses import JSONResponse
+import asyncio
 import tempfile
 import os
-from app.services.pdf_parser import parse_order_pdf
+from functools import partial
+from app.services.pdf_pool import PDFParserBusy, parse_pdf_in_pool
 
 router = APIRouter()
 
+# Uploads up to this size are parsed straight from memory; larger ones are
+# spooled to a temp file so their bytes aren't held in memory or copied into
+# the parse worker
+PDF_SPOOL_THRESHOLD_BYTES = int(os.getenv("PDF_SPOOL_THRESHOLD_BYTES", str(5 * 1024 * 1024)))
+PDF_SPOOL_CHUNK_BYTES = 1024 * 1024
+
 @router.post("/parse-order")
 async def parse_order(pdf_file: UploadFile = File(...)):
     """
@@ -14,22 +22,53 @@ async def parse_order(pdf_file: UploadFile = File(...)):
     if not pdf_file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="File must be a PDF")
     
+    tmp_path = None
     try:
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            content = await pdf_file.read()
-            tmp_file.write(content)
-            tmp_path = tmp_file.name
+        # Read no more than the threshold before deciding where the upload goes
+        pdf_source = await pdf_file.read(PDF_SPOOL_THRESHOLD_BYTES + 1)
         
-        # Parse PDF
-        order_data = parse_order_pdf(tmp_path)
+        if len(pdf_source) > PDF_SPOOL_THRESHOLD_BYTES:
+            # Spool large uploads to disk and hand the worker a path
+            tmp_path = await _spool_upload(pdf_source, pdf_file)
+            pdf_source = tmp_path
         
-        # Clean up
-        os.unlink(tmp_path)
+        # Parse PDF in the worker pool so the event loop stays responsive;
+        # the pool deletes the temp file once the parse is over (even after a timeout)
+        cleanup = None
+        if tmp_path:
+            cleanup = partial(_remove, tmp_path)
+            tmp_path = None
+        order_data = await parse_pdf_in_pool(pdf_source, cleanup=cleanup)
         
         return JSONResponse(content=order_data)
+    except PDFParserBusy:
+        # Backpressure: the parse pool is saturated
+        raise HTTPException(status_code=503, detail="PDF parser is busy, please retry shortly",
+                            headers={"Retry-After": "2"})
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Timed out parsing PDF")
     except Exception as e:
-        if os.path.exists(tmp_path):
-            os.unlink(tmp_path)
         raise HTTPException(status_code=500, detail=f"Error parsing PDF: {str(e)}")
+    finally:
+        # Clean up (only if the file never reached the pool)
+        if tmp_path and os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+async def _spool_upload(head: bytes, pdf_file: UploadFile) -> str:
+    """Write the upload to a temp file chunk by chunk, off the event loop; returns its path"""
+    tmp_file = await asyncio.to_thread(tempfile.NamedTemporaryFile, delete=False, suffix='.pdf')
+    try:
+        chunk = head
+        while chunk:
+            await asyncio.to_thread(tmp_file.write, chunk)
+            chunk = await pdf_file.read(PDF_SPOOL_CHUNK_BYTES)
+    except BaseException:
+        await asyncio.to_thread(tmp_file.close)
+        _remove(tmp_file.name)
+        raise
+    await asyncio.to_thread(tmp_file.close)
+    return tmp_file.name
 
+def _remove(path: str) -> None:
+    if os.path.exists(path):
+        os.unlink(path)
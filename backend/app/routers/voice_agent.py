@@ -1,16 +1,82 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
 from pydantic import BaseModel
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
+from datetime import datetime
+import bisect
+import os
 import uuid
 from app.services.ai_agent import ZainVoiceAgent
+from app.services.db_writer import get_db_writer
+from app.services.llm_client import get_llm_client
+from app.services.session_store import SessionConflict, get_session_store
 from app.database import get_db, USE_DATABASE
-from app.db_service import DatabaseService
+from app.db_service import AsyncDatabaseService
 from sqlalchemy.orm import Session
 
 router = APIRouter()
 
-# Store active sessions in memory (for quick access)
-active_sessions: Dict[str, ZainVoiceAgent] = {}
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "50"))
+HISTORY_PAGE_MAX = int(os.getenv("HISTORY_PAGE_MAX", "200"))
+SESSION_SAVE_ATTEMPTS = int(os.getenv("SESSION_SAVE_ATTEMPTS", "3"))
+
+# Active sessions live in the shared session store (see app/services/session_store.py),
+# so any worker can serve any request of a call
+
+async def load_agent(session_id: str) -> Optional[ZainVoiceAgent]:
+    """Rehydrate a session's agent from the session store.
+    
+    Agents persist messages through the worker's write-behind queue, so a
+    turn never waits on the database.
+    """
+    state = await get_session_store().get(session_id)
+    if state is None:
+        return None
+    db_writer = get_db_writer() if USE_DATABASE else None
+    return ZainVoiceAgent.from_state(state, db_writer, claude_client=get_llm_client())
+
+async def flush_session_writes() -> None:
+    """Write a call's queued messages before it is considered over"""
+    if USE_DATABASE:
+        await get_db_writer().flush()
+
+async def refresh_agent(agent: ZainVoiceAgent) -> bool:
+    """
+    Bring a long-lived agent (the voice WebSocket's) up to date before a turn.
+    
+    Turns served by other requests since it was loaded are picked up from
+    the session store. Returns False if the session has been ended.
+    """
+    state = await get_session_store().get(agent.session_id)
+    if state is None:
+        return False
+    if state.get("rev") != agent.revision:
+        agent.restore(state)
+    return True
+
+async def save_agent(agent: ZainVoiceAgent) -> bool:
+    """
+    Write the agent's state back so the next turn can run on any worker.
+    
+    The save only succeeds on top of the revision the agent was loaded at.
+    If another request saved the session meanwhile, its state is reloaded
+    and this turn's messages are saved after its own. Returns False, without
+    saving, if the session has been ended (so a late save never brings a
+    deleted call back).
+    """
+    store = get_session_store()
+    for attempt in range(SESSION_SAVE_ATTEMPTS):
+        try:
+            agent.revision = await store.put(agent.session_id, agent.to_state())
+            agent.saved_history = len(agent.conversation_history)
+            return True
+        except SessionConflict:
+            state = await store.get(agent.session_id)
+            if state is None:
+                return False
+            if attempt == SESSION_SAVE_ATTEMPTS - 1:
+                raise
+            agent.rebase(state)
+    return False
 
 class StartCallRequest(BaseModel):
     order_data: Dict[str, Any]
@@ -21,32 +87,33 @@ async def start_call(request: StartCallRequest):
     Initialize voice agent for specific order
     """
     try:
-        db_service = None
         order_id = request.order_data.get("order_id", f"ORDER-{uuid.uuid4().hex[:8]}")
         session_id = str(uuid.uuid4())
+        db_session = None
         
         # Use database if available
         if USE_DATABASE:
             try:
-                from app.database import SessionLocal
-                if SessionLocal:
-                    db = SessionLocal()
-                    try:
-                        db_service = DatabaseService(db)
+                from app.database import AsyncSessionLocal
+                if AsyncSessionLocal:
+                    async with AsyncSessionLocal() as db:
+                        db_service = AsyncDatabaseService(db)
                         # Create or get order in database
-                        order = db_service.create_order(request.order_data)
+                        order = await db_service.create_order(request.order_data)
                         order_id = order.order_id
                         
                         # Create session
-                        db_session = db_service.create_session(order.id, session_id)
-                    finally:
-                        db.close()
+                        db_session = await db_service.create_session(order.id, session_id)
             except Exception as db_error:
                 print(f"Database error (continuing without DB): {db_error}")
         
         # Create agent instance
-        agent = ZainVoiceAgent(request.order_data, session_id, db_service)
-        active_sessions[session_id] = agent
+        agent = ZainVoiceAgent(request.order_data, session_id,
+                               claude_client=get_llm_client())
+        if db_session is not None:
+            agent.session_db_id = db_session.id
+            agent.order_db_id = db_session.order_id
+        await save_agent(agent)
         
         return {
             "session_id": session_id,
@@ -63,72 +130,136 @@ async def get_session(session_id: str):
     """
     Get session information
     """
-    if session_id not in active_sessions:
+    state = await get_session_store().get(session_id)
+    if state is None:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    agent = active_sessions[session_id]
     return {
         "session_id": session_id,
-        "state": agent.state.value,
-        "language": agent.language,
-        "customer_authenticated": agent.customer_authenticated,
-        "order_confirmed": agent.order_confirmed
+        "state": state["s"],
+        "language": state["lang"],
+        "customer_authenticated": state["auth"],
+        "order_confirmed": state["conf"]
     }
 
+def history_entry(role: str, content: str, state: str, timestamp: str) -> Dict[str, Any]:
+    return {"role": role, "content": content, "state": state, "timestamp": timestamp}
+
+def history_index(history: List[Any], since: str) -> int:
+    """Index of the first message after a `since` cursor: a message index or an ISO timestamp"""
+    if since.isdigit():
+        return min(int(since), len(history))
+    try:
+        after = datetime.fromisoformat(since)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="since must be a message index or an ISO timestamp")
+    if after.tzinfo is not None:
+        after = after.astimezone().replace(tzinfo=None)  # history timestamps are local time
+    # History is in turn order, so timestamps are sorted
+    return bisect.bisect_right(history, after, key=lambda msg: datetime.fromisoformat(msg.timestamp))
+
 @router.post("/session/{session_id}/process")
-async def process_message(session_id: str, message: Dict[str, str]):
+async def process_message(session_id: str, message: Dict[str, str], since: Optional[str] = None):
     """
     Process text message from user
-    """
-    if session_id not in active_sessions:
-        raise HTTPException(status_code=404, detail="Session not found")
     
-    agent = active_sessions[session_id]
+    Returns only the messages added by this turn, or everything after the
+    `since` cursor (a message index or ISO timestamp) when given, so the
+    response stays the same size however long the call gets. `cursor` is
+    the index to pass as `since` next time; the full history is paginated
+    by GET /session/{session_id}/history.
+    """
     user_input = message.get("text", "")
     
+    agent = await load_agent(session_id)
+    if agent is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
     if not user_input:
         raise HTTPException(status_code=400, detail="Message text is required")
     
+    start = history_index(agent.conversation_history, since) if since else len(agent.conversation_history)
     try:
         response = await agent.process_input(user_input)
-        return {
-            "response": response,
-            "state": agent.state.value,
-            "conversation_history": [
-                {
-                    "role": msg.role,
-                    "content": msg.content,
-                    "state": msg.state,
-                    "timestamp": msg.timestamp
-                }
-                for msg in agent.conversation_history
-            ]
-        }
+        saved = await save_agent(agent)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing message: {str(e)}")
+    if not saved:
+        # The call was ended while this turn ran
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    return {
+        "response": response,
+        "state": agent.state.value,
+        "messages": [
+            history_entry(msg.role, msg.content, msg.state, msg.timestamp)
+            for msg in agent.conversation_history[start:]
+        ],
+        "cursor": len(agent.conversation_history)
+    }
+
+@router.get("/session/{session_id}/history")
+async def get_history(session_id: str, offset: int = Query(0, ge=0),
+                      limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_PAGE_MAX)):
+    """
+    Page through a call's conversation history, oldest first
+    
+    Live calls are read from the session store; ended calls from the database.
+    """
+    state = await get_session_store().get(session_id)
+    if state is not None:
+        history = state["h"]
+        total = len(history)
+        messages = [history_entry(*entry) for entry in history[offset:offset + limit]]
+    elif USE_DATABASE:
+        try:
+            from app.database import AsyncSessionLocal
+            async with AsyncSessionLocal() as db:
+                db_service = AsyncDatabaseService(db)
+                total = await db_service.count_session_messages(session_id)
+                rows = await db_service.get_session_messages(session_id, offset=offset, limit=limit)
+        except Exception as e:
+            print(f"Database error reading history: {e}")
+            raise HTTPException(status_code=503, detail="History is temporarily unavailable")
+        if total is None:
+            raise HTTPException(status_code=404, detail="Session not found")
+        messages = [
+            history_entry(row.role, row.content, row.state,
+                          row.timestamp.isoformat() if row.timestamp else None)
+            for row in rows
+        ]
+    else:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    next_offset = offset + len(messages)
+    return {
+        "session_id": session_id,
+        "messages": messages,
+        "offset": offset,
+        "total": total,
+        "next_offset": next_offset if next_offset < total else None
+    }
 
 @router.delete("/session/{session_id}")
 async def end_call(session_id: str):
     """
     End call session
     """
-    # End session in database if available
+    # Write the call's queued messages, then end the session in the database
+    await flush_session_writes()
     if USE_DATABASE:
         try:
-            from app.database import SessionLocal
-            if SessionLocal:
-                db = SessionLocal()
-                try:
-                    db_service = DatabaseService(db)
-                    db_session = db_service.end_session(session_id)
-                finally:
-                    db.close()
+            from app.database import AsyncSessionLocal
+            if AsyncSessionLocal:
+                state = await get_session_store().get(session_id)
+                async with AsyncSessionLocal() as db:
+                    db_service = AsyncDatabaseService(db)
+                    await db_service.end_session(session_id, state.get("sdb") if state else None)
         except Exception as e:
             print(f"Database error ending session: {e}")
     
-    # Remove from active sessions
-    if session_id in active_sessions:
-        del active_sessions[session_id]
+    # Remove from the session store
+    if await get_session_store().delete(session_id):
         return {"status": "ended", "message": "Call session ended"}
     else:
         raise HTTPException(status_code=404, detail="Session not found")
@@ -1,11 +1,19 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from fastapi.websockets import WebSocketState
+import asyncio
+import functools
 import json
 import logging
 import base64
+import time
+from typing import Callable, Optional, Union
 from app.services.ai_agent import ZainVoiceAgent
 from app.models.agent import AgentState
-from app.services.voice_service import text_to_speech, speech_to_text
+from app.services.metrics import metrics
+from app.services.speculation import Prefetch, discard_prefetch, start_prefetch, take_prefetch
+from app.services.speech_pipeline import Playback, stream_segments
+from app.services.stt_stream import TranscriptionStream, get_stt_backend
+from app.services.voice_protocol import AudioUpdate, BinaryFraming, ProtocolError, negotiate
 
 logger = logging.getLogger(__name__)
 
@@ -14,18 +22,346 @@ router = APIRouter()
 # Store active WebSocket sessions
 active_ws_sessions: dict = {}
 
+class Outbox:
+    """
+    The send side of a voice connection.
+    
+    Messages are queued and written to the socket by one sender task, so the
+    receive loop never waits on a send, and speech still queued when the
+    caller barges in can be dropped instead of sent.
+    """
+    
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.task = asyncio.create_task(self._run())
+    
+    async def send_json(self, message: dict) -> None:
+        self.queue.put_nowait(("json", message, None))
+    
+    async def send_audio(self, data: Union[bytes, str], sent: Optional[Callable[[], None]] = None) -> None:
+        """
+        Queue speech: a binary chunk, or the legacy ``audio_chunk`` header before one.
+        ``sent`` is called once it is written to the socket (never, if it is dropped).
+        """
+        self.queue.put_nowait(("audio", data, sent))
+    
+    def drop_audio(self) -> int:
+        """Drop the speech not sent yet; returns its size in bytes"""
+        kept, dropped = [], 0
+        while not self.queue.empty():
+            item = self.queue.get_nowait()
+            if item[0] == "audio":
+                dropped += len(item[1])
+            else:
+                kept.append(item)
+        for item in kept:
+            self.queue.put_nowait(item)
+        return dropped
+    
+    async def _run(self) -> None:
+        try:
+            while True:
+                kind, data, sent = await self.queue.get()
+                if kind == "json":
+                    await self.websocket.send_json(data)
+                elif isinstance(data, str):
+                    await self.websocket.send_text(data)
+                else:
+                    await self.websocket.send_bytes(data)
+                if sent is not None:
+                    sent()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # The client is gone; the receive loop sees the disconnect
+            logger.info(f"WebSocket send stopped: {e}")
+    
+    async def close(self) -> None:
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+
+class Turns:
+    """
+    The agent's side of the conversation, run off the receive loop.
+    
+    One turn at a time (transcription, agent reply, speech) runs as its own
+    task, so caller audio is still read while the agent thinks and talks.
+    New caller input interrupts the turn in progress: its LLM call or TTS
+    stream is cancelled and its unsent audio dropped (barge-in).
+    """
+    
+    def __init__(self, outbox: Outbox):
+        self.outbox = outbox
+        self.task: Optional[asyncio.Task] = None
+    
+    def start(self, turn, *args) -> None:
+        self.task = asyncio.create_task(self._run(turn, *args))
+    
+    async def _run(self, turn, *args) -> None:
+        try:
+            await turn(*args)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error in WebSocket handler: {e}")
+            await self.outbox.send_json({
+                "type": "error",
+                "message": "An error occurred. Please try again."
+            })
+    
+    async def interrupt(self) -> bool:
+        """The caller spoke: cancel the turn in progress, if any"""
+        task, self.task = self.task, None
+        if task is None or task.done():
+            return False
+        started = time.perf_counter()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        metrics.increment("turn.barge_ins")
+        metrics.observe("turn.interrupt_ms", (time.perf_counter() - started) * 1000)
+        return True
+    
+    async def close(self) -> None:
+        task, self.task = self.task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+async def send_speech(outbox: Outbox, text: str, language: str,
+                      framing: Optional[BinaryFraming] = None, ended: Optional[float] = None,
+                      playback: Optional[Playback] = None, prefetch: Optional[Prefetch] = None) -> None:
+    """
+    Stream synthesized speech to the client as it comes off the TTS generator.
+    
+    The text is split into sentence/line segments that are synthesized in a
+    pipeline, so multi-line answers start playing after the first segment.
+    With binary framing (see app/services/voice_protocol.py) each chunk is
+    one framed binary message; legacy clients get an ``audio_chunk`` header
+    followed by the raw chunk. An ``audio_end`` marker closes the utterance
+    (also on failure, and with ``interrupted`` when the caller barged in).
+    ``ended`` is when the caller's utterance ended, for the end-of-speech to
+    first audio latency; ``playback`` records what was sent. ``prefetch``
+    holds audio already synthesized for this reply (see speculation.py).
+    """
+    playback = playback or Playback(text)
+    segments = playback.segments
+    started = time.perf_counter()
+    first_byte_ms = None
+    chunks = 0
+    total_bytes = 0
+    error = False
+    interrupted = False
+    
+    if prefetch is not None:
+        speech = stream_segments(segments, language, pace=playback.pace, speak=prefetch.speak)
+    else:
+        speech = stream_segments(segments, language, pace=playback.pace)
+    try:
+        async for segment, chunk in speech:
+            if first_byte_ms is None:
+                first_byte_ms = (time.perf_counter() - started) * 1000
+                metrics.observe("tts.time_to_first_byte_ms", first_byte_ms)
+                if ended is not None:
+                    metrics.observe("turn.first_audio_ms", (time.perf_counter() - ended) * 1000)
+            # Counted as heard from when it is written, not queued: a barge-in
+            # drops what is still in the outbox
+            sent = functools.partial(playback.chunk, segment, len(chunk))
+            if framing is not None:
+                await outbox.send_audio(framing.audio_frame(chunk), sent)
+            else:
+                header = json.dumps({
+                    "type": "audio_chunk",
+                    "seq": chunks,
+                    "segment": segment,
+                    "size": len(chunk)
+                }, separators=(",", ":"))
+                await outbox.send_audio(header)
+                await outbox.send_audio(chunk, sent)
+                metrics.increment("ws.audio_out_bytes", len(header) + len(chunk))
+            chunks += 1
+            total_bytes += len(chunk)
+        playback.finish()
+    except asyncio.CancelledError:
+        # Barge-in: stop synthesizing and don't send what is still queued
+        interrupted = True
+        playback.stop()
+        metrics.increment("tts.audio_bytes_dropped", outbox.drop_audio())
+        raise
+    except Exception as e:
+        error = True
+        logger.error(f"Error generating speech: {e}")
+    finally:
+        await speech.aclose()
+        if prefetch is not None:
+            prefetch.close()
+        metrics.observe("tts.total_ms", (time.perf_counter() - started) * 1000)
+        metrics.increment("tts.segments", len(segments))
+        message = {
+            "type": "audio_end",
+            "segments": len(segments),
+            "chunks": chunks,
+            "size": total_bytes,
+            "time_to_first_byte_ms": round(first_byte_ms, 1) if first_byte_ms is not None else None,
+            "error": error,
+            "interrupted": interrupted
+        }
+        if interrupted:
+            # The client stops playback; this is as far as the caller got
+            message["heard"] = playback.heard()
+        await outbox.send_json(message)
+
+async def respond(outbox: Outbox, agent: ZainVoiceAgent, user_input: str,
+                  framing: Optional[BinaryFraming], transcript: bool = False,
+                  ended: Optional[float] = None) -> None:
+    """
+    Run one agent turn, send the text reply and stream it as speech.
+    
+    The agent is first brought up to date with turns served elsewhere
+    (``POST /process`` on any worker). The reply goes into the history once
+    spoken; if the caller barges in, only the part they heard is recorded.
+    Once it is sent, the likely next reply is synthesized ahead (when
+    ``SPECULATIVE_PREFETCH`` is on).
+    """
+    from app.routers.voice_agent import refresh_agent, save_agent
+    
+    if not await refresh_agent(agent):
+        await outbox.send_json({
+            "type": "error",
+            "message": "Session not found. Please start a call first."
+        })
+        return
+    
+    response = None
+    playback = None
+    try:
+        response = await agent.process_input(user_input, record_response=False)
+        playback = Playback(response)
+        prefetch = take_prefetch(agent.session_id, response, agent.language or "en")
+        
+        # Send text response
+        message = {
+            "type": "text",
+            "message": response,
+            "state": agent.state.value
+        }
+        if transcript:
+            message["transcript"] = user_input
+        await outbox.send_json(message)
+        if ended is not None:
+            metrics.observe("turn.response_ms", (time.perf_counter() - ended) * 1000)
+        
+        # Stream audio as it is synthesized
+        await send_speech(outbox, response, agent.language or "en", framing, ended, playback, prefetch)
+        start_prefetch(agent)
+    except asyncio.CancelledError:
+        if response is not None:
+            heard = playback.heard()
+            metrics.increment("tts.characters_unheard", len(response) - len(heard))
+            response = heard
+        raise
+    finally:
+        if response is not None:
+            await agent.record_response(response)
+        await save_agent(agent)
+
+async def respond_to_audio(outbox: Outbox, agent: ZainVoiceAgent, audio_bytes: bytes,
+                           framing: Optional[BinaryFraming], codec: str = "webm-opus",
+                           stream: Optional[TranscriptionStream] = None) -> None:
+    """Transcribe a complete utterance (finishing its stream, if one was fed) and answer it"""
+    ended = time.perf_counter()
+    try:
+        if stream is None:
+            stream = get_stt_backend().open(agent.language or "en", codec, agent.session_id)
+        transcript = await stream.finish(audio_bytes)
+        metrics.observe("stt.final_ms", (time.perf_counter() - ended) * 1000)
+        await respond(outbox, agent, transcript, framing, transcript=True, ended=ended)
+    except Exception as e:
+        logger.error(f"Error transcribing audio: {e}")
+        await outbox.send_json({
+            "type": "error",
+            "message": "Sorry, I couldn't understand that. Could you repeat?"
+        })
+
+class LiveTranscript:
+    """
+    Streaming transcription of the utterance a framed client is speaking.
+    
+    Audio is fed to the speech-to-text backend as frames arrive; partial
+    transcripts go to the client as ``transcript_partial`` and a stable one
+    starts the agent's classification early. The first audio of an utterance
+    interrupts the agent if it is still answering the previous one, and when
+    the utterance ends only the finalization is left before it can answer.
+    """
+    
+    def __init__(self, outbox: Outbox, agent: ZainVoiceAgent, framing: BinaryFraming, turns: Turns):
+        self.outbox = outbox
+        self.agent = agent
+        self.framing = framing
+        self.turns = turns
+        self.stream: Optional[TranscriptionStream] = None
+        self.partial: Optional[str] = None
+    
+    async def update(self, update: AudioUpdate) -> None:
+        if self.stream is None:
+            # The caller started speaking
+            await self.turns.interrupt()
+            self.stream = get_stt_backend().open(self.agent.language or "en", update.codec,
+                                                 self.agent.session_id)
+            self.partial = None
+        try:
+            partial = await self.stream.feed(update.chunk)
+        except Exception as e:
+            logger.error(f"Error streaming audio to speech-to-text: {e}")
+            partial = None
+        if partial is not None and partial.text != self.partial:
+            self.partial = partial.text
+            metrics.increment("stt.partials")
+            await self.outbox.send_json({
+                "type": "transcript_partial",
+                "text": partial.text,
+                "stable": partial.stable
+            })
+        if partial is not None and partial.stable:
+            self.agent.start_early_classification(partial.text)
+        
+        if update.utterance is not None:
+            stream, self.stream = self.stream, None
+            self.turns.start(respond_to_audio, self.outbox, self.agent, update.utterance, self.framing,
+                             update.codec, stream)
+    
+    def close(self) -> None:
+        if self.stream is not None:
+            self.stream.cancel()
+            self.stream = None
+        self.agent.cancel_early_classification()
+
 @router.websocket("/voice/{session_id}")
-async def voice_websocket(websocket: WebSocket, session_id: str):
+async def voice_websocket(websocket: WebSocket, session_id: str,
+                          protocol: Optional[str] = None, codecs: Optional[str] = None):
     """
     WebSocket endpoint for real-time voice communication
+    
+    Pass ?protocol=1&codecs=... for binary audio framing (see
+    app/services/voice_protocol.py); without it the legacy messages are used.
+    The connection is full duplex: this loop only reads, agent turns run as
+    separate tasks (``Turns``) and everything is sent by the ``Outbox``.
     """
     await websocket.accept()
+    outbox: Optional[Outbox] = None
+    turns: Optional[Turns] = None
+    live: Optional[LiveTranscript] = None
     
     try:
-        # Get or create agent session
-        from app.routers.voice_agent import active_sessions
+        # Rehydrate the agent from the shared session store (the call may have
+        # been started on another worker)
+        from app.routers.voice_agent import flush_session_writes, load_agent, save_agent
         
-        if session_id not in active_sessions:
+        agent = await load_agent(session_id)
+        if agent is None:
             await websocket.send_json({
                 "type": "error",
                 "message": "Session not found. Please start a call first."
@@ -33,37 +369,45 @@ async def voice_websocket(websocket: WebSocket, session_id: str):
             await websocket.close()
             return
         
-        agent = active_sessions[session_id]
+        try:
+            framing = negotiate(protocol, codecs)
+        except ProtocolError as e:
+            await websocket.send_json({"type": "error", "message": str(e)})
+            await websocket.close(code=1003)
+            return
+        
+        outbox = Outbox(websocket)
+        turns = Turns(outbox)
+        if framing is not None:
+            await outbox.send_json(framing.ready_message())
+            live = LiveTranscript(outbox, agent, framing, turns)
+        
         active_ws_sessions[session_id] = websocket
+        metrics.set_gauge("sessions.websockets", len(active_ws_sessions))
         
         # Send initial greeting
         initial_response = agent.handle_init()
+        await save_agent(agent)
         
         # Send text response
-        await websocket.send_json({
+        await outbox.send_json({
             "type": "text",
             "message": initial_response,
             "state": agent.state.value
         })
         
-        # Generate and send audio
-        try:
-            audio_data = await text_to_speech(initial_response, agent.language or "en")
-            await websocket.send_json({
-                "type": "audio",
-                "size": len(audio_data)
-            })
-            await websocket.send_bytes(audio_data)
-        except Exception as e:
-            logger.error(f"Error generating speech: {e}")
+        # Stream audio as it is synthesized (the caller may talk over it)
+        turns.start(send_speech, outbox, initial_response, agent.language or "en", framing)
         
         # Main message loop
         while True:
             try:
                 # Receive message
                 data = await websocket.receive()
+                if data["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(data.get("code", 1000))
                 
-                if "text" in data:
+                if data.get("text") is not None:
                     # Text message
                     message_data = json.loads(data["text"])
                     message_type = message_data.get("type")
@@ -71,108 +415,47 @@ async def voice_websocket(websocket: WebSocket, session_id: str):
                     if message_type == "text":
                         user_input = message_data.get("text", "")
                         if user_input:
-                            # Process with agent
-                            response = await agent.process_input(user_input)
-                            
-                            # Send text response
-                            await websocket.send_json({
-                                "type": "text",
-                                "message": response,
-                                "state": agent.state.value
-                            })
-                            
-                            # Generate and send audio
-                            try:
-                                audio_data = await text_to_speech(response, agent.language or "en")
-                                await websocket.send_json({
-                                    "type": "audio",
-                                    "size": len(audio_data)
-                                })
-                                await websocket.send_bytes(audio_data)
-                            except Exception as e:
-                                logger.error(f"Error generating speech: {e}")
+                            await turns.interrupt()
+                            turns.start(respond, outbox, agent, user_input, framing)
                     
                     elif message_type == "audio":
-                        # Audio message (base64 encoded)
+                        # Legacy audio message (base64 in JSON)
                         audio_base64 = message_data.get("audio", "")
                         if audio_base64:
-                            # Decode audio
+                            started = time.perf_counter()
                             audio_bytes = base64.b64decode(audio_base64)
-                            
-                            # Convert to text
-                            try:
-                                transcript = await speech_to_text(audio_bytes, agent.language or "en")
-                                
-                                # Process with agent
-                                response = await agent.process_input(transcript)
-                                
-                                # Send text response
-                                await websocket.send_json({
-                                    "type": "text",
-                                    "message": response,
-                                    "transcript": transcript,
-                                    "state": agent.state.value
-                                })
-                                
-                                # Generate and send audio
-                                try:
-                                    audio_data = await text_to_speech(response, agent.language or "en")
-                                    await websocket.send_json({
-                                        "type": "audio",
-                                        "size": len(audio_data)
-                                    })
-                                    await websocket.send_bytes(audio_data)
-                                except Exception as e:
-                                    logger.error(f"Error generating speech: {e}")
-                            except Exception as e:
-                                logger.error(f"Error transcribing audio: {e}")
-                                await websocket.send_json({
-                                    "type": "error",
-                                    "message": "Sorry, I couldn't understand that. Could you repeat?"
-                                })
+                            metrics.observe("ws.decode_ms", (time.perf_counter() - started) * 1000)
+                            metrics.increment("ws.legacy_audio_messages")
+                            metrics.increment("ws.audio_in_bytes", len(data["text"]))
+                            await turns.interrupt()
+                            turns.start(respond_to_audio, outbox, agent, audio_bytes, framing)
                 
-                elif "bytes" in data:
-                    # Binary audio data
-                    audio_bytes = data["bytes"]
-                    
-                    # Convert to text
-                    try:
-                        transcript = await speech_to_text(audio_bytes, agent.language or "en")
-                        
-                        # Process with agent
-                        response = await agent.process_input(transcript)
-                        
-                        # Send text response
-                        await websocket.send_json({
-                            "type": "text",
-                            "message": response,
-                            "transcript": transcript,
-                            "state": agent.state.value
-                        })
-                        
-                        # Generate and send audio
+                elif data.get("bytes") is not None:
+                    if framing is not None:
+                        # Framed audio, transcribed as it arrives and answered once
+                        # the utterance is complete (FINAL frame, or end of speech
+                        # on a pcm16 stream)
                         try:
-                            audio_data = await text_to_speech(response, agent.language or "en")
-                            await websocket.send_json({
-                                "type": "audio",
-                                "size": len(audio_data)
-                            })
-                            await websocket.send_bytes(audio_data)
-                        except Exception as e:
-                            logger.error(f"Error generating speech: {e}")
-                    except Exception as e:
-                        logger.error(f"Error transcribing audio: {e}")
-                        await websocket.send_json({
-                            "type": "error",
-                            "message": "Sorry, I couldn't understand that. Could you repeat?"
-                        })
-                
+                            updates = framing.receive(data["bytes"])
+                        except ProtocolError as e:
+                            metrics.increment("ws.protocol_errors")
+                            await outbox.send_json({"type": "error", "message": str(e)})
+                            continue
+                        for update in updates:
+                            await live.update(update)
+                    else:
+                        # Legacy raw binary utterance (webm)
+                        metrics.increment("ws.legacy_audio_messages")
+                        metrics.increment("ws.audio_in_bytes", len(data["bytes"]))
+                        await turns.interrupt()
+                        turns.start(respond_to_audio, outbox, agent, data["bytes"], framing)
+            
             except WebSocketDisconnect:
                 logger.info(f"WebSocket disconnected for session {session_id}")
                 break
             except Exception as e:
                 logger.error(f"Error in WebSocket handler: {e}")
-                await websocket.send_json({
+                await outbox.send_json({
                     "type": "error",
                     "message": "An error occurred. Please try again."
                 })
@@ -180,6 +463,16 @@ async def voice_websocket(websocket: WebSocket, session_id: str):
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
     finally:
+        if live is not None:
+            live.close()
+        if turns is not None:
+            # A reply cut off by the hang-up is recorded as far as it was heard
+            await turns.close()
+        if outbox is not None:
+            await outbox.close()
+        discard_prefetch(session_id)
         if session_id in active_ws_sessions:
             del active_ws_sessions[session_id]
-
+            metrics.set_gauge("sessions.websockets", len(active_ws_sessions))
+            # The call is over for this client; don't leave its messages queued
+            await flush_session_writes()
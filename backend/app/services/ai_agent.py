@@ -1,12 +1,26 @@
-import json
+import asyncio
+import inspect
 import anthropic
 import os
-from typing import Dict, Any, List, Optional
+import time
+from typing import Callable, Dict, Any, List, Optional
 from datetime import datetime
 from app.models.agent import AgentState, ConversationMessage, AgentSession
+from app.services.auth_extractor import (
+    CPR_LENGTH, IDENTITY_TOOL, extract_digits, extract_identity, has_name_words, merge_cpr_digits,
+    names_match, validate_identity
+)
+from app.services.intent_classifier import (
+    INTENT_CONFIDENCE_THRESHOLD, classify_language, classify_order_intent
+)
+from app.services.llm_client import CLAUDE_TIMEOUT_SECONDS, get_llm_client
+from app.services.metrics import metrics
+from app.services.prompts import LLM_PERSONA, order_context, record_usage, system_blocks
+from app.services.response_templates import render, slot_values
 
 class ZainVoiceAgent:
-    def __init__(self, order_data: Dict[str, Any], session_id: str, db_service=None):
+    def __init__(self, order_data: Dict[str, Any], session_id: str, db_service=None,
+                 claude_client: Optional[anthropic.AsyncAnthropic] = None):
         self.session_id = session_id
         self.order_data = order_data
         self.state = AgentState.INIT
@@ -16,87 +30,192 @@ class ZainVoiceAgent:
         self.order_confirmed = False
         self.order_modified = False
         self.customer_name: Optional[str] = None
-        self.db_service = db_service  # Database service for persistence
+        self.customer_cpr = ""  # CPR digits collected so far (may span turns)
+        # DatabaseService, AsyncDatabaseService or the write-behind DatabaseWriter
+        self.db_service = db_service
+        # Primary keys of the call's AgentSession and Order rows, set at call
+        # start so persistence never has to look the session up by session_id
+        self.session_db_id: Optional[str] = None
+        self.order_db_id: Optional[str] = None
+        # Session store revision this agent was loaded or last saved at (None:
+        # never saved), and how much of the history that saved state held
+        self.revision: Optional[int] = None
+        self.saved_history = 0
         
-        # Initialize Claude client (using cheapest model: claude-3-haiku)
-        self.claude_client = anthropic.Anthropic(api_key=os.getenv("CLAUDE_API_KEY"))
+        # Async Claude client (using cheapest model: claude-3-haiku); defaults to
+        # the worker's shared pooled client so sessions reuse warm connections
+        self.claude_client = claude_client or get_llm_client()
         self.model = "claude-3-haiku-20240307"  # Cheapest Claude model
-        
-    def get_system_prompt(self) -> str:
-        """Get system prompt based on language"""
-        base_prompt_en = """You are Jassim, a sales representative at Zain Bahrain Telecommunications. You speak in Bahraini Gulf dialect when using Arabic, and clear American accent when using English.
-
-GOAL: Complete digital store orders accurately, comply with regulations, and maintain customer privacy in every interaction.
-
-PERSONALITY:
-- Professional yet warm and friendly
-- Patient and clear in explanations
-- Helpful and solution-oriented
-- Respectful of customer time
-
-CONVERSATION RULES:
-1. Always start with the fixed opening statement
-2. Always end with the fixed closing statement
-3. Listen carefully to customer responses
-4. Confirm understanding before moving forward
-5. Handle interruptions gracefully
-6. If customer requests callback, note preferred time and end call
-7. Speak naturally - avoid robotic or overly formal language
-8. Keep responses concise and clear
-
-CRITICAL RULES:
-- Device changes require NEW order - current order must be cancelled
-- Plan changes are allowed (any direction: new↔existing)
-- Always read back financial details EXACTLY as shown in system
-- Never guess or improvise financial information
-- If customer is not eligible, present BEST available alternative from system
-- Authentication must be completed before proceeding
-- Ownership must be verified before order confirmation
-
-CURRENT ORDER CONTEXT:
-{order_context}"""
+        self.llm_timeout = CLAUDE_TIMEOUT_SECONDS
+        self.llm_calls = 0
+        # Claude classification started on a stable partial transcript: (prompt, task)
+        self._early: Optional[tuple] = None
+        # Template slot values for this order, formatted once (see response_templates)
+        self._slot_values: Optional[Dict[str, str]] = None
+        # Order context sent with each state's Claude calls (see prompts.order_context)
+        self._order_contexts: Dict[AgentState, str] = {}
+        # Claude tokens used this turn: input, cache_write, cache_read, output
+        self._turn_tokens: Dict[str, int] = {}
 
-        base_prompt_ar = """أنت جاسم، موظف مبيعات في شركة زين البحرين للاتصالات. تتحدث باللهجة البحرينية الخليجية عند استخدام العربية، وبلهجة أمريكية واضحة عند استخدام الإنجليزية.
+    def to_state(self) -> Dict[str, Any]:
+        """Compact, JSON-serializable snapshot of the conversation (see session_store)"""
+        return {
+            "v": 1,
+            "rev": self.revision,
+            "id": self.session_id,
+            "sdb": self.session_db_id,
+            "odb": self.order_db_id,
+            "order": self.order_data,
+            "s": self.state.value,
+            "lang": self.language,
+            "auth": self.customer_authenticated,
+            "conf": self.order_confirmed,
+            "mod": self.order_modified,
+            "name": self.customer_name,
+            "cpr": self.customer_cpr,
+            "calls": self.llm_calls,
+            "h": [[msg.role, msg.content, msg.state, msg.timestamp] for msg in self.conversation_history]
+        }
 
-الهدف: إكمال إجراءات الطلبات القادمة من المتجر الإلكتروني بدقة، الالتزام بالأنظمة، والمحافظة على خصوصية العميل في كل تواصل.
+    @classmethod
+    def from_state(cls, state: Dict[str, Any], db_service=None,
+                   claude_client: Optional[anthropic.AsyncAnthropic] = None) -> "ZainVoiceAgent":
+        """Rehydrate an agent saved with to_state, on any worker"""
+        agent = cls(state["order"], state["id"], db_service, claude_client=claude_client)
+        agent.restore(state)
+        return agent
 
-الشخصية:
-- محترف وودود بنفس الوقت
-- صبور وواضح في الشرح
-- متعاون وحريص على المساعدة
-- يحترم وقت العميل
+    def restore(self, state: Dict[str, Any]) -> None:
+        """Replace this agent's conversation with a state saved by to_state"""
+        self.revision = state.get("rev")
+        self.session_db_id = state.get("sdb")
+        self.order_db_id = state.get("odb")
+        self.order_data = state["order"]
+        self.state = AgentState(state["s"])
+        self.language = state["lang"]
+        self.customer_authenticated = state["auth"]
+        self.order_confirmed = state["conf"]
+        self.order_modified = state["mod"]
+        self.customer_name = state["name"]
+        self.customer_cpr = state["cpr"]
+        self.llm_calls = state["calls"]
+        self.conversation_history = [
+            ConversationMessage(role=role, content=content, state=msg_state, timestamp=timestamp)
+            for role, content, msg_state, timestamp in state["h"]
+        ]
+        self.saved_history = len(self.conversation_history)
+        self._slot_values = None
+        self._order_contexts.clear()
 
-قواعد المحادثة:
-١. دايماً ابدأ بالجملة الافتتاحية الثابتة
-٢. دايماً اختم بالجملة الختامية الثابتة
-٣. اسمع العميل زين وبتركيز
-٤. تأكد من الفهم قبل ما تكمل
-٥. تعامل مع المقاطعات بشكل لبق
-٦. إذا العميل طلب اتصال ثاني، سجل الوقت المفضل وأنهي المكالمة
-٧. تكلم بشكل طبيعي - ما تكون رسمي زيادة
-٨. خلي ردودك مختصرة وواضحة
-
-قواعد مهمة:
-- تغيير الجهاز يتطلب طلب جديد - الطلب الحالي لازم ينلغى
-- تغيير الباقة مسموح (أي اتجاه: جديد↔موجود)
-- دايماً اقرأ التفاصيل المالية بالضبط كما موجودة في النظام
-- لا تخمن أو ترتجل معلومات مالية
-- إذا العميل ما يستحق، اعرض أحسن بديل متاح من النظام
-- التوثيق لازم يكتمل قبل ما تكمل
-- لازم تتأكد من الملكية قبل تأكيد الطلب
-
-سياق الطلب الحالي:
-{order_context}"""
+    def rebase(self, state: Dict[str, Any]) -> None:
+        """
+        Move this agent's unsaved messages on top of a newer saved state.
+        
+        Used when another request saved the session during this turn: its
+        state wins, and the messages this turn added are kept after its own.
+        """
+        unsaved = self.conversation_history[self.saved_history:]
+        self.restore(state)
+        self.conversation_history.extend(unsaved)
 
-        order_context = json.dumps(self.order_data, indent=2, ensure_ascii=False)
+    async def create_message(self, messages: List[Dict[str, Any]], max_tokens: int, **options) -> Any:
+        """Send a Messages API request and return the response.
         
-        if self.language == 'ar':
-            return base_prompt_ar.format(order_context=order_context)
-        else:
-            return base_prompt_en.format(order_context=order_context)
+        With ``LLM_PERSONA`` the persona and the current state's order context
+        go first, as cacheable system prompt blocks (see prompts.py). The call is bounded
+        by ``self.llm_timeout``; if the surrounding task is cancelled (e.g.
+        the WebSocket closed) the HTTP request is cancelled too.
+        """
+        request = {"model": self.model, "max_tokens": max_tokens, "messages": messages, **options}
+        if LLM_PERSONA:
+            request["system"] = self.system_prompt_blocks()
+        started = time.perf_counter()
+        response = await asyncio.wait_for(
+            self.claude_client.messages.create(**request),
+            timeout=self.llm_timeout
+        )
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        metrics.observe("llm.first_call_ms" if self.llm_calls == 0 else "llm.call_ms", elapsed_ms)
+        self.llm_calls += 1
+        for kind, count in record_usage(response.usage).items():
+            self._turn_tokens[kind] = self._turn_tokens.get(kind, 0) + count
+        return response
+    
+    async def ask_claude(self, prompt: str, max_tokens: int) -> str:
+        """Send a single-turn prompt to Claude and return the text reply"""
+        response = await self.create_message([{"role": "user", "content": prompt}], max_tokens)
+        return response.content[0].text.strip()
     
-    async def process_input(self, user_input: str) -> str:
-        """Main processing logic based on current state"""
+    async def ask_claude_tool(self, prompt: str, tool: Dict[str, Any], validate: Callable[[Any], Dict[str, Any]],
+                              max_tokens: int, retries: int = 1) -> Optional[Dict[str, Any]]:
+        """
+        Have Claude answer ``prompt`` by calling ``tool`` and return the validated arguments.
+        
+        ``validate`` returns the cleaned arguments or raises ValueError. An
+        invalid call is sent back as an error tool result, and Claude gets
+        ``retries`` more attempts to correct it; returns None if none passes.
+        """
+        messages = [{"role": "user", "content": prompt}]
+        for attempt in range(retries + 1):
+            response = await self.create_message(
+                messages, max_tokens, tools=[tool], tool_choice={"type": "tool", "name": tool["name"]}
+            )
+            metrics.increment("llm.tool_calls")
+            call = next((block for block in response.content
+                         if block.type == "tool_use" and block.name == tool["name"]), None)
+            try:
+                if call is None:
+                    raise ValueError(f"respond by calling the {tool['name']} tool")
+                return validate(call.input)
+            except ValueError as e:
+                metrics.increment("llm.tool_invalid")
+                error = str(e)
+            if attempt == retries:
+                break
+            metrics.increment("llm.tool_retries")
+            if call is not None:
+                messages = messages + [
+                    {"role": "assistant", "content": [
+                        {"type": "tool_use", "id": call.id, "name": call.name, "input": call.input}
+                    ]},
+                    {"role": "user", "content": [
+                        {"type": "tool_result", "tool_use_id": call.id, "content": error, "is_error": True}
+                    ]}
+                ]
+        metrics.increment("llm.tool_failures")
+        return None
+    
+    def order_context(self) -> str:
+        """The order fields the current state needs, serialized once per state"""
+        context = self._order_contexts.get(self.state)
+        if context is None:
+            context = self._order_contexts[self.state] = order_context(self.order_data, self.state)
+        return context
+        
+    def get_system_prompt(self) -> str:
+        """Get system prompt based on language"""
+        return "\n\n".join(block["text"] for block in self.system_prompt_blocks())
+    
+    def system_prompt_blocks(self) -> List[Dict[str, Any]]:
+        return system_blocks(self.language, self.order_context())
+    
+    def _observe_turn_tokens(self) -> None:
+        if not self._turn_tokens:
+            return
+        tokens = self._turn_tokens
+        metrics.observe("turn.llm_input_tokens", tokens["input"] + tokens["cache_write"] + tokens["cache_read"])
+        metrics.observe("turn.llm_cached_tokens", tokens["cache_read"])
+        metrics.observe("turn.llm_output_tokens", tokens["output"])
+        self._turn_tokens = {}
+    
+    async def process_input(self, user_input: str, record_response: bool = True) -> str:
+        """
+        Main processing logic based on current state
+        
+        With ``record_response=False`` the reply is not added to the history;
+        the caller records it with ``record_response`` once it is known how
+        much of it was spoken.
+        """
         # Add user message to history
         user_msg = ConversationMessage(
             role="user",
@@ -109,11 +228,13 @@ CURRENT ORDER CONTEXT:
         # Save to database if db_service is available
         if self.db_service:
             try:
-                self.db_service.add_message(
+                await self.save_to_database(
+                    "add_message",
                     self.session_id,
                     "user",
                     user_input,
-                    self.state.value
+                    self.state.value,
+                    session_db_id=self.session_db_id
                 )
             except Exception as e:
                 print(f"Error saving message to database: {e}")
@@ -153,157 +274,254 @@ CURRENT ORDER CONTEXT:
             response = await self.handle_ekyc_send(user_input)
             
         else:
-            response = "Thank you for choosing Zain, have a good day."
+            response = self.say(AgentState.CLOSE, "goodbye")
         
-        # Add assistant response to history
-        assistant_msg = ConversationMessage(
-            role="assistant",
-            content=response,
-            state=self.state.value,
-            timestamp=datetime.now().isoformat()
-        )
-        self.conversation_history.append(assistant_msg)
+        if record_response:
+            await self.record_response(response)
+        
+        # An early classification this turn did not use is wasted
+        self.cancel_early_classification()
+        self._observe_turn_tokens()
+        return response
+    
+    async def record_response(self, response: str) -> None:
+        """
+        Add the agent's reply to the history and save it with the session state.
+        
+        ``response`` is what the caller heard: the voice WebSocket passes only
+        the spoken part of a reply the caller interrupted, and an empty string
+        (nothing heard) saves just the state.
+        """
+        if response:
+            # Add assistant response to history
+            assistant_msg = ConversationMessage(
+                role="assistant",
+                content=response,
+                state=self.state.value,
+                timestamp=datetime.now().isoformat()
+            )
+            self.conversation_history.append(assistant_msg)
         
         # Save to database if db_service is available
         if self.db_service:
             try:
-                self.db_service.add_message(
-                    self.session_id,
-                    "assistant",
-                    response,
-                    self.state.value
-                )
+                if response:
+                    await self.save_to_database(
+                        "add_message",
+                        self.session_id,
+                        "assistant",
+                        response,
+                        self.state.value,
+                        session_db_id=self.session_db_id
+                    )
                 # Update session state in database
-                self.db_service.update_session(self.session_id, {
+                await self.save_to_database("update_session", self.session_id, {
                     "state": self.state.value,
                     "language": self.language,
                     "customer_authenticated": self.customer_authenticated,
                     "order_confirmed": self.order_confirmed,
                     "order_modified": self.order_modified,
                     "customer_name": self.customer_name
-                })
+                }, session_db_id=self.session_db_id)
             except Exception as e:
                 print(f"Error saving message to database: {e}")
+    
+    async def save_to_database(self, method: str, *args, **kwargs) -> None:
+        """Call a db_service method, awaiting it when the service is async"""
+        result = getattr(self.db_service, method)(*args, **kwargs)
+        if inspect.isawaitable(result):
+            await result
+
+    def classify_locally(self, classifier, user_input: str) -> tuple:
+        """
+        Run a local intent classifier and record whether it settled the turn.
         
-        return response
+        Returns ``(label, confident)``; when not confident the caller should ask
+        Claude and can still use ``label`` as its fallback guess.
+        """
+        started = time.perf_counter()
+        label, confidence = classifier(user_input)
+        metrics.observe("intent.local_ms", (time.perf_counter() - started) * 1000)
+        confident = label is not None and confidence >= INTENT_CONFIDENCE_THRESHOLD
+        metrics.increment("intent.local" if confident else "intent.llm")
+        return label, confident
+    
+    async def classify_with_claude(self, prompt: str) -> str:
+        """One-word classification from Claude, timed for the intent metrics"""
+        started = time.perf_counter()
+        early, self._early = self._early, None
+        if early is not None and early[0] == prompt:
+            # Started on a partial transcript that turned out to be final
+            metrics.increment("stt.early_hits")
+            answer = await early[1]
+        else:
+            self.cancel_early_classification(early)
+            answer = await self.ask_claude(prompt, max_tokens=10)
+        answer = answer.lower()
+        metrics.observe("intent.llm_ms", (time.perf_counter() - started) * 1000)
+        return answer
+    
+    def classification_prompt(self, user_input: str) -> Optional[str]:
+        """The Claude prompt this turn will need for user_input, None when not a closed-set turn or settled locally"""
+        if self.state == AgentState.LANGUAGE_SELECT:
+            classifier, prompt = classify_language, self.language_prompt
+        elif self.state == AgentState.ORDER_CONFIRM and self.order_confirmed:
+            classifier, prompt = classify_order_intent, self.order_intent_prompt
+        else:
+            return None
+        label, confidence = classifier(user_input)
+        if label is not None and confidence >= INTENT_CONFIDENCE_THRESHOLD:
+            return None
+        return prompt(user_input)
+    
+    def start_early_classification(self, partial: str) -> bool:
+        """
+        Start this turn's Claude classification on a stable partial transcript.
+        
+        Only the Claude fallback is worth starting early (the local classifier
+        takes microseconds). The answer is used if the final transcript is the
+        same text; otherwise it is cancelled by the next process_input.
+        """
+        prompt = self.classification_prompt(partial)
+        if prompt is None or (self._early is not None and self._early[0] == prompt):
+            return False
+        self.cancel_early_classification(self._early)
+        self._early = (prompt, asyncio.create_task(self.ask_claude(prompt, max_tokens=10)))
+        metrics.increment("stt.early_starts")
+        return True
+    
+    def cancel_early_classification(self, early: Optional[tuple] = None) -> None:
+        """Drop an early classification whose partial did not become the final transcript"""
+        if early is None:
+            early, self._early = self._early, None
+        if early is None:
+            return
+        metrics.increment("stt.early_misses")
+        task = early[1]
+        if task.done():
+            if not task.cancelled():
+                task.exception()  # retrieved, so a failure is not reported as unhandled
+        else:
+            task.cancel()
+    
+    def say(self, state: AgentState, scenario: str) -> str:
+        """Catalog line in the session language (English until one is chosen)"""
+        if self._slot_values is None:
+            self._slot_values = slot_values(self.order_data, self.customer_name)
+        return render(state, scenario, self.language, self._slot_values)
+    
+    def predict_response(self) -> Optional[str]:
+        """
+        The reply the caller's next turn most likely gets, or None.
+        
+        Mirrors the handlers below: the order read-back and the financial
+        breakdown follow whatever the caller says, and a read-back is
+        usually confirmed (see speculation.py).
+        """
+        if self.state == AgentState.ORDER_CONFIRM:
+            if not self.order_confirmed:
+                return self.generate_order_summary()
+            return self.say(AgentState.ORDER_CONFIRM, "confirmed")
+        if self.state == AgentState.ELIGIBILITY_CHECK:
+            return self.say(AgentState.ELIGIBILITY_CHECK, "financials")
+        return None
     
     def handle_init(self) -> str:
         """Opening statement"""
         # Start with bilingual opening
-        response = "Hello, this is Jassim speaking from Zain Bahrain, may I take a few minutes of your time. / مرحبا، معاك جاسم من زين البحرين، ممكن آخذ ثواني من وقتك"
+        response = self.say(AgentState.INIT, "greeting")
         # Update state after sending initial message
         self.state = AgentState.LANGUAGE_SELECT
         return response
     
     async def handle_language_selection(self, user_input: str) -> str:
         """Detect and set language preference"""
-        # Use Claude to detect language preference
-        prompt = f"""The customer just responded to: "Would you prefer to continue in Arabic or English? / تفضل نكمل بالعربي ولا الإنجليزي؟"
-
-Customer response: "{user_input}"
-
-Determine if they want Arabic or English. Respond with ONLY one word: "arabic" or "english"."""
+        language, confident = self.classify_locally(classify_language, user_input)
+        if confident:
+            self.language = language
+            return self.say(AgentState.LANGUAGE_SELECT, "confirmed")
         
+        # Ambiguous reply - use Claude to detect language preference
         try:
-            response = self.claude_client.messages.create(
-                model=self.model,
-                max_tokens=10,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            
-            lang_choice = response.content[0].text.strip().lower()
+            lang_choice = await self.classify_with_claude(self.language_prompt(user_input))
             
             if "arabic" in lang_choice or "عربي" in user_input.lower():
                 self.language = 'ar'
-                return "تمام، نكمل بالعربي. ممكن الاسم الكامل من فضلك؟"
-            else:
-                self.language = 'en'
-                return "Sure, we'll continue in English. Can I please have your full name?"
-        except:
-            # Fallback detection
-            arabic_keywords = ['عربي', 'العربية', 'arabic']
-            english_keywords = ['english', 'إنجليزي', 'انجليزي']
-            
-            if any(kw in user_input.lower() for kw in arabic_keywords):
-                self.language = 'ar'
-                return "تمام، نكمل بالعربي. ممكن الاسم الكامل من فضلك؟"
             else:
                 self.language = 'en'
-                return "Sure, we'll continue in English. Can I please have your full name?"
+            return self.say(AgentState.LANGUAGE_SELECT, "confirmed")
+        except Exception:
+            # Fallback to the local classifier's best guess
+            self.language = language or 'en'
+            return self.say(AgentState.LANGUAGE_SELECT, "confirmed")
     
-    async def handle_authentication(self, user_input: str) -> str:
-        """Handle name and CPR verification"""
-        # Extract customer info using Claude
-        prompt = f"""Extract customer information from this text: "{user_input}"
+    def language_prompt(self, user_input: str) -> str:
+        return f"""The customer just responded to: "Would you prefer to continue in Arabic or English? / تفضل نكمل بالعربي ولا الإنجليزي؟"
 
-Return JSON with:
-- name (full name if mentioned, otherwise null)
-- cpr (ID number if mentioned, 9 digits, otherwise null)
+Customer response: "{user_input}"
 
-Only include fields that are clearly stated. Return ONLY valid JSON."""
-        
-        try:
-            response = self.claude_client.messages.create(
-                model=self.model,
-                max_tokens=200,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            
-            extracted_text = response.content[0].text.strip()
-            # Try to parse JSON from response
-            if "{" in extracted_text:
-                json_start = extracted_text.find("{")
-                json_end = extracted_text.rfind("}") + 1
-                extracted_data = json.loads(extracted_text[json_start:json_end])
-            else:
-                extracted_data = {}
-        except:
-            extracted_data = {}
+Determine if they want Arabic or English. Respond with ONLY one word: "arabic" or "english"."""
+    
+    async def handle_authentication(self, user_input: str) -> str:
+        """Handle name and CPR verification"""
+        order_name = self.order_data.get('customer', {}).get('name', '')
+        order_cpr = self.order_data.get('customer', {}).get('cpr', '')
         
-        # Check if we have name and CPR
-        has_name = extracted_data.get('name') or self.customer_name
-        has_cpr = extracted_data.get('cpr')
+        # Local pass: fuzzy match against the name on the order and read any
+        # CPR digits (numeric, Arabic-Indic or spoken). Once the name is known
+        # the agent's last question was for the CPR.
+        name, digits = extract_identity(user_input, order_name, cpr_prompted=bool(self.customer_name))
+        extracted_data = None
+        if name is None and not self.customer_name and (not digits or has_name_words(user_input)):
+            # Caller said something other than the expected name - let Claude extract it
+            metrics.increment("auth.llm_turns")
+            extracted_data = await self.extract_identity_with_claude(user_input)
+            name = extracted_data.get('name') or None
+            digits = digits or extract_digits(str(extracted_data.get('cpr') or ''))
+        else:
+            metrics.increment("auth.local_turns")
         
-        if has_name and not self.customer_name:
-            self.customer_name = extracted_data.get('name', '')
+        if name and not self.customer_name:
+            self.customer_name = name
+            self._slot_values = None
+        cpr = merge_cpr_digits(self.customer_cpr, digits)
+        if cpr is None:
+            # More digits than a CPR: keep the ones collected and take the
+            # number from Claude if it can tell, otherwise ask for it again
+            metrics.increment("auth.cpr_overflow")
+            if extracted_data is None:
+                extracted_data = await self.extract_identity_with_claude(user_input)
+            cpr = extracted_data.get('cpr') or self.customer_cpr
+        self.customer_cpr = cpr
         
-        if not has_name:
-            if self.language == 'ar':
-                return "ممكن الاسم الكامل من فضلك؟"
-            else:
-                return "Can I please have your full name?"
+        if not self.customer_name:
+            return self.say(AgentState.AUTH, "ask_name")
         
-        if not has_cpr:
-            if self.language == 'ar':
-                return "تسلم. وممكن رقم الهوية؟"
-            else:
-                return "Thank you. And can I have your CPR number please?"
+        if len(self.customer_cpr) < CPR_LENGTH:
+            return self.say(AgentState.AUTH, "ask_cpr")
         
         # Verify against order data
-        order_name = self.order_data.get('customer', {}).get('name', '').lower()
-        order_cpr = self.order_data.get('customer', {}).get('cpr', '')
-        
-        provided_name = (extracted_data.get('name', '') or self.customer_name or '').lower()
-        provided_cpr = extracted_data.get('cpr', '')
-        
-        # Simple matching (can be enhanced)
-        name_match = order_name in provided_name or provided_name in order_name
-        cpr_match = order_cpr == provided_cpr
+        name_match = names_match(self.customer_name, order_name)
+        cpr_match = order_cpr == self.customer_cpr
         
         if name_match and cpr_match:
             self.customer_authenticated = True
             self.state = AgentState.ORDER_CONFIRM
-            
-            if self.language == 'ar':
-                return f"مشكور {self.customer_name or 'عليك'}، تأكدت من المعلومات. خلني أأكد تفاصيل طلبك..."
-            else:
-                return f"Thank you {self.customer_name or ''}, I've verified your details. Let me confirm your order details..."
+            return self.say(AgentState.AUTH, "verified")
         else:
             self.state = AgentState.OWNERSHIP_CHECK
-            if self.language == 'ar':
-                return "ألاحظ إن المعلومات ما تطابق السجلات عندنا. هل تتصل نيابة عن صاحب الحساب؟"
-            else:
-                return "I notice the details don't match our records. Are you calling on behalf of the account holder?"
+            return self.say(AgentState.AUTH, "details_mismatch")
+    
+    async def extract_identity_with_claude(self, user_input: str) -> Dict[str, Any]:
+        """Ask Claude for the name/CPR in a turn the local extractor couldn't resolve"""
+        prompt = f"""Extract customer information from this text: "{user_input}"
+
+Only include fields that are clearly stated."""
+        
+        try:
+            return await self.ask_claude_tool(prompt, IDENTITY_TOOL, validate_identity, max_tokens=200) or {}
+        except Exception:
+            return {}
     
     async def handle_ownership_check(self, user_input: str) -> str:
         """Handle ownership verification"""
@@ -311,10 +529,7 @@ Only include fields that are clearly stated. Return ONLY valid JSON."""
         # In production, would collect correct owner details
         self.state = AgentState.ORDER_CONFIRM
         
-        if self.language == 'ar':
-            return "فهمت. خلني أأكد تفاصيل الطلب..."
-        else:
-            return "I understand. Let me confirm the order details..."
+        return self.say(AgentState.OWNERSHIP_CHECK, "acknowledged")
     
     async def handle_order_confirmation(self, user_input: str) -> str:
         """Read order details and get confirmation"""
@@ -325,8 +540,27 @@ Only include fields that are clearly stated. Return ONLY valid JSON."""
             return order_summary
         
         # Customer response to confirmation
-        # Use Claude to detect intent
-        prompt = f"""Customer response to order confirmation: "{user_input}"
+        intent, confident = self.classify_locally(classify_order_intent, user_input)
+        if not confident:
+            intent = await self.classify_order_intent_with_claude(user_input, fallback=intent)
+        
+        if intent == 'confirm':
+            self.state = AgentState.ELIGIBILITY_CHECK
+            return self.say(AgentState.ORDER_CONFIRM, "confirmed")
+        else:
+            self.state = AgentState.MODIFICATION
+            return self.say(AgentState.ORDER_CONFIRM, "ask_modification")
+    
+    async def classify_order_intent_with_claude(self, user_input: str, fallback: Optional[str]) -> str:
+        """Ask Claude for the confirm/modify/reject intent of an ambiguous reply"""
+        try:
+            return await self.classify_with_claude(self.order_intent_prompt(user_input))
+        except Exception:
+            # Fallback to the local classifier's best guess
+            return fallback or 'confirm'
+    
+    def order_intent_prompt(self, user_input: str) -> str:
+        return f"""Customer response to order confirmation: "{user_input}"
 
 Determine intent:
 - "confirm" if they accept/agree
@@ -334,35 +568,6 @@ Determine intent:
 - "reject" if they don't want it
 
 Respond with ONLY one word: confirm, modify, or reject."""
-        
-        try:
-            response = self.claude_client.messages.create(
-                model=self.model,
-                max_tokens=10,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            intent = response.content[0].text.strip().lower()
-        except:
-            # Fallback
-            if any(word in user_input.lower() for word in ['yes', 'correct', 'نعم', 'صح', 'صحيح']):
-                intent = 'confirm'
-            elif any(word in user_input.lower() for word in ['no', 'change', 'لا', 'غير', 'تغيير']):
-                intent = 'modify'
-            else:
-                intent = 'confirm'
-        
-        if intent == 'confirm':
-            self.state = AgentState.ELIGIBILITY_CHECK
-            if self.language == 'ar':
-                return "ممتاز! خلني أشيك استحقاقك..."
-            else:
-                return "Great! Let me check your eligibility..."
-        else:
-            self.state = AgentState.MODIFICATION
-            if self.language == 'ar':
-                return "فهمت. شنو التغيير اللي تبي تسويه؟"
-            else:
-                return "I understand. What would you like to change?"
     
     async def handle_modification(self, user_input: str) -> str:
         """Handle order modifications"""
@@ -371,41 +576,14 @@ Respond with ONLY one word: confirm, modify, or reject."""
         self.order_modified = True
         self.state = AgentState.ORDER_CONFIRM
         self.order_confirmed = False  # Re-confirm modified order
+        self._slot_values = None  # Order details may have changed
+        self._order_contexts.clear()
         
-        if self.language == 'ar':
-            return "تمام، حدثت الطلب. خلني أأكد التفاصيل المحدثة..."
-        else:
-            return "Perfect, I've updated the order. Let me confirm the updated details..."
+        return self.say(AgentState.MODIFICATION, "updated")
     
     async def handle_eligibility_check(self, user_input: str) -> str:
         """Handle eligibility check and present financial details"""
-        financial = self.order_data.get('financial', {})
-        
-        # Format financial details
-        monthly = financial.get('monthly', 0)
-        advance = financial.get('advance', 0)
-        upfront = financial.get('upfront', 0)
-        vat = financial.get('vat', 0)
-        total = financial.get('total', 0)
-        
-        if self.language == 'ar':
-            response = f"""ممتاز! خلني أشيك استحقاقك. هذي التفاصيل:
-- الدفعة الشهرية: {monthly:.3f} دينار
-- الدفعة المقدمة: {advance:.3f} دينار
-- الدفعة المسبقة: {upfront:.3f} دينار
-- ضريبة القيمة المضافة: {vat:.3f} دينار
-- المبلغ الإجمالي للدفع اليوم: {total:.3f} دينار
-
-مناسب لك؟"""
-        else:
-            response = f"""Great! Let me check your eligibility. Here are the details:
-- Monthly payment: {monthly:.3f} Dinars
-- Advance payment: {advance:.3f} Dinars
-- Upfront payment: {upfront:.3f} Dinars
-- VAT: {vat:.3f} Dinars
-- Total amount to pay today: {total:.3f} Dinars
-
-Does this work for you?"""
+        response = self.say(AgentState.ELIGIBILITY_CHECK, "financials")
         
         self.state = AgentState.CROSS_SELL
         return response
@@ -413,34 +591,22 @@ Does this work for you?"""
     async def handle_commitment_approval(self, user_input: str) -> str:
         """Handle commitment approval requests"""
         # Acknowledge and schedule callback
-        if self.language == 'ar':
-            return "أكيد، بقدم طلب للموافقة. بيصل فيك خلال 24 ساعة. شكراً لاختيارك زين، مع السلامة."
-        else:
-            return "Absolutely, I'll submit the approval request. You'll receive a callback within 24 hours. Thank you for choosing Zain, have a good day."
+        return self.say(AgentState.COMMITMENT_APPROVAL, "callback")
     
     async def handle_cross_sell(self, user_input: str) -> str:
         """Handle cross-selling accessories"""
         # Check if customer accepted
         if any(word in user_input.lower() for word in ['yes', 'نعم', 'أكيد', 'ok']):
-            if self.language == 'ar':
-                response = "حلو! ضفت الإكسسوارات لطلبك. الحين باعث لك رابط التوقيع الرقمي..."
-            else:
-                response = "Great! I've added the accessories to your order. Now I'm sending you the digital signing link..."
+            response = self.say(AgentState.CROSS_SELL, "accepted")
         else:
-            if self.language == 'ar':
-                response = "ما فيها مشكلة. الحين باعث لك رابط التوقيع الرقمي..."
-            else:
-                response = "No problem at all. Now I'm sending you the digital signing link..."
+            response = self.say(AgentState.CROSS_SELL, "declined")
         
         self.state = AgentState.EKYC_SEND
         return response
     
     async def handle_ekyc_send(self, user_input: str) -> str:
         """Handle eKYC sending"""
-        if self.language == 'ar':
-            response = "ممتاز! أرسلت لك رابط التوقيع الرقمي والدفع عن طريق رسالة نصية. من فضلك كمله خلال ساعة. شكراً لاختيارك زين، مع السلامة."
-        else:
-            response = "Excellent! I've sent you the digital signing and payment link via SMS. Please complete it within one hour. Thank you for choosing Zain, have a good day."
+        response = self.say(AgentState.EKYC_SEND, "closing")
         
         self.state = AgentState.CLOSE
         return response
@@ -449,38 +615,16 @@ Does this work for you?"""
         """Generate order summary in current language"""
         order_type = self.order_data.get('order_type', 'new_line')
         device = self.order_data.get('device')
-        line_details = self.order_data.get('line_details', {})
         
-        if self.language == 'ar':
-            if order_type == 'new_line' and device:
-                sub_num = line_details.get('sub_number', 'N/A')
-                device_name = device.get('name', 'N/A')
-                return f"خلني أأكد تفاصيل طلبك. طلبك لخط جديد برقم فرعي {sub_num} والجهاز {device_name}. صح؟"
-            elif order_type == 'new_line':
-                sub_num = line_details.get('sub_number', 'N/A')
-                return f"خلني أأكد تفاصيل طلبك. طلبك لخط جديد فقط برقم فرعي {sub_num}. صح؟"
-            elif order_type == 'existing_line' and device:
-                number = line_details.get('number', 'N/A')
-                device_name = device.get('name', 'N/A')
-                return f"خلني أأكد تفاصيل طلبك. طلبك لـ {device_name} على رقمك الموجود {number}. صح؟"
-            elif order_type == 'cash' and device:
-                device_name = device.get('name', 'N/A')
-                return f"خلني أأكد تفاصيل طلبك. طلبك لـ {device_name} على أساس كاش. صح؟"
+        if order_type == 'new_line' and device:
+            scenario = "new_line_with_device"
+        elif order_type == 'new_line':
+            scenario = "new_line"
+        elif order_type == 'existing_line' and device:
+            scenario = "existing_line_with_device"
+        elif order_type == 'cash' and device:
+            scenario = "cash_with_device"
         else:
-            if order_type == 'new_line' and device:
-                sub_num = line_details.get('sub_number', 'N/A')
-                device_name = device.get('name', 'N/A')
-                return f"Let me confirm your order details. Your order is for a new line with sub-number {sub_num} and the device {device_name}. Is this correct?"
-            elif order_type == 'new_line':
-                sub_num = line_details.get('sub_number', 'N/A')
-                return f"Let me confirm your order details. Your order is for a new line only with sub-number {sub_num}. Is this correct?"
-            elif order_type == 'existing_line' and device:
-                number = line_details.get('number', 'N/A')
-                device_name = device.get('name', 'N/A')
-                return f"Let me confirm your order details. Your order is for an {device_name} under your existing number {number}. Is this correct?"
-            elif order_type == 'cash' and device:
-                device_name = device.get('name', 'N/A')
-                return f"Let me confirm your order details. Your order is for an {device_name} on a cash basis. Is this correct?"
-        
-        return "Let me confirm your order details..."
+            scenario = "summary_fallback"
+        return self.say(AgentState.ORDER_CONFIRM, scenario)
 
@@ -0,0 +1,264 @@
+"""
+Local extraction of the caller's name and CPR for the authentication step.
+
+CPR numbers are 9 digits and may arrive as ASCII digits, Arabic-Indic digits
+or spoken digit words in either language ("eight five oh...", "ثمانية خمسة
+صفر..."), possibly split over several turns. Names are fuzzy-matched against
+the name already on the order, so the common case needs no LLM call.
+
+Turns the local pass can't resolve go to Claude through the
+``record_identity`` tool (``IDENTITY_TOOL``), and its arguments are checked
+by ``validate_identity`` before they are used.
+"""
+import re
+from difflib import SequenceMatcher
+from typing import Any, Dict, Optional, Tuple
+
+from app.services.intent_classifier import normalize
+from app.services.metrics import metrics
+
+CPR_LENGTH = 9
+NAME_TOKEN_SIMILARITY = 0.8  # Per-token fuzzy ratio to count as the same name part
+NAME_MATCH_THRESHOLD = 0.5  # Share of the expected name parts the caller must say
+NAME_MIN_PARTS = 2  # ...and at least this many of them (all of a shorter name)
+NAME_MAX_LENGTH = 80
+
+_DIGIT_FOLDS = str.maketrans("٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹", "01234567890123456789")
+
+# Keys are in normalize() form (Arabic letter variants folded, ة -> ه)
+SPOKEN_DIGITS = {
+    "zero": "0", "one": "1", "two": "2", "three": "3",
+    "four": "4", "five": "5", "six": "6", "seven": "7", "eight": "8", "nine": "9",
+    "صفر": "0", "واحد": "1", "اثنين": "2", "اثنان": "2", "ثنين": "2", "اتنين": "2",
+    "ثلاثه": "3", "ثلاث": "3", "تلاته": "3", "اربعه": "4", "اربع": "4",
+    "خمسه": "5", "خمس": "5", "سته": "6", "ست": "6", "سبعه": "7", "سبع": "7",
+    "ثمانيه": "8", "ثمان": "8", "ثمنيه": "8", "تسعه": "9", "تسع": "9"
+}
+REPEATERS = {"double": 2, "triple": 3, "دبل": 2}
+# Zero only between other digits ("eight five oh one"); elsewhere it's a
+# filler ("oh, it's eight five...")
+SPOKEN_ZERO_LETTERS = {"oh", "o"}
+
+# Lead-ins callers put before their name
+NAME_FILLERS = {
+    "my", "name", "is", "its", "it's", "this", "i", "am", "i'm", "im", "hi",
+    "hello", "yes", "sure", "ok", "okay", "the", "and", "cpr", "number", "id",
+    "اسمي", "انا", "معاك", "معك", "الاسم", "هلا", "مرحبا", "نعم", "اي", "رقم", "الهويه", "و"
+}
+
+_SEPARATORS = re.compile(r'[\s\-.,/]+')
+_CPR_PATTERN = re.compile(r'^[0-9]{9}$')
+
+IDENTITY_TOOL = {
+    "name": "record_identity",
+    "description": "Record the customer's full name and CPR number as stated by the caller. "
+                   "Use null for anything the caller did not clearly say.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "name": {
+                "type": ["string", "null"],
+                "description": "Full name as spoken, without titles or filler words"
+            },
+            "cpr": {
+                "type": ["string", "null"],
+                "pattern": _CPR_PATTERN.pattern,
+                "description": "The 9-digit CPR number as ASCII digits, no spaces or dashes"
+            }
+        },
+        "required": ["name", "cpr"],
+        "additionalProperties": False
+    }
+}
+
+
+def normalize_digits(text: str) -> str:
+    """Map Arabic-Indic and Persian digits to ASCII"""
+    return text.translate(_DIGIT_FOLDS)
+
+
+def _spoken_digit(token: str) -> Optional[str]:
+    if token in SPOKEN_DIGITS:
+        return SPOKEN_DIGITS[token]
+    # Arabic conjunction: "وخمسه" = "and five"
+    if token.startswith("و") and token[1:] in SPOKEN_DIGITS:
+        return SPOKEN_DIGITS[token[1:]]
+    return None
+
+
+def _is_digit_token(token: str) -> bool:
+    return token.isdigit() or _spoken_digit(token) is not None
+
+
+def _between_digits(tokens: list, index: int) -> bool:
+    """Whether the "oh" at ``index`` has digits on both sides (other "oh"s and repeaters aside)"""
+    skip = REPEATERS.keys() | SPOKEN_ZERO_LETTERS
+    before = next((token for token in reversed(tokens[:index]) if token not in skip), "")
+    after = next((token for token in tokens[index + 1:] if token not in skip), "")
+    return _is_digit_token(before) and _is_digit_token(after)
+
+
+def extract_digits(text: str) -> str:
+    """
+    All digits the caller said, in order.
+    
+    Numeric and spoken digits can be mixed and separated by spaces, dashes or
+    dots; "double five" repeats the following digit, and "oh" is a zero only
+    between other digits.
+    """
+    tokens = normalize(normalize_digits(text).replace("-", " ")).split()
+    digits = []
+    repeat = 1
+    for index, token in enumerate(tokens):
+        if token in REPEATERS:
+            repeat = REPEATERS[token]
+            continue
+        if token.isdigit():
+            digits.append(token[0] * repeat + token[1:])
+        else:
+            spoken = _spoken_digit(token)
+            if spoken is None and token in SPOKEN_ZERO_LETTERS and _between_digits(tokens, index):
+                spoken = "0"
+            if spoken is None:
+                repeat = 1
+                continue
+            digits.append(spoken * repeat)
+        repeat = 1
+    return "".join(digits)
+
+
+_WHOLE_CPR = re.compile(rf'(?<!\d)\d{{{CPR_LENGTH}}}(?!\d)')
+
+
+def cpr_digits(text: str, expected_name: str = "", prompted: bool = False) -> str:
+    """
+    The digits in one caller turn that can be (part of) their CPR.
+    
+    A whole number is always taken, and so is any fragment said right after
+    the agent asked for the CPR (``prompted``). Otherwise a fragment only
+    counts when the turn is mostly digits: numbers said in passing ("I have
+    2 lines", a house number) would end up in the CPR.
+    """
+    whole = _WHOLE_CPR.search(normalize_digits(text))
+    if whole:
+        return whole.group()
+    digits = extract_digits(text)
+    if not digits or len(digits) == CPR_LENGTH or prompted:
+        return digits
+    tokens = normalize(normalize_digits(text).replace("-", " ")).split()
+    numbers = sum(1 for token in tokens if _is_digit_token(token))
+    expected_parts = normalize(expected_name).split()
+    words = [token for token in _name_tokens(text) if not _name_part(token, expected_parts)]
+    return digits if numbers > len(words) else ""
+
+
+def merge_cpr_digits(previous: str, new: str) -> Optional[str]:
+    """
+    Accumulate CPR digits across turns; a complete new number replaces a partial one.
+    
+    Returns None when the digits don't add up to a CPR (more than
+    ``CPR_LENGTH`` together, and ``new`` isn't a whole number on its own):
+    there's no telling which ones the caller meant, so the caller keeps
+    ``previous`` and asks Claude or the customer.
+    """
+    if not new:
+        return previous
+    if len(new) == CPR_LENGTH:
+        return new
+    if len(previous) + len(new) > CPR_LENGTH:
+        return None
+    return previous + new
+
+
+def _name_tokens(text: str) -> list:
+    tokens = normalize(re.sub(r'\d+', ' ', normalize_digits(text))).split()
+    return [t for t in tokens if t not in NAME_FILLERS and _spoken_digit(t) is None
+            and t not in REPEATERS and t not in SPOKEN_ZERO_LETTERS]
+
+
+def has_name_words(text: str) -> bool:
+    """Whether the turn contains words other than digits and lead-in fillers"""
+    return bool(_name_tokens(text))
+
+
+def _name_part(token: str, parts: list) -> bool:
+    return any(SequenceMatcher(None, part, token).ratio() >= NAME_TOKEN_SIMILARITY for part in parts)
+
+
+def _matched_parts(provided: str, expected: str) -> Tuple[int, int]:
+    """How many of the expected name's parts the caller said (fuzzy per part), out of how many"""
+    expected_tokens = normalize(expected).split()
+    provided_tokens = _name_tokens(provided)
+    if not provided_tokens:
+        return 0, len(expected_tokens)
+    return sum(1 for part in expected_tokens if _name_part(part, provided_tokens)), len(expected_tokens)
+
+
+def name_match_score(provided: str, expected: str) -> float:
+    """Share of the expected name's parts that the caller said (fuzzy per part)"""
+    matched, total = _matched_parts(provided, expected)
+    return matched / total if total else 0.0
+
+
+def names_match(provided: Optional[str], expected: str) -> bool:
+    """
+    Whether the caller gave the name on the order: at least half of its parts,
+    and at least ``NAME_MIN_PARTS`` of them, so a first name alone ("Ali") is
+    not taken for "Ali Hassan"
+    """
+    if not provided:
+        return False
+    matched, total = _matched_parts(provided, expected)
+    return total > 0 and matched >= min(NAME_MIN_PARTS, total) and matched / total >= NAME_MATCH_THRESHOLD
+
+
+def extract_identity(text: str, expected_name: str, cpr_prompted: bool = False) -> Tuple[Optional[str], str]:
+    """
+    Locally extract ``(name, digits)`` from one caller turn.
+    
+    ``name`` is the expected name when the caller's words fuzzy-match it, and
+    None otherwise (including when they said some other name - that case is
+    left to the LLM). ``digits`` holds the CPR digits said in this turn (see
+    ``cpr_digits``; ``cpr_prompted`` when the agent just asked for the CPR).
+    """
+    digits = cpr_digits(text, expected_name, cpr_prompted)
+    name = expected_name if expected_name and names_match(text, expected_name) else None
+    return name, digits
+
+
+def validate_identity(arguments: Any) -> Dict[str, Optional[str]]:
+    """
+    Check ``record_identity`` arguments against ``IDENTITY_TOOL``'s schema.
+    
+    Returns ``{"name": ..., "cpr": ...}`` with None for fields not given, or
+    raises ValueError with a message the model can act on.
+    """
+    if not isinstance(arguments, dict):
+        raise ValueError("arguments must be an object with name and cpr")
+    unexpected = sorted(set(arguments) - {"name", "cpr"})
+    if unexpected:
+        raise ValueError(f"unexpected fields: {', '.join(unexpected)}")
+    
+    name = arguments.get("name")
+    if name is not None:
+        if not isinstance(name, str):
+            raise ValueError("name must be a string or null")
+        name = name.strip()
+        if len(name) > NAME_MAX_LENGTH or any(char.isdigit() for char in name):
+            raise ValueError("name must be the caller's name only, without digits")
+    
+    cpr = arguments.get("cpr")
+    if cpr is not None:
+        if not isinstance(cpr, str) or not _CPR_PATTERN.match(cpr):
+            raise ValueError(f"cpr must be a string of exactly {CPR_LENGTH} ASCII digits or null")
+    
+    return {"name": name or None, "cpr": cpr}
+
+
+def _local_share() -> float:
+    local = metrics.counter("auth.local_turns")
+    total = local + metrics.counter("auth.llm_turns")
+    return round(local / total, 4) if total else 0.0
+
+
+metrics.derive("auth.local_share", _local_share)
@@ -0,0 +1,269 @@
+"""
+Write-behind persistence for conversation messages and session state.
+
+``DatabaseService.add_message``/``update_session`` each look the session up,
+commit and refresh, so a turn cost about 8 synchronous round trips on the
+event loop. ``DatabaseWriter`` has the same two methods but only queues the
+write; a background task coalesces everything queued per flush interval into
+one bulk insert, one bulk update and one commit on the async engine. Agents
+pass their session's primary key along, so the session_id lookup is only
+needed for writes queued without one.
+
+Queued writes are flushed when a call ends and on shutdown. A failed batch
+is queued again for the next flush unless the database was reachable and
+rejected it: writes that have been in ``DB_WRITER_MAX_ATTEMPTS`` such
+batches are then tried one at a time, and those that fail on their own are
+quarantined (logged, counted in ``db_writer.quarantined`` and dropped) so
+one bad row can't hold back everything queued with it.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+from app.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DB_FLUSH_INTERVAL_SECONDS = float(os.getenv("DB_FLUSH_INTERVAL_SECONDS", "0.5"))
+DB_FLUSH_MAX_BATCH = int(os.getenv("DB_FLUSH_MAX_BATCH", "200"))
+DB_WRITER_MAX_PENDING = int(os.getenv("DB_WRITER_MAX_PENDING", "10000"))
+DB_WRITER_MAX_ATTEMPTS = int(os.getenv("DB_WRITER_MAX_ATTEMPTS", "3"))
+
+# The database couldn't be reached (or was busy): the writes themselves are fine
+UNAVAILABLE_ERRORS = (OperationalError, InterfaceError, OSError, asyncio.TimeoutError)
+
+
+def _describe(error: Exception) -> str:
+    """The error without the SQL parameters SQLAlchemy appends to its message (they are caller data)"""
+    return f"{type(error).__name__}: {getattr(error, 'orig', None) or error}"
+
+_writer: Optional["DatabaseWriter"] = None
+
+
+class DatabaseWriter:
+    """Queues add_message/update_session calls and writes them in batches"""
+
+    def __init__(self, session_factory: Optional[Callable] = None,  # async_sessionmaker
+                 flush_interval: float = DB_FLUSH_INTERVAL_SECONDS,
+                 max_batch: int = DB_FLUSH_MAX_BATCH,
+                 max_attempts: int = DB_WRITER_MAX_ATTEMPTS):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_attempts = max_attempts
+        self._messages: List[Dict[str, Any]] = []
+        self._updates: Dict[str, Dict[str, Any]] = {}
+        self._update_attempts: Dict[str, int] = {}  # Failed batches each queued update was in
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    def add_message(self, session_id: str, role: str, content: str, state: str,
+                    session_db_id: Optional[str] = None) -> None:
+        """Queue a conversation message (timestamped now, not at flush time)"""
+        self._messages.append({
+            "session_id": session_id,
+            "session_db_id": session_db_id,
+            "role": role,
+            "content": content,
+            "state": state,
+            "timestamp": datetime.now(timezone.utc),
+            "attempts": 0  # Failed batches it was in
+        })
+        if len(self._messages) >= self.max_batch:
+            self._wake.set()
+        metrics.set_gauge("db_writer.pending", len(self._messages))
+
+    def update_session(self, session_id: str, updates: Dict[str, Any],
+                       session_db_id: Optional[str] = None) -> None:
+        """Queue session column updates; later updates to the same session win"""
+        pending = self._updates.setdefault(session_id, {})
+        pending.update(updates)
+        if session_db_id is not None:
+            pending["id"] = session_db_id
+
+    def pending(self) -> int:
+        return len(self._messages) + len(self._updates)
+
+    async def flush(self) -> int:
+        """Write everything queued so far; returns the number of messages written"""
+        async with self._flush_lock:
+            messages, self._messages = self._messages, []
+            updates, self._updates = self._updates, {}
+            if not messages and not updates:
+                return 0
+            started = time.perf_counter()
+            try:
+                await self._write_batch(messages, updates)
+            except Exception as e:
+                logger.warning(f"Database error flushing queued writes: {_describe(e)}")
+                metrics.increment("db_writer.failed_flushes")
+                for message in messages:
+                    message["attempts"] += 1
+                for session_id in updates:
+                    self._update_attempts[session_id] = self._update_attempts.get(session_id, 0) + 1
+                written = 0
+                if not isinstance(e, UNAVAILABLE_ERRORS):
+                    written, messages, updates = await self._write_alone(messages, updates)
+                self._requeue(messages, updates)
+                metrics.increment("db_writer.messages", written)
+                return written
+            for session_id in updates:
+                self._update_attempts.pop(session_id, None)
+            metrics.observe("db_writer.flush_ms", (time.perf_counter() - started) * 1000)
+            metrics.observe("db_writer.batch_messages", len(messages))
+            metrics.increment("db_writer.messages", len(messages))
+            metrics.set_gauge("db_writer.pending", len(self._messages))
+            return len(messages)
+
+    async def _write_alone(self, messages: List[Dict[str, Any]], updates: Dict[str, Dict[str, Any]]):
+        """Write each write that has used up its attempts on its own and quarantine
+        those that still fail; returns the number of messages written and the
+        writes left to queue again"""
+        written = 0
+        unavailable = False
+        left_messages: List[Dict[str, Any]] = []
+        left_updates: Dict[str, Dict[str, Any]] = {}
+        for message in messages:
+            if unavailable or message["attempts"] < self.max_attempts:
+                left_messages.append(message)
+                continue
+            try:
+                await self._write_batch([message], {})
+                written += 1
+            except UNAVAILABLE_ERRORS:
+                unavailable = True
+                left_messages.append(message)
+            except Exception as e:
+                self._quarantine("message", message["session_id"], e)
+        for session_id, values in updates.items():
+            if unavailable or self._update_attempts[session_id] < self.max_attempts:
+                left_updates[session_id] = values
+                continue
+            try:
+                await self._write_batch([], {session_id: values})
+                self._update_attempts.pop(session_id)
+            except UNAVAILABLE_ERRORS:
+                unavailable = True
+                left_updates[session_id] = values
+            except Exception as e:
+                self._quarantine("session update", session_id, e)
+                self._update_attempts.pop(session_id)
+        return written, left_messages, left_updates
+
+    def _quarantine(self, kind: str, session_id: str, error: Exception) -> None:
+        metrics.increment("db_writer.quarantined")
+        # The row itself is caller data (transcripts, names), so it isn't logged
+        logger.error(f"Quarantined queued {kind} for session {session_id} after {self.max_attempts} failed "
+                     f"batches: {_describe(error)}")
+
+    def _requeue(self, messages: List[Dict[str, Any]], updates: Dict[str, Dict[str, Any]]) -> None:
+        # Keep failed writes for the next flush, newer updates on top, but never
+        # let an unreachable database grow the queue without bound
+        self._messages = messages + self._messages
+        overflow = len(self._messages) - DB_WRITER_MAX_PENDING
+        if overflow > 0:
+            del self._messages[:overflow]
+            metrics.increment("db_writer.dropped", overflow)
+        for session_id, values in self._updates.items():
+            updates.setdefault(session_id, {}).update(values)
+        self._updates = updates
+
+    async def _write_batch(self, messages: List[Dict[str, Any]], updates: Dict[str, Dict[str, Any]]) -> None:
+        from app.models.db_models import AgentSession, ConversationMessage
+
+        async with self._session_factory()() as db:
+            ids = {message["session_id"]: message["session_db_id"]
+                   for message in messages if message["session_db_id"] is not None}
+            ids.update((session_id, values["id"]) for session_id, values in updates.items() if "id" in values)
+            unresolved = ({message["session_id"] for message in messages} | set(updates)) - set(ids)
+            if unresolved:
+                result = await db.execute(
+                    select(AgentSession.session_id, AgentSession.id)
+                    .where(AgentSession.session_id.in_(unresolved))
+                )
+                ids.update(result.all())
+                metrics.increment("db_writer.session_lookups", len(unresolved))
+            rows = [
+                {key: value for key, value in message.items() if key not in ("session_db_id", "attempts")}
+                | {"session_id": ids[message["session_id"]]}
+                for message in messages if message["session_id"] in ids
+            ]
+            changes = [
+                dict({key: value for key, value in values.items() if hasattr(AgentSession, key)},
+                     id=ids[session_id])
+                for session_id, values in updates.items() if session_id in ids
+            ]
+            if len(rows) < len(messages):
+                metrics.increment("db_writer.orphaned", len(messages) - len(rows))
+                unknown = sorted({message["session_id"] for message in messages} - set(ids))
+                logger.warning(f"Dropping {len(messages) - len(rows)} queued messages for unknown sessions {unknown}")
+            if rows:
+                await db.execute(insert(ConversationMessage), rows)
+            if changes:
+                await db.execute(update(AgentSession), changes)
+            await db.commit()
+
+    async def _flush_forever(self) -> None:
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    def _session_factory(self) -> Callable:
+        if self.session_factory is not None:
+            return self.session_factory
+        from app.database import AsyncSessionLocal
+        if AsyncSessionLocal is None:
+            raise RuntimeError("The async database engine isn't configured "
+                               "(see the warning logged at startup); queued writes can't be saved")
+        return AsyncSessionLocal
+
+    def start(self) -> None:
+        """Start the flush loop; raises RuntimeError when there is no database to write to"""
+        self._session_factory()
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_forever())
+
+    async def close(self) -> None:
+        """Stop the flush loop and write whatever is still queued"""
+        if self._task is not None:
+            # Let the loop finish its current flush rather than cancelling a
+            # batch mid-write
+            self._closing = True
+            self._wake.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+
+def get_db_writer() -> DatabaseWriter:
+    """Return the worker's write-behind queue, creating it on first use"""
+    global _writer
+    if _writer is None:
+        _writer = DatabaseWriter()
+    return _writer
+
+
+async def startup_db_writer() -> None:
+    from app.database import USE_DATABASE
+
+    if USE_DATABASE:
+        get_db_writer().start()
+
+
+async def shutdown_db_writer() -> None:
+    global _writer
+    if _writer is not None:
+        await _writer.close()
+        _writer = None
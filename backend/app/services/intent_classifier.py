@@ -0,0 +1,191 @@
+"""
+Deterministic bilingual (Gulf Arabic / English) intent classifier.
+
+Used as a fast path before Claude for the closed-set decisions in the call
+flow: language choice and the reply to the order read-back. Each classifier
+returns ``(label, confidence)``; callers only trust labels above
+``INTENT_CONFIDENCE_THRESHOLD`` and send everything else to the LLM.
+"""
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from app.services.metrics import metrics
+
+INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.8"))
+
+STRONG = 1.0
+WEAK = 0.6  # Cue words that lean one way but need support (e.g. a bare "no")
+
+# A negator this many words before a cue turns it around ("not sure", "مو تمام",
+# "I don't speak English", "no need to change"); the classifier leaves those
+# replies to the LLM
+NEGATORS = {"not", "no", "don't", "dont", "never", "nothing", "مو", "مب", "ما", "مش", "لا"}
+NEGATION_WINDOW = 3
+
+_DIACRITICS = re.compile(r'[\u0610-\u061A\u064B-\u065F\u0670\u0640]')  # Tashkeel and tatweel
+_PUNCTUATION = re.compile(r'[^\w\s\']', re.UNICODE)
+_WORDS = re.compile(r'\S+')
+_ARABIC_LETTERS = re.compile(r'[\u0621-\u064A]')
+_LATIN_LETTERS = re.compile(r'[a-z]')
+_ARABIC_FOLDS = str.maketrans({
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ى": "ي", "ة": "ه", "ؤ": "و", "ئ": "ي",
+    "’": "'", "‘": "'"
+})
+
+LANGUAGE_KEYWORDS: Dict[str, List[Tuple[str, float]]] = {
+    "ar": [
+        ("arabic", STRONG), ("arabi", STRONG), ("in arabic", STRONG),
+        ("عربي", STRONG), ("بالعربي", STRONG), ("العربي", STRONG),
+        ("عربيه", STRONG), ("العربيه", STRONG), ("بالعربيه", STRONG)
+    ],
+    "en": [
+        ("english", STRONG), ("in english", STRONG), ("inglizi", STRONG),
+        ("انجليزي", STRONG), ("انقليزي", STRONG), ("انكليزي", STRONG),
+        ("بالانجليزي", STRONG), ("بالانقليزي", STRONG), ("الانجليزيه", STRONG)
+    ]
+}
+
+ORDER_INTENT_KEYWORDS: Dict[str, List[Tuple[str, float]]] = {
+    "confirm": [
+        ("yes", STRONG), ("yeah", STRONG), ("yep", STRONG), ("yup", STRONG),
+        ("correct", STRONG), ("that's right", STRONG), ("thats right", STRONG),
+        ("right", WEAK), ("confirm", STRONG), ("confirmed", STRONG),
+        ("sure", STRONG), ("ok", STRONG), ("okay", STRONG), ("fine", WEAK),
+        ("sounds good", STRONG), ("go ahead", STRONG), ("perfect", STRONG),
+        ("absolutely", STRONG), ("exactly", STRONG),
+        ("نعم", STRONG), ("اي", STRONG), ("ايوه", STRONG), ("ايه", STRONG),
+        ("صح", STRONG), ("صحيح", STRONG), ("تمام", STRONG), ("اوكي", STRONG),
+        ("ماشي", STRONG), ("اكيد", STRONG), ("موافق", STRONG), ("مضبوط", STRONG),
+        ("بالضبط", STRONG), ("زين", WEAK), ("يب", STRONG)
+    ],
+    "modify": [
+        ("change", STRONG), ("modify", STRONG), ("update", STRONG),
+        ("different", STRONG), ("instead", STRONG), ("another", WEAK),
+        ("not correct", STRONG), ("not right", STRONG), ("wrong", STRONG),
+        ("no", WEAK), ("nope", WEAK),
+        ("غير", STRONG), ("تغيير", STRONG), ("ابي اغير", STRONG), ("ابغي اغير", STRONG),
+        ("اغير", STRONG), ("تغير", STRONG), ("عدل", STRONG), ("تعديل", STRONG), ("بدل", STRONG),
+        ("مو صح", STRONG), ("مب صح", STRONG), ("مو صحيح", STRONG), ("غلط", STRONG),
+        ("لا", WEAK)
+    ],
+    "reject": [
+        ("cancel", STRONG), ("reject", STRONG), ("don't want", STRONG),
+        ("dont want", STRONG), ("do not want", STRONG), ("no thanks", STRONG),
+        ("no thank you", STRONG), ("not interested", STRONG),
+        ("الغي", STRONG), ("الغاء", STRONG), ("كنسل", STRONG), ("ما ابي", STRONG),
+        ("مابي", STRONG), ("ما ابغي", STRONG), ("مابغي", STRONG),
+        ("لا شكرا", STRONG), ("مو مهتم", STRONG)
+    ]
+}
+
+
+def normalize(text: str) -> str:
+    """Lowercase, fold Arabic letter variants, drop diacritics and punctuation"""
+    text = _DIACRITICS.sub("", text.lower().translate(_ARABIC_FOLDS))
+    text = _PUNCTUATION.sub(" ", text)
+    return " ".join(text.split())
+
+
+def _compile(keywords: Dict[str, List[Tuple[str, float]]]) -> List[Tuple[re.Pattern, str, float]]:
+    # Longest phrases first so "not correct" is consumed before "correct"
+    entries = [
+        (normalize(phrase), label, weight)
+        for label, phrases in keywords.items()
+        for phrase, weight in phrases
+    ]
+    entries.sort(key=lambda entry: len(entry[0]), reverse=True)
+    return [
+        (re.compile(rf'(?<!\w){re.escape(phrase)}(?!\w)'), label, weight)
+        for phrase, label, weight in entries
+    ]
+
+
+_LANGUAGE_PATTERNS = _compile(LANGUAGE_KEYWORDS)
+_ORDER_INTENT_PATTERNS = _compile(ORDER_INTENT_KEYWORDS)
+
+
+def _negator(text: str, start: int, phrase: str) -> Optional[int]:
+    """Offset of the negator that turns the cue at ``start`` around, if any"""
+    # Phrases that carry their own negator ("not correct", "ما ابي") aren't flipped again
+    if phrase.split()[0] in NEGATORS:
+        return None
+    for word in reversed(list(_WORDS.finditer(text[:start]))[-NEGATION_WINDOW:]):
+        if word.group() in NEGATORS:
+            return word.start()
+    return None
+
+
+def _score(text: str, patterns: List[Tuple[re.Pattern, str, float]]) -> Tuple[Dict[str, float], bool]:
+    """Cue weights per label, and whether any cue was negated (and dropped)"""
+    matches = []
+    remaining = text
+    for pattern, label, weight in patterns:
+        for match in pattern.finditer(remaining):
+            # Blank out the match in place so later lookbehinds still see the original words
+            remaining = remaining[:match.start()] + " " * len(match.group()) + remaining[match.end():]
+            matches.append((match.start(), match.group(), label, weight))
+    negated = {}
+    for start, phrase, _, _ in matches:
+        negator = _negator(text, start, phrase)
+        if negator is not None:
+            negated[start] = negator
+    negators = set(negated.values())
+    scores: Dict[str, float] = {}
+    for start, phrase, label, weight in matches:
+        # A bare "no"/"لا" that negated another cue is not a cue itself ("لا تغير شي")
+        if start in negated or (phrase in NEGATORS and start in negators):
+            continue
+        scores[label] = scores.get(label, 0.0) + weight
+    return scores, bool(negated)
+
+
+def _decide(scores: Dict[str, float], negated: bool = False) -> Tuple[Optional[str], float]:
+    if not scores:
+        return None, 0.0
+    label = max(scores, key=scores.get)
+    top = scores[label]
+    # Share of the evidence for the winner, discounted when it rests on weak cues
+    confidence = (top / sum(scores.values())) * min(1.0, top)
+    if negated:
+        # A negated cue may have meant the opposite of what's left; let the LLM decide
+        confidence = min(confidence, WEAK)
+    return label, round(confidence, 3)
+
+
+def classify_language(text: str) -> Tuple[Optional[str], float]:
+    """Classify a reply to "Arabic or English?" as 'ar' or 'en'"""
+    normalized = normalize(text)
+    scores, negated = _score(normalized, _LANGUAGE_PATTERNS)
+    label, confidence = _decide(scores, negated)
+    if label or negated:
+        return label, confidence
+    
+    # No keyword: the script the caller answered in is a hint, not a decision
+    arabic = len(_ARABIC_LETTERS.findall(normalized))
+    latin = len(_LATIN_LETTERS.findall(normalized))
+    if arabic or latin:
+        return ("ar" if arabic > latin else "en"), 0.5
+    return None, 0.0
+
+
+def classify_order_intent(text: str) -> Tuple[Optional[str], float]:
+    """Classify a reply to the order read-back as 'confirm', 'modify' or 'reject'"""
+    return _decide(*_score(normalize(text), _ORDER_INTENT_PATTERNS))
+
+
+def _local_share() -> float:
+    local = metrics.counter("intent.local")
+    total = local + metrics.counter("intent.llm")
+    return round(local / total, 4) if total else 0.0
+
+
+def _latency_saved_ms() -> float:
+    # Average LLM classification time avoided by each locally served turn
+    llm_ms = metrics.timing_avg("intent.llm_ms")
+    return round(max(0.0, llm_ms - metrics.timing_avg("intent.local_ms")), 3) if llm_ms else 0.0
+
+
+metrics.derive("intent.local_share", _local_share)
+metrics.derive("intent.latency_saved_ms_per_local_turn", _latency_saved_ms)
@@ -0,0 +1,79 @@
+"""
+Process-wide pooled Claude client.
+
+One ``AsyncAnthropic`` instance per worker, created in the FastAPI lifespan and
+injected into every ``ZainVoiceAgent``, so sessions share a keep-alive
+connection pool instead of paying TCP/TLS setup on their first turn.
+"""
+import os
+from typing import Optional
+
+import anthropic
+import httpx
+
+from app.services.metrics import metrics
+
+CLAUDE_TIMEOUT_SECONDS = float(os.getenv("CLAUDE_TIMEOUT_SECONDS", "8"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "10"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+
+_client: Optional[anthropic.AsyncAnthropic] = None
+
+
+async def _trace(event_name: str, info: dict) -> None:
+    # httpcore only emits connect_tcp when the pool has no idle connection to reuse
+    if event_name == "connection.connect_tcp.complete":
+        metrics.increment("llm.connections_opened")
+
+
+async def _on_request(request: httpx.Request) -> None:
+    metrics.increment("llm.http_requests")
+    request.extensions["trace"] = _trace
+
+
+def _connection_reuse_rate() -> float:
+    requests = metrics.counter("llm.http_requests")
+    if not requests:
+        return 0.0
+    return round(1 - metrics.counter("llm.connections_opened") / requests, 4)
+
+
+metrics.derive("llm.connection_reuse_rate", _connection_reuse_rate)
+
+
+def create_llm_client() -> anthropic.AsyncAnthropic:
+    """Build a Claude client backed by a bounded keep-alive connection pool"""
+    http_client = anthropic.DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+        ),
+        event_hooks={"request": [_on_request]}
+    )
+    return anthropic.AsyncAnthropic(
+        api_key=os.getenv("CLAUDE_API_KEY"),
+        timeout=CLAUDE_TIMEOUT_SECONDS,
+        max_retries=1,
+        http_client=http_client
+    )
+
+
+def get_llm_client() -> anthropic.AsyncAnthropic:
+    """Return the worker's shared client, creating it on first use"""
+    global _client
+    if _client is None:
+        _client = create_llm_client()
+    return _client
+
+
+async def startup_llm_client() -> None:
+    get_llm_client()
+
+
+async def shutdown_llm_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
@@ -0,0 +1,96 @@
+"""
+Lightweight in-process metrics registry.
+
+Counters, gauges and timings are kept per worker and exposed as JSON at
+``GET /metrics``. Derived values (ratios, rates) are registered as callables
+and evaluated when a snapshot is taken.
+"""
+import threading
+from collections import defaultdict, deque
+from typing import Callable, Dict, Any
+
+TIMING_WINDOW = 1000  # Samples kept per timing for percentiles
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._gauges: Dict[str, float] = {}
+        self._timings: Dict[str, deque] = {}
+        self._timing_totals: Dict[str, list] = {}
+        self._derived: Dict[str, Callable[[], Any]] = {}
+    
+    def increment(self, name: str, value: float = 1) -> None:
+        """Add ``value`` to a counter"""
+        with self._lock:
+            self._counters[name] += value
+    
+    def set_gauge(self, name: str, value: float) -> None:
+        """Set a gauge to its current value"""
+        with self._lock:
+            self._gauges[name] = value
+    
+    def observe(self, name: str, value: float) -> None:
+        """Record a timing sample (milliseconds by convention)"""
+        with self._lock:
+            if name not in self._timings:
+                self._timings[name] = deque(maxlen=TIMING_WINDOW)
+                self._timing_totals[name] = [0, 0.0]
+            self._timings[name].append(value)
+            totals = self._timing_totals[name]
+            totals[0] += 1
+            totals[1] += value
+    
+    def derive(self, name: str, fn: Callable[[], Any]) -> None:
+        """Register a value computed from other metrics at snapshot time"""
+        with self._lock:
+            self._derived[name] = fn
+    
+    def counter(self, name: str) -> float:
+        with self._lock:
+            return self._counters.get(name, 0.0)
+    
+    def ratio(self, numerator: str, denominator: str) -> float:
+        """Counter ratio, 0.0 when the denominator is empty"""
+        with self._lock:
+            total = self._counters.get(denominator, 0.0)
+            return self._counters.get(numerator, 0.0) / total if total else 0.0
+    
+    def timing_avg(self, name: str) -> float:
+        with self._lock:
+            count, total = self._timing_totals.get(name, (0, 0.0))
+            return total / count if count else 0.0
+    
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            timings = {}
+            for name, samples in self._timings.items():
+                ordered = sorted(samples)
+                count, total = self._timing_totals[name]
+                timings[name] = {
+                    "count": count,
+                    "avg": round(total / count, 3),
+                    "p50": round(ordered[len(ordered) // 2], 3),
+                    "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+                    "max": round(ordered[-1], 3)
+                }
+            snapshot = {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "timings": timings
+            }
+            derived = dict(self._derived)
+        
+        snapshot["derived"] = {name: fn() for name, fn in derived.items()}
+        return snapshot
+    
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._timings.clear()
+            self._timing_totals.clear()
+
+
+metrics = Metrics()
@@ -1,58 +1,211 @@
 import pdfplumber
+import io
 import re
 import json
-from typing import Dict, Any, Optional, List
+import time
+from collections import defaultdict
+from typing import Dict, Any, Optional, List, Tuple, Union, BinaryIO
 from app.models.order import OrderData, OrderType, LineType, FinancialType, Customer, LineDetails, Device, Plan, Financial
 
-def parse_order_pdf(pdf_path: str) -> Dict[str, Any]:
+# A PDF can be given as a filesystem path, raw bytes or a binary file-like object
+PDFSource = Union[str, bytes, BinaryIO]
+
+def parse_order_pdf(pdf_source: PDFSource) -> Dict[str, Any]:
     """
     Parse order summary PDF and extract structured data
     """
+    order_data, _ = parse_order_pdf_timed(pdf_source)
+    return order_data
+
+def parse_order_pdf_timed(pdf_source: PDFSource) -> Tuple[Dict[str, Any], Dict[str, float]]:
+    """
+    Parse order summary PDF and report per-stage timings in milliseconds
+    ("extract_ms" for pdfplumber text extraction, "fields_ms" for field parsing)
+    """
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            text = ""
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
+        started = time.perf_counter()
+        text = extract_pdf_text(pdf_source)
+        extracted = time.perf_counter()
         
         if not text:
             raise ValueError("No text extracted from PDF")
         
-        # Extract order data
-        order_data = {
-            "order_id": extract_order_id(text),
-            "customer": extract_customer_info(text),
-            "order_type": extract_order_type(text),
-            "line_details": extract_line_details(text),
-            "device": extract_device_info(text),
-            "plan": extract_plan_info(text),
-            "financial": extract_financial_info(text),
-            "accessories": extract_accessories(text),
-            "credit_control_options": []
+        order_data = parse_order_text(text)
+        timings = {
+            "extract_ms": (extracted - started) * 1000,
+            "fields_ms": (time.perf_counter() - extracted) * 1000
         }
-        
-        return order_data
+        return order_data, timings
     except Exception as e:
         raise Exception(f"Error parsing PDF: {str(e)}")
 
-def extract_order_id(text: str) -> str:
-    """Extract order ID from text"""
-    patterns = [
-        r'Order\s+ID[:\s]+(\d{4}-\d{4}-\d+)',
-        r'Order\s+Number[:\s]+(\d{4}-\d{4}-\d+)',
-        r'(\d{4}-\d{4}-\d+)',
+def extract_pdf_text(pdf_source: PDFSource) -> str:
+    """Extract the text of every page"""
+    if isinstance(pdf_source, (bytes, bytearray, memoryview)):
+        pdf_source = io.BytesIO(pdf_source)
+    with pdfplumber.open(pdf_source) as pdf:
+        pages = []
+        for page in pdf.pages:
+            page_text = page.extract_text()
+            if page_text:
+                pages.append(page_text + "\n")
+    return "".join(pages)
+
+# Field patterns, compiled once. Each is registered under the literal word it
+# starts with; OrderTextIndex finds every occurrence of those words in a single
+# scan, and a pattern is then only tried (anchored) at its word's positions.
+# That gives exactly what re.search would return, without rescanning the
+# whole document for every pattern.
+def _field(stem: str, pattern: str, lookback: Tuple[int, ...] = (0,)) -> Tuple[str, re.Pattern, Tuple[int, ...]]:
+    return stem, re.compile(pattern, re.IGNORECASE), lookback
+
+ORDER_ID_PATTERNS = [
+    _field("order", r'Order\s+ID[:\s]+(\d{4}-\d{4}-\d+)'),
+    _field("order", r'Order\s+Number[:\s]+(\d{4}-\d{4}-\d+)'),
+    _field("order_id", r'(\d{4}-\d{4}-\d+)'),
+]
+
+NAME_PATTERNS = [
+    _field("customer", r'Customer\s+Name[:\s]+(.+?)(?:\n|CPR|Mobile)'),
+    _field("name", r'Name[:\s]+(.+?)(?:\n|CPR|Mobile)'),
+    _field("full", r'Full\s+Name[:\s]+(.+?)(?:\n|CPR|Mobile)'),
+]
+
+CPR_PATTERNS = [
+    _field("cpr", r'CPR[:\s]+(\d{9})'),
+    _field("cpr", r'CPR\s+Number[:\s]+(\d{9})'),
+    _field("id", r'ID\s+Number[:\s]+(\d{9})'),
+]
+
+MOBILE_PATTERNS = [
+    _field("mobile", r'Mobile[:\s]+(\d{8})'),
+    _field("phone", r'Phone[:\s]+(\d{8})'),
+    _field("contact", r'Contact[:\s]+(\d{8})'),
+]
+
+LINE_NUMBER_PATTERNS = [
+    _field("line", r'Line\s+Number[:\s]+(\d{8})'),
+    _field("number", r'Number[:\s]+(\d{8})'),
+    _field("existing", r'Existing\s+Number[:\s]+(\d{8})'),
+]
+
+SUB_NUMBER_PATTERNS = [
+    _field("sub", r'Sub[-\s]?Number[:\s]+(\d{8})'),
+    _field("new", r'New\s+Number[:\s]+(\d{8})'),
+]
+
+DEVICE_PATTERNS = [
+    _field("device", r'Device[:\s]+(.+?)(?:\n|Plan|Package|Financial)'),
+    _field("product", r'Product[:\s]+(.+?)(?:\n|Plan|Package|Financial)'),
+]
+
+PLAN_PATTERNS = [
+    _field("plan", r'Plan[:\s]+(.+?)(?:\n|Commitment|Financial)'),
+    _field("package", r'Package[:\s]+(.+?)(?:\n|Commitment|Financial)'),
+]
+
+# "12-month" starts with the digits, so it is found from the "month" that
+# follows them: the match can only start 2 or 3 characters earlier
+COMMITMENT_PATTERNS = [
+    _field("commitment", r'Commitment[:\s]+(\d{1,2})\s*month'),
+    _field("month", r'(\d{1,2})[-\s]month', lookback=(3, 2)),
+]
+
+AMOUNT_PATTERNS = {
+    label: [
+        _field(stem, rf'{label}[:\s]+(\d+\.?\d*)'),
+        _field(stem, rf'{label}\s+Payment[:\s]+(\d+\.?\d*)'),
     ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            return match.group(1)
-    
-    return "UNKNOWN-ORDER-ID"
+    for label, stem in (("Monthly", "month"), ("Advance", "advance"), ("Upfront", "upfront"),
+                        ("VAT", "vat"), ("Total", "total"))
+}
+
+ACCESSORY_PATTERNS = [
+    _field("accessor", r'Accessories?[:\s]+(.+?)(?:\n\n|\n[A-Z])'),
+]
+
+ACCESSORY_SPLIT = re.compile(r'[,;]')
+
+LABEL_STEMS = ("order", "customer", "name", "full", "cpr", "id", "mobile", "phone", "contact",
+               "line", "number", "existing", "sub", "new", "device", "product", "plan", "package",
+               "commitment", "month", "advance", "upfront", "vat", "total", "accessor")
+
+ORDER_ID_START = re.compile(r'\d{4}-\d{4}-\d')
+
+# Case-insensitive matching treats these as i/s, and some characters lower-case
+# to two, so for text containing them the positions in text.lower() would not
+# line up with what the patterns match. Such text is indexed with a regex scan.
+_FOLD_HAZARDS = re.compile('[\u0130\u0131\u017f]')
+
+# Zero-width alternation so overlapping words are all recorded. No stem is a
+# prefix of another ("monthly" amounts are found from "month").
+_LABEL_SCANNER = re.compile(
+    "(?=" + "|".join(f"(?P<{stem}>{stem})" for stem in LABEL_STEMS) + ")",
+    re.IGNORECASE
+)
+
+class OrderTextIndex:
+    """Label positions for one document, built in a single pass per label word"""
+    
+    def __init__(self, text: str):
+        self.text = text
+        self.positions: Dict[str, List[int]] = defaultdict(list)
+        self.lower = lower = text.lower()
+        if len(lower) == len(text) and not _FOLD_HAZARDS.search(text):
+            for stem in LABEL_STEMS:
+                position = lower.find(stem)
+                while position != -1:
+                    self.positions[stem].append(position)
+                    position = lower.find(stem, position + 1)
+        else:
+            for match in _LABEL_SCANNER.finditer(text):
+                self.positions[match.lastgroup].append(match.start())
+        self.positions["order_id"] = [match.start() for match in ORDER_ID_START.finditer(text)]
+    
+    def search(self, patterns) -> Optional[re.Match]:
+        """First match of the first pattern that matches, as re.search over the list would give"""
+        for stem, pattern, lookback in patterns:
+            for position in self.positions.get(stem, ()):
+                for offset in lookback:
+                    if position >= offset:
+                        match = pattern.match(self.text, position - offset)
+                        if match:
+                            return match
+        return None
+    
+    def search_each(self, patterns):
+        """Matches in pattern order (for fields that validate a match and may fall through)"""
+        for field in patterns:
+            match = self.search([field])
+            if match:
+                yield match
+
+def _as_index(text) -> OrderTextIndex:
+    return text if isinstance(text, OrderTextIndex) else OrderTextIndex(text)
+
+def parse_order_text(text: str) -> Dict[str, Any]:
+    """Extract order data from the PDF text"""
+    index = OrderTextIndex(text)
+    return {
+        "order_id": extract_order_id(index),
+        "customer": extract_customer_info(index),
+        "order_type": extract_order_type(index),
+        "line_details": extract_line_details(index),
+        "device": extract_device_info(index),
+        "plan": extract_plan_info(index),
+        "financial": extract_financial_info(index),
+        "accessories": extract_accessories(index),
+        "credit_control_options": []
+    }
 
-def extract_customer_info(text: str) -> Dict[str, str]:
+def extract_order_id(text) -> str:
+    """Extract order ID from text"""
+    match = _as_index(text).search(ORDER_ID_PATTERNS)
+    return match.group(1) if match else "UNKNOWN-ORDER-ID"
+
+def extract_customer_info(text) -> Dict[str, str]:
     """Extract customer information"""
+    index = _as_index(text)
     customer = {
         "name": "",
         "cpr": "",
@@ -60,50 +213,23 @@ def extract_customer_info(text: str) -> Dict[str, str]:
         "preferred_language": None
     }
     
-    # Name patterns
-    name_patterns = [
-        r'Customer\s+Name[:\s]+(.+?)(?:\n|CPR|Mobile)',
-        r'Name[:\s]+(.+?)(?:\n|CPR|Mobile)',
-        r'Full\s+Name[:\s]+(.+?)(?:\n|CPR|Mobile)',
-    ]
-    
-    for pattern in name_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            customer["name"] = match.group(1).strip()
-            break
-    
-    # CPR patterns
-    cpr_patterns = [
-        r'CPR[:\s]+(\d{9})',
-        r'CPR\s+Number[:\s]+(\d{9})',
-        r'ID\s+Number[:\s]+(\d{9})',
-    ]
-    
-    for pattern in cpr_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            customer["cpr"] = match.group(1)
-            break
+    match = index.search(NAME_PATTERNS)
+    if match:
+        customer["name"] = match.group(1).strip()
     
-    # Mobile patterns
-    mobile_patterns = [
-        r'Mobile[:\s]+(\d{8})',
-        r'Phone[:\s]+(\d{8})',
-        r'Contact[:\s]+(\d{8})',
-    ]
+    match = index.search(CPR_PATTERNS)
+    if match:
+        customer["cpr"] = match.group(1)
     
-    for pattern in mobile_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            customer["mobile"] = match.group(1)
-            break
+    match = index.search(MOBILE_PATTERNS)
+    if match:
+        customer["mobile"] = match.group(1)
     
     return customer
 
-def extract_order_type(text: str) -> str:
+def extract_order_type(text) -> str:
     """Extract order type"""
-    text_lower = text.lower()
+    text_lower = _as_index(text).lower
     
     if "new line" in text_lower or "newline" in text_lower:
         return "new_line"
@@ -114,8 +240,9 @@ def extract_order_type(text: str) -> str:
     
     return "new_line"  # Default
 
-def extract_line_details(text: str) -> Dict[str, str]:
+def extract_line_details(text) -> Dict[str, str]:
     """Extract line details"""
+    index = _as_index(text)
     line_details = {
         "type": "mobile",
         "number": None,
@@ -123,84 +250,43 @@ def extract_line_details(text: str) -> Dict[str, str]:
     }
     
     # Check for fiber
-    if "fiber" in text.lower():
+    if "fiber" in index.lower:
         line_details["type"] = "fiber"
     
-    # Extract line numbers
-    number_patterns = [
-        r'Line\s+Number[:\s]+(\d{8})',
-        r'Number[:\s]+(\d{8})',
-        r'Existing\s+Number[:\s]+(\d{8})',
-    ]
-    
-    for pattern in number_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            line_details["number"] = match.group(1)
-            break
-    
-    # Extract sub-number
-    sub_number_patterns = [
-        r'Sub[-\s]?Number[:\s]+(\d{8})',
-        r'New\s+Number[:\s]+(\d{8})',
-    ]
+    match = index.search(LINE_NUMBER_PATTERNS)
+    if match:
+        line_details["number"] = match.group(1)
     
-    for pattern in sub_number_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            line_details["sub_number"] = match.group(1)
-            break
+    match = index.search(SUB_NUMBER_PATTERNS)
+    if match:
+        line_details["sub_number"] = match.group(1)
     
     return line_details
 
-def extract_device_info(text: str) -> Optional[Dict[str, str]]:
+def extract_device_info(text) -> Optional[Dict[str, str]]:
     """Extract device information"""
-    device_patterns = [
-        r'Device[:\s]+(.+?)(?:\n|Plan|Package|Financial)',
-        r'Product[:\s]+(.+?)(?:\n|Plan|Package|Financial)',
-    ]
-    
-    for pattern in device_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            device_str = match.group(1).strip()
-            # Try to parse device details
-            parts = device_str.split()
-            if len(parts) >= 2:
-                return {
-                    "name": device_str,
-                    "variant": parts[-1] if len(parts) > 1 else "",
-                    "color": ""
-                }
+    for match in _as_index(text).search_each(DEVICE_PATTERNS):
+        device_str = match.group(1).strip()
+        # Try to parse device details
+        parts = device_str.split()
+        if len(parts) >= 2:
+            return {
+                "name": device_str,
+                "variant": parts[-1] if len(parts) > 1 else "",
+                "color": ""
+            }
     
     return None
 
-def extract_plan_info(text: str) -> Optional[Dict[str, str]]:
+def extract_plan_info(text) -> Optional[Dict[str, str]]:
     """Extract plan information"""
-    plan_patterns = [
-        r'Plan[:\s]+(.+?)(?:\n|Commitment|Financial)',
-        r'Package[:\s]+(.+?)(?:\n|Commitment|Financial)',
-    ]
-    
-    plan_name = None
-    for pattern in plan_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            plan_name = match.group(1).strip()
-            break
+    index = _as_index(text)
+    match = index.search(PLAN_PATTERNS)
+    plan_name = match.group(1).strip() if match else None
     
     # Extract commitment period
-    commitment_patterns = [
-        r'Commitment[:\s]+(\d{1,2})\s*month',
-        r'(\d{1,2})[-\s]month',
-    ]
-    
-    commitment = "24"  # Default
-    for pattern in commitment_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            commitment = match.group(1)
-            break
+    match = index.search(COMMITMENT_PATTERNS)
+    commitment = match.group(1) if match else "24"  # Default
     
     if plan_name:
         return {
@@ -210,8 +296,9 @@ def extract_plan_info(text: str) -> Optional[Dict[str, str]]:
     
     return None
 
-def extract_financial_info(text: str) -> Dict[str, Any]:
+def extract_financial_info(text) -> Dict[str, Any]:
     """Extract financial information"""
+    index = _as_index(text)
     financial = {
         "type": "INSTALLMENT",
         "monthly": 0.0,
@@ -222,52 +309,33 @@ def extract_financial_info(text: str) -> Dict[str, Any]:
     }
     
     # Check financial type
-    if "subsidy" in text.lower():
+    if "subsidy" in index.lower:
         financial["type"] = "SUBSIDY"
     
-    # Extract amounts (look for numbers with "BD", "Dinar", or currency symbols)
-    amount_patterns = [
-        r'Monthly[:\s]+(\d+\.?\d*)',
-        r'Advance[:\s]+(\d+\.?\d*)',
-        r'Upfront[:\s]+(\d+\.?\d*)',
-        r'VAT[:\s]+(\d+\.?\d*)',
-        r'Total[:\s]+(\d+\.?\d*)',
-    ]
-    
-    financial["monthly"] = extract_amount(text, "Monthly")
-    financial["advance"] = extract_amount(text, "Advance")
-    financial["upfront"] = extract_amount(text, "Upfront")
-    financial["vat"] = extract_amount(text, "VAT")
-    financial["total"] = extract_amount(text, "Total")
+    # Amounts follow their label, optionally as "<Label> Payment"
+    financial["monthly"] = extract_amount(index, "Monthly")
+    financial["advance"] = extract_amount(index, "Advance")
+    financial["upfront"] = extract_amount(index, "Upfront")
+    financial["vat"] = extract_amount(index, "VAT")
+    financial["total"] = extract_amount(index, "Total")
     
     return financial
 
-def extract_amount(text: str, label: str) -> float:
+def extract_amount(text, label: str) -> float:
     """Extract amount for a specific label"""
-    patterns = [
-        rf'{label}[:\s]+(\d+\.?\d*)',
-        rf'{label}\s+Payment[:\s]+(\d+\.?\d*)',
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            return float(match.group(1))
-    
-    return 0.0
+    match = _as_index(text).search(AMOUNT_PATTERNS[label])
+    return float(match.group(1)) if match else 0.0
 
-def extract_accessories(text: str) -> List[str]:
+def extract_accessories(text) -> List[str]:
     """Extract accessories list"""
     accessories = []
     
     # Look for accessories section
-    accessory_pattern = r'Accessories?[:\s]+(.+?)(?:\n\n|\n[A-Z])'
-    match = re.search(accessory_pattern, text, re.IGNORECASE)
+    match = _as_index(text).search(ACCESSORY_PATTERNS)
     
     if match:
         accessories_str = match.group(1)
         # Split by common delimiters
-        accessories = [a.strip() for a in re.split(r'[,;]', accessories_str) if a.strip()]
+        accessories = [a.strip() for a in ACCESSORY_SPLIT.split(accessories_str) if a.strip()]
     
     return accessories
-
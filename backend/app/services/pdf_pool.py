@@ -0,0 +1,99 @@
+"""
+Bounded process pool for PDF parsing.
+
+pdfplumber text extraction is CPU-bound; running it on the event loop stalls
+every live voice WebSocket on the worker. Parsing runs in a small process pool
+instead, and once ``PDF_PARSE_QUEUE_LIMIT`` parses are in flight or queued new
+uploads are rejected so callers can back off. A parse that times out keeps its
+slot until the worker is actually done with it, so the limit counts real load.
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.services.metrics import metrics
+from app.services.pdf_parser import PDFSource, parse_order_pdf_timed
+
+PDF_PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", "2"))
+PDF_PARSE_QUEUE_LIMIT = int(os.getenv("PDF_PARSE_QUEUE_LIMIT", "8"))
+PDF_PARSE_TIMEOUT_SECONDS = float(os.getenv("PDF_PARSE_TIMEOUT_SECONDS", "30"))
+
+
+class PDFParserBusy(Exception):
+    """Raised when the parse queue is full"""
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+_pending = 0
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn, not fork: the parent runs an event loop and client threads
+        _executor = ProcessPoolExecutor(
+            max_workers=PDF_PARSE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+
+async def parse_pdf_in_pool(pdf_source: PDFSource,
+                            cleanup: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+    """
+    Parse an order PDF off the event loop, with backpressure and a timeout.
+    
+    ``pdf_source`` is a path or the PDF bytes (file-like objects can't cross
+    the process boundary). ``cleanup`` runs once no worker can still be
+    reading ``pdf_source`` (e.g. to delete a temp file), which after a
+    timeout is when the parse finally ends, not when the caller gives up.
+    """
+    global _pending
+    if _pending >= PDF_PARSE_QUEUE_LIMIT:
+        metrics.increment("pdf.rejected")
+        if cleanup is not None:
+            cleanup()
+        raise PDFParserBusy(f"{_pending} PDF parses already in progress")
+    
+    _pending += 1
+    metrics.set_gauge("pdf.pending", _pending)
+    
+    def release(future: Optional[asyncio.Future]) -> None:
+        global _pending
+        if future is not None and not future.cancelled():
+            future.exception()  # Retrieved here too: after a timeout nobody awaits the parse
+        _pending -= 1
+        metrics.set_gauge("pdf.pending", _pending)
+        if cleanup is not None:
+            cleanup()
+    
+    loop = asyncio.get_running_loop()
+    try:
+        parse = loop.run_in_executor(get_executor(), parse_order_pdf_timed, pdf_source)
+    except BaseException:
+        release(None)
+        raise
+    parse.add_done_callback(release)
+    try:
+        # Shielded: a timeout stops the wait, not the parse already running in a worker
+        order_data, timings = await asyncio.wait_for(asyncio.shield(parse), timeout=PDF_PARSE_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        metrics.increment("pdf.timeouts")
+        raise
+    metrics.increment("pdf.parsed")
+    metrics.observe("pdf.extract_ms", timings["extract_ms"])
+    metrics.observe("pdf.fields_ms", timings["fields_ms"])
+    return order_data
+
+
+async def startup_pdf_pool() -> None:
+    get_executor()
+
+
+async def shutdown_pdf_pool() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
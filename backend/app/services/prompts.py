@@ -0,0 +1,181 @@
+"""
+Prompt assembly for Claude calls.
+
+With ``LLM_PERSONA=true`` every request carries the agent's persona as its
+system prompt, in two cacheable prefixes (``cache_control``):
+
+1. the persona in the session language, the same for every call,
+2. the order context: only the order fields the current state needs
+   (``STATE_ORDER_FIELDS``) as compact JSON, the same for every call of a
+   session in that state; states that need none send no context block,
+
+followed by the turn's own prompt as the user message. Anthropic caches a
+prefix once it reaches the model's minimum cacheable length (2048 tokens
+for Haiku models, 1024 for the others); shorter prefixes are billed as
+normal input. The persona is off by default: every Claude call here is a
+short classification or extraction (spoken replies come from templates),
+and at about 500 tokens the prefix is far below Haiku's minimum, so it
+would make each call about 5x the cost of the bare prompt and slower, with
+nothing cached. Turn it on once the cacheable prefix reaches the minimum.
+
+``record_usage`` adds a response's token counts to the ``llm.*_tokens``
+counters and its estimated cost (``LLM_PRICE_*`` per million tokens,
+Claude 3 Haiku list prices by default) to ``llm.cost_usd``. Tool calls
+whose arguments fail validation are counted in ``llm.tool_invalid`` (see
+``ZainVoiceAgent.ask_claude_tool``).
+"""
+import json
+import os
+from typing import Any, Dict, List, Tuple
+
+from app.models.agent import AgentState
+from app.services.metrics import metrics
+
+LLM_PERSONA = os.getenv("LLM_PERSONA", "false").lower() == "true"
+LLM_PRICE_INPUT_PER_MTOK = float(os.getenv("LLM_PRICE_INPUT_PER_MTOK", "0.25"))
+LLM_PRICE_OUTPUT_PER_MTOK = float(os.getenv("LLM_PRICE_OUTPUT_PER_MTOK", "1.25"))
+CACHE_WRITE_PRICE_FACTOR = 1.25  # Writing a prefix to the cache costs 25% more than input
+CACHE_READ_PRICE_FACTOR = 0.1  # Reading it back costs 10% of input
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+PERSONA: Dict[str, str] = {
+    "en": """You are Jassim, a sales representative at Zain Bahrain Telecommunications. You speak in Bahraini Gulf dialect when using Arabic, and clear American accent when using English.
+
+GOAL: Complete digital store orders accurately, comply with regulations, and maintain customer privacy in every interaction.
+
+PERSONALITY:
+- Professional yet warm and friendly
+- Patient and clear in explanations
+- Helpful and solution-oriented
+- Respectful of customer time
+
+CONVERSATION RULES:
+1. Always start with the fixed opening statement
+2. Always end with the fixed closing statement
+3. Listen carefully to customer responses
+4. Confirm understanding before moving forward
+5. Handle interruptions gracefully
+6. If customer requests callback, note preferred time and end call
+7. Speak naturally - avoid robotic or overly formal language
+8. Keep responses concise and clear
+
+CRITICAL RULES:
+- Device changes require NEW order - current order must be cancelled
+- Plan changes are allowed (any direction: new↔existing)
+- Always read back financial details EXACTLY as shown in system
+- Never guess or improvise financial information
+- If customer is not eligible, present BEST available alternative from system
+- Authentication must be completed before proceeding
+- Ownership must be verified before order confirmation""",
+    "ar": """أنت جاسم، موظف مبيعات في شركة زين البحرين للاتصالات. تتحدث باللهجة البحرينية الخليجية عند استخدام العربية، وبلهجة أمريكية واضحة عند استخدام الإنجليزية.
+
+الهدف: إكمال إجراءات الطلبات القادمة من المتجر الإلكتروني بدقة، الالتزام بالأنظمة، والمحافظة على خصوصية العميل في كل تواصل.
+
+الشخصية:
+- محترف وودود بنفس الوقت
+- صبور وواضح في الشرح
+- متعاون وحريص على المساعدة
+- يحترم وقت العميل
+
+قواعد المحادثة:
+١. دايماً ابدأ بالجملة الافتتاحية الثابتة
+٢. دايماً اختم بالجملة الختامية الثابتة
+٣. اسمع العميل زين وبتركيز
+٤. تأكد من الفهم قبل ما تكمل
+٥. تعامل مع المقاطعات بشكل لبق
+٦. إذا العميل طلب اتصال ثاني، سجل الوقت المفضل وأنهي المكالمة
+٧. تكلم بشكل طبيعي - ما تكون رسمي زيادة
+٨. خلي ردودك مختصرة وواضحة
+
+قواعد مهمة:
+- تغيير الجهاز يتطلب طلب جديد - الطلب الحالي لازم ينلغى
+- تغيير الباقة مسموح (أي اتجاه: جديد↔موجود)
+- دايماً اقرأ التفاصيل المالية بالضبط كما موجودة في النظام
+- لا تخمن أو ترتجل معلومات مالية
+- إذا العميل ما يستحق، اعرض أحسن بديل متاح من النظام
+- التوثيق لازم يكتمل قبل ما تكمل
+- لازم تتأكد من الملكية قبل تأكيد الطلب"""
+}
+
+CONTEXT_HEADER: Dict[str, str] = {
+    "en": "CURRENT ORDER CONTEXT:",
+    "ar": "سياق الطلب الحالي:"
+}
+
+# Order fields each state's prompts can refer to. Identity is checked
+# locally, so the customer's name, CPR and mobile are never sent.
+STATE_ORDER_FIELDS: Dict[AgentState, Tuple[str, ...]] = {
+    AgentState.ORDER_CONFIRM: ("order_type", "line_details", "device", "plan"),
+    AgentState.MODIFICATION: ("order_type", "line_details", "device", "plan", "accessories"),
+    AgentState.ELIGIBILITY_CHECK: ("plan", "financial", "credit_control_options"),
+    AgentState.COMMITMENT_APPROVAL: ("plan", "credit_control_options"),
+    AgentState.CROSS_SELL: ("device", "accessories"),
+    AgentState.EKYC_SEND: ("order_id",)
+}
+
+
+def order_context(order_data: Dict[str, Any], state: AgentState) -> str:
+    """The order fields ``state`` needs as compact JSON ("" when none)"""
+    fields = {
+        field: order_data[field]
+        for field in STATE_ORDER_FIELDS.get(state, ())
+        if order_data.get(field) not in (None, "", [], {})
+    }
+    return json.dumps(fields, ensure_ascii=False, separators=(",", ":")) if fields else ""
+
+
+def system_blocks(language: str, context: str) -> List[Dict[str, Any]]:
+    """Persona and order context as cacheable system prompt blocks"""
+    language = "ar" if language == "ar" else "en"
+    blocks = [{"type": "text", "text": PERSONA[language], "cache_control": CACHE_CONTROL}]
+    if context:
+        blocks.append({
+            "type": "text",
+            "text": f"{CONTEXT_HEADER[language]}\n{context}",
+            "cache_control": CACHE_CONTROL
+        })
+    return blocks
+
+
+def usage_cost(tokens: Dict[str, int]) -> float:
+    """Estimated USD cost of one call's token counts"""
+    input_cost = (
+        tokens["input"]
+        + tokens["cache_write"] * CACHE_WRITE_PRICE_FACTOR
+        + tokens["cache_read"] * CACHE_READ_PRICE_FACTOR
+    ) * LLM_PRICE_INPUT_PER_MTOK
+    return (input_cost + tokens["output"] * LLM_PRICE_OUTPUT_PER_MTOK) / 1_000_000
+
+
+def record_usage(usage: Any) -> Dict[str, int]:
+    """Add a response's ``usage`` to the token and cost counters and return its counts"""
+    tokens = {
+        "input": getattr(usage, "input_tokens", 0) or 0,
+        "cache_write": getattr(usage, "cache_creation_input_tokens", 0) or 0,
+        "cache_read": getattr(usage, "cache_read_input_tokens", 0) or 0,
+        "output": getattr(usage, "output_tokens", 0) or 0
+    }
+    metrics.increment("llm.calls")
+    for kind, count in tokens.items():
+        metrics.increment(f"llm.{kind}_tokens", count)
+    metrics.increment("llm.cost_usd", usage_cost(tokens))
+    return tokens
+
+
+def _cost_per_call() -> float:
+    return round(metrics.ratio("llm.cost_usd", "llm.calls"), 8)
+
+
+def _cached_input_share() -> float:
+    prompt_tokens = sum(metrics.counter(f"llm.{kind}_tokens") for kind in ("input", "cache_write", "cache_read"))
+    return round(metrics.counter("llm.cache_read_tokens") / prompt_tokens, 4) if prompt_tokens else 0.0
+
+
+def _tool_invalid_rate() -> float:
+    return round(metrics.ratio("llm.tool_invalid", "llm.tool_calls"), 4)
+
+
+metrics.derive("llm.cost_per_call_usd", _cost_per_call)
+metrics.derive("llm.cached_input_share", _cached_input_share)
+metrics.derive("llm.tool_invalid_rate", _tool_invalid_rate)
@@ -0,0 +1,243 @@
+"""
+Bilingual response templates for the voice agent.
+
+Every line the agent speaks is a template in ``TEMPLATES``, keyed by the
+state it is spoken in, a scenario name and the language. Order details are
+typed slots (``{device}``, ``{monthly}``): ``text`` slots are inserted as is
+and ``money`` slots are formatted as Bahraini dinars (three decimals, fils).
+An empty slot renders as its ``EMPTY_SLOT_TEXT`` for the language, if any
+(the Arabic thanks without a name still needs an object).
+Templates are compiled once at import into literal parts and slot
+references, and an unknown slot fails at startup rather than mid-call.
+
+Slot values are formatted once per session (``slot_values``) and reused
+for every render, so a line without slots is returned as is and a line with
+slots is a single join.
+
+Template segments without slots (a whole fixed phrase, or a fixed sentence
+of a line with order details, like "Is this correct?") are the same for
+every caller: ``static_segments`` lists them for the TTS cache and
+prewarm_tts.py, so their audio is synthesized once and reused.
+
+To add a language, add its variant to each template; a missing variant
+falls back to English.
+"""
+import string
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from app.models.agent import AgentState
+
+GREETING = "Hello, this is Jassim speaking from Zain Bahrain, may I take a few minutes of your time. / مرحبا، معاك جاسم من زين البحرين، ممكن آخذ ثواني من وقتك"
+
+TEMPLATES: Dict[Tuple[AgentState, str], Dict[str, str]] = {
+    (AgentState.INIT, "greeting"): {
+        "en": GREETING
+    },
+    (AgentState.LANGUAGE_SELECT, "confirmed"): {
+        "ar": "تمام، نكمل بالعربي. ممكن الاسم الكامل من فضلك؟",
+        "en": "Sure, we'll continue in English. Can I please have your full name?"
+    },
+    (AgentState.AUTH, "ask_name"): {
+        "ar": "ممكن الاسم الكامل من فضلك؟",
+        "en": "Can I please have your full name?"
+    },
+    (AgentState.AUTH, "ask_cpr"): {
+        "ar": "تسلم. وممكن رقم الهوية؟",
+        "en": "Thank you. And can I have your CPR number please?"
+    },
+    (AgentState.AUTH, "verified"): {
+        "ar": "مشكور {customer_name}، تأكدت من المعلومات. خلني أأكد تفاصيل طلبك...",
+        "en": "Thank you {customer_name}, I've verified your details. Let me confirm your order details..."
+    },
+    (AgentState.AUTH, "details_mismatch"): {
+        "ar": "ألاحظ إن المعلومات ما تطابق السجلات عندنا. هل تتصل نيابة عن صاحب الحساب؟",
+        "en": "I notice the details don't match our records. Are you calling on behalf of the account holder?"
+    },
+    (AgentState.OWNERSHIP_CHECK, "acknowledged"): {
+        "ar": "فهمت. خلني أأكد تفاصيل الطلب...",
+        "en": "I understand. Let me confirm the order details..."
+    },
+    (AgentState.ORDER_CONFIRM, "new_line_with_device"): {
+        "ar": "خلني أأكد تفاصيل طلبك. طلبك لخط جديد برقم فرعي {sub_number} والجهاز {device}. صح؟",
+        "en": "Let me confirm your order details. Your order is for a new line with sub-number {sub_number} and the device {device}. Is this correct?"
+    },
+    (AgentState.ORDER_CONFIRM, "new_line"): {
+        "ar": "خلني أأكد تفاصيل طلبك. طلبك لخط جديد فقط برقم فرعي {sub_number}. صح؟",
+        "en": "Let me confirm your order details. Your order is for a new line only with sub-number {sub_number}. Is this correct?"
+    },
+    (AgentState.ORDER_CONFIRM, "existing_line_with_device"): {
+        "ar": "خلني أأكد تفاصيل طلبك. طلبك لـ {device} على رقمك الموجود {number}. صح؟",
+        "en": "Let me confirm your order details. Your order is for an {device} under your existing number {number}. Is this correct?"
+    },
+    (AgentState.ORDER_CONFIRM, "cash_with_device"): {
+        "ar": "خلني أأكد تفاصيل طلبك. طلبك لـ {device} على أساس كاش. صح؟",
+        "en": "Let me confirm your order details. Your order is for an {device} on a cash basis. Is this correct?"
+    },
+    (AgentState.ORDER_CONFIRM, "summary_fallback"): {
+        "ar": "Let me confirm your order details...",
+        "en": "Let me confirm your order details..."
+    },
+    (AgentState.ORDER_CONFIRM, "confirmed"): {
+        "ar": "ممتاز! خلني أشيك استحقاقك...",
+        "en": "Great! Let me check your eligibility..."
+    },
+    (AgentState.ORDER_CONFIRM, "ask_modification"): {
+        "ar": "فهمت. شنو التغيير اللي تبي تسويه؟",
+        "en": "I understand. What would you like to change?"
+    },
+    (AgentState.MODIFICATION, "updated"): {
+        "ar": "تمام، حدثت الطلب. خلني أأكد التفاصيل المحدثة...",
+        "en": "Perfect, I've updated the order. Let me confirm the updated details..."
+    },
+    (AgentState.ELIGIBILITY_CHECK, "financials"): {
+        "ar": """ممتاز! خلني أشيك استحقاقك. هذي التفاصيل:
+- الدفعة الشهرية: {monthly} دينار
+- الدفعة المقدمة: {advance} دينار
+- الدفعة المسبقة: {upfront} دينار
+- ضريبة القيمة المضافة: {vat} دينار
+- المبلغ الإجمالي للدفع اليوم: {total} دينار
+
+مناسب لك؟""",
+        "en": """Great! Let me check your eligibility. Here are the details:
+- Monthly payment: {monthly} Dinars
+- Advance payment: {advance} Dinars
+- Upfront payment: {upfront} Dinars
+- VAT: {vat} Dinars
+- Total amount to pay today: {total} Dinars
+
+Does this work for you?"""
+    },
+    (AgentState.COMMITMENT_APPROVAL, "callback"): {
+        "ar": "أكيد، بقدم طلب للموافقة. بيصل فيك خلال 24 ساعة. شكراً لاختيارك زين، مع السلامة.",
+        "en": "Absolutely, I'll submit the approval request. You'll receive a callback within 24 hours. Thank you for choosing Zain, have a good day."
+    },
+    (AgentState.CROSS_SELL, "accepted"): {
+        "ar": "حلو! ضفت الإكسسوارات لطلبك. الحين باعث لك رابط التوقيع الرقمي...",
+        "en": "Great! I've added the accessories to your order. Now I'm sending you the digital signing link..."
+    },
+    (AgentState.CROSS_SELL, "declined"): {
+        "ar": "ما فيها مشكلة. الحين باعث لك رابط التوقيع الرقمي...",
+        "en": "No problem at all. Now I'm sending you the digital signing link..."
+    },
+    (AgentState.EKYC_SEND, "closing"): {
+        "ar": "ممتاز! أرسلت لك رابط التوقيع الرقمي والدفع عن طريق رسالة نصية. من فضلك كمله خلال ساعة. شكراً لاختيارك زين، مع السلامة.",
+        "en": "Excellent! I've sent you the digital signing and payment link via SMS. Please complete it within one hour. Thank you for choosing Zain, have a good day."
+    },
+    (AgentState.CLOSE, "goodbye"): {
+        "ar": "Thank you for choosing Zain, have a good day.",
+        "en": "Thank you for choosing Zain, have a good day."
+    }
+}
+
+
+def format_text(value: Any) -> str:
+    return "N/A" if value is None or value == "" else str(value)
+
+
+def format_money(value: Any) -> str:
+    """Dinars with three decimals (1000 fils to the dinar)"""
+    try:
+        return f"{float(value or 0):.3f}"
+    except (TypeError, ValueError):
+        return str(value)
+
+
+SLOT_FORMATTERS: Dict[str, Callable[[Any], str]] = {
+    "text": format_text,
+    "money": format_money
+}
+
+# Slot name -> type
+SLOTS: Dict[str, str] = {
+    "customer_name": "text",
+    "sub_number": "text",
+    "number": "text",
+    "device": "text",
+    "monthly": "money",
+    "advance": "money",
+    "upfront": "money",
+    "vat": "money",
+    "total": "money"
+}
+
+
+# Language -> slot -> what the slot renders as when empty
+EMPTY_SLOT_TEXT: Dict[str, Dict[str, str]] = {
+    "ar": {"customer_name": "عليك"}  # "مشكور عليك": thank you, without a name
+}
+
+
+class Template:
+    """A compiled template: literal text alternating with slot names"""
+
+    __slots__ = ("text", "parts", "slots")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.parts: List[Tuple[str, Optional[str]]] = []
+        for literal, slot, spec, conversion in string.Formatter().parse(text):
+            if slot is not None:
+                if slot not in SLOTS:
+                    raise ValueError(f"Unknown slot {{{slot}}} in template {text[:40]!r}")
+                if spec or conversion:
+                    raise ValueError(f"Slot {{{slot}}} is formatted by its type, not in the template")
+            self.parts.append((literal, slot))
+        self.slots = frozenset(slot for _, slot in self.parts if slot is not None)
+
+    def render(self, values: Dict[str, str], empty: Optional[Dict[str, str]] = None) -> str:
+        if not self.slots:
+            return self.text
+        empty = empty or {}
+        return "".join(
+            literal + (values[slot] or empty.get(slot, "")) if slot is not None else literal
+            for literal, slot in self.parts
+        )
+
+
+def compile_templates(templates: Dict[Tuple[AgentState, str], Dict[str, str]]) -> Dict[Tuple[AgentState, str, str], Template]:
+    return {
+        (state, scenario, language): Template(text)
+        for (state, scenario), variants in templates.items()
+        for language, text in variants.items()
+    }
+
+
+CATALOG = compile_templates(TEMPLATES)
+
+
+def render(state: AgentState, scenario: str, language: Optional[str], values: Dict[str, str]) -> str:
+    """The line for (state, scenario) in ``language`` (English when it has no variant)"""
+    template = CATALOG.get((state, scenario, language or "en")) or CATALOG[(state, scenario, "en")]
+    return template.render(values, EMPTY_SLOT_TEXT.get(language or "en"))
+
+
+def slot_values(order_data: Dict[str, Any], customer_name: Optional[str] = None) -> Dict[str, str]:
+    """Every slot formatted for one session's order (cache it on the session)"""
+    device = order_data.get("device") or {}
+    line_details = order_data.get("line_details") or {}
+    financial = order_data.get("financial") or {}
+    raw = {
+        "sub_number": line_details.get("sub_number"),
+        "number": line_details.get("number"),
+        "device": device.get("name"),
+        "monthly": financial.get("monthly"),
+        "advance": financial.get("advance"),
+        "upfront": financial.get("upfront"),
+        "vat": financial.get("vat"),
+        "total": financial.get("total")
+    }
+    values = {slot: SLOT_FORMATTERS[SLOTS[slot]](value) for slot, value in raw.items()}
+    values["customer_name"] = customer_name or ""
+    return values
+
+
+def static_segments() -> FrozenSet[tuple]:
+    """(segment, language) pairs the agent always speaks the same way"""
+    from app.services.speech_pipeline import split_segments
+
+    return frozenset(
+        (segment, language)
+        for (state, scenario, language), template in CATALOG.items()
+        for segment in split_segments(template.text)
+        if "{" not in segment  # No slot, so no customer data
+    )
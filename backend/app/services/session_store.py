@@ -0,0 +1,581 @@
+"""
+Call session storage shared by every worker.
+
+gunicorn runs several workers, and a call's HTTP requests and WebSocket can
+land on any of them, so agent state lives in a session store rather than in a
+per-process dict. Agents are saved after every turn (``ZainVoiceAgent.to_state``)
+and rehydrated on whichever worker handles the next request.
+
+Backends (``SESSION_STORE``):
+- ``memory``: in-process dict; only correct with a single worker
+- ``sqlite``: a SQLite file (``SESSION_STORE_URL`` is the path) shared by the
+  workers on one host
+- ``redis``: any Redis-protocol server (``SESSION_STORE_URL`` like
+  ``redis://host:6379/0``), for workers spread over several hosts
+
+Abandoned calls are never DELETEd by the client, so every backend evicts
+sessions that have not been saved for ``SESSION_IDLE_TTL_SECONDS`` and the
+least recently saved ones beyond ``SESSION_MAX_ACTIVE``. A background sweeper
+writes evicted sessions' final state to the database and marks them ended.
+
+Each saved state carries a revision (``"rev"``). A save is conditional on the
+revision the state was loaded at, so two requests working on the same call (a
+``/process`` turn and a WebSocket turn) can't silently overwrite each other,
+and a session that was ended in the meantime is never brought back: both raise
+``SessionConflict``.
+"""
+import asyncio
+import inspect
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from app.services.metrics import metrics
+
+SESSION_STORE = os.getenv("SESSION_STORE", "memory").lower()
+SESSION_STORE_URL = os.getenv("SESSION_STORE_URL", "")
+SESSION_STORE_POOL_SIZE = int(os.getenv("SESSION_STORE_POOL_SIZE", "4"))
+SESSION_STORE_TIMEOUT_SECONDS = float(os.getenv("SESSION_STORE_TIMEOUT_SECONDS", "2"))
+SESSION_IDLE_TTL_SECONDS = float(os.getenv("SESSION_IDLE_TTL_SECONDS", "900"))
+SESSION_MAX_ACTIVE = int(os.getenv("SESSION_MAX_ACTIVE", "1000"))
+SESSION_SWEEP_INTERVAL_SECONDS = float(os.getenv("SESSION_SWEEP_INTERVAL_SECONDS", "30"))
+
+KEY_PREFIX = "zain:session:"
+REVISION_PREFIX = "zain:session-rev:"
+INDEX_KEY = b"zain:sessions"
+
+_store: Optional["SessionStore"] = None
+_sweeper: Optional[asyncio.Task] = None
+
+# (reason, serialized state) for each evicted session; reason is "idle" or "capacity"
+Evicted = List[Tuple[str, bytes]]
+
+
+class SessionConflict(Exception):
+    """The session was saved by another request, or ended, since it was loaded"""
+
+
+def dumps_state(state: Dict[str, Any]) -> bytes:
+    return json.dumps(state, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads_state(data: bytes) -> Dict[str, Any]:
+    return json.loads(data)
+
+
+class SessionStore:
+    """Stores serialized agent state by session id, bounded by idle TTL and a size cap"""
+
+    def __init__(self, idle_ttl: float = SESSION_IDLE_TTL_SECONDS, max_sessions: int = SESSION_MAX_ACTIVE):
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+
+    async def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        started = time.perf_counter()
+        data = await self._get(session_id)
+        metrics.observe("session_store.get_ms", (time.perf_counter() - started) * 1000)
+        if data is None:
+            metrics.increment("session_store.misses")
+            return None
+        return loads_state(data)
+
+    async def put(self, session_id: str, state: Dict[str, Any]) -> int:
+        """Save a state and return its new revision.
+        
+        A state without a revision (a new call) is saved unconditionally;
+        otherwise the stored one must still be at ``state["rev"]``.
+        """
+        expected = state.get("rev")
+        revision = (expected or 0) + 1
+        data = dumps_state(dict(state, rev=revision))
+        started = time.perf_counter()
+        saved = await self._put(session_id, data, expected, revision)
+        metrics.observe("session_store.put_ms", (time.perf_counter() - started) * 1000)
+        if not saved:
+            metrics.increment("session_store.conflicts")
+            raise SessionConflict(session_id)
+        metrics.observe("session_store.state_bytes", len(data))
+        return revision
+
+    async def delete(self, session_id: str) -> bool:
+        return await self._delete(session_id)
+
+    async def evict(self) -> List[Dict[str, Any]]:
+        """Remove idle and over-cap sessions and return their last state"""
+        evicted = await self._evict(time.time() - self.idle_ttl)
+        for reason, _ in evicted:
+            metrics.increment(f"sessions.evicted_{reason}")
+        return [loads_state(data) for _, data in evicted]
+
+    async def stats(self) -> Tuple[int, Optional[int]]:
+        """Live session count and total serialized bytes (None if the backend can't tell cheaply)"""
+        return await self._stats()
+
+    async def close(self) -> None:
+        pass
+
+    async def _get(self, session_id: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def _put(self, session_id: str, data: bytes, expected: Optional[int], revision: int) -> bool:
+        """Store ``data`` at ``revision`` if the stored revision is ``expected`` (None: always)"""
+        raise NotImplementedError
+
+    async def _delete(self, session_id: str) -> bool:
+        raise NotImplementedError
+
+    async def _evict(self, cutoff: float) -> Evicted:
+        raise NotImplementedError
+
+    async def _stats(self) -> Tuple[int, Optional[int]]:
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """Per-process store (the previous behaviour); sessions are lost across workers"""
+
+    def __init__(self, idle_ttl: float = SESSION_IDLE_TTL_SECONDS, max_sessions: int = SESSION_MAX_ACTIVE):
+        super().__init__(idle_ttl, max_sessions)
+        # session_id -> (state, last save, revision), least recently saved
+        # first; reads don't count, as in the shared backends
+        self._data: "OrderedDict[str, Tuple[bytes, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._over_capacity: Evicted = []
+
+    async def _get(self, session_id: str) -> Optional[bytes]:
+        entry = self._data.get(session_id)
+        return entry[0] if entry is not None else None
+
+    async def _put(self, session_id: str, data: bytes, expected: Optional[int], revision: int) -> bool:
+        previous = self._data.get(session_id)
+        if expected is not None and (previous is None or previous[2] != expected):
+            return False
+        if previous is not None:
+            del self._data[session_id]
+            self._bytes -= len(previous[0])
+        self._data[session_id] = (data, time.time(), revision)
+        self._bytes += len(data)
+        # Enforce the cap immediately; the sweeper persists what was dropped
+        while len(self._data) > self.max_sessions:
+            _, (dropped, _, _) = self._data.popitem(last=False)
+            self._bytes -= len(dropped)
+            self._over_capacity.append(("capacity", dropped))
+        return True
+
+    async def _delete(self, session_id: str) -> bool:
+        entry = self._data.pop(session_id, None)
+        if entry is None:
+            return False
+        self._bytes -= len(entry[0])
+        return True
+
+    async def _evict(self, cutoff: float) -> Evicted:
+        evicted, self._over_capacity = self._over_capacity, []
+        while self._data:
+            session_id, (data, saved_at, _) = next(iter(self._data.items()))
+            if saved_at >= cutoff:
+                break
+            del self._data[session_id]
+            self._bytes -= len(data)
+            evicted.append(("idle", data))
+        return evicted
+
+    async def _stats(self) -> Tuple[int, Optional[int]]:
+        return len(self._data), self._bytes
+
+
+class SQLiteSessionStore(SessionStore):
+    """SQLite file in WAL mode, shared by the workers on one host"""
+
+    def __init__(self, path: str, idle_ttl: float = SESSION_IDLE_TTL_SECONDS,
+                 max_sessions: int = SESSION_MAX_ACTIVE):
+        super().__init__(idle_ttl, max_sessions)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=SESSION_STORE_TIMEOUT_SECONDS,
+                                     isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, state BLOB NOT NULL, updated_at REAL NOT NULL, "
+            "revision INTEGER NOT NULL DEFAULT 0)"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(sessions)")]
+        if "revision" not in columns:
+            # A session file left by a worker from before revisions existed
+            self._conn.execute("ALTER TABLE sessions ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+
+    def _execute(self, sql: str, params: tuple):
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            return cursor.fetchone(), cursor.rowcount
+
+    async def _get(self, session_id: str) -> Optional[bytes]:
+        row, _ = await asyncio.to_thread(
+            self._execute, "SELECT state FROM sessions WHERE session_id = ?", (session_id,)
+        )
+        return row[0] if row else None
+
+    async def _put(self, session_id: str, data: bytes, expected: Optional[int], revision: int) -> bool:
+        if expected is None:
+            await asyncio.to_thread(
+                self._execute,
+                "INSERT INTO sessions (session_id, state, updated_at, revision) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET state = excluded.state, "
+                "updated_at = excluded.updated_at, revision = excluded.revision",
+                (session_id, data, time.time(), revision)
+            )
+            return True
+        _, updated = await asyncio.to_thread(
+            self._execute,
+            "UPDATE sessions SET state = ?, updated_at = ?, revision = ? WHERE session_id = ? AND revision = ?",
+            (data, time.time(), revision, session_id, expected)
+        )
+        return updated > 0
+
+    async def _delete(self, session_id: str) -> bool:
+        _, deleted = await asyncio.to_thread(
+            self._execute, "DELETE FROM sessions WHERE session_id = ?", (session_id,)
+        )
+        return deleted > 0
+
+    def _evict_sync(self, cutoff: float) -> Evicted:
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so concurrent sweepers in
+            # other workers never evict (and persist) the same session twice
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                idle = self._conn.execute(
+                    "SELECT session_id, state FROM sessions WHERE updated_at < ?", (cutoff,)
+                ).fetchall()
+                live = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] - len(idle)
+                over = []
+                if live > self.max_sessions:
+                    over = self._conn.execute(
+                        "SELECT session_id, state FROM sessions WHERE updated_at >= ? "
+                        "ORDER BY updated_at LIMIT ?", (cutoff, live - self.max_sessions)
+                    ).fetchall()
+                self._conn.executemany("DELETE FROM sessions WHERE session_id = ?",
+                                       [(row[0],) for row in idle + over])
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [("idle", row[1]) for row in idle] + [("capacity", row[1]) for row in over]
+
+    async def _evict(self, cutoff: float) -> Evicted:
+        return await asyncio.to_thread(self._evict_sync, cutoff)
+
+    async def _stats(self) -> Tuple[int, Optional[int]]:
+        (count, total), _ = await asyncio.to_thread(
+            self._execute, "SELECT COUNT(*), SUM(LENGTH(state)) FROM sessions", ()
+        )
+        return count, total or 0
+
+    async def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class RedisError(Exception):
+    pass
+
+
+class RedisConnection:
+    """Minimal RESP client: one command in flight per connection"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def open(cls, host: str, port: int, password: Optional[str], db: int) -> "RedisConnection":
+        reader, writer = await asyncio.open_connection(host, port)
+        connection = cls(reader, writer)
+        if password:
+            await connection.execute(b"AUTH", password.encode())
+        if db:
+            await connection.execute(b"SELECT", str(db).encode())
+        return connection
+
+    async def execute(self, *args: bytes):
+        return (await self.pipeline([args]))[0]
+
+    async def pipeline(self, commands: List[Tuple[bytes, ...]]) -> list:
+        """Send several commands in one write and read their replies in order"""
+        payload = []
+        for args in commands:
+            payload.append(b"*%d\r\n" % len(args))
+            for arg in args:
+                payload.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        self.writer.write(b"".join(payload))
+        await self.writer.drain()
+        return [await self._read_reply() for _ in commands]
+
+    async def _read_reply(self):
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("Redis connection closed")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload
+        if kind == b"-":
+            raise RedisError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = await self.reader.readexactly(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            count = int(payload)
+            if count < 0:
+                return None
+            return [await self._read_reply() for _ in range(count)]
+        raise RedisError(f"Unexpected reply: {line!r}")
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+class RedisSessionStore(SessionStore):
+    """Any Redis-protocol server, shared by workers on every host.
+    
+    A sorted set (``INDEX_KEY``) scores each session by its last save time so
+    the sweeper can find idle and least recently saved sessions. Keys also carry
+    a server-side expiry of twice the idle TTL, which bounds memory even if no
+    sweeper runs. A session's revision is kept in its own key, so conditional
+    saves can WATCH it without reading the state back.
+    """
+
+    def __init__(self, url: str, pool_size: int = SESSION_STORE_POOL_SIZE,
+                 idle_ttl: float = SESSION_IDLE_TTL_SECONDS, max_sessions: int = SESSION_MAX_ACTIVE):
+        super().__init__(idle_ttl, max_sessions)
+        parsed = urlparse(url or "redis://localhost:6379/0")
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(pool_size)
+
+    async def _execute(self, *args: bytes):
+        return (await self._pipeline([args]))[0]
+
+    async def _pipeline(self, commands: List[Tuple[bytes, ...]]) -> list:
+        async with self._connection() as connection:
+            return await asyncio.wait_for(connection.pipeline(commands),
+                                          timeout=SESSION_STORE_TIMEOUT_SECONDS)
+
+    @asynccontextmanager
+    async def _connection(self) -> AsyncIterator[RedisConnection]:
+        """Check out one connection, for commands that must share it (WATCH ... EXEC)"""
+        async with self._slots:
+            try:
+                connection = self._idle.get_nowait()
+            except asyncio.QueueEmpty:
+                connection = await asyncio.wait_for(
+                    RedisConnection.open(self.host, self.port, self.password, self.db),
+                    timeout=SESSION_STORE_TIMEOUT_SECONDS
+                )
+            try:
+                yield connection
+            except BaseException:
+                # A reply may still be in flight; never hand this connection out again
+                connection.close()
+                raise
+            self._idle.put_nowait(connection)
+
+    async def _get(self, session_id: str) -> Optional[bytes]:
+        return await self._execute(b"GET", (KEY_PREFIX + session_id).encode())
+
+    async def _put(self, session_id: str, data: bytes, expected: Optional[int], revision: int) -> bool:
+        revision_key = (REVISION_PREFIX + session_id).encode()
+        expiry = b"%d" % max(1, int(self.idle_ttl * 2))
+        writes = [
+            (b"SET", (KEY_PREFIX + session_id).encode(), data, b"EX", expiry),
+            (b"SET", revision_key, b"%d" % revision, b"EX", expiry),
+            (b"ZADD", INDEX_KEY, repr(time.time()).encode(), session_id.encode())
+        ]
+        if expected is None:
+            await self._pipeline(writes)
+            return True
+        # Optimistic transaction: EXEC is aborted if anyone saved (or deleted)
+        # the session after the WATCH
+        async with self._connection() as connection:
+            _, current = await asyncio.wait_for(
+                connection.pipeline([(b"WATCH", revision_key), (b"GET", revision_key)]),
+                timeout=SESSION_STORE_TIMEOUT_SECONDS
+            )
+            if current != b"%d" % expected:
+                await asyncio.wait_for(connection.execute(b"UNWATCH"), timeout=SESSION_STORE_TIMEOUT_SECONDS)
+                return False
+            replies = await asyncio.wait_for(connection.pipeline([(b"MULTI",), *writes, (b"EXEC",)]),
+                                             timeout=SESSION_STORE_TIMEOUT_SECONDS)
+        return replies[-1] is not None
+
+    async def _delete(self, session_id: str) -> bool:
+        deleted, _, _ = await self._pipeline([
+            (b"DEL", (KEY_PREFIX + session_id).encode()),
+            (b"DEL", (REVISION_PREFIX + session_id).encode()),
+            (b"ZREM", INDEX_KEY, session_id.encode())
+        ])
+        return deleted > 0
+
+    async def _evict(self, cutoff: float) -> Evicted:
+        idle, count = await self._pipeline([
+            (b"ZRANGEBYSCORE", INDEX_KEY, b"-inf", b"(" + repr(cutoff).encode(), b"WITHSCORES"),
+            (b"ZCARD", INDEX_KEY)
+        ])
+        idle = list(zip(idle[0::2], idle[1::2]))
+        over = []
+        if count - len(idle) > self.max_sessions:
+            oldest = await self._execute(b"ZRANGE", INDEX_KEY, b"0",
+                                         b"%d" % (count - self.max_sessions - 1), b"WITHSCORES")
+            over = list(zip(oldest[0::2], oldest[1::2]))[len(idle):]
+        evicted = []
+        for reason, members in (("idle", idle), ("capacity", over)):
+            for member, score in members:
+                data = await self._evict_member(member, score)
+                if data is not None:
+                    evicted.append((reason, data))
+        return evicted
+
+    async def _evict_member(self, member: bytes, score: bytes) -> Optional[bytes]:
+        """
+        Remove a session if it hasn't been saved since the index was read
+        (its score is still ``score``); returns its state when this call removed it.
+        
+        A save in between (on any worker) re-scores the session and writes its
+        revision key, which the WATCH turns into an aborted EXEC, so a live
+        session is never evicted. Whoever's EXEC removes the index entry owns
+        the eviction, so sweepers in other workers never persist it twice.
+        """
+        key = KEY_PREFIX.encode() + member
+        revision_key = REVISION_PREFIX.encode() + member
+        async with self._connection() as connection:
+            _, current = await asyncio.wait_for(
+                connection.pipeline([(b"WATCH", revision_key), (b"ZSCORE", INDEX_KEY, member)]),
+                timeout=SESSION_STORE_TIMEOUT_SECONDS
+            )
+            if current != score:
+                await asyncio.wait_for(connection.execute(b"UNWATCH"), timeout=SESSION_STORE_TIMEOUT_SECONDS)
+                return None
+            replies = await asyncio.wait_for(connection.pipeline([
+                (b"MULTI",), (b"GET", key), (b"DEL", key), (b"DEL", revision_key),
+                (b"ZREM", INDEX_KEY, member), (b"EXEC",)
+            ]), timeout=SESSION_STORE_TIMEOUT_SECONDS)
+        result = replies[-1]
+        if result is None or not result[3]:
+            return None
+        return result[0]
+
+    async def _stats(self) -> Tuple[int, Optional[int]]:
+        return await self._execute(b"ZCARD", INDEX_KEY), None
+
+    async def close(self) -> None:
+        while not self._idle.empty():
+            self._idle.get_nowait().close()
+
+
+def create_session_store(backend: str = SESSION_STORE, url: str = SESSION_STORE_URL) -> SessionStore:
+    if backend == "memory":
+        return MemorySessionStore()
+    if backend == "sqlite":
+        return SQLiteSessionStore(url or os.path.join(tempfile.gettempdir(), "zain_sessions.db"))
+    if backend == "redis":
+        return RedisSessionStore(url)
+    raise ValueError(f"Unknown SESSION_STORE backend: {backend}")
+
+
+def get_session_store() -> SessionStore:
+    """Return the worker's session store, creating it on first use"""
+    global _store
+    if _store is None:
+        _store = create_session_store()
+    return _store
+
+
+async def persist_evicted_sessions(states: List[Dict[str, Any]]) -> None:
+    """Write evicted sessions' final state to the database and mark them ended"""
+    from app.database import USE_DATABASE, AsyncSessionLocal
+    from app.db_service import AsyncDatabaseService
+
+    if not states or not USE_DATABASE or not AsyncSessionLocal:
+        return
+    try:
+        async with AsyncSessionLocal() as db:
+            db_service = AsyncDatabaseService(db)
+            for state in states:
+                await db_service.update_session(state["id"], {
+                    "state": state["s"],
+                    "language": state["lang"],
+                    "customer_authenticated": state["auth"],
+                    "order_confirmed": state["conf"],
+                    "order_modified": state["mod"],
+                    "customer_name": state["name"],
+                    "is_active": False,
+                    "ended_at": datetime.utcnow()
+                }, state.get("sdb"))
+                metrics.increment("sessions.persisted")
+    except Exception as e:
+        print(f"Database error persisting evicted sessions: {e}")
+
+
+async def sweep_sessions(store: Optional[SessionStore] = None,
+                         persist: Callable[[List[Dict[str, Any]]], Any] = persist_evicted_sessions) -> int:
+    """One sweeper pass: evict, persist what was evicted and refresh the session gauges"""
+    store = store or get_session_store()
+    evicted = await store.evict()
+    if evicted:
+        result = persist(evicted)
+        if inspect.isawaitable(result):
+            await result
+    count, total_bytes = await store.stats()
+    metrics.set_gauge("sessions.live", count)
+    if total_bytes is None:
+        metrics.set_gauge("sessions.bytes_per_session", round(metrics.timing_avg("session_store.state_bytes")))
+    else:
+        metrics.set_gauge("sessions.bytes_per_session", total_bytes // count if count else 0)
+    return len(evicted)
+
+
+async def _sweep_forever(interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await sweep_sessions()
+        except Exception as e:
+            print(f"Session sweeper error: {e}")
+
+
+async def startup_session_store() -> None:
+    global _sweeper
+    get_session_store()
+    _sweeper = asyncio.create_task(_sweep_forever(SESSION_SWEEP_INTERVAL_SECONDS))
+
+
+async def shutdown_session_store() -> None:
+    global _store, _sweeper
+    if _sweeper is not None:
+        _sweeper.cancel()
+        try:
+            await _sweeper
+        except asyncio.CancelledError:
+            pass
+        _sweeper = None
+    if _store is not None:
+        await _store.close()
+        _store = None
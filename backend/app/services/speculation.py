@@ -0,0 +1,147 @@
+"""
+Speculative speech prefetch (opt-in, ``SPECULATIVE_PREFETCH=true``).
+
+Most of the call follows a fixed path: whatever the caller says after the
+authentication line, they hear the order read-back, and after "let me check
+your eligibility" they hear the financial breakdown. Those replies carry the
+caller's order details, so their audio can't come from the TTS cache and is
+synthesized while the caller waits.
+
+Once a reply has been sent, ``start_prefetch`` asks the agent for the likely
+next reply (``ZainVoiceAgent.predict_response``) and synthesizes its segments
+that the TTS cache doesn't cover while the caller is still listening, up to
+``TTS_PIPELINE_LOOKAHEAD`` at once and in order, as ``stream_segments`` does. On the next turn ``take_prefetch`` commits the audio if the agent
+actually gave that reply in that language and discards it otherwise (or when
+the call ends, ``discard_prefetch``).
+
+Prefetched speech is counted in ``speculation.characters``; of that,
+``speculation.wasted_characters`` was billed for nothing (the extra TTS
+spend), and ``speculation.hit_characters`` is the part of committed
+predictions whose audio was ready when the reply was given (a segment still
+synthesizing then is used, but the caller waits for it like any other).
+``speculation.hit_rate`` is hits over committed and discarded predictions.
+"""
+import asyncio
+import logging
+import os
+from typing import AsyncIterator, Dict, List, Optional
+
+from app.services.metrics import metrics
+from app.services.speech_pipeline import TTS_PIPELINE_LOOKAHEAD, split_segments
+from app.services.tts_cache import tts_cache
+from app.services.voice_service import stream_text_to_speech
+
+SPECULATIVE_PREFETCH = os.getenv("SPECULATIVE_PREFETCH", "false").lower() == "true"
+SPECULATION_MAX_CHARS = int(os.getenv("SPECULATION_MAX_CHARS", "600"))
+
+logger = logging.getLogger(__name__)
+
+
+class Prefetch:
+    """Audio for one predicted reply, synthesized in the background"""
+
+    def __init__(self, text: str, language: str, segments: List[str]):
+        self.text = text
+        self.language = language
+        self.characters = 0  # Sent to TTS so far
+        loop = asyncio.get_running_loop()
+        self.audio: Dict[str, asyncio.Future] = {segment: loop.create_future() for segment in segments}
+        self.task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        limiter = asyncio.Semaphore(TTS_PIPELINE_LOOKAHEAD)
+        
+        async def synthesize(segment: str, future: asyncio.Future) -> None:
+            async with limiter:
+                self.characters += len(segment)
+                metrics.increment("speculation.characters", len(segment))
+                chunks = [chunk async for chunk in stream_text_to_speech(segment, self.language)]
+            if not future.done():
+                future.set_result(b"".join(chunks))
+        
+        # Created in segment order, so the limiter (FIFO) sends them to TTS in order
+        tasks = [asyncio.create_task(synthesize(segment, future)) for segment, future in self.audio.items()]
+        try:
+            await asyncio.gather(*tasks)
+        except Exception as e:
+            logger.warning(f"Speculative prefetch failed (synthesizing live instead): {e}")
+        finally:
+            for task in tasks:
+                task.cancel()
+            for future in self.audio.values():
+                future.cancel()  # No-op for the segments already done
+
+    async def speak(self, text: str, language: str) -> AsyncIterator[bytes]:
+        """``stream_text_to_speech`` that uses the prefetched audio where there is some"""
+        future = self.audio.get(text)
+        if future is not None and language == self.language:
+            await asyncio.wait([future])
+            if not future.cancelled() and future.exception() is None:
+                yield future.result()
+                return
+        async for chunk in stream_text_to_speech(text, language):
+            yield chunk
+
+    def ready_characters(self) -> int:
+        """Characters of the segments whose audio is already synthesized"""
+        return sum(
+            len(segment) for segment, future in self.audio.items()
+            if future.done() and not future.cancelled() and future.exception() is None
+        )
+
+    def close(self) -> None:
+        self.task.cancel()
+
+
+_prefetches: Dict[str, Prefetch] = {}
+
+
+def start_prefetch(agent) -> None:
+    """Start synthesizing the agent's likely next reply, if it needs synthesis"""
+    if not SPECULATIVE_PREFETCH:
+        return
+    discard_prefetch(agent.session_id)
+    text = agent.predict_response()
+    if not text:
+        return
+    language = agent.language or "en"
+    segments = [segment for segment in split_segments(text) if not tts_cache.is_cacheable(segment, language)]
+    if not segments or sum(len(segment) for segment in segments) > SPECULATION_MAX_CHARS:
+        return
+    metrics.increment("speculation.started")
+    _prefetches[agent.session_id] = Prefetch(text, language, segments)
+
+
+def take_prefetch(session_id: str, text: str, language: str) -> Optional[Prefetch]:
+    """The prefetch for this reply (a hit), or None; a mismatched prefetch is discarded"""
+    prefetch = _prefetches.pop(session_id, None)
+    if prefetch is None:
+        return None
+    if prefetch.text == text and prefetch.language == language:
+        metrics.increment("speculation.hits")
+        metrics.increment("speculation.hit_characters", prefetch.ready_characters())
+        return prefetch
+    metrics.increment("speculation.misses")
+    _discard(prefetch)
+    return None
+
+
+def discard_prefetch(session_id: str) -> None:
+    prefetch = _prefetches.pop(session_id, None)
+    if prefetch is not None:
+        metrics.increment("speculation.discarded")
+        _discard(prefetch)
+
+
+def _discard(prefetch: Prefetch) -> None:
+    prefetch.close()
+    metrics.increment("speculation.wasted_characters", prefetch.characters)
+
+
+def _hit_rate() -> float:
+    hits = metrics.counter("speculation.hits")
+    total = hits + metrics.counter("speculation.misses") + metrics.counter("speculation.discarded")
+    return round(hits / total, 4) if total else 0.0
+
+
+metrics.derive("speculation.hit_rate", _hit_rate)
@@ -0,0 +1,216 @@
+"""
+Sentence-level TTS pipelining.
+
+A response is split at sentence/line boundaries and each segment is synthesized
+as its own TTS stream. Up to ``TTS_PIPELINE_LOOKAHEAD`` segments are in flight
+at once: segment 1 streams live to the client while segment 2 is already being
+synthesized into a buffer, and audio is always yielded in segment order.
+
+Synthesis can be paced to playback (``pace``), so later segments are only
+requested when the caller is within ``TTS_SYNTHESIS_LEAD_SECONDS`` of
+hearing them; segments that start sooner still overlap. If the consumer stops early
+(the caller barged in), segments that were never sent to TTS are counted as
+``tts.characters_saved``, and ``Playback`` tells how much of the response
+the caller actually heard.
+"""
+import asyncio
+import os
+import re
+import time
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable, List, Optional, Tuple, Union
+
+from app.services.metrics import metrics
+from app.services.voice_service import stream_text_to_speech
+
+TTS_PIPELINE_LOOKAHEAD = int(os.getenv("TTS_PIPELINE_LOOKAHEAD", "2"))
+MIN_SEGMENT_CHARS = 12  # Shorter pieces are merged so prosody doesn't get choppy
+# Playback rate of the synthesized audio (ElevenLabs' default mp3_44100_128)
+TTS_BYTES_PER_SECOND = int(os.getenv("TTS_BYTES_PER_SECOND", "16000"))
+SPEECH_CHARS_PER_SECOND = 15  # To size a segment whose audio has not all arrived
+# How far ahead of playback later segments are synthesized
+TTS_SYNTHESIS_LEAD_SECONDS = float(os.getenv("TTS_SYNTHESIS_LEAD_SECONDS", "3"))
+
+# Sentence ends (English and Arabic question mark), line breaks, and the " / "
+# separator used between the English and Arabic halves of bilingual lines
+SEGMENT_BOUNDARY = re.compile(r'(?<=[.!?؟])\s+(?:/\s+)?|\s*\n+\s*|\s+/\s+')
+
+_END = object()
+
+
+def split_segments(text: str) -> List[str]:
+    """Split a response into speakable segments at sentence or line boundaries"""
+    segments: List[str] = []
+    pending = ""
+    for piece in SEGMENT_BOUNDARY.split(text):
+        piece = piece.strip()
+        if not piece:
+            continue
+        pending = f"{pending} {piece}" if pending else piece
+        if len(pending) >= MIN_SEGMENT_CHARS:
+            segments.append(pending)
+            pending = ""
+    if pending:
+        if segments and len(pending) < MIN_SEGMENT_CHARS:
+            segments[-1] = f"{segments[-1]} {pending}"
+        else:
+            segments.append(pending)
+    return segments
+
+
+async def _as_async(segments: Union[Iterable[str], AsyncIterable[str]]) -> AsyncIterator[str]:
+    if hasattr(segments, "__aiter__"):
+        async for segment in segments:
+            yield segment
+    else:
+        for segment in segments:
+            yield segment
+
+
+async def stream_segments(
+    segments: Union[Iterable[str], AsyncIterable[str]],
+    language: str = "en",
+    lookahead: Optional[int] = None,
+    pace: Optional[Callable[[int], Awaitable[None]]] = None,
+    speak: Callable[[str, str], AsyncIterator[bytes]] = stream_text_to_speech
+) -> AsyncIterator[Tuple[int, bytes]]:
+    """
+    Synthesize segments concurrently and yield ``(segment_index, chunk)`` in order.
+    
+    ``segments`` may be an async iterable, so segments still being produced
+    upstream overlap with synthesis of the ones already available. With
+    ``pace``, segments are sent to TTS in order, each once ``pace(segment_index)``
+    returns (``Playback.pace`` counts the audio of the segments before it,
+    yielded or not, so the next ones overlap while within the lead). ``speak`` synthesizes one segment (a speculative prefetch passes
+    one that has some audio ready).
+    """
+    limiter = asyncio.Semaphore(lookahead or TTS_PIPELINE_LOOKAHEAD)
+    order: asyncio.Queue = asyncio.Queue()
+    tasks: List[asyncio.Task] = []
+    waiting: List[str] = []  # Segments not sent to TTS yet
+    requested: List[asyncio.Event] = []  # Per segment, set once it is sent to TTS
+    
+    async def synthesize(index: int, text: str, out: asyncio.Queue) -> None:
+        try:
+            async with limiter:
+                if pace is not None:
+                    if index:
+                        await requested[index - 1].wait()
+                    await pace(index)
+                requested[index].set()
+                waiting.remove(text)
+                metrics.increment("tts.characters", len(text))
+                async for chunk in speak(text, language):
+                    await out.put(chunk)
+            await out.put(_END)
+        except Exception as e:
+            await out.put(e)
+    
+    async def produce() -> None:
+        try:
+            index = 0
+            async for text in _as_async(segments):
+                out: asyncio.Queue = asyncio.Queue()
+                waiting.append(text)
+                requested.append(asyncio.Event())
+                tasks.append(asyncio.create_task(synthesize(index, text, out)))
+                await order.put(out)
+                index += 1
+        finally:
+            await order.put(_END)
+    
+    producer = asyncio.create_task(produce())
+    try:
+        index = 0
+        while True:
+            out = await order.get()
+            if out is _END:
+                break
+            while True:
+                item = await out.get()
+                if item is _END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield index, item
+            index += 1
+        await producer
+    finally:
+        producer.cancel()
+        for task in tasks:
+            task.cancel()
+        if waiting:
+            # Stopped before these were synthesized: characters not billed
+            metrics.increment("tts.characters_saved", sum(len(text) for text in waiting))
+
+
+class Playback:
+    """
+    How much of a streamed response the caller has heard.
+    
+    Record each chunk as it is sent; ``heard`` estimates the played part from
+    the time since the first chunk at ``TTS_BYTES_PER_SECOND``, cutting the
+    segment being played at a word boundary.
+    """
+    
+    def __init__(self, text: str):
+        self.segments = split_segments(text)
+        self.sent = [0] * len(self.segments)
+        self.current = 0  # Segment being sent; the ones before it are complete
+        self.started_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None
+    
+    def chunk(self, segment: int, size: int) -> None:
+        if self.started_at is None:
+            self.started_at = time.perf_counter()
+        self.sent[segment] += size
+        self.current = segment
+    
+    def finish(self) -> None:
+        self.current = len(self.segments)
+    
+    def ahead(self, before: int = 0) -> float:
+        """
+        Seconds of audio sent but not played yet, plus (sized from the text) the
+        segments before ``before`` with no audio sent yet, which may still be synthesizing
+        """
+        queued = sum(
+            len(self.segments[index]) / SPEECH_CHARS_PER_SECOND * TTS_BYTES_PER_SECOND
+            for index in range(self.current, min(before, len(self.segments)))
+            if not self.sent[index]
+        )
+        unplayed = 0.0
+        if self.started_at is not None:
+            # Never negative: a gap in the audio is silence, not playback of what comes next
+            unplayed = max(0.0, sum(self.sent) / TTS_BYTES_PER_SECOND - (time.perf_counter() - self.started_at))
+        return unplayed + queued / TTS_BYTES_PER_SECOND
+    
+    async def pace(self, segment: int) -> None:
+        """Wait until playback is within ``TTS_SYNTHESIS_LEAD_SECONDS`` of the start of ``segment``"""
+        while self.ahead(segment) > TTS_SYNTHESIS_LEAD_SECONDS:
+            # Re-checked often: the text-sized estimate is replaced as the real audio arrives
+            await asyncio.sleep(min(self.ahead(segment) - TTS_SYNTHESIS_LEAD_SECONDS, 0.25))
+    
+    def stop(self) -> None:
+        """Playback was cut off (the client drops the rest of the audio)"""
+        self.stopped_at = time.perf_counter()
+    
+    def heard(self) -> str:
+        if self.started_at is None:
+            return ""
+        played = ((self.stopped_at or time.perf_counter()) - self.started_at) * TTS_BYTES_PER_SECOND
+        heard = []
+        for index, text in enumerate(self.segments):
+            size = self.sent[index]
+            if not size or played <= 0:
+                break
+            if index >= self.current:
+                # Still arriving: size it from the text
+                size = max(size, len(text) / SPEECH_CHARS_PER_SECOND * TTS_BYTES_PER_SECOND)
+            if played >= size:
+                heard.append(text)
+                played -= size
+                continue
+            words = text.split()
+            heard.extend(words[:int(len(words) * played / size)])
+            break
+        return " ".join(heard)
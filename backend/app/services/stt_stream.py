@@ -0,0 +1,153 @@
+"""
+Streaming speech-to-text.
+
+The voice WebSocket opens one ``TranscriptionStream`` per utterance
+(``get_stt_backend().open(language, codec, session_id)``), feeds it the audio as frames
+arrive and calls ``finish`` with the complete utterance once it has ended
+(FINAL frame or VAD endpoint). ``feed`` may return a ``Partial`` transcript,
+which is forwarded to the client as ``transcript_partial``; a stable partial
+lets the agent start its classification before the final transcript is in.
+
+Backends are chosen with ``STT_BACKEND``:
+
+- ``whisper`` (default): batch Whisper behind the streaming interface. The
+  final transcript is one upload of the whole utterance. With
+  ``STT_PARTIAL_INTERVAL_MS`` > 0 the audio received so far is also
+  re-transcribed at most that often for partials (each one a billed
+  request); a partial is stable once two in a row agree.
+
+A vendor with a real streaming API plugs in as another ``STTBackend``, or is
+installed with ``set_stt_backend`` (the tests and benchmarks install
+``benchmarks.fakes.FakeStreamingSTT``).
+"""
+import asyncio
+import os
+import time
+from typing import NamedTuple, Optional, Union
+
+from app.services.metrics import metrics
+from app.services.vad import pcm_to_wav
+from app.services.voice_protocol import CODEC_IDS, CODECS
+from app.services.voice_service import speech_to_text
+
+STT_BACKEND = os.getenv("STT_BACKEND", "whisper")
+STT_PARTIAL_INTERVAL_MS = int(os.getenv("STT_PARTIAL_INTERVAL_MS", "0"))
+
+
+class Partial(NamedTuple):
+    text: str
+    stable: bool  # the backend does not expect to revise it
+
+
+class TranscriptionStream:
+    """One utterance, transcribed as its audio arrives"""
+
+    async def feed(self, chunk: Union[bytes, memoryview]) -> Optional[Partial]:
+        """Add audio; returns a new partial transcript when there is one"""
+        return None
+
+    async def finish(self, utterance: bytes) -> str:
+        """The utterance has ended; returns the final transcript"""
+        raise NotImplementedError
+
+    def cancel(self) -> None:
+        """Drop the utterance (connection closed)"""
+
+
+class STTBackend:
+    """Opens a transcription stream per utterance"""
+
+    def open(self, language: str, codec: str, session_id: Optional[str] = None) -> TranscriptionStream:
+        raise NotImplementedError
+
+
+async def transcribe_whisper(audio: bytes, language: str, codec: str, session_id: Optional[str] = None) -> str:
+    """One Whisper request for audio in a negotiated codec"""
+    if codec == "pcm16":
+        audio = pcm_to_wav(audio)
+    return await speech_to_text(audio, language, CODECS[CODEC_IDS[codec]][1], session_id)
+
+
+class WhisperStream(TranscriptionStream):
+    def __init__(self, language: str, codec: str, partial_interval_ms: int, session_id: Optional[str] = None):
+        self.language = language
+        self.codec = codec
+        self.session_id = session_id
+        self.partial_interval = partial_interval_ms / 1000
+        self._audio = bytearray()
+        self._task: Optional[asyncio.Task] = None
+        self._requested_at = 0.0
+        self._previous: Optional[str] = None
+
+    async def feed(self, chunk: Union[bytes, memoryview]) -> Optional[Partial]:
+        if not self.partial_interval:
+            # No partials: finish() uploads the complete utterance, nothing to keep
+            return None
+        self._audio += chunk
+        partial = None
+        if self._task is not None and self._task.done():
+            task, self._task = self._task, None
+            try:
+                text = task.result().strip()
+            except Exception as e:
+                print(f"Error transcribing partial audio: {e}")
+                text = ""
+            if text:
+                partial = Partial(text, stable=text == self._previous)
+                self._previous = text
+        now = time.perf_counter()
+        if self._task is None and now - self._requested_at >= self.partial_interval:
+            # Whisper has no streaming API: re-transcribe what has arrived so far. Partials
+            # skip the session's ordering (only final utterances need it), so one cancelled
+            # while its thread still waits on Whisper never holds up the final transcription
+            self._requested_at = now
+            metrics.increment("stt.partial_requests")
+            self._task = asyncio.create_task(transcribe_whisper(bytes(self._audio), self.language, self.codec))
+        return partial
+
+    async def finish(self, utterance: bytes) -> str:
+        self.cancel()
+        return await transcribe_whisper(utterance, self.language, self.codec, self.session_id)
+
+    def cancel(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+class WhisperBackend(STTBackend):
+    def __init__(self, partial_interval_ms: int = STT_PARTIAL_INTERVAL_MS):
+        self.partial_interval_ms = partial_interval_ms
+
+    def open(self, language: str, codec: str, session_id: Optional[str] = None) -> TranscriptionStream:
+        return WhisperStream(language, codec, self.partial_interval_ms, session_id)
+
+
+def _early_hit_rate() -> float:
+    return round(metrics.ratio("stt.early_hits", "stt.early_starts"), 3)
+
+
+metrics.derive("stt.early_hit_rate", _early_hit_rate)
+
+
+BACKENDS = {
+    "whisper": WhisperBackend
+}
+
+_backend: Optional[STTBackend] = None
+
+
+def get_stt_backend() -> STTBackend:
+    """Return the worker's speech-to-text backend, creating it on first use"""
+    global _backend
+    if _backend is None:
+        if STT_BACKEND not in BACKENDS:
+            raise ValueError(f"Unknown STT_BACKEND {STT_BACKEND!r}; available: {list(BACKENDS)}")
+        _backend = BACKENDS[STT_BACKEND]()
+    return _backend
+
+
+def set_stt_backend(backend: Optional[STTBackend]) -> None:
+    """Install a backend (None goes back to ``STT_BACKEND``)"""
+    global _backend
+    _backend = backend
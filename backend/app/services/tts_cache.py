@@ -0,0 +1,109 @@
+"""
+Content-addressed cache for synthesized speech.
+
+Audio is keyed by (text, voice_id, model_id, language). Lookups go through an
+in-memory LRU first and then an on-disk directory shared by every worker on the
+host. Only template segments without slots (see response_templates.py) are
+cached, so customer names, CPRs and order amounts are never written to disk.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import FrozenSet, Optional
+
+from app.services.metrics import metrics
+
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "zain_tts_cache"))
+TTS_CACHE_MEMORY_BYTES = int(os.getenv("TTS_CACHE_MEMORY_BYTES", str(32 * 1024 * 1024)))
+TTS_CACHE_ENABLED = os.getenv("TTS_CACHE_ENABLED", "true").lower() != "false"
+
+
+def cache_key(text: str, voice_id: Optional[str], model_id: str, language: str) -> str:
+    payload = json.dumps([text, voice_id, model_id, language], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@lru_cache(maxsize=1)
+def static_segments() -> FrozenSet[tuple]:
+    """(segment, language) pairs the agent always speaks the same way"""
+    from app.services import response_templates
+    
+    return response_templates.static_segments()
+
+
+class TTSCache:
+    def __init__(self, directory: str = TTS_CACHE_DIR, max_memory_bytes: int = TTS_CACHE_MEMORY_BYTES):
+        self.directory = directory
+        self.max_memory_bytes = max_memory_bytes
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+    
+    def is_cacheable(self, text: str, language: str) -> bool:
+        return TTS_CACHE_ENABLED and (text, language) in static_segments()
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.mp3")
+    
+    def _remember(self, key: str, audio: bytes) -> None:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return
+            self._memory[key] = audio
+            self._memory_bytes += len(audio)
+            while self._memory_bytes > self.max_memory_bytes and self._memory:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+        metrics.set_gauge("tts_cache.memory_bytes", self._memory_bytes)
+    
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+        
+        if audio is None:
+            try:
+                with open(self._path(key), "rb") as f:
+                    audio = f.read()
+            except OSError:
+                metrics.increment("tts_cache.misses")
+                return None
+            self._remember(key, audio)
+            metrics.increment("tts_cache.disk_hits")
+        else:
+            metrics.increment("tts_cache.memory_hits")
+        
+        metrics.increment("tts_cache.bytes_saved", len(audio))
+        return audio
+    
+    def put(self, key: str, audio: bytes) -> None:
+        if not audio:
+            return
+        self._remember(key, audio)
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename so other workers never read a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(audio)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"TTS cache write failed (continuing without disk tier): {e}")
+
+
+def _hit_ratio() -> float:
+    hits = metrics.counter("tts_cache.memory_hits") + metrics.counter("tts_cache.disk_hits")
+    total = hits + metrics.counter("tts_cache.misses")
+    return round(hits / total, 4) if total else 0.0
+
+
+metrics.derive("tts_cache.hit_ratio", _hit_ratio)
+
+tts_cache = TTSCache()
@@ -0,0 +1,216 @@
+"""
+Server-side voice activity detection and utterance endpointing.
+
+Clients that stream raw microphone audio (the ``pcm16`` codec of the voice
+WebSocket: 16 kHz mono signed 16-bit little-endian) no longer decide where an
+utterance ends. ``Endpointer`` splits the stream into 20 ms frames and marks
+a frame as speech when its energy is ``VAD_THRESHOLD_DB`` above the noise
+floor. The floor starts at ``VAD_INITIAL_FLOOR_DBFS`` and then is the quietest
+of the last ``VAD_NOISE_WINDOW_MS`` of frames classified as silence between
+utterances, so it follows the room rather than a fixed level, and neither a
+long turn nor a caller who talks as soon as the stream opens can raise it to
+the level of the voice. An utterance starts after
+``VAD_START_MS`` of consecutive speech and ends after ``VAD_END_SILENCE_MS``
+of silence; only the speech plus ``VAD_PADDING_MS`` on either side is sent
+to speech-to-text, so leading/trailing silence and pauses between turns are
+never uploaded or billed.
+"""
+import io
+import os
+import time
+import wave
+from collections import deque
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.services.metrics import metrics
+
+PCM_SAMPLE_RATE = 16000
+FRAME_MS = 20
+
+VAD_THRESHOLD_DB = float(os.getenv("VAD_THRESHOLD_DB", "12"))
+VAD_MIN_LEVEL_DBFS = float(os.getenv("VAD_MIN_LEVEL_DBFS", "-55"))
+VAD_INITIAL_FLOOR_DBFS = float(os.getenv("VAD_INITIAL_FLOOR_DBFS", "-45"))
+VAD_NOISE_WINDOW_MS = int(os.getenv("VAD_NOISE_WINDOW_MS", "1500"))
+VAD_START_MS = int(os.getenv("VAD_START_MS", "60"))
+VAD_END_SILENCE_MS = int(os.getenv("VAD_END_SILENCE_MS", "500"))
+VAD_PADDING_MS = int(os.getenv("VAD_PADDING_MS", "200"))
+VAD_MIN_SPEECH_MS = int(os.getenv("VAD_MIN_SPEECH_MS", "200"))
+VAD_MAX_UTTERANCE_SECONDS = float(os.getenv("VAD_MAX_UTTERANCE_SECONDS", "30"))
+
+
+def frame_levels(pcm: bytes) -> np.ndarray:
+    """RMS level (dBFS) of each whole 20 ms frame of 16 kHz s16le audio"""
+    samples = np.frombuffer(pcm, dtype="<i2").astype(np.float32)
+    frame_samples = PCM_SAMPLE_RATE * FRAME_MS // 1000
+    frames = samples[:len(samples) // frame_samples * frame_samples].reshape(-1, frame_samples)
+    rms = np.sqrt(np.mean(frames * frames, axis=1)) / 32768.0
+    return 20 * np.log10(rms + 1e-10)
+
+
+def pcm_to_wav(pcm: bytes, sample_rate: int = PCM_SAMPLE_RATE) -> bytes:
+    """Wrap raw mono s16le audio in a WAV container for speech-to-text"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+
+class Endpointer:
+    """Turns a continuous PCM stream into trimmed utterances"""
+
+    def __init__(self, threshold_db: float = VAD_THRESHOLD_DB,
+                 min_level_dbfs: float = VAD_MIN_LEVEL_DBFS,
+                 initial_floor_dbfs: float = VAD_INITIAL_FLOOR_DBFS,
+                 noise_window_ms: int = VAD_NOISE_WINDOW_MS,
+                 start_ms: int = VAD_START_MS,
+                 end_silence_ms: int = VAD_END_SILENCE_MS,
+                 padding_ms: int = VAD_PADDING_MS,
+                 min_speech_ms: int = VAD_MIN_SPEECH_MS,
+                 max_utterance_seconds: float = VAD_MAX_UTTERANCE_SECONDS):
+        self.frame_bytes = PCM_SAMPLE_RATE * FRAME_MS // 1000 * 2
+        self.threshold_db = threshold_db
+        self.min_level_dbfs = min_level_dbfs
+        self.initial_floor_dbfs = initial_floor_dbfs
+        self.start_frames = max(1, start_ms // FRAME_MS)
+        self.end_frames = max(1, end_silence_ms // FRAME_MS)
+        self.padding_bytes = padding_ms // FRAME_MS * self.frame_bytes
+        self.min_speech_frames = min_speech_ms // FRAME_MS
+        self.max_utterance_bytes = int(max_utterance_seconds * 1000) // FRAME_MS * self.frame_bytes
+        self._levels = deque(maxlen=max(1, noise_window_ms // FRAME_MS))
+        self._pending = b""
+        # Recent frames while idle: the padding before speech plus the frames that
+        # triggered it, or the whole stream so far while the floor is being learned
+        self._preroll_frames = padding_ms // FRAME_MS + self.start_frames
+        self._preroll = deque(maxlen=max(self._preroll_frames, self._levels.maxlen))
+        self._speech_run = 0
+        self._utterance: Optional[bytearray] = None
+        self._speech_end = 0
+        self._speech_frames = 0
+        self._silence_run = 0
+        self._started_at = 0
+        self._sent = 0  # bytes of the utterance in progress already handed out by stream()
+        self.stream_bytes = 0  # audio received so far, for stream-time positions
+        self.last_span = (0, 0)  # stream offsets of the last utterance returned
+
+    def feed(self, pcm: bytes) -> List[bytes]:
+        """Add audio; returns the utterances (trimmed PCM) that ended in it"""
+        return [utterance for _, utterance in self.stream(pcm) if utterance is not None]
+
+    def stream(self, pcm: bytes, final: bool = False) -> List[Tuple[bytes, Optional[bytes]]]:
+        """
+        Add audio, handing out the utterance in progress as it grows.
+
+        Returns ``(new audio, None)`` while speech continues and ``(rest of the
+        audio, utterance)`` when it ends, so a streaming transcriber can follow
+        along. Audio is only handed out once the utterance has enough speech to
+        be kept, so a click never starts a transcription. ``final`` ends the
+        stream as ``flush`` does.
+        """
+        started = time.perf_counter()
+        data = self._pending + pcm if self._pending else pcm
+        whole = len(data) - len(data) % self.frame_bytes
+        self._pending = bytes(data[whole:])
+        events = []
+        if whole:
+            view = memoryview(data)
+            for index, level in enumerate(frame_levels(data[:whole])):
+                frame = view[index * self.frame_bytes:(index + 1) * self.frame_bytes]
+                self.stream_bytes += self.frame_bytes
+                utterance = self._step(frame, float(level))
+                if utterance is not None:
+                    events.append((utterance[self._sent:], utterance))
+                    self._sent = 0
+        if final:
+            utterance = self.flush()
+            if utterance is not None:
+                events.append((utterance[self._sent:], utterance))
+                self._sent = 0
+        elif self._utterance is not None and self._speech_frames >= self.min_speech_frames:
+            if len(self._utterance) > self._sent:
+                events.append((bytes(self._utterance[self._sent:]), None))
+                self._sent = len(self._utterance)
+        metrics.increment("vad.input_bytes", len(pcm))
+        metrics.observe("vad.feed_ms", (time.perf_counter() - started) * 1000)
+        return events
+
+    def flush(self) -> Optional[bytes]:
+        """End of stream: return the utterance in progress, if any"""
+        self._pending = b""
+        if self._utterance is None:
+            return None
+        return self._finish(self._speech_end + self.padding_bytes)
+
+    def _is_speech(self, level: float) -> bool:
+        # Until silence has been heard the floor is a fixed level: seeding it from the
+        # first frames would make a caller who talks right away the background
+        floor = min(self._levels) if self._levels else self.initial_floor_dbfs
+        speech = level >= self.min_level_dbfs and level >= floor + self.threshold_db
+        # Only background between utterances feeds the floor: inside one, the quiet
+        # frames are still voice (dips between syllables) and would pull it up
+        if not speech and self._utterance is None:
+            self._levels.append(level)
+        return speech
+
+    def _step(self, frame: memoryview, level: float) -> Optional[bytes]:
+        speech = self._is_speech(level)
+        if self._utterance is None:
+            self._preroll.append(frame)
+            self._speech_run = self._speech_run + 1 if speech else 0
+            if self._speech_run >= self.start_frames:
+                # Speech within the first noise window keeps the stream from its start:
+                # quiet first syllables may have been under the initial floor
+                frames = list(self._preroll)
+                if self.stream_bytes > self._levels.maxlen * self.frame_bytes:
+                    frames = frames[-self._preroll_frames:]
+                self._utterance = bytearray(b"".join(frames))
+                self._preroll.clear()
+                self._started_at = self.stream_bytes - len(self._utterance)
+                self._speech_end = len(self._utterance)
+                self._speech_frames = self._speech_run
+                self._silence_run = 0
+                self._sent = 0
+            return None
+
+        self._utterance += frame
+        if speech:
+            self._speech_end = len(self._utterance)
+            self._speech_frames += 1
+            self._silence_run = 0
+        else:
+            self._silence_run += 1
+        if self._silence_run >= self.end_frames:
+            return self._finish(self._speech_end + self.padding_bytes)
+        if len(self._utterance) >= self.max_utterance_bytes:
+            metrics.increment("vad.max_length_cuts")
+            if self._silence_run == 0:
+                # Still "speech" after the longest turn: more likely the room got louder than
+                # anyone talking this long, so measure the floor again from here
+                self._levels.clear()
+            return self._finish(len(self._utterance))
+        return None
+
+    def _finish(self, end: int) -> Optional[bytes]:
+        utterance, self._utterance = self._utterance, None
+        self._speech_run = 0
+        if self._speech_frames < self.min_speech_frames:
+            # A click or a cough, not a turn
+            metrics.increment("vad.discarded")
+            return None
+        audio = bytes(utterance[:end])
+        self.last_span = (self._started_at, self._started_at + len(audio))
+        metrics.increment("vad.utterances")
+        metrics.increment("vad.output_bytes", len(audio))
+        metrics.observe("vad.utterance_ms", len(audio) / self.frame_bytes * FRAME_MS)
+        return audio
+
+
+def _upload_ratio() -> float:
+    return round(metrics.ratio("vad.output_bytes", "vad.input_bytes"), 3)
+
+
+metrics.derive("vad.upload_ratio", _upload_ratio)
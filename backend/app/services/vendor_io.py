@@ -0,0 +1,210 @@
+"""
+Scheduler for the blocking speech vendor SDKs.
+
+The OpenAI (Whisper) and ElevenLabs clients are synchronous, so every call
+runs on a thread. Instead of asyncio's default executor, which is shared with
+everything else that uses ``asyncio.to_thread`` and sized from the CPU count
+(five threads on a one-core container), vendor calls get their own pool of
+``VENDOR_IO_THREADS`` threads, and each vendor is capped at its own number of
+requests in flight (``STT_MAX_CONCURRENCY``, ``TTS_MAX_CONCURRENCY``), so a
+burst of one kind can't starve the other.
+
+A cancelled call can't stop its thread, which keeps the vendor request open
+until the vendor answers, so its slot (and its place in the session order)
+is only released when the thread returns: the caps count real requests in
+flight, not the callers still waiting for them. Resources registered with
+``VendorSlot.closing`` (a streaming response) are closed on the pool at that
+point, before the slot is released, since they can't be closed while that
+thread is still reading from them.
+
+Calls that carry a ``session_id`` run in submission order for that session:
+a caller's utterances are transcribed one after another, even when a later
+one would come back first. Calls beyond the vendor cap wait in a queue whose
+depth is exported as the ``vendor.<name>.queued`` gauge.
+"""
+import asyncio
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, List, Optional, TypeVar
+
+from app.services.metrics import metrics
+
+VENDOR_IO_THREADS = int(os.getenv("VENDOR_IO_THREADS", "32"))
+STT_MAX_CONCURRENCY = int(os.getenv("STT_MAX_CONCURRENCY", "16"))
+TTS_MAX_CONCURRENCY = int(os.getenv("TTS_MAX_CONCURRENCY", "16"))
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class VendorSlot:
+    """A held vendor slot; blocking calls made through it keep it until their thread returns"""
+
+    def __init__(self, executor: ThreadPoolExecutor):
+        self.executor = executor
+        self.pending: Optional[asyncio.Future] = None  # A call whose caller was cancelled
+        self.closers: List[Callable[[], None]] = []
+
+    def closing(self, resource: R) -> R:
+        """Close ``resource`` when the slot is released, once no call is using it"""
+        if hasattr(resource, "close"):
+            self.closers.append(resource.close)
+        return resource
+
+    def close_resources(self) -> None:
+        for close in self.closers:
+            close()
+
+    async def call(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+        self.pending = future
+        # Shielded: cancelling the caller leaves the thread running, and the slot with it
+        result = await asyncio.shield(future)
+        self.pending = None
+        return result
+
+
+class VendorScheduler:
+    """A bounded thread pool plus per-vendor limits and per-session ordering"""
+
+    def __init__(self, threads: int = VENDOR_IO_THREADS, limits: Optional[Dict[str, int]] = None):
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="vendor-io")
+        self.limits = limits or {"stt": STT_MAX_CONCURRENCY, "tts": TTS_MAX_CONCURRENCY}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+        self._sessions: Dict[str, asyncio.Lock] = {}
+        self._session_users: Dict[str, int] = {}
+        self._queued: Dict[str, int] = {vendor: 0 for vendor in self.limits}
+        self._active: Dict[str, int] = {vendor: 0 for vendor in self.limits}
+
+    def _vendor_slots(self, vendor: str) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # asyncio primitives belong to one loop (benchmarks run several in turn)
+            self._loop = loop
+            self._slots = {name: asyncio.Semaphore(limit) for name, limit in self.limits.items()}
+            self._sessions.clear()
+            self._session_users.clear()
+        return self._slots[vendor]
+
+    def _gauges(self, vendor: str) -> None:
+        metrics.set_gauge(f"vendor.{vendor}.queued", self._queued[vendor])
+        metrics.set_gauge(f"vendor.{vendor}.active", self._active[vendor])
+
+    @asynccontextmanager
+    async def slot(self, vendor: str, session_id: Optional[str] = None) -> AsyncIterator[VendorSlot]:
+        """
+        Hold one of the vendor's request slots (after the session's earlier calls).
+        
+        Make the blocking calls through the yielded ``VendorSlot``: if one is
+        still running in its thread when the block exits (the caller was
+        cancelled), the slot is released when that thread returns, after the
+        slot's ``closing`` resources are closed.
+        """
+        slots = self._vendor_slots(vendor)
+        lock = None
+        if session_id is not None:
+            lock = self._sessions.setdefault(session_id, asyncio.Lock())
+            self._session_users[session_id] = self._session_users.get(session_id, 0) + 1
+        queued_at = time.perf_counter()
+        self._queued[vendor] += 1
+        self._gauges(vendor)
+        ordered = acquired = False
+        try:
+            if lock is not None:
+                await lock.acquire()  # asyncio.Lock wakes waiters in FIFO order
+                ordered = True
+            await slots.acquire()
+            acquired = True
+        finally:
+            self._queued[vendor] -= 1
+            if not acquired:
+                # Cancelled while queued
+                if ordered:
+                    lock.release()
+                self._leave_session(session_id)
+                self._gauges(vendor)
+        metrics.observe(f"vendor.{vendor}.wait_ms", (time.perf_counter() - queued_at) * 1000)
+        metrics.increment(f"vendor.{vendor}.calls")
+        self._active[vendor] += 1
+        self._gauges(vendor)
+        
+        def release(future: Optional[asyncio.Future] = None) -> None:
+            if future is not None and not future.cancelled():
+                future.exception()  # Nobody awaits a cancelled caller's request
+            self._active[vendor] -= 1
+            slots.release()
+            if lock is not None:
+                lock.release()
+            self._leave_session(session_id)
+            self._gauges(vendor)
+        
+        loop = asyncio.get_running_loop()
+        held = VendorSlot(self.executor)
+        
+        def close(future: Optional[asyncio.Future] = None) -> None:
+            if future is not None and not future.cancelled():
+                future.exception()
+            if not held.closers:
+                release()
+                return
+            # Closing a response can block on the connection too
+            closed = asyncio.wrap_future(self.executor.submit(held.close_resources), loop=loop)
+            closed.add_done_callback(release)
+        
+        try:
+            yield held
+        finally:
+            if held.pending is not None and not held.pending.done():
+                metrics.increment(f"vendor.{vendor}.cancelled_in_flight")
+                held.pending.add_done_callback(close)
+            else:
+                close()
+
+    def _leave_session(self, session_id: Optional[str]) -> None:
+        if session_id is None:
+            return
+        self._session_users[session_id] -= 1
+        if not self._session_users[session_id]:
+            del self._session_users[session_id]
+            self._sessions.pop(session_id, None)
+
+    async def call(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """Run a blocking function on the vendor pool (no slot; see ``slot``)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+
+    async def run(self, vendor: str, fn: Callable[..., T], *args,
+                  session_id: Optional[str] = None, **kwargs) -> T:
+        """Run one blocking vendor request within the vendor's limit"""
+        async with self.slot(vendor, session_id) as held:
+            return await held.call(fn, *args, **kwargs)
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+_scheduler: Optional[VendorScheduler] = None
+
+
+def get_vendor_scheduler() -> VendorScheduler:
+    """Return the worker's vendor scheduler, creating it on first use"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = VendorScheduler()
+    return _scheduler
+
+
+async def startup_vendor_io() -> None:
+    get_vendor_scheduler()
+
+
+async def shutdown_vendor_io() -> None:
+    global _scheduler
+    if _scheduler is not None:
+        _scheduler.shutdown()
+        _scheduler = None
@@ -0,0 +1,207 @@
+"""
+Binary audio framing for the voice WebSocket.
+
+Audio travels as binary WebSocket messages, each one frame: an 8-byte header
+followed by the payload bytes. Control messages (text, state, errors,
+``audio_end``) stay JSON text messages.
+
+    offset  size  field
+    0       1     version   protocol version (1)
+    1       1     type      1 = audio from the client, 2 = audio to the client
+    2       1     codec     1 = webm-opus, 2 = ogg-opus, 3 = mpeg, 4 = wav, 5 = pcm16
+    3       1     flags     bit 0 = FINAL (last frame of the client's utterance or stream)
+    4       4     seq       big-endian uint32, counted per direction per connection
+
+A client opts in on the connection URL, listing the codecs it can record in:
+
+    /ws/voice/{session_id}?protocol=1&codecs=webm-opus,ogg-opus
+
+and the server answers with ``{"type": "ready", "protocol": 1, "audio_in":
+[...], "audio_out": "mpeg"}`` before the greeting. The client streams an
+utterance as any number of type-1 frames (e.g. MediaRecorder timeslices) and
+sets FINAL on the last one, which may be empty (a FINAL with no audio before
+it ends nothing and is ignored). Compressed audio is passed
+through untouched to speech-to-text, so there is no transcoding on the server.
+
+``pcm16`` (16 kHz mono s16le) is a continuous microphone stream instead: the
+client just keeps sending frames and the server's endpointer (app/services/
+vad.py) finds where each utterance starts and ends and trims the silence
+around it. FINAL on a pcm16 frame ends whatever utterance is in progress.
+
+Either way the server hands the audio on as it arrives (``AudioUpdate``), so
+streaming speech-to-text can transcribe while the caller is still speaking.
+
+Every chunk of synthesized speech arrives as one type-2 frame; ``audio_end``
+still closes each spoken response.
+
+Clients that connect without ``protocol`` keep the old behaviour: base64
+audio in a ``{"type": "audio"}`` JSON message or a raw binary utterance in,
+an ``audio_chunk`` JSON header before each raw audio chunk out.
+"""
+import os
+import struct
+import time
+from typing import List, NamedTuple, Optional, Sequence, Union
+
+from app.services.metrics import metrics
+from app.services.vad import Endpointer
+
+PROTOCOL_VERSION = 1
+WS_MAX_UTTERANCE_BYTES = int(os.getenv("WS_MAX_UTTERANCE_BYTES", str(10 * 1024 * 1024)))
+
+HEADER = struct.Struct("!BBBBI")
+
+FRAME_AUDIO_IN = 1
+FRAME_AUDIO_OUT = 2
+FLAG_FINAL = 0x01
+
+# Codec id -> (name, file extension speech-to-text recognizes)
+CODECS = {
+    1: ("webm-opus", "webm"),
+    2: ("ogg-opus", "ogg"),
+    3: ("mpeg", "mp3"),
+    4: ("wav", "wav"),
+    5: ("pcm16", "wav"),  # continuous stream, endpointed on the server
+}
+CODEC_IDS = {name: codec for codec, (name, _) in CODECS.items()}
+OUTPUT_CODEC = "mpeg"  # ElevenLabs streams MP3
+
+
+class ProtocolError(ValueError):
+    """A frame or negotiation request that does not follow the protocol"""
+
+
+class Frame(NamedTuple):
+    type: int
+    codec: int
+    flags: int
+    seq: int
+    payload: memoryview
+
+
+class AudioUpdate(NamedTuple):
+    """Audio received for the utterance in progress"""
+    codec: str
+    chunk: Union[bytes, memoryview]  # new audio since the previous update (raw PCM for pcm16)
+    utterance: Optional[bytes]  # the whole utterance, once it has ended
+
+
+def pack_frame(frame_type: int, seq: int, codec: int,
+               payload: Union[bytes, memoryview], flags: int = 0) -> bytes:
+    """Header + payload as one message"""
+    return b"".join((HEADER.pack(PROTOCOL_VERSION, frame_type, codec, flags, seq & 0xFFFFFFFF), payload))
+
+
+def parse_frame(data: bytes) -> Frame:
+    """Split a binary message into header fields and a zero-copy view of the payload"""
+    if len(data) < HEADER.size:
+        raise ProtocolError(f"Frame shorter than the {HEADER.size}-byte header")
+    version, frame_type, codec, flags, seq = HEADER.unpack_from(data)
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError(f"Unsupported protocol version {version}")
+    if codec not in CODECS:
+        raise ProtocolError(f"Unknown codec {codec}")
+    return Frame(frame_type, codec, flags, seq, memoryview(data)[HEADER.size:])
+
+
+class BinaryFraming:
+    """Per-connection framing state: negotiated codecs, sequence numbers and the utterance being received"""
+
+    def __init__(self, input_codecs: Sequence[str]):
+        self.input_codecs = list(input_codecs)
+        self.output_codec = CODEC_IDS[OUTPUT_CODEC]
+        self.out_seq = 0
+        self.in_seq = 0
+        self._parts: List[memoryview] = []
+        self._size = 0
+        self._codec: Optional[int] = None
+        self._endpointer: Optional[Endpointer] = None
+
+    def ready_message(self) -> dict:
+        return {
+            "type": "ready",
+            "protocol": PROTOCOL_VERSION,
+            "audio_in": self.input_codecs,
+            "audio_out": OUTPUT_CODEC
+        }
+
+    def audio_frame(self, chunk: bytes) -> bytes:
+        """Frame one chunk of synthesized speech for the client"""
+        frame = pack_frame(FRAME_AUDIO_OUT, self.out_seq, self.output_codec, chunk)
+        self.out_seq += 1
+        metrics.increment("ws.frames_out")
+        metrics.increment("ws.audio_out_bytes", len(frame))
+        return frame
+
+    def receive(self, data: bytes) -> List[AudioUpdate]:
+        """Take one client frame; returns the audio it added, and any utterances it completed"""
+        started = time.perf_counter()
+        frame = parse_frame(data)
+        if frame.type != FRAME_AUDIO_IN:
+            raise ProtocolError(f"Unexpected frame type {frame.type}")
+        if CODECS[frame.codec][0] not in self.input_codecs:
+            raise ProtocolError(f"Codec {CODECS[frame.codec][0]} was not negotiated")
+        if self._codec is not None and frame.codec != self._codec:
+            self._reset()
+            raise ProtocolError("Codec changed in the middle of an utterance")
+        if frame.seq != self.in_seq:
+            # A lost or reordered frame; the utterance is kept, the gap counted
+            metrics.increment("ws.seq_gaps")
+        self.in_seq = (frame.seq + 1) & 0xFFFFFFFF
+        metrics.increment("ws.frames_in")
+        metrics.increment("ws.audio_in_bytes", len(data))
+
+        if frame.codec == CODEC_IDS["pcm16"]:
+            utterances = self._endpoint(frame)
+        else:
+            utterances = self._assemble(frame)
+        metrics.observe("ws.decode_ms", (time.perf_counter() - started) * 1000)
+        return utterances
+
+    def _endpoint(self, frame: Frame) -> List[AudioUpdate]:
+        # Continuous stream: utterance boundaries come from the VAD
+        if self._endpointer is None:
+            self._endpointer = Endpointer()
+        events = self._endpointer.stream(frame.payload, final=bool(frame.flags & FLAG_FINAL))
+        return [AudioUpdate("pcm16", chunk, utterance) for chunk, utterance in events]
+
+    def _assemble(self, frame: Frame) -> List[AudioUpdate]:
+        # Client-delimited utterance: collect payloads until FINAL
+        self._size += len(frame.payload)
+        if self._size > WS_MAX_UTTERANCE_BYTES:
+            self._reset()
+            raise ProtocolError(f"Utterance larger than {WS_MAX_UTTERANCE_BYTES} bytes")
+        if frame.payload:
+            self._parts.append(frame.payload)
+        self._codec = frame.codec
+        name = CODECS[frame.codec][0]
+        if not frame.flags & FLAG_FINAL:
+            return [AudioUpdate(name, frame.payload, None)] if frame.payload else []
+        if not self._parts:
+            # FINAL with no audio (a tap on the mic): nothing to transcribe
+            self._reset()
+            metrics.increment("ws.empty_utterances")
+            return []
+
+        # The only copy of the audio: joining the frames' payload views
+        audio = b"".join(self._parts)
+        self._reset()
+        return [AudioUpdate(name, frame.payload, audio)]
+
+    def _reset(self) -> None:
+        self._parts = []
+        self._size = 0
+        self._codec = None
+
+
+def negotiate(protocol: Optional[str], codecs: Optional[str]) -> Optional[BinaryFraming]:
+    """Framing for a connection's ?protocol=&codecs= query, None for legacy clients"""
+    if protocol is None:
+        return None
+    if protocol != str(PROTOCOL_VERSION):
+        raise ProtocolError(f"Unsupported protocol version {protocol}; this server speaks {PROTOCOL_VERSION}")
+    offered = [name.strip() for name in (codecs or "").split(",") if name.strip()]
+    accepted = [name for name in offered if name in CODEC_IDS]
+    if not accepted:
+        raise ProtocolError(f"No supported input codec in {offered}; supported: {list(CODEC_IDS)}")
+    return BinaryFraming(accepted)
@@ -1,7 +1,10 @@
 import os
 import requests
+from typing import AsyncIterator, Optional
 from elevenlabs import ElevenLabs
 from openai import OpenAI
+from app.services.tts_cache import cache_key, tts_cache
+from app.services.vendor_io import get_vendor_scheduler
 import base64
 import io
 
@@ -9,52 +12,88 @@ import io
 ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
 ELEVENLABS_VOICE_ID = os.getenv("ELEVENLABS_VOICE_ID")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+TTS_MODEL_ID = "eleven_multilingual_v2"  # Supports Arabic
 
 # Initialize ElevenLabs client
 elevenlabs_client = ElevenLabs(api_key=ELEVENLABS_API_KEY) if ELEVENLABS_API_KEY else None
 openai_client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
 
-async def text_to_speech(text: str, language: str = "en") -> bytes:
+async def stream_text_to_speech(text: str, language: str = "en") -> AsyncIterator[bytes]:
     """
-    Convert text to speech using ElevenLabs API
+    Stream speech audio for text, yielding chunks as they arrive.
+    
+    Fixed agent phrases are served from the TTS cache; on a miss the audio
+    is streamed from ElevenLabs and stored once complete. The stream holds
+    one of the vendor scheduler's TTS slots until it is done.
     """
+    cacheable = tts_cache.is_cacheable(text, language)
+    key = cache_key(text, ELEVENLABS_VOICE_ID, TTS_MODEL_ID, language) if cacheable else None
+    if key:
+        audio = tts_cache.get(key)
+        if audio is not None:
+            yield audio
+            return
+    
+    chunks = []
+    scheduler = get_vendor_scheduler()
     try:
         if not elevenlabs_client:
             raise Exception("ElevenLabs API key not configured")
         
-        # Generate audio using new API
-        audio_generator = elevenlabs_client.text_to_speech.convert(
-            voice_id=ELEVENLABS_VOICE_ID,
-            text=text,
-            model_id="eleven_multilingual_v2"  # Supports Arabic
-        )
-        
-        # Collect all audio chunks
-        audio_bytes = b""
-        for chunk in audio_generator:
-            audio_bytes += chunk
-        
-        return audio_bytes
+        async with scheduler.slot("tts") as slot:
+            # Closed by the slot (releasing the vendor HTTP stream if the
+            # consumer stopped early), after any read still in flight returns
+            audio_generator = slot.closing(elevenlabs_client.text_to_speech.stream(
+                voice_id=ELEVENLABS_VOICE_ID,
+                text=text,
+                model_id=TTS_MODEL_ID
+            ))
+            
+            # The SDK iterator blocks on network reads, so pull each chunk on the vendor pool
+            while True:
+                chunk = await slot.call(next, audio_generator, None)
+                if chunk is None:
+                    break
+                if chunk:
+                    if key:
+                        chunks.append(chunk)
+                    yield chunk
+        if key:
+            tts_cache.put(key, b"".join(chunks))
     except Exception as e:
         raise Exception(f"Error generating speech: {str(e)}")
 
-async def speech_to_text(audio_data: bytes, language: str = "en") -> str:
+async def text_to_speech(text: str, language: str = "en") -> bytes:
+    """
+    Convert text to speech using ElevenLabs API
+    """
+    chunks = [chunk async for chunk in stream_text_to_speech(text, language)]
+    return b"".join(chunks)
+
+async def speech_to_text(audio_data: bytes, language: str = "en", extension: str = "webm",
+                         session_id: Optional[str] = None) -> str:
     """
     Convert speech to text using OpenAI Whisper (cheapest option)
+    
+    The audio is passed through as recorded; `extension` tells Whisper its
+    container (webm, ogg, mp3, wav). Requests for the same `session_id` are
+    transcribed in the order they were made.
     """
     try:
         # Create a file-like object from bytes
         audio_file = io.BytesIO(audio_data)
-        audio_file.name = "audio.webm"
+        audio_file.name = f"audio.{extension}"
         
-        # Transcribe using Whisper
-        transcript = openai_client.audio.transcriptions.create(
+        # Transcribe using Whisper; the SDK call blocks, so run it on the vendor pool
+        transcript = await get_vendor_scheduler().run(
+            "stt",
+            openai_client.audio.transcriptions.create,
             model="whisper-1",  # Cheapest OpenAI model for STT
             file=audio_file,
-            language="ar" if language == "ar" else "en"
+            language="ar" if language == "ar" else "en",
+            session_id=session_id
         )
         
         return transcript.text
     except Exception as e:
         raise Exception(f"Error transcribing speech: {str(e)}")
-
@@ -0,0 +1 @@
+# Local benchmarks for the voice agent backend (run from backend/: python -m benchmarks.<name>)
@@ -0,0 +1,180 @@
+"""
+Benchmark: barge-in, the caller talking over the agent.
+
+1. A call through the real /ws/voice handler (binary frames, fake
+   speech-to-text and TTS producing realistically sized audio): while the
+   order read-back is playing the caller starts answering. Checks the
+   read-back was cut off (``audio_end`` with ``interrupted``), the caller's
+   answer was taken, and the history holds only the part of the read-back
+   the caller heard.
+2. A long reply spoken straight through ``send_speech`` and interrupted
+   after different times: TTS characters synthesized and saved, audio
+   dropped before sending, and the heard text recorded.
+
+Without barge-in the receive loop was serial: the caller's audio waited in
+the socket until the whole reply had been synthesized and sent, and every
+character was billed.
+
+Usage (from backend/):
+    python -m benchmarks.barge_in [interrupt_after_seconds]
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+
+from benchmarks.fakes import FakeElevenLabs, FakeWhisper, fake_recording
+from benchmarks.llm_concurrency import SAMPLE_ORDER
+
+TIMESLICE_BYTES = 2000
+LONG_REPLY = (
+    "Before we finish, let me go over the terms of your plan. "
+    "Your commitment is twenty four months from the activation date. "
+    "The monthly payment is twenty five dinars and five hundred fils, charged on the first of each month. "
+    "Ending the contract early means paying the remaining device installments in full. "
+    "Roaming is not included and is charged according to the published tariff. "
+    "Your data allowance renews every month and unused data does not carry over. "
+    "You can upgrade your plan at any time from the Zain app. "
+    "Is there anything you would like me to repeat?"
+)
+COUNTERS = ("tts.characters", "tts.characters_saved", "tts.characters_unheard",
+            "tts.audio_bytes_dropped", "turn.barge_ins", "ws.frames_out")
+
+
+def counters() -> dict:
+    from app.services.metrics import metrics
+    return {name: metrics.counter(name) for name in COUNTERS}
+
+
+def delta(before: dict) -> dict:
+    after = counters()
+    return {name: after[name] - before[name] for name in COUNTERS}
+
+
+def websocket_call(client, tts, interrupt_after: float) -> bool:
+    from app.services.voice_protocol import CODEC_IDS, FLAG_FINAL, FRAME_AUDIO_IN, pack_frame
+
+    codec = CODEC_IDS["ogg-opus"]
+    seq = 0
+
+    def say(ws, text):
+        nonlocal seq
+        audio = fake_recording(text, 8000, container=b"OggS")
+        for offset in range(0, len(audio), TIMESLICE_BYTES):
+            ws.send_bytes(pack_frame(FRAME_AUDIO_IN, seq, codec, audio[offset:offset + TIMESLICE_BYTES]))
+            seq += 1
+        ws.send_bytes(pack_frame(FRAME_AUDIO_IN, seq, codec, b"", FLAG_FINAL))
+        seq += 1
+
+    def read_until(ws, predicate):
+        while True:
+            message = ws.receive()
+            if message.get("text") is None:
+                continue
+            data = json.loads(message["text"])
+            if predicate(data):
+                return data
+
+    session_id = client.post("/api/start-call", json={"order_data": SAMPLE_ORDER}).json()["session_id"]
+    with client.websocket_connect(f"/ws/voice/{session_id}?protocol=1&codecs=ogg-opus") as ws:
+        read_until(ws, lambda data: data["type"] == "audio_end")  # greeting
+        for text in ("English please", "My name is Ali Hassan and my CPR is 850101234"):
+            say(ws, text)
+            read_until(ws, lambda data: data["type"] == "audio_end")
+        tts.audio_bytes_per_char = 1000  # realistic sizes from the read-back on: it plays in real time
+        say(ws, "yes")
+        readback = read_until(ws, lambda data: data["type"] == "text")["message"]
+        while ws.receive().get("bytes") is None:  # first audio frame of the read-back
+            pass
+        time.sleep(interrupt_after)
+        before = counters()
+        started = time.perf_counter()
+        say(ws, "yes that's correct")
+        cut = read_until(ws, lambda data: data["type"] == "audio_end")
+        silenced_ms = (time.perf_counter() - started) * 1000
+        answer = read_until(ws, lambda data: data["type"] == "text")
+        read_until(ws, lambda data: data["type"] == "audio_end")
+    spent = delta(before)
+    history = client.get(f"/api/session/{session_id}/history").json()["messages"]
+    client.delete(f"/api/session/{session_id}")
+    recorded = [m["content"] for m in history if m["role"] == "assistant"][-2]
+
+    print(f"Call: caller answered {interrupt_after:.1f} s into the order read-back ({len(readback)} characters)")
+    print(f"  read-back cut off after {silenced_ms:.0f} ms, {cut['chunks']} chunks sent; "
+          f"{spent['tts.audio_bytes_dropped']:.0f} queued bytes dropped, "
+          f"{spent['tts.characters_saved']:.0f} characters never synthesized")
+    print(f"  caller's answer {answer['transcript']!r} -> {answer['state']}")
+    print(f"  history records the read-back as {recorded!r}")
+    return (
+        cut["interrupted"] and cut.get("heard") == recorded
+        and answer["state"] == "ELIGIBILITY_CHECK"
+        and len(recorded) < len(readback) and readback.startswith(recorded)
+    )
+
+
+async def long_reply(interrupt_after: float) -> dict:
+    from app.routers.websocket_handler import Outbox, send_speech
+    from app.services.speech_pipeline import Playback
+
+    class Socket:
+        sent = 0
+
+        async def send_json(self, message):
+            pass
+
+        async def send_text(self, text):
+            pass
+
+        async def send_bytes(self, data):
+            self.sent += len(data)
+            await asyncio.sleep(0)
+
+    socket = Socket()
+    outbox = Outbox(socket)
+    playback = Playback(LONG_REPLY)
+    before = counters()
+    speaking = asyncio.create_task(send_speech(outbox, LONG_REPLY, "en", playback=playback))
+    await asyncio.sleep(interrupt_after)
+    speaking.cancel()
+    await asyncio.gather(speaking, return_exceptions=True)
+    await outbox.close()
+    result = delta(before)
+    result["heard"] = playback.heard()
+    result["sent"] = socket.sent
+    return result
+
+
+def main():
+    interrupt_after = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    os.environ.setdefault("CLAUDE_API_KEY", "fake-key")
+    os.environ["SESSION_STORE"] = "memory"
+    os.environ["TTS_CACHE_ENABLED"] = "false"
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.services import voice_service
+    from app.services.speech_pipeline import TTS_SYNTHESIS_LEAD_SECONDS, split_segments
+
+    tts = voice_service.elevenlabs_client = FakeElevenLabs(base_latency=0.1, per_char=0.001, chunks=4)
+    voice_service.openai_client = FakeWhisper()
+
+    with TestClient(app) as client:
+        ok = websocket_call(client, tts, interrupt_after)
+
+    segments = split_segments(LONG_REPLY)
+    print(f"Long reply: {len(LONG_REPLY)} characters in {len(segments)} segments, "
+          f"synthesized up to {TTS_SYNTHESIS_LEAD_SECONDS:.0f} s ahead of playback")
+    print(f"  {'interrupted':>11}  {'synthesized':>11}  {'saved':>5}  {'bytes sent':>10}  heard")
+    for after in (0.5, 2.0, 5.0):
+        result = asyncio.run(long_reply(after))
+        print(f"  {after:>9.1f} s  {result['tts.characters']:>11.0f}  {result['tts.characters_saved']:>5.0f}  "
+              f"{result['sent']:>10}  {len(result['heard'])} characters: {result['heard'][:50]!r}...")
+        ok = ok and result["tts.characters_saved"] > 0 and LONG_REPLY.startswith(result["heard"])
+
+    print("Barge-in: " + ("reply cut off, caller answered, history records what was heard" if ok else "FAILED"))
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark: CPR digits read locally from spoken turns, and turns that say too many.
+
+1. Digits: each turn in ``EXPECTED_DIGITS`` goes through ``extract_digits``;
+   "oh" counts as a zero only between other digits, so a leading "oh" filler
+   doesn't add one.
+2. Overflow: a caller who has given part of their CPR says more digits than
+   fit. The agent keeps the digits collected so far and asks Claude (a fake
+   Messages API) for the number; when Claude can't tell it asks the caller
+   again, and when it can the call is authenticated.
+
+Usage (from backend/):
+    python -m benchmarks.cpr_digits
+"""
+import asyncio
+import os
+import sys
+
+from benchmarks.fakes import FakeServer, make_fake_anthropic_app
+from benchmarks.llm_concurrency import SAMPLE_ORDER
+
+CPR = SAMPLE_ORDER["customer"]["cpr"]
+
+# (turn, digits the local pass must read)
+EXPECTED_DIGITS = [
+    ("oh, it's 850101234", "850101234"),
+    ("Oh it's eight five oh one oh one two three four", "850101234"),
+    ("O my CPR is eight five zero one zero one two three four", "850101234"),
+    ("eight five oh one oh one two three four", "850101234"),
+    ("eight five double oh one", "85001"),
+    ("eight five oh oh one", "85001"),
+    ("oh oh I mean eight five", "85"),
+    ("five oh", "5"),
+    ("ثمانية خمسة صفر واحد", "8501"),
+]
+
+
+async def overflow(cpr_from_claude) -> dict:
+    """A caller with four digits given says seven more"""
+    from app.models.agent import AgentState
+    from app.services.ai_agent import ZainVoiceAgent
+    from app.services.llm_client import shutdown_llm_client
+    from app.services.metrics import metrics
+
+    metrics.reset()
+    agent = ZainVoiceAgent(SAMPLE_ORDER, f"overflow-{cpr_from_claude}")
+    agent.language = "en"
+    agent.state = AgentState.AUTH
+    agent.customer_name = SAMPLE_ORDER["customer"]["name"]
+    agent.customer_cpr = CPR[:4]
+    await agent.process_input("zero one two three four five six")
+    kept = agent.customer_cpr
+    await shutdown_llm_client()
+    return {"kept": kept, "state": agent.state, "claude_calls": metrics.counter("llm.calls")}
+
+
+def run_overflow(cpr_from_claude) -> dict:
+    def respond(body: dict) -> list:
+        return [{"type": "tool_use", "id": "toolu_overflow", "name": body["tools"][0]["name"],
+                 "input": {"name": None, "cpr": cpr_from_claude}}]
+
+    with FakeServer(make_fake_anthropic_app(latency=0.005, respond=respond)) as server:
+        os.environ["ANTHROPIC_BASE_URL"] = server.url
+        return asyncio.run(overflow(cpr_from_claude))
+
+
+def main():
+    os.environ.setdefault("CLAUDE_API_KEY", "fake-key")
+    from app.models.agent import AgentState
+    from app.services.auth_extractor import extract_digits
+
+    print("1. Digits read locally:")
+    ok = True
+    for text, expected in EXPECTED_DIGITS:
+        digits = extract_digits(text)
+        ok = ok and digits == expected
+        print(f"  {'ok' if digits == expected else 'WRONG':<5} {digits:<10} {text}")
+
+    unclear = run_overflow(None)
+    clear = run_overflow(CPR)
+    print(f"2. Too many digits after {CPR[:4]!r}: Claude can't tell -> kept {unclear['kept']!r}, "
+          f"state {unclear['state'].value}; Claude reads {CPR} -> state {clear['state'].value} "
+          f"({unclear['claude_calls']:.0f} / {clear['claude_calls']:.0f} Claude calls)")
+    ok = (
+        ok
+        and unclear["kept"] == CPR[:4] and unclear["state"] == AgentState.AUTH
+        and clear["state"] == AgentState.ORDER_CONFIRM
+        and unclear["claude_calls"] == clear["claude_calls"] == 1
+    )
+    print("CPR digits: " + ("fillers ignored, collected digits kept on overflow" if ok else "FAILED"))
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Concurrency test: request-path database work on the sync vs the async engine,
+with artificial per-round-trip latency injected into the database.
+
+Each call does what the routers and agent do: create the order and session
+(start-call), persist every turn of the scripted conversation through its
+db_service, and end the session. A heartbeat task measures how long the event
+loop is blocked meanwhile; with the sync DatabaseService every round trip
+stalls every other call, with AsyncDatabaseService they overlap.
+
+Two latencies are reported per call: ``call`` from when the call starts
+running, and ``done`` from when all calls were submitted, which is what a
+caller waits. Sync calls run one at a time on the blocked loop, so each one's
+own time is short (a lone call's) but the median caller waits half the wall
+time for its turn. Async calls all run at once and their own time is the wait.
+
+The async calls still queue, not on the connection pool (sized to the call
+count here) but on SQLite's single write lock: every simulated commit round
+trip is spent holding it, so writers to unrelated rows take turns. A third run
+gives each call its own database file to show how much of the async time that
+is; Postgres locks rows, so the production engine behaves like that run. What
+is left over a lone call is CPU on the one event loop.
+
+Usage (from backend/):
+    python -m benchmarks.db_async [calls] [round_trip_ms]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+from sqlalchemy import func
+
+from benchmarks.db_write_behind import make_database
+from benchmarks.llm_concurrency import SAMPLE_ORDER
+from benchmarks.session_spray import SCRIPT
+
+HEARTBEAT = 0.005
+
+
+async def heartbeat(lags: list, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(HEARTBEAT)
+        lags.append((time.perf_counter() - started - HEARTBEAT) * 1000)
+
+
+async def sync_call(database, call_ms: list) -> str:
+    from app.db_service import DatabaseService
+    from app.services.ai_agent import ZainVoiceAgent
+
+    started = time.perf_counter()
+    db = database.SessionLocal()
+    try:
+        db_service = DatabaseService(db)
+        order = db_service.create_order(dict(SAMPLE_ORDER, order_id=f"sync-{uuid.uuid4().hex}"))
+        session = db_service.create_session(order.id, str(uuid.uuid4()))
+        session_id = session.session_id
+        agent = ZainVoiceAgent(SAMPLE_ORDER, session_id, db_service)
+        agent.session_db_id = session.id
+        for text in SCRIPT:
+            await agent.process_input(text)
+        db_service.end_session(session_id, session.id)
+    finally:
+        db.close()
+    call_ms.append((time.perf_counter() - started) * 1000)
+    return session_id
+
+
+async def async_call(database, call_ms: list) -> str:
+    from app.db_service import AsyncDatabaseService
+    from app.services.ai_agent import ZainVoiceAgent
+
+    started = time.perf_counter()
+    async with database.AsyncSessionLocal() as db:
+        db_service = AsyncDatabaseService(db)
+        order = await db_service.create_order(dict(SAMPLE_ORDER, order_id=f"async-{uuid.uuid4().hex}"))
+        session = await db_service.create_session(order.id, str(uuid.uuid4()))
+        session_id = session.session_id
+        agent = ZainVoiceAgent(SAMPLE_ORDER, session_id, db_service)
+        agent.session_db_id = session.id
+        for text in SCRIPT:
+            await agent.process_input(text)
+        await db_service.end_session(session_id, session.id)
+    call_ms.append((time.perf_counter() - started) * 1000)
+    return session_id
+
+
+def check_written(databases: list, session_ids: list) -> bool:
+    return all(check_database(database, session_ids[i::len(databases)])
+               for i, database in enumerate(databases))
+
+
+def check_database(database, session_ids: list) -> bool:
+    from app.models.db_models import AgentSession, ConversationMessage
+
+    db = database.SessionLocal()
+    try:
+        messages = db.query(func.count(ConversationMessage.id)).join(AgentSession) \
+            .filter(AgentSession.session_id.in_(session_ids)).scalar()
+        ended = db.query(func.count(AgentSession.id)).filter(
+            AgentSession.session_id.in_(session_ids),
+            AgentSession.state == "CLOSE",
+            AgentSession.is_active.is_(False)
+        ).scalar()
+        return messages == 2 * len(SCRIPT) * len(session_ids) and ended == len(session_ids)
+    finally:
+        db.close()
+
+
+def run(label: str, databases: list, calls: int, call) -> bool:
+    """Run the calls, round-robin over the databases (one shared, or one per call)"""
+    latencies = [database.async_latency if call is async_call else database.latency
+                 for database in databases]
+    call_ms, done_ms, lags = [], [], []
+
+    async def main():
+        stop = asyncio.Event()
+        monitor = asyncio.create_task(heartbeat(lags, stop))
+        submitted = time.perf_counter()
+
+        async def timed(database):
+            session_id = await call(database, call_ms)
+            done_ms.append((time.perf_counter() - submitted) * 1000)
+            return session_id
+
+        session_ids = await asyncio.gather(*(timed(databases[i % len(databases)]) for i in range(calls)))
+        stop.set()
+        await monitor
+        if call is async_call:
+            for database in databases:
+                await database.async_engine.dispose()
+        return session_ids
+
+    for latency in latencies:
+        latency.active = True
+    started = time.perf_counter()
+    session_ids = asyncio.run(main())
+    elapsed = time.perf_counter() - started
+    for latency in latencies:
+        latency.active = False
+
+    lags.sort()
+    print(f"  {label:<20} wall {elapsed:5.2f}s   call p50 {statistics.median(call_ms):6.0f} ms   "
+          f"done p50 {statistics.median(done_ms):6.0f} ms   "
+          f"loop blocked p95 {lags[int(len(lags) * 0.95) - 1]:6.1f} ms  max {lags[-1]:6.1f} ms   "
+          f"round trips {sum(latency.count for latency in latencies)}")
+    return check_written(databases, session_ids)
+
+
+def main():
+    os.environ.setdefault("CLAUDE_API_KEY", "fake-key")
+    import app.db_service, app.services.ai_agent  # noqa: F401  (imported before the clock starts)
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    round_trip = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.005
+
+    print(f"{calls} concurrent calls (start, {len(SCRIPT)} turns, end), "
+          f"{round_trip * 1000:.1f} ms per DB round trip")
+    with tempfile.TemporaryDirectory() as tmp:
+        database = make_database(os.path.join(tmp, "bench.db"), round_trip, pool_size=calls)
+        per_call = [make_database(os.path.join(tmp, f"call-{i}.db"), round_trip, pool_size=1)
+                    for i in range(calls)]
+        ok = all([
+            run("sync, lone call", [database], 1, sync_call),
+            run("async, lone call", [database], 1, async_call),
+            run("sync", [database], calls, sync_call),
+            run("async", [database], calls, async_call),
+            run("async, file per call", per_call, calls, async_call)
+        ])
+        for each in [database] + per_call:
+            each.engine.dispose()
+    print("Persisted: " + ("every message and ended session" if ok else "MISSING WRITES"))
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Query-count check: statements each turn costs the database, per persistence path.
+
+Runs the scripted conversation through DatabaseService, AsyncDatabaseService
+and the write-behind DatabaseWriter and counts the SQL statements by kind.
+An agent started by start-call carries its session's primary key, so a turn
+must be insert/update only: no SELECT of agent_sessions. An agent rehydrated
+from state saved before the key was carried still works, at the cost of one
+lookup per DatabaseService (or per writer flush).
+
+Exits non-zero if any path issues more statements than expected.
+
+Usage (from backend/):
+    python -m benchmarks.db_queries
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from collections import Counter
+
+from sqlalchemy import event
+
+from benchmarks.db_write_behind import create_calls, make_database
+from benchmarks.llm_concurrency import SAMPLE_ORDER
+from benchmarks.session_spray import SCRIPT
+
+
+class StatementCounter:
+    """Count statements executed on an engine by their first keyword"""
+
+    def __init__(self, engine):
+        self.counts = Counter()
+        sync_engine = getattr(engine, "sync_engine", engine)
+        event.listen(sync_engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.counts[statement.lstrip().split(None, 1)[0].upper()] += 1
+
+    def take(self) -> Counter:
+        counts, self.counts = self.counts, Counter()
+        return counts
+
+
+async def converse(session_id: str, session_db_id, db_service, counter: StatementCounter,
+                   fresh_service=None) -> list:
+    """Per-turn statement counts for one scripted call"""
+    from app.services.ai_agent import ZainVoiceAgent
+
+    agent = ZainVoiceAgent(SAMPLE_ORDER, session_id, db_service)
+    agent.session_db_id = session_db_id
+    turns = []
+    for text in SCRIPT:
+        if fresh_service is not None:
+            # One service (one request) per turn, as the HTTP routes do
+            agent.db_service = fresh_service()
+        counter.take()
+        await agent.process_input(text)
+        turns.append(counter.take())
+    return turns
+
+
+def report(label: str, turns: list, expected: dict) -> bool:
+    worst = Counter()
+    for counts in turns:
+        for kind, count in counts.items():
+            worst[kind] = max(worst[kind], count)
+    ok = all(worst[kind] <= limit for kind, limit in expected.items()) and set(worst) <= set(expected)
+    shown = "  ".join(f"{kind} {worst[kind]}" for kind in ("SELECT", "INSERT", "UPDATE") if worst[kind])
+    print(f"  {label:<50} per turn: {shown:<28} {'ok' if ok else 'UNEXPECTED ' + str(dict(worst))}")
+    return ok
+
+
+def run_services(database) -> bool:
+    from app.db_service import AsyncDatabaseService, DatabaseService
+
+    ok = True
+    counter = StatementCounter(database.engine)
+    db = database.SessionLocal()
+    try:
+        service = DatabaseService(db)
+        order = service.create_order(dict(SAMPLE_ORDER, order_id="queries-sync"))
+        session = service.create_session(order.id, "queries-sync")
+        turns = asyncio.run(converse(session.session_id, session.id, service, counter))
+        ok &= report("DatabaseService, key carried", turns, {"INSERT": 2, "UPDATE": 1})
+
+        # Agent state saved without the key: the first write looks it up,
+        # the identity map serves the rest of the request
+        turns = asyncio.run(converse(session.session_id, None, None, counter,
+                                     fresh_service=lambda: DatabaseService(db)))
+        ok &= report("DatabaseService, no key (request per turn)", turns,
+                     {"SELECT": 1, "INSERT": 2, "UPDATE": 1})
+    finally:
+        db.close()
+
+    async_counter = StatementCounter(database.async_engine)
+
+    async def run_async():
+        async with database.AsyncSessionLocal() as db:
+            service = AsyncDatabaseService(db)
+            order = await service.create_order(dict(SAMPLE_ORDER, order_id="queries-async"))
+            session = await service.create_session(order.id, "queries-async")
+            return await converse(session.session_id, session.id, service, async_counter)
+
+    turns = asyncio.run(run_async())
+    ok &= report("AsyncDatabaseService, key carried", turns, {"INSERT": 2, "UPDATE": 1})
+    return ok
+
+
+def run_writer(database, calls: int) -> bool:
+    from app.db_service import DatabaseService
+    from app.services.db_writer import DatabaseWriter
+
+    ok = True
+    counter = StatementCounter(database.async_engine)
+    for carried in (True, False):
+        session_ids = create_calls(database.SessionLocal, calls)
+        db = database.SessionLocal()
+        try:
+            service = DatabaseService(db)
+            keys = {session_id: service.session_pk(session_id) if carried else None
+                    for session_id in session_ids}
+        finally:
+            db.close()
+
+        async def main():
+            writer = DatabaseWriter(session_factory=database.AsyncSessionLocal)
+            await asyncio.gather(*(queue_call(session_id, keys[session_id], writer)
+                                   for session_id in session_ids))
+            counter.take()
+            await writer.flush()
+            return counter.take()
+
+        flush = asyncio.run(main())
+        label = f"DatabaseWriter, {calls} calls, {'key carried' if carried else 'no key'}"
+        ok &= report(label + " (one flush)", [flush],
+                     {"INSERT": 1, "UPDATE": 1} if carried else {"SELECT": 1, "INSERT": 1, "UPDATE": 1})
+    return ok
+
+
+async def queue_call(session_id: str, session_db_id, writer) -> None:
+    """Run a scripted call against the writer without flushing"""
+    from app.services.ai_agent import ZainVoiceAgent
+
+    agent = ZainVoiceAgent(SAMPLE_ORDER, session_id, writer)
+    agent.session_db_id = session_db_id
+    for text in SCRIPT:
+        await agent.process_input(text)
+
+
+def main():
+    os.environ.setdefault("CLAUDE_API_KEY", "fake-key")
+    print(f"Statements per turn ({len(SCRIPT)}-turn script)")
+    with tempfile.TemporaryDirectory() as tmp:
+        database = make_database(os.path.join(tmp, "bench.db"), 0)
+        ok = run_services(database) & run_writer(database, 10)
+        asyncio.run(database.async_engine.dispose())
+        database.engine.dispose()
+    print("Query counts: " + ("as expected" if ok else "FAILED"))
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
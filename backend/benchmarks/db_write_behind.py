@@ -0,0 +1,212 @@
+"""
+Benchmark: per-turn persistence, synchronous DatabaseService vs the write-behind DatabaseWriter.
+
+Concurrent calls run the full scripted conversation against a SQLite database
+whose every statement is delayed by a simulated network round trip (as to a
+remote Postgres). Reports turn latency and database round trips per
+turn, then checks every message and the final session state were written.
+Finally queues a message the database rejects (no content) among good ones
+and checks the good ones are written and the bad one quarantined within
+``DB_WRITER_MAX_ATTEMPTS`` flushes, and that a writer without a database
+refuses to start.
+
+Usage (from backend/):
+    python -m benchmarks.db_write_behind [calls] [round_trip_ms]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine, func, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.fakes import SimulatedDatabaseLatency
+from benchmarks.llm_concurrency import SAMPLE_ORDER
+from benchmarks.session_spray import SCRIPT
+
+
+BUSY_TIMEOUT = 60  # seconds
+
+
+def make_database(path: str, round_trip: float, pool_size: int = 10) -> SimpleNamespace:
+    """A SQLite database with sync and async engines, each with simulated round-trip latency"""
+    from app.database import Base
+    from app.models import db_models  # noqa: F401  (registers the tables)
+
+    # Writers queue on SQLite's single write lock, longer than its default 5 s busy timeout
+    # when every round trip is slowed down; wait instead of failing with "database is locked"
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False, "timeout": BUSY_TIMEOUT})
+    latency = SimulatedDatabaseLatency(engine, round_trip)
+    Base.metadata.create_all(engine)
+    with engine.connect() as conn:
+        conn.execute(text("PRAGMA journal_mode=WAL"))
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", pool_size=pool_size,
+                                       connect_args={"timeout": BUSY_TIMEOUT})
+    return SimpleNamespace(
+        engine=engine,
+        SessionLocal=sessionmaker(autocommit=False, autoflush=False, bind=engine),
+        latency=latency,
+        async_engine=async_engine,
+        AsyncSessionLocal=async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False),
+        async_latency=SimulatedDatabaseLatency(async_engine, round_trip)
+    )
+
+
+def create_calls(SessionLocal, calls: int) -> list:
+    from app.db_service import DatabaseService
+
+    db = SessionLocal()
+    try:
+        service = DatabaseService(db)
+        session_ids = []
+        for call in range(calls):
+            order = service.create_order(dict(SAMPLE_ORDER, order_id=f"bench-{call}-{time.time_ns()}"))
+            session_ids.append(service.create_session(order.id, f"session-{call}-{time.time_ns()}").session_id)
+        return session_ids
+    finally:
+        db.close()
+
+
+async def run_calls(session_ids: list, make_db_service, latencies: list) -> None:
+    from app.services.ai_agent import ZainVoiceAgent
+
+    async def call(session_id):
+        agent = ZainVoiceAgent(SAMPLE_ORDER, session_id, make_db_service())
+        for text in SCRIPT:
+            started = time.perf_counter()
+            await agent.process_input(text)
+            latencies.append((time.perf_counter() - started) * 1000)
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(call(session_id) for session_id in session_ids))
+
+
+def check_written(SessionLocal, session_ids: list) -> bool:
+    from app.models.db_models import AgentSession, ConversationMessage
+
+    db = SessionLocal()
+    try:
+        messages = db.query(func.count(ConversationMessage.id)).join(AgentSession) \
+            .filter(AgentSession.session_id.in_(session_ids)).scalar()
+        closed = db.query(func.count(AgentSession.id)) \
+            .filter(AgentSession.session_id.in_(session_ids), AgentSession.state == "CLOSE").scalar()
+        return messages == 2 * len(SCRIPT) * len(session_ids) and closed == len(session_ids)
+    finally:
+        db.close()
+
+
+def run(label: str, database: SimpleNamespace, calls: int, write_behind: bool) -> bool:
+    from app.db_service import DatabaseService
+    from app.services.db_writer import DatabaseWriter
+
+    SessionLocal = database.SessionLocal
+    session_ids = create_calls(SessionLocal, calls)
+    latency = database.async_latency if write_behind else database.latency
+    latencies = []
+
+    async def main():
+        if not write_behind:
+            sessions = []
+
+            def make_db_service():
+                sessions.append(SessionLocal())
+                return DatabaseService(sessions[-1])
+
+            await run_calls(session_ids, make_db_service, latencies)
+            for db in sessions:
+                db.close()
+            return
+        writer = DatabaseWriter(session_factory=database.AsyncSessionLocal)
+        writer.start()
+        await run_calls(session_ids, lambda: writer, latencies)
+        await writer.close()
+        await database.async_engine.dispose()
+
+    latency.active = True
+    started = time.perf_counter()
+    asyncio.run(main())
+    elapsed = time.perf_counter() - started
+    latency.active = False
+
+    turns = calls * len(SCRIPT)
+    latencies.sort()
+    print(f"  {label:<14} turn p50 {statistics.median(latencies):7.1f} ms   "
+          f"p95 {latencies[int(len(latencies) * 0.95) - 1]:7.1f} ms   "
+          f"DB round trips/turn {latency.count / turns:5.2f}   wall {elapsed:5.2f}s")
+    return check_written(SessionLocal, session_ids)
+
+
+def check_rejected_write(database: SimpleNamespace) -> bool:
+    """A message the database rejects doesn't hold back the ones queued with it"""
+    from app.models.db_models import AgentSession, ConversationMessage
+    from app.services.db_writer import DatabaseWriter
+    from app.services.metrics import metrics
+
+    session_id = create_calls(database.SessionLocal, 1)[0]
+
+    async def main():
+        writer = DatabaseWriter(session_factory=database.AsyncSessionLocal)
+        writer.add_message(session_id, "user", "first", "INIT")
+        writer.add_message(session_id, "user", None, "INIT")  # content is NOT NULL
+        writer.add_message(session_id, "user", "second", "INIT")
+        flushes = 0
+        while writer.pending() and flushes < 2 * writer.max_attempts:
+            await writer.flush()
+            flushes += 1
+        await database.async_engine.dispose()
+        return flushes
+
+    quarantined = metrics.counter("db_writer.quarantined")
+    flushes = asyncio.run(main())
+    quarantined = metrics.counter("db_writer.quarantined") - quarantined
+    db = database.SessionLocal()
+    try:
+        written = sorted(content for content, in db.query(ConversationMessage.content).join(AgentSession)
+                         .filter(AgentSession.session_id == session_id))
+    finally:
+        db.close()
+    print(f"  rejected row   good rows written {written} after {flushes} flushes, {quarantined:.0f} quarantined")
+    return written == ["first", "second"] and quarantined == 1
+
+
+def check_refuses_without_database() -> bool:
+    from app import database
+    from app.services.db_writer import DatabaseWriter
+
+    if database.AsyncSessionLocal is not None:
+        return True
+    try:
+        DatabaseWriter().start()
+    except RuntimeError as e:
+        print(f"  no database    start() refused: {e}")
+        return True
+    return False
+
+
+def main():
+    os.environ.setdefault("CLAUDE_API_KEY", "fake-key")
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    round_trip = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.002
+
+    print(f"{calls} concurrent calls x {len(SCRIPT)} turns, {round_trip * 1000:.1f} ms per DB round trip")
+    with tempfile.TemporaryDirectory() as tmp:
+        database = make_database(os.path.join(tmp, "bench.db"), round_trip)
+        ok = all([
+            run("synchronous", database, calls, write_behind=False),
+            run("write-behind", database, calls, write_behind=True),
+            check_rejected_write(database)
+        ]) and check_refuses_without_database()
+        database.engine.dispose()
+    print("Persisted: " + ("every message and final session state" if ok else "MISSING WRITES"))
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,567 @@
+"""
+Local fake vendor endpoints used by the benchmarks and the tests
+"""
+import asyncio
+import json
+import os
+import socket
+import threading
+import time
+import types
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text.encode("utf-8")) // 4)
+
+
+def make_fake_anthropic_app(latency: float = 0.5, reply: str = "english", cache_min_tokens: int = 2048,
+                            per_input_token: float = 0.0, respond=None) -> FastAPI:
+    """Minimal stand-in for the Anthropic Messages API.
+    
+    Every request sleeps ``latency`` seconds without blocking the server loop,
+    so concurrent clients can overlap exactly as they would against the real API.
+    
+    Usage is estimated at four UTF-8 bytes per token. System and message blocks
+    marked with ``cache_control`` are cached as the API does: a prefix of at
+    least ``cache_min_tokens`` is written on first use and read back by later
+    requests that start with it. ``per_input_token`` adds prefill time for each
+    uncached input token (a tenth of it for cached ones).
+    
+    ``respond(body)``, when given, returns the reply's content blocks (text or
+    tool_use) for each request instead of the fixed ``reply`` text.
+    """
+    app = FastAPI()
+    app.state.requests = 0
+    app.state.cache = set()
+    
+    def blocks(body):
+        # In the API's prefix order: tools, system, messages
+        if body.get("tools"):
+            yield {"text": json.dumps(body["tools"])}
+        system = body.get("system") or []
+        if isinstance(system, str):
+            system = [{"type": "text", "text": system}]
+        yield from system
+        for message in body.get("messages", []):
+            content = message["content"]
+            if isinstance(content, str):
+                content = [{"type": "text", "text": content}]
+            yield from content
+    
+    def usage(body, content):
+        total = 0
+        prefix = []
+        breakpoints = []  # (tokens up to the breakpoint, prefix key)
+        for block in blocks(body):
+            text = block["text"] if "text" in block else json.dumps(block, ensure_ascii=False)
+            prefix.append(text)
+            total += _estimate_tokens(text)
+            if block.get("cache_control"):
+                breakpoints.append((total, "\0".join(prefix)))
+        read = max((tokens for tokens, key in breakpoints if key in app.state.cache), default=0)
+        write = 0
+        if breakpoints and breakpoints[-1][0] >= cache_min_tokens and breakpoints[-1][1] not in app.state.cache:
+            write = breakpoints[-1][0] - read
+        app.state.cache.update(key for tokens, key in breakpoints if tokens >= cache_min_tokens)
+        return {
+            "input_tokens": total - read - write,
+            "cache_creation_input_tokens": write,
+            "cache_read_input_tokens": read,
+            "output_tokens": sum(
+                _estimate_tokens(block["text"] if block["type"] == "text" else json.dumps(block["input"]))
+                for block in content
+            )
+        }
+    
+    @app.post("/v1/messages")
+    async def messages(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        content = respond(body) if respond else [{"type": "text", "text": reply}]
+        tokens = usage(body, content)
+        prefill = tokens["input_tokens"] + tokens["cache_creation_input_tokens"] + tokens["cache_read_input_tokens"] / 10
+        await asyncio.sleep(latency + per_input_token * prefill)
+        return {
+            "id": f"msg_fake_{app.state.requests}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", "fake"),
+            "content": content,
+            "stop_reason": "tool_use" if any(block["type"] == "tool_use" for block in content) else "end_turn",
+            "stop_sequence": None,
+            "usage": tokens
+        }
+    
+    return app
+
+
+def make_fake_speech_app(stt_latency: float = 0.3, stt_per_kb: float = 0.0,
+                         tts_latency: float = 0.2, chunks: int = 4) -> FastAPI:
+    """Minimal stand-in for the Whisper and ElevenLabs HTTP APIs.
+    
+    ``POST /v1/audio/transcriptions`` waits ``stt_latency`` (plus ``stt_per_kb``
+    per KB uploaded) and returns the transcript embedded by ``fake_recording``;
+    ``POST /v1/text-to-speech/{voice_id}/stream`` waits ``tts_latency`` and
+    streams ``chunks`` pieces of fake audio. Point the real SDK clients at it
+    with ``base_url`` so their blocking HTTP calls are exercised.
+    """
+    app = FastAPI()
+    app.state.transcriptions = 0
+    app.state.syntheses = 0
+    
+    @app.post("/v1/audio/transcriptions")
+    async def transcriptions(request: Request):
+        form = await request.form()
+        audio = await form["file"].read()
+        app.state.transcriptions += 1
+        await asyncio.sleep(stt_latency + stt_per_kb * len(audio) / 1024)
+        return {"text": audio[4:audio.index(b"\0", 4)].decode("utf-8")}
+    
+    @app.post("/v1/text-to-speech/{voice_id}/stream")
+    async def synthesize(voice_id: str, request: Request):
+        text = (await request.json())["text"]
+        app.state.syntheses += 1
+        
+        async def audio():
+            await asyncio.sleep(tts_latency)
+            payload = text.encode("utf-8")
+            for i in range(chunks):
+                yield b"ID3" + payload[i::chunks]
+                await asyncio.sleep(0.005)
+        
+        return StreamingResponse(audio(), media_type="audio/mpeg")
+    
+    return app
+
+
+class FakeServer:
+    """Run a FastAPI app on a random local port in a background thread"""
+    
+    def __init__(self, app: FastAPI):
+        self.app = app
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self._server = uvicorn.Server(uvicorn.Config(
+            app, host="127.0.0.1", port=self.port, log_level="warning"
+        ))
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+    
+    def __enter__(self) -> "FakeServer":
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+    
+    def __exit__(self, *exc):
+        self._server.should_exit = True
+        self._thread.join(timeout=5)
+
+
+class FakeRedis:
+    """In-memory Redis-protocol server (strings with expiry, sorted sets and WATCH/MULTI/EXEC) on a random local port.
+    
+    Runs its own event loop in a background thread so several worker processes
+    can share it the way they would share a real Redis.
+    """
+    
+    def __init__(self):
+        self.port = _free_port()
+        self.url = f"redis://127.0.0.1:{self.port}/0"
+        self.data = {}
+        self.expires = {}
+        self.zsets = {}
+        # key -> number of writes, for WATCH
+        self.writes = {}
+        self.commands = 0
+        self._handlers = set()
+        self._loop = asyncio.new_event_loop()
+        self._started = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+    
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, "127.0.0.1", self.port)
+        )
+        self._started.set()
+        self._loop.run_forever()
+    
+    def _live(self, key):
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.time():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+    
+    def _transaction(self, args, connection):
+        """WATCH/MULTI/EXEC for one connection; None for any other command outside MULTI"""
+        name = args[0].upper()
+        if name == b"WATCH":
+            connection["watched"].update({key: self.writes.get(key, 0) for key in args[1:]})
+            return b"+OK\r\n"
+        if name == b"UNWATCH":
+            connection["watched"] = {}
+            return b"+OK\r\n"
+        if name == b"MULTI":
+            connection["queued"] = []
+            return b"+OK\r\n"
+        if name == b"EXEC":
+            queued, connection["queued"] = connection["queued"], None
+            watched, connection["watched"] = connection["watched"], {}
+            if any(self.writes.get(key, 0) != count for key, count in watched.items()):
+                return b"*-1\r\n"
+            return b"*%d\r\n" % len(queued) + b"".join(self._command(queued_args) for queued_args in queued)
+        if connection["queued"] is not None:
+            connection["queued"].append(args)
+            return b"+QUEUED\r\n"
+        return None
+    
+    def _command(self, args):
+        self.commands += 1
+        name = args[0].upper()
+        if name in (b"SET", b"DEL"):
+            for key in args[1:2] if name == b"SET" else args[1:]:
+                self.writes[key] = self.writes.get(key, 0) + 1
+        if name == b"PING":
+            return b"+PONG\r\n"
+        if name in (b"SELECT", b"AUTH"):
+            return b"+OK\r\n"
+        if name == b"GET":
+            if not self._live(args[1]):
+                return b"$-1\r\n"
+            value = self.data[args[1]]
+            return b"$%d\r\n%s\r\n" % (len(value), value)
+        if name == b"SET":
+            self.data[args[1]] = args[2]
+            self.expires.pop(args[1], None)
+            options = [arg.upper() for arg in args[3:]]
+            if b"EX" in options:
+                self.expires[args[1]] = time.time() + int(args[3 + options.index(b"EX") + 1])
+            return b"+OK\r\n"
+        if name == b"DEL":
+            deleted = 0
+            for key in args[1:]:
+                if self._live(key):
+                    del self.data[key]
+                    self.expires.pop(key, None)
+                    deleted += 1
+            return b":%d\r\n" % deleted
+        if name == b"EXPIRE":
+            if not self._live(args[1]):
+                return b":0\r\n"
+            self.expires[args[1]] = time.time() + int(args[2])
+            return b":1\r\n"
+        if name == b"ZADD":
+            self.zsets.setdefault(args[1], {})[args[3]] = float(args[2])
+            return b":1\r\n"
+        if name == b"ZREM":
+            removed = self.zsets.get(args[1], {}).pop(args[2], None) is not None
+            return b":%d\r\n" % removed
+        if name == b"ZCARD":
+            return b":%d\r\n" % len(self.zsets.get(args[1], {}))
+        if name == b"ZSCORE":
+            score = self.zsets.get(args[1], {}).get(args[2])
+            if score is None:
+                return b"$-1\r\n"
+            score = repr(score).encode()
+            return b"$%d\r\n%s\r\n" % (len(score), score)
+        if name in (b"ZRANGE", b"ZRANGEBYSCORE"):
+            members = sorted(self.zsets.get(args[1], {}).items(), key=lambda item: (item[1], item[0]))
+            if name == b"ZRANGE":
+                start, stop = int(args[2]), int(args[3])
+                members = members[start:None if stop == -1 else stop + 1]
+            else:
+                low, high = args[2], args[3]
+                below = (lambda score: score < float(high[1:])) if high.startswith(b"(") \
+                    else (lambda score: score <= float(high))
+                members = [item for item in members if item[1] >= float(low) and below(item[1])]
+            if b"WITHSCORES" in [arg.upper() for arg in args[4:]]:
+                members = [(field, None) for member, score in members for field in (member, repr(score).encode())]
+            return b"*%d\r\n" % len(members) + b"".join(
+                b"$%d\r\n%s\r\n" % (len(member), member) for member, _ in members
+            )
+        return b"-ERR unknown command\r\n"
+    
+    async def _handle(self, reader, writer):
+        connection = {"watched": {}, "queued": None}
+        handler = asyncio.current_task()
+        self._handlers.add(handler)
+        try:
+            while True:
+                header = await reader.readline()
+                if not header:
+                    break
+                args = []
+                for _ in range(int(header[1:-2])):
+                    length = int((await reader.readline())[1:-2])
+                    args.append((await reader.readexactly(length + 2))[:-2])
+                reply = self._transaction(args, connection)
+                writer.write(reply if reply is not None else self._command(args))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            self._handlers.discard(handler)
+            writer.close()
+    
+    async def _shutdown(self):
+        self._server.close()
+        for handler in list(self._handlers):
+            handler.cancel()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+    
+    def __enter__(self) -> "FakeRedis":
+        self._thread.start()
+        self._started.wait()
+        return self
+    
+    def __exit__(self, *exc):
+        # Finish the connection handlers rather than leave them pending on a stopped loop
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(timeout=5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+
+class SimulatedDatabaseLatency:
+    """Delay every statement and commit on a SQLite engine by a network round trip, and count them.
+    
+    Attach it before the engine opens connections. Round trips are counted per
+    SQLAlchemy execute (an executemany is one, as with asyncpg) and commit.
+    The delay runs in the thread executing the statement: the caller's thread
+    for a sync engine (as with psycopg2, blocking the event loop), the driver's
+    worker thread for an aiosqlite engine (as with asyncpg's non-blocking I/O).
+    """
+    
+    def __init__(self, engine, round_trip: float):
+        from sqlalchemy import event
+        
+        self.round_trip = round_trip
+        self.count = 0
+        self.active = False
+        self._async = hasattr(engine, "sync_engine")
+        sync_engine = engine.sync_engine if self._async else engine
+        event.listen(sync_engine, "connect", self._on_connect)
+        event.listen(sync_engine, "before_cursor_execute", self._on_round_trip)
+        event.listen(sync_engine, "commit", self._on_round_trip)
+    
+    def _on_round_trip(self, conn, *args):
+        due = conn.info.get("round_trip_due")
+        if self.active and due is not None:
+            self.count += 1
+            due[0] = True
+    
+    def _on_connect(self, dbapi_connection, record):
+        due = record.info["round_trip_due"] = [False]
+        
+        def trace(statement):
+            # First statement sqlite runs after the round trip was announced
+            if due[0]:
+                due[0] = False
+                time.sleep(self.round_trip)
+        
+        if self._async:
+            from sqlalchemy.util import await_only
+            await_only(dbapi_connection.driver_connection.set_trace_callback(trace))
+        else:
+            dbapi_connection.set_trace_callback(trace)
+
+
+class FakeElevenLabs:
+    """Stand-in for the ElevenLabs SDK client with text-length dependent latency.
+    
+    ``text_to_speech.stream`` blocks (like the real SDK iterator) for
+    ``base_latency + per_char * len(text)`` before the first chunk, then
+    yields ``chunks`` pieces of fake audio. With ``audio_bytes_per_char``
+    the audio is padded to a realistic size (about 1000 bytes per character
+    at 128 kbps and 15 characters per second).
+    """
+    
+    def __init__(self, base_latency: float = 0.1, per_char: float = 0.002, chunks: int = 4,
+                 audio_bytes_per_char: int = 0):
+        self.base_latency = base_latency
+        self.per_char = per_char
+        self.chunks = chunks
+        self.audio_bytes_per_char = audio_bytes_per_char
+        self.characters = 0
+        self.requests = 0
+        self.text_to_speech = self
+    
+    def stream(self, voice_id=None, text: str = "", model_id=None, **kwargs):
+        self.requests += 1
+        self.characters += len(text)
+        time.sleep(self.base_latency + self.per_char * len(text))
+        payload = text.encode("utf-8")
+        padding = b"\0" * (self.audio_bytes_per_char * len(text) // self.chunks)
+        for i in range(self.chunks):
+            time.sleep(0.005)
+            yield b"ID3" + payload[i::self.chunks] + padding
+    
+    convert = stream
+
+
+def fake_recording(transcript: str, size: int, container: bytes = b"\x1aE\xdf\xa3") -> bytes:
+    """Compressed-looking audio of ``size`` bytes that FakeWhisper transcribes as ``transcript``"""
+    head = container + transcript.encode("utf-8") + b"\0"
+    return head + os.urandom(max(size - len(head), 0))
+
+
+class FakeWhisper:
+    """Stand-in for the OpenAI client's Whisper endpoint (``audio.transcriptions.create``).
+
+    Returns the transcript embedded by ``fake_recording`` (or the next of
+    ``transcripts``, for real audio such as WAV) and records the upload's file
+    name and size, so callers can check what was sent.
+    """
+    
+    def __init__(self, latency: float = 0.0, transcripts=None):
+        self.latency = latency
+        self.transcripts = list(transcripts or [])
+        self.files = []
+        self.audio = self
+        self.transcriptions = self
+    
+    def create(self, model=None, file=None, language=None, **kwargs):
+        time.sleep(self.latency)
+        audio = file.read()
+        self.files.append((file.name, len(audio)))
+        if self.transcripts:
+            return types.SimpleNamespace(text=self.transcripts.pop(0))
+        text = audio[4:audio.index(b"\0", 4)].decode("utf-8")
+        return types.SimpleNamespace(text=text.split("|")[-1])
+
+
+class FakeStreamingSTT:
+    """Stand-in streaming speech-to-text backend (the app.services.stt_stream interface).
+
+    Reads the transcript embedded by ``fake_recording`` from the first chunk
+    and reveals it as partials, one word per ``bytes_per_word`` of audio
+    received; the partial is stable once every word is out. ``finish`` takes
+    ``final_latency`` seconds. A transcript written as ``"partial|final"`` is
+    revised at the end, so its partials do not match the final transcript.
+    """
+    
+    def __init__(self, final_latency: float = 0.1, bytes_per_word: int = 1500):
+        self.final_latency = final_latency
+        self.bytes_per_word = bytes_per_word
+        self.opened = 0
+        self.finished = 0
+    
+    def open(self, language: str, codec: str, session_id=None):
+        self.opened += 1
+        return _FakeTranscriptionStream(self)
+
+
+class _FakeTranscriptionStream:
+    def __init__(self, backend: FakeStreamingSTT):
+        self.backend = backend
+        self.received = 0
+        self.words = None
+        self.final = None
+        self.revealed = 0
+    
+    async def feed(self, chunk):
+        from app.services.stt_stream import Partial
+        
+        if self.words is None:
+            audio = bytes(chunk)
+            spoken, _, final = audio[4:audio.index(b"\0", 4)].decode("utf-8").partition("|")
+            self.words, self.final = spoken.split(), final or spoken
+        self.received += len(chunk)
+        revealed = min(len(self.words), self.received // self.backend.bytes_per_word + 1)
+        if revealed == self.revealed:
+            return None
+        self.revealed = revealed
+        return Partial(" ".join(self.words[:revealed]), stable=revealed == len(self.words))
+    
+    async def finish(self, utterance: bytes) -> str:
+        await asyncio.sleep(self.backend.final_latency)
+        self.backend.finished += 1
+        return self.final
+    
+    def cancel(self) -> None:
+        pass
+
+
+class FakeWebSocket:
+    """The send side of a Starlette WebSocket, recording what the server sends"""
+    
+    def __init__(self):
+        self.sent = []  # JSON messages as dicts, binary frames as bytes
+    
+    async def send_json(self, data):
+        self.sent.append(data)
+    
+    async def send_text(self, data):
+        self.sent.append(json.loads(data))
+    
+    async def send_bytes(self, data):
+        self.sent.append(data)
+    
+    def messages(self, kind: str) -> list:
+        return [message for message in self.sent if isinstance(message, dict) and message["type"] == kind]
+
+
+SAMPLE_ORDER_LINES = [
+    "Zain Bahrain - Order Summary",
+    "Order ID: 3870-6449-1",
+    "Customer Name: Ali Hassan",
+    "CPR: 850101234",
+    "Mobile: 33334444",
+    "Order Type: New Line",
+    "Sub Number: 36001122",
+    "Device: iPhone 15 Pro 256GB",
+    "Plan: Wiyana 9",
+    "Commitment: 24 months",
+    "Payment Type: Installment",
+    "Monthly Payment: 25.500 BD",
+    "Advance Payment: 0.000 BD",
+    "Upfront Payment: 50.000 BD",
+    "VAT: 5.000 BD",
+    "Total: 55.000 BD",
+    "Accessories: Screen Protector, Silicone Case",
+    "",
+    "Terms And Conditions apply."
+]
+
+
+def make_order_pdf(lines=None, pages: int = 1) -> bytes:
+    """Build a small text PDF (Helvetica, one line per row) for parser benchmarks"""
+    lines = SAMPLE_ORDER_LINES if lines is None else lines
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page in range(pages):
+        rows = lines if page == 0 else [f"Terms and conditions page {page + 1}"] + \
+            [f"Clause {page}.{i}: The customer agrees to the terms of service item {i}." for i in range(40)]
+        stream = b"BT /F1 10 Tf 50 800 Td 14 TL\n" + b"".join(
+            b"(" + row.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)").encode("latin-1") + b") '\n"
+            for row in rows
+        ) + b"ET"
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id)
+        page_ids.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % i for i in page_ids)
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+    
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
@@ -0,0 +1,81 @@
+"""
+Benchmark: POST /session/{id}/process response size over a long call.
+
+Drives one call per mode through the HTTP API for many turns: the default
+(only the turn's new messages) and `since=0` (the whole history every turn,
+as the endpoint used to return). Reports bytes and time per turn as the call
+grows, then checks that paging GET /session/{id}/history and a timestamp
+cursor reproduce the full history.
+
+Usage (from backend/):
+    python -m benchmarks.history_payload [turns]
+"""
+import os
+import sys
+import time
+
+from benchmarks.llm_concurrency import SAMPLE_ORDER
+from benchmarks.session_spray import SCRIPT
+
+
+def run_call(client, turns: int, params: dict) -> tuple:
+    session_id = client.post("/api/start-call", json={"order_data": SAMPLE_ORDER}).json()["session_id"]
+    sizes, times = [], []
+    # Scripted call to CLOSE, then keep talking (answered locally, no Claude)
+    for turn in range(turns):
+        text = SCRIPT[turn] if turn < len(SCRIPT) else "ok"
+        started = time.perf_counter()
+        response = client.post(f"/api/session/{session_id}/process", json={"text": text}, params=params)
+        times.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+        sizes.append(len(response.content))
+    return session_id, sizes, times, response.json()
+
+
+def read_history(client, session_id: str, limit: int) -> list:
+    messages, offset = [], 0
+    while offset is not None:
+        page = client.get(f"/api/session/{session_id}/history", params={"offset": offset, "limit": limit}).json()
+        messages.extend(page["messages"])
+        offset = page["next_offset"]
+    return messages
+
+
+def main():
+    os.environ.setdefault("CLAUDE_API_KEY", "fake-key")
+    os.environ["SESSION_STORE"] = "memory"
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    checkpoints = sorted({10, turns // 3, turns})
+    print(f"One call of {turns} turns per mode")
+    with TestClient(app) as client:
+        _, full_sizes, full_times, full = run_call(client, turns, {"since": "0"})
+        session_id, sizes, times, last = run_call(client, turns, {})
+
+        print(f"  {'turn':>6}  {'full history':>14}  {'new messages':>14}")
+        for turn in checkpoints:
+            print(f"  {turn:>6}  {full_sizes[turn - 1]:>8} bytes  {sizes[turn - 1]:>8} bytes")
+        window = slice(-50, None)
+        print(f"  last 50 turns, mean request time: full history {sum(full_times[window]) / 50:.2f} ms, "
+              f"new messages {sum(times[window]) / 50:.2f} ms")
+
+        history = read_history(client, session_id, limit=37)
+        middle = history[len(history) // 2]
+        after = client.post(f"/api/session/{session_id}/process", json={"text": "ok"},
+                            params={"since": middle["timestamp"]}).json()
+        ok = (
+            max(sizes[10:]) <= 2 * sizes[9]
+            and len(last["messages"]) == 2 and last["cursor"] == 2 * turns
+            and len(full["messages"]) == 2 * turns
+            and [m["content"] for m in history] == [m["content"] for m in full["messages"]]
+            and after["messages"][:-2] == history[len(history) // 2 + 1:]
+        )
+    print("Payload per turn: " + ("constant, history pages and cursors match" if ok else "FAILED"))
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
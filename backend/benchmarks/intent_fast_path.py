@@ -0,0 +1,118 @@
+"""
+Benchmark: share of classification turns served by the local intent classifier.
+
+Replays a set of typical caller replies (Gulf Arabic and English) through the
+language-selection and order-confirmation handlers against a fake Claude
+endpoint, then reports how many turns skipped the LLM and the latency saved.
+Also checks the label (or the Claude fallback, None) of replies the fast path
+must not get wrong, negated cues in particular.
+
+Usage (from backend/):
+    python -m benchmarks.intent_fast_path [llm_latency_seconds]
+"""
+import asyncio
+import os
+import sys
+
+from benchmarks.fakes import FakeServer, make_fake_anthropic_app
+from benchmarks.llm_concurrency import SAMPLE_ORDER
+
+LANGUAGE_REPLIES = [
+    "English please", "english", "In English, thanks", "بالعربي", "عربي لو سمحت",
+    "العربية", "Arabic", "انجليزي", "whichever is easier", "تمام"
+]
+CONFIRMATION_REPLIES = [
+    "Yes", "yes that's correct", "Correct", "ok go ahead", "نعم", "ايوه صح",
+    "تمام", "No, I want to change the colour", "ابي اغير الجهاز", "مو صح",
+    "cancel it", "لا شكرا", "hmm let me think", "yes but change the plan"
+]
+
+# (classifier, reply, label the fast path may settle on; None = must go to Claude)
+EXPECTED = [
+    ("language", "English please", "en"),
+    ("language", "بالعربي", "ar"),
+    ("language", "not english", None),
+    ("language", "I dont speak english", None),
+    ("language", "ما اتكلم انجليزي", None),
+    ("order", "yes that's correct", "confirm"),
+    ("order", "مو صح", "modify"),
+    ("order", "no thanks", "reject"),
+    ("order", "I am not sure", None),
+    ("order", "not ok", None),
+    ("order", "not perfect", None),
+    ("order", "مو موافق", None),
+    ("order", "مو تمام", None),
+    ("order", "ما ابي اغير شي", None),
+    ("order", "I don't want to change anything", None),
+    ("order", "nothing to change", None),
+    ("order", "no need to change", None),
+    ("order", "لا تغير شي", None),
+    ("order", "No, I want to change the colour", "modify"),
+    ("order", "تغير اللون", "modify")
+]
+
+
+async def replay() -> None:
+    from app.models.agent import AgentState
+    from app.services.ai_agent import ZainVoiceAgent
+    from app.services.llm_client import shutdown_llm_client
+    
+    for i, reply in enumerate(LANGUAGE_REPLIES):
+        agent = ZainVoiceAgent(SAMPLE_ORDER, f"intent-lang-{i}")
+        agent.state = AgentState.LANGUAGE_SELECT
+        await agent.process_input(reply)
+    
+    for i, reply in enumerate(CONFIRMATION_REPLIES):
+        agent = ZainVoiceAgent(SAMPLE_ORDER, f"intent-confirm-{i}")
+        agent.language = "en"
+        agent.state = AgentState.ORDER_CONFIRM
+        agent.order_confirmed = True
+        await agent.process_input(reply)
+    
+    await shutdown_llm_client()
+
+
+def check_expected() -> list:
+    """Replies in EXPECTED the fast path gets wrong"""
+    from app.services.intent_classifier import (
+        INTENT_CONFIDENCE_THRESHOLD, classify_language, classify_order_intent
+    )
+    
+    classifiers = {"language": classify_language, "order": classify_order_intent}
+    wrong = []
+    for kind, reply, expected in EXPECTED:
+        label, confidence = classifiers[kind](reply)
+        settled = label if confidence >= INTENT_CONFIDENCE_THRESHOLD else None
+        if settled != expected:
+            wrong.append((reply, expected, settled))
+    return wrong
+
+
+def main():
+    latency = float(sys.argv[1]) if len(sys.argv) > 1 else 0.4
+    
+    with FakeServer(make_fake_anthropic_app(latency=latency, reply="confirm")) as server:
+        os.environ["ANTHROPIC_BASE_URL"] = server.url
+        os.environ.setdefault("CLAUDE_API_KEY", "fake-key")
+        asyncio.run(replay())
+    
+    from app.services.metrics import metrics
+    snapshot = metrics.snapshot()
+    turns = len(LANGUAGE_REPLIES) + len(CONFIRMATION_REPLIES)
+    print(f"Classification turns:        {turns}")
+    print(f"Served locally:              {snapshot['counters'].get('intent.local', 0):.0f} "
+          f"({snapshot['derived']['intent.local_share']:.0%})")
+    print(f"Sent to Claude:              {snapshot['counters'].get('intent.llm', 0):.0f}")
+    print(f"Local classifier avg:        {snapshot['timings']['intent.local_ms']['avg']:.3f} ms")
+    print(f"Latency saved per local turn: {snapshot['derived']['intent.latency_saved_ms_per_local_turn']:.0f} ms")
+    
+    wrong = check_expected()
+    for reply, expected, settled in wrong:
+        print(f"  {reply!r}: expected {expected or 'Claude'}, fast path gave {settled or 'Claude'}")
+    print(f"Expected labels:             {len(EXPECTED) - len(wrong)}/{len(EXPECTED)}")
+    if wrong:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
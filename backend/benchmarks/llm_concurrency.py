@@ -0,0 +1,73 @@
+"""
+Benchmark: N concurrent agent turns on one event loop against a fake Anthropic endpoint.
+
+With the async Claude client, N simultaneous sessions should finish in roughly
+the time of one; a blocking client would take about N times as long.
+
+Usage (from backend/):
+    python -m benchmarks.llm_concurrency [sessions] [latency_seconds]
+"""
+import asyncio
+import os
+import sys
+import time
+
+from benchmarks.fakes import FakeServer, make_fake_anthropic_app
+
+SAMPLE_ORDER = {
+    "order_id": "3870-6449-1",
+    "customer": {"name": "Ali Hassan", "cpr": "850101234", "mobile": "33334444"},
+    "order_type": "new_line",
+    "line_details": {"type": "mobile", "number": None, "sub_number": "36001122"},
+    "device": {"name": "iPhone 15 Pro 256GB", "variant": "256GB", "color": ""},
+    "plan": {"name": "Wiyana 9", "selected_commitment": "24"},
+    "financial": {"type": "INSTALLMENT", "monthly": 25.5, "advance": 0.0,
+                  "upfront": 50.0, "vat": 5.0, "total": 55.0},
+    "accessories": [],
+    "credit_control_options": []
+}
+
+# A language choice the local intent classifier leaves to Claude
+AMBIGUOUS_REPLY = "whichever is easier"
+
+
+async def run_turns(sessions: int) -> float:
+    from app.models.agent import AgentState
+    from app.services.ai_agent import ZainVoiceAgent
+    from app.services.llm_client import shutdown_llm_client
+    
+    agents = []
+    for i in range(sessions):
+        agent = ZainVoiceAgent(SAMPLE_ORDER, f"bench-{i}")
+        agent.state = AgentState.LANGUAGE_SELECT
+        agents.append(agent)
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(agent.process_input(AMBIGUOUS_REPLY) for agent in agents))
+    elapsed = time.perf_counter() - start
+    await shutdown_llm_client()
+    
+    assert all(agent.language == "en" for agent in agents)
+    return elapsed
+
+
+def main():
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+    
+    with FakeServer(make_fake_anthropic_app(latency=latency)) as server:
+        os.environ["ANTHROPIC_BASE_URL"] = server.url
+        os.environ.setdefault("CLAUDE_API_KEY", "fake-key")
+        
+        single = asyncio.run(run_turns(1))
+        concurrent = asyncio.run(run_turns(sessions))
+        
+        print(f"Fake Claude latency:       {latency * 1000:.0f} ms")
+        print(f"1 session:                 {single * 1000:.0f} ms")
+        print(f"{sessions} concurrent sessions: {concurrent * 1000:.0f} ms")
+        print(f"Slowdown vs single turn:   {concurrent / single:.2f}x (serial would be ~{sessions}x)")
+        print(f"Requests served by fake:   {server.app.state.requests}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark: first-turn Claude latency with a client per session vs the shared pooled client.
+
+Each session makes its first LLM call one after another (as calls arrive over
+time on a worker). With a client per session every first turn opens a fresh
+connection; with the shared client they reuse the warm keep-alive pool.
+
+Usage (from backend/):
+    python -m benchmarks.llm_pool [sessions] [latency_seconds]
+"""
+import asyncio
+import os
+import sys
+
+from benchmarks.fakes import FakeServer, make_fake_anthropic_app
+from benchmarks.llm_concurrency import AMBIGUOUS_REPLY, SAMPLE_ORDER
+
+
+async def run_sessions(sessions: int, shared: bool) -> dict:
+    from app.models.agent import AgentState
+    from app.services.ai_agent import ZainVoiceAgent
+    from app.services.llm_client import create_llm_client, get_llm_client, shutdown_llm_client
+    from app.services.metrics import metrics
+    
+    metrics.reset()
+    clients = []
+    for i in range(sessions):
+        client = get_llm_client() if shared else create_llm_client()
+        clients.append(client)
+        agent = ZainVoiceAgent(SAMPLE_ORDER, f"pool-{i}", claude_client=client)
+        agent.state = AgentState.LANGUAGE_SELECT
+        await agent.process_input(AMBIGUOUS_REPLY)
+    
+    snapshot = metrics.snapshot()
+    if shared:
+        await shutdown_llm_client()
+    else:
+        for client in clients:
+            await client.close()
+    
+    return {
+        "first_call_ms": snapshot["timings"]["llm.first_call_ms"],
+        "reuse_rate": snapshot["derived"]["llm.connection_reuse_rate"],
+        "connections": snapshot["counters"].get("llm.connections_opened", 0)
+    }
+
+
+def main():
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.02
+    
+    with FakeServer(make_fake_anthropic_app(latency=latency)) as server:
+        os.environ["ANTHROPIC_BASE_URL"] = server.url
+        os.environ.setdefault("CLAUDE_API_KEY", "fake-key")
+        
+        per_session = asyncio.run(run_sessions(sessions, shared=False))
+        shared = asyncio.run(run_sessions(sessions, shared=True))
+    
+    for label, result in (("client per session", per_session), ("shared pooled client", shared)):
+        timing = result["first_call_ms"]
+        print(f"{label}:")
+        print(f"  first-turn latency avg/p95: {timing['avg']:.1f} / {timing['p95']:.1f} ms")
+        print(f"  connections opened:         {result['connections']:.0f}")
+        print(f"  connection reuse rate:      {result['reuse_rate']:.1%}")
+    
+    saved = per_session["first_call_ms"]["avg"] - shared["first_call_ms"]["avg"]
+    print(f"First-turn latency drop: {saved:.1f} ms per session "
+          f"(local fake endpoint, no TLS; real gains include the TLS handshake)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Benchmark: Claude prompt size, cost and latency per call.
+
+Replays the turns of a call that reach Claude (an ambiguous language choice,
+a name the local extractor can't read, ambiguous order confirmations) for
+``sessions`` callers, half in Arabic, against a fake Messages API that
+estimates tokens, emulates prompt caching and charges prefill time per
+uncached input token. Three ways of building the request:
+
+1. bare: the prompt alone (LLM_PERSONA=false, the default)
+2. full: the persona with the whole order as indented JSON, re-sent on
+   every call (``get_system_prompt`` as it was)
+3. assembled: the persona and the state's trimmed order context as cacheable
+   system blocks (prompts.py)
+
+Each runs with the cache minimum of the model in use (2048 tokens for
+claude-3-haiku, so nothing the agent sends is cached yet) and with a lower
+one, to show what the breakpoints save once the persona outgrows it.
+
+Usage (from backend/):
+    python -m benchmarks.llm_prompt_cache [sessions] [low_cache_min_tokens]
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+
+from benchmarks.fakes import FakeServer, make_fake_anthropic_app
+from benchmarks.llm_concurrency import SAMPLE_ORDER
+
+LATENCY = 0.15  # seconds per request
+PER_INPUT_TOKEN = 0.0002  # prefill seconds per uncached input token
+
+# (state, caller reply) for each turn that goes to Claude
+TURNS = [
+    ("LANGUAGE_SELECT", "whichever is easier"),
+    ("AUTH", "my name is, um, the one on the order"),
+    ("ORDER_CONFIRM", "hmm let me think"),
+    ("ORDER_CONFIRM", "yes but change the plan")
+]
+
+
+async def replay(sessions: int, agent_class) -> float:
+    from app.models.agent import AgentState
+    from app.services.llm_client import shutdown_llm_client
+
+    started = time.perf_counter()
+    for i in range(sessions):
+        agent = agent_class(SAMPLE_ORDER, f"prompt-cache-{i}")
+        for state, reply in TURNS:
+            agent.state = AgentState[state]
+            agent.order_confirmed = True
+            if state != "LANGUAGE_SELECT":
+                agent.language = "ar" if i % 2 else "en"
+            await agent.process_input(reply)
+    elapsed = time.perf_counter() - started
+    await shutdown_llm_client()
+    return elapsed
+
+
+def full_prompt_agent():
+    """An agent that sends the whole persona and order on every call"""
+    from app.services import prompts
+    from app.services.ai_agent import ZainVoiceAgent
+
+    class FullPromptAgent(ZainVoiceAgent):
+        def system_prompt_blocks(self):
+            language = "ar" if self.language == "ar" else "en"
+            return [{"type": "text", "text": f"{prompts.PERSONA[language]}\n\n{prompts.CONTEXT_HEADER[language]}\n"
+                                             f"{json.dumps(self.order_data, indent=2, ensure_ascii=False)}"}]
+
+    return FullPromptAgent
+
+
+def respond(body: dict) -> list:
+    """Intent replies as text, identity extraction as a tool call"""
+    if body.get("tools"):
+        return [{"type": "tool_use", "id": "toolu_fake", "name": body["tools"][0]["name"],
+                 "input": {"name": None, "cpr": None}}]
+    return [{"type": "text", "text": "confirm"}]
+
+
+def run(mode: str, sessions: int, cache_min_tokens: int) -> dict:
+    from app.services import ai_agent
+    from app.services.metrics import metrics
+
+    metrics.reset()
+    ai_agent.LLM_PERSONA = mode != "bare"
+    agent_class = full_prompt_agent() if mode == "full" else ai_agent.ZainVoiceAgent
+    app = make_fake_anthropic_app(latency=LATENCY, cache_min_tokens=cache_min_tokens,
+                                  per_input_token=PER_INPUT_TOKEN, respond=respond)
+    with FakeServer(app) as server:
+        os.environ["ANTHROPIC_BASE_URL"] = server.url
+        asyncio.run(replay(sessions, agent_class))
+
+    snapshot = metrics.snapshot()
+    calls = metrics.counter("llm.calls")
+    timings = snapshot["timings"]
+    call_ms = [timings[name]["avg"] * timings[name]["count"] for name in ("llm.first_call_ms", "llm.call_ms")
+               if name in timings]
+    return {
+        "calls": calls,
+        "input": sum(metrics.counter(f"llm.{kind}_tokens") for kind in ("input", "cache_write", "cache_read")) / calls,
+        "cached": metrics.counter("llm.cache_read_tokens") / calls,
+        "output": metrics.counter("llm.output_tokens") / calls,
+        "cost": snapshot["derived"]["llm.cost_per_call_usd"],
+        "ms": sum(call_ms) / calls,
+        "turn_input": timings["turn.llm_input_tokens"]["avg"]
+    }
+
+
+def main():
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    low_minimum = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+    os.environ.setdefault("CLAUDE_API_KEY", "fake-key")
+
+    print(f"{sessions} calls x {len(TURNS)} Claude turns; fake API {LATENCY * 1000:.0f} ms "
+          f"+ {PER_INPUT_TOKEN * 1e6:.0f} us per uncached input token")
+    results = {}
+    for minimum in (2048, low_minimum):
+        print(f"Cache minimum {minimum} tokens:")
+        print(f"  {'prompt':<10} {'in/call':>8} {'cached':>7} {'out':>4} {'in/turn':>8} {'USD/call':>10} {'ms/call':>8}")
+        for mode in ("bare", "full", "assembled"):
+            result = results[minimum, mode] = run(mode, sessions, minimum)
+            print(f"  {mode:<10} {result['input']:>8.0f} {result['cached']:>7.0f} {result['output']:>4.0f} "
+                  f"{result['turn_input']:>8.0f} {result['cost']:>10.7f} {result['ms']:>8.0f}")
+
+    bare, full, assembled = results[2048, "bare"], results[2048, "full"], results[2048, "assembled"]
+    cached = results[low_minimum, "assembled"]
+    print(f"Assembled vs full prompt: {1 - assembled['input'] / full['input']:.0%} fewer input tokens, "
+          f"{1 - assembled['cost'] / full['cost']:.0%} cheaper per call at the Haiku minimum; "
+          f"{cached['cached'] / cached['input']:.0%} of input read from the cache above a {low_minimum}-token minimum")
+    print(f"Persona vs bare prompt at the Haiku minimum: {assembled['input'] - bare['input']:+.0f} input tokens, "
+          f"{assembled['ms'] - bare['ms']:+.0f} ms, {assembled['cost'] / bare['cost']:.1f}x the cost per call "
+          f"(why LLM_PERSONA is off by default)")
+    ok = (
+        assembled["input"] < full["input"] and assembled["cost"] < full["cost"]
+        and cached["cost"] < results[low_minimum, "full"]["cost"] and cached["cached"] > 0
+    )
+    print("Prompt assembly: " + ("persona sent for less, cache breakpoints honoured" if ok else "FAILED"))
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark: voice-turn latency while order PDFs are parsed concurrently.
+
+Runs a steady stream of agent turns (local fast path, no vendor calls) on the
+event loop while a batch of multi-page PDFs is parsed, first inline on the
+loop (the old endpoint behaviour) and then through the process pool.
+
+Usage (from backend/):
+    python -m benchmarks.pdf_concurrency [pdfs] [pages]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.fakes import make_order_pdf
+from benchmarks.llm_concurrency import SAMPLE_ORDER
+
+
+TURN_INTERVAL = 0.02  # A caller turn arrives every 20 ms
+
+
+async def voice_turns(stop: asyncio.Event, latencies: list) -> None:
+    """Latency is measured from when each turn arrived, so time spent waiting for the loop counts"""
+    from app.models.agent import AgentState
+    from app.services.ai_agent import ZainVoiceAgent
+    
+    agent = ZainVoiceAgent(SAMPLE_ORDER, "bench-voice", claude_client=object())
+    agent.language = "en"
+    arrival = time.perf_counter()
+    while not stop.is_set():
+        agent.state = AgentState.ORDER_CONFIRM
+        agent.order_confirmed = True
+        await agent.process_input("yes")
+        now = time.perf_counter()
+        latencies.append((now - arrival) * 1000)
+        # Turns that arrived while the loop was blocked are served back to back
+        arrival = max(arrival + TURN_INTERVAL, now - TURN_INTERVAL * 10)
+        await asyncio.sleep(max(0.0, arrival - now))
+
+
+async def run(mode: str, paths: list) -> dict:
+    from app.services.pdf_parser import parse_order_pdf
+    from app.services.pdf_pool import parse_pdf_in_pool, startup_pdf_pool
+    
+    await startup_pdf_pool()
+    # Warm the pool so process start-up isn't counted
+    await parse_pdf_in_pool(paths[0])
+    
+    stop = asyncio.Event()
+    latencies: list = []
+    voice = asyncio.create_task(voice_turns(stop, latencies))
+    await asyncio.sleep(0.1)
+    latencies.clear()
+    
+    started = time.perf_counter()
+    if mode == "inline":
+        async def parse(path):
+            return parse_order_pdf(path)
+    elif mode == "pool":
+        parse = parse_pdf_in_pool
+    else:
+        async def parse(path):
+            await asyncio.sleep(0.5)
+    await asyncio.gather(*(parse(path) for path in paths))
+    elapsed = (time.perf_counter() - started) * 1000
+    
+    # Let turns that queued up behind a blocked loop drain before stopping
+    await asyncio.sleep(0.2)
+    stop.set()
+    await voice
+    latencies.sort()
+    return {
+        "parse_ms": elapsed,
+        "turns": len(latencies),
+        "p50": latencies[len(latencies) // 2],
+        "p95": latencies[int(len(latencies) * 0.95)],
+        "max": latencies[-1]
+    }
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    pages = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    
+    from app.services.pdf_pool import shutdown_pdf_pool
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(count):
+            path = os.path.join(tmp, f"order-{i}.pdf")
+            with open(path, "wb") as f:
+                f.write(make_order_pdf(pages=pages))
+            paths.append(path)
+        
+        print(f"{count} PDFs x {pages} pages parsed concurrently with live voice turns")
+        for mode in ("idle", "inline", "pool"):
+            result = asyncio.run(run(mode, paths))
+            print(f"  {mode:<6} voice turn p50 {result['p50']:7.2f} ms, p95 {result['p95']:8.2f} ms, "
+                  f"max {result['max']:8.2f} ms "
+                  f"({result['turns']} turns, batch took {result['parse_ms']:.0f} ms)")
+        asyncio.run(shutdown_pdf_pool())
+
+
+if __name__ == "__main__":
+    main()
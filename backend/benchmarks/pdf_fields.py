@@ -0,0 +1,363 @@
+"""
+Benchmark: single-pass order field extractor vs the previous per-field regex scans.
+
+Builds a golden corpus of order-summary texts (label spellings, casing,
+separators, missing fields, noise and multi-page filler), checks that
+parse_order_text gives exactly the output of the previous implementation
+(kept below as the reference), and reports per-document parse time for both.
+
+Usage (from backend/):
+    python -m benchmarks.pdf_fields [documents] [seed]
+"""
+import random
+import re
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from benchmarks.fakes import SAMPLE_ORDER_LINES
+
+
+# --- Reference implementation (field parsing before the single-pass index) ---
+
+def legacy_parse_order_text(text: str) -> Dict[str, Any]:
+    return {
+        "order_id": extract_order_id(text),
+        "customer": extract_customer_info(text),
+        "order_type": extract_order_type(text),
+        "line_details": extract_line_details(text),
+        "device": extract_device_info(text),
+        "plan": extract_plan_info(text),
+        "financial": extract_financial_info(text),
+        "accessories": extract_accessories(text),
+        "credit_control_options": []
+    }
+
+def extract_order_id(text: str) -> str:
+    """Extract order ID from text"""
+    patterns = [
+        r'Order\s+ID[:\s]+(\d{4}-\d{4}-\d+)',
+        r'Order\s+Number[:\s]+(\d{4}-\d{4}-\d+)',
+        r'(\d{4}-\d{4}-\d+)',
+    ]
+    
+    for pattern in patterns:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            return match.group(1)
+    
+    return "UNKNOWN-ORDER-ID"
+
+def extract_customer_info(text: str) -> Dict[str, str]:
+    """Extract customer information"""
+    customer = {
+        "name": "",
+        "cpr": "",
+        "mobile": "",
+        "preferred_language": None
+    }
+    
+    # Name patterns
+    name_patterns = [
+        r'Customer\s+Name[:\s]+(.+?)(?:\n|CPR|Mobile)',
+        r'Name[:\s]+(.+?)(?:\n|CPR|Mobile)',
+        r'Full\s+Name[:\s]+(.+?)(?:\n|CPR|Mobile)',
+    ]
+    
+    for pattern in name_patterns:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            customer["name"] = match.group(1).strip()
+            break
+    
+    # CPR patterns
+    cpr_patterns = [
+        r'CPR[:\s]+(\d{9})',
+        r'CPR\s+Number[:\s]+(\d{9})',
+        r'ID\s+Number[:\s]+(\d{9})',
+    ]
+    
+    for pattern in cpr_patterns:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            customer["cpr"] = match.group(1)
+            break
+    
+    # Mobile patterns
+    mobile_patterns = [
+        r'Mobile[:\s]+(\d{8})',
+        r'Phone[:\s]+(\d{8})',
+        r'Contact[:\s]+(\d{8})',
+    ]
+    
+    for pattern in mobile_patterns:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            customer["mobile"] = match.group(1)
+            break
+    
+    return customer
+
+def extract_order_type(text: str) -> str:
+    """Extract order type"""
+    text_lower = text.lower()
+    
+    if "new line" in text_lower or "newline" in text_lower:
+        return "new_line"
+    elif "existing line" in text_lower or "existingline" in text_lower:
+        return "existing_line"
+    elif "cash" in text_lower:
+        return "cash"
+    
+    return "new_line"  # Default
+
+def extract_line_details(text: str) -> Dict[str, str]:
+    """Extract line details"""
+    line_details = {
+        "type": "mobile",
+        "number": None,
+        "sub_number": None
+    }
+    
+    # Check for fiber
+    if "fiber" in text.lower():
+        line_details["type"] = "fiber"
+    
+    # Extract line numbers
+    number_patterns = [
+        r'Line\s+Number[:\s]+(\d{8})',
+        r'Number[:\s]+(\d{8})',
+        r'Existing\s+Number[:\s]+(\d{8})',
+    ]
+    
+    for pattern in number_patterns:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            line_details["number"] = match.group(1)
+            break
+    
+    # Extract sub-number
+    sub_number_patterns = [
+        r'Sub[-\s]?Number[:\s]+(\d{8})',
+        r'New\s+Number[:\s]+(\d{8})',
+    ]
+    
+    for pattern in sub_number_patterns:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            line_details["sub_number"] = match.group(1)
+            break
+    
+    return line_details
+
+def extract_device_info(text: str) -> Optional[Dict[str, str]]:
+    """Extract device information"""
+    device_patterns = [
+        r'Device[:\s]+(.+?)(?:\n|Plan|Package|Financial)',
+        r'Product[:\s]+(.+?)(?:\n|Plan|Package|Financial)',
+    ]
+    
+    for pattern in device_patterns:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            device_str = match.group(1).strip()
+            # Try to parse device details
+            parts = device_str.split()
+            if len(parts) >= 2:
+                return {
+                    "name": device_str,
+                    "variant": parts[-1] if len(parts) > 1 else "",
+                    "color": ""
+                }
+    
+    return None
+
+def extract_plan_info(text: str) -> Optional[Dict[str, str]]:
+    """Extract plan information"""
+    plan_patterns = [
+        r'Plan[:\s]+(.+?)(?:\n|Commitment|Financial)',
+        r'Package[:\s]+(.+?)(?:\n|Commitment|Financial)',
+    ]
+    
+    plan_name = None
+    for pattern in plan_patterns:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            plan_name = match.group(1).strip()
+            break
+    
+    # Extract commitment period
+    commitment_patterns = [
+        r'Commitment[:\s]+(\d{1,2})\s*month',
+        r'(\d{1,2})[-\s]month',
+    ]
+    
+    commitment = "24"  # Default
+    for pattern in commitment_patterns:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            commitment = match.group(1)
+            break
+    
+    if plan_name:
+        return {
+            "name": plan_name,
+            "selected_commitment": commitment
+        }
+    
+    return None
+
+def extract_financial_info(text: str) -> Dict[str, Any]:
+    """Extract financial information"""
+    financial = {
+        "type": "INSTALLMENT",
+        "monthly": 0.0,
+        "advance": 0.0,
+        "upfront": 0.0,
+        "vat": 0.0,
+        "total": 0.0
+    }
+    
+    # Check financial type
+    if "subsidy" in text.lower():
+        financial["type"] = "SUBSIDY"
+    
+    # Extract amounts (look for numbers with "BD", "Dinar", or currency symbols)
+    amount_patterns = [
+        r'Monthly[:\s]+(\d+\.?\d*)',
+        r'Advance[:\s]+(\d+\.?\d*)',
+        r'Upfront[:\s]+(\d+\.?\d*)',
+        r'VAT[:\s]+(\d+\.?\d*)',
+        r'Total[:\s]+(\d+\.?\d*)',
+    ]
+    
+    financial["monthly"] = extract_amount(text, "Monthly")
+    financial["advance"] = extract_amount(text, "Advance")
+    financial["upfront"] = extract_amount(text, "Upfront")
+    financial["vat"] = extract_amount(text, "VAT")
+    financial["total"] = extract_amount(text, "Total")
+    
+    return financial
+
+def extract_amount(text: str, label: str) -> float:
+    """Extract amount for a specific label"""
+    patterns = [
+        rf'{label}[:\s]+(\d+\.?\d*)',
+        rf'{label}\s+Payment[:\s]+(\d+\.?\d*)',
+    ]
+    
+    for pattern in patterns:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            return float(match.group(1))
+    
+    return 0.0
+
+def extract_accessories(text: str) -> List[str]:
+    """Extract accessories list"""
+    accessories = []
+    
+    # Look for accessories section
+    accessory_pattern = r'Accessories?[:\s]+(.+?)(?:\n\n|\n[A-Z])'
+    match = re.search(accessory_pattern, text, re.IGNORECASE)
+    
+    if match:
+        accessories_str = match.group(1)
+        # Split by common delimiters
+        accessories = [a.strip() for a in re.split(r'[,;]', accessories_str) if a.strip()]
+    
+    return accessories
+
+
+
+# --- Golden corpus ---
+
+LABEL_VARIANTS = {
+    "order": ["Order ID: {id}", "Order Number: {id}", "ORDER ID {id}", "Reference {id}", "order id:{id}"],
+    "name": ["Customer Name: {name}", "Name: {name}", "Full Name: {name}", "CUSTOMER NAME {name} CPR: {cpr}",
+             "Name: {name} Mobile: {mobile}", "Customer: {name}"],
+    "cpr": ["CPR: {cpr}", "CPR Number: {cpr}", "ID Number: {cpr}", "cpr {cpr}", "CPR: {cpr8}"],
+    "mobile": ["Mobile: {mobile}", "Phone: {mobile}", "Contact: {mobile}", "Mobile Number: {mobile}", "mobile:{mobile}"],
+    "type": ["Order Type: New Line", "Order Type: Existing Line", "Payment: Cash", "Type: newline",
+             "Existing line upgrade", "Fiber New Line", ""],
+    "line": ["Line Number: {mobile}", "Existing Number: {mobile}", "Number: {mobile}", "Sub Number: {sub}",
+             "Sub-Number: {sub}", "SubNumber: {sub}", "New Number: {sub}", ""],
+    "device": ["Device: {device}", "Product: {device}", "Device: {device} Plan: {plan}", "Device: Phone",
+               "DEVICE {device}", "Device: {device} Financial", ""],
+    "plan": ["Plan: {plan}", "Package: {plan}", "Plan: {plan} Commitment: {months} months",
+             "Package {plan}", ""],
+    "commitment": ["Commitment: {months} months", "{months}-month contract", "{months} month term",
+                   "Commitment {months}month", ""],
+    "money": ["Monthly: {a}", "Monthly Payment: {a}", "Advance: {b}", "Advance Payment: {b} BD",
+              "Upfront: {c}", "Upfront Payment: {c}", "VAT: {d}", "VAT 10%: {d}", "Total: {e}",
+              "Total Payment: {e}", "Subsidy applied", "TOTAL {e}"],
+    "accessories": ["Accessories: {acc}\n\n", "Accessory: {acc}\nNext section", "accessories {acc}\nlower",
+                    "Accessories: {acc}", ""],
+    "noise": ["Thank you for choosing Zain.", "Order placed online 2024-0101-77 ref",
+              "Identification verified", "Name of store: Seef", "Numbers are subject to change",
+              "Monthly plan includes 20 GB", "شكرا لاختياركم زين", "Contact centre 80008000",
+              "Fully paid", "Total due on delivery", ""]
+}
+
+
+def make_document(rng: random.Random) -> str:
+    values = {
+        "id": f"{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}-{rng.randint(1, 99)}",
+        "name": rng.choice(["Ali Hassan", "Fatima Al Khalifa", "John Smith", "محمد علي", "Sara"]),
+        "cpr": f"{rng.randint(10 ** 8, 10 ** 9 - 1)}",
+        "cpr8": f"{rng.randint(10 ** 7, 10 ** 8 - 1)}",
+        "mobile": f"3{rng.randint(10 ** 6, 10 ** 7 - 1)}",
+        "sub": f"36{rng.randint(10 ** 5, 10 ** 6 - 1)}",
+        "device": rng.choice(["iPhone 15 Pro 256GB", "Galaxy S24 Ultra 512GB", "Pixel 8", "Router"]),
+        "plan": rng.choice(["Wiyana 9", "Fiber 500", "Data 25", "Postpaid"]),
+        "months": rng.choice(["12", "18", "24", "6"]),
+        "a": f"{rng.uniform(0, 60):.3f}", "b": f"{rng.uniform(0, 200):.3f}",
+        "c": f"{rng.randint(0, 100)}", "d": f"{rng.uniform(0, 20):.2f}", "e": f"{rng.uniform(0, 300):.1f}",
+        "acc": ", ".join(rng.sample(["Case", "Screen Protector", "Charger", "AirPods"], rng.randint(1, 3)))
+    }
+    lines = []
+    for section, variants in LABEL_VARIANTS.items():
+        for _ in range(rng.randint(0, 2) if section in ("money", "noise") else 1):
+            lines.append(rng.choice(variants).format(**values))
+    if rng.random() < 0.5:
+        lines.extend(rng.choice(variants).format(**values)
+                     for variants in LABEL_VARIANTS.values() for _ in range(rng.randint(0, 2)))
+    rng.shuffle(lines)
+    if rng.random() < 0.3:
+        lines = [line.upper() if rng.random() < 0.3 else line for line in lines]
+    text = "\n".join(lines) + "\n"
+    if rng.random() < 0.2:
+        text += "".join(f"Clause {i}: terms of service.\n" for i in range(rng.randint(10, 200)))
+    return text
+
+
+def build_corpus(documents: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    corpus = ["\n".join(SAMPLE_ORDER_LINES) + "\n"]
+    corpus.extend(make_document(rng) for _ in range(documents - 1))
+    return corpus
+
+
+def main():
+    from app.services.pdf_parser import parse_order_text
+    
+    documents = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 7
+    corpus = build_corpus(documents, seed)
+    
+    mismatches = [text for text in corpus if parse_order_text(text) != legacy_parse_order_text(text)]
+    print(f"Golden corpus: {documents} documents, {len(mismatches)} mismatches")
+    if mismatches:
+        print("First mismatch:\n" + mismatches[0])
+        sys.exit(1)
+    
+    for label, parse in (("per-field regex", legacy_parse_order_text), ("single pass", parse_order_text)):
+        started = time.perf_counter()
+        for text in corpus:
+            parse(text)
+        elapsed = time.perf_counter() - started
+        print(f"  {label:<16} {elapsed * 1e6 / documents:8.1f} us/document")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmark: PDF parse throughput from memory vs a temp-file round-trip.
+
+Parses a corpus of generated order PDFs the old way (write upload to a
+NamedTemporaryFile, reopen by path, unlink) and straight from the upload
+bytes, and reports documents per second for each.
+
+Usage (from backend/):
+    python -m benchmarks.pdf_throughput [documents] [rounds]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.fakes import SAMPLE_ORDER_LINES, make_order_pdf
+
+
+def build_corpus(documents: int) -> list:
+    corpus = []
+    for i in range(documents):
+        lines = [line.replace("3870-6449-1", f"3870-6449-{i}") for line in SAMPLE_ORDER_LINES]
+        corpus.append(make_order_pdf(lines, pages=1 + i % 3))
+    return corpus
+
+
+def via_temp_file(content: bytes) -> dict:
+    from app.services.pdf_parser import parse_order_pdf
+    
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
+        tmp_file.write(content)
+        tmp_path = tmp_file.name
+    try:
+        return parse_order_pdf(tmp_path)
+    finally:
+        os.unlink(tmp_path)
+
+
+def from_memory(content: bytes) -> dict:
+    from app.services.pdf_parser import parse_order_pdf
+    
+    return parse_order_pdf(content)
+
+
+def main():
+    documents = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    corpus = build_corpus(documents)
+    
+    print(f"Corpus: {documents} PDFs, {sum(map(len, corpus)) / 1024:.0f} KB total, {rounds} rounds")
+    results = {}
+    for label, parse in (("temp file", via_temp_file), ("in memory", from_memory)):
+        started = time.perf_counter()
+        for _ in range(rounds):
+            outputs = [parse(content) for content in corpus]
+        elapsed = time.perf_counter() - started
+        results[label] = outputs
+        print(f"  {label:<10} {documents * rounds / elapsed:7.1f} docs/s ({elapsed * 1000 / (documents * rounds):.2f} ms/doc)")
+    
+    assert results["temp file"] == results["in memory"], "parsers disagree"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmark: the response template catalog.
+
+1. Catalog size and compile time (once per worker, at import).
+2. Render cost per line of a call, with the session's slot values cached
+   (what the agent does) and with the slots formatted on every render.
+3. TTS reuse: the lines of a typical call in each language, split into
+   segments as the speech pipeline does. Reports the characters whose
+   audio comes from the cache, counting only whole fixed phrases (as
+   before the catalog) and counting every template segment without slots.
+   Checks that no cached segment contains order or customer details.
+
+Usage (from backend/):
+    python -m benchmarks.response_templates [renders]
+"""
+import sys
+import time
+
+from benchmarks.llm_concurrency import SAMPLE_ORDER
+
+CUSTOMER_NAME = "Ali Hassan"
+
+
+def call_lines():
+    """(state, scenario) of each agent line in a call that accepts the order"""
+    from app.models.agent import AgentState
+
+    return [
+        (AgentState.INIT, "greeting"),
+        (AgentState.LANGUAGE_SELECT, "confirmed"),
+        (AgentState.AUTH, "verified"),
+        (AgentState.ORDER_CONFIRM, "new_line_with_device"),
+        (AgentState.ORDER_CONFIRM, "confirmed"),
+        (AgentState.ELIGIBILITY_CHECK, "financials"),
+        (AgentState.CROSS_SELL, "declined"),
+        (AgentState.EKYC_SEND, "closing")
+    ]
+
+
+def main():
+    renders = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    from app.models.agent import AgentState
+    from app.services.response_templates import CATALOG, TEMPLATES, compile_templates, render, slot_values
+    from app.services.speech_pipeline import split_segments
+    from app.services.tts_cache import static_segments
+
+    started = time.perf_counter()
+    compile_templates(TEMPLATES)
+    compile_ms = (time.perf_counter() - started) * 1000
+    slotted = sum(1 for template in CATALOG.values() if template.slots)
+    print(f"Catalog: {len(TEMPLATES)} lines, {len(CATALOG)} variants ({slotted} with slots), "
+          f"compiled in {compile_ms:.2f} ms")
+
+    lines = call_lines()
+    values = slot_values(SAMPLE_ORDER, CUSTOMER_NAME)
+    started = time.perf_counter()
+    for _ in range(renders):
+        for state, scenario in lines:
+            render(state, scenario, "ar", values)
+    cached_us = (time.perf_counter() - started) / (renders * len(lines)) * 1e6
+    started = time.perf_counter()
+    for _ in range(renders):
+        for state, scenario in lines:
+            render(state, scenario, "ar", slot_values(SAMPLE_ORDER, CUSTOMER_NAME))
+    uncached_us = (time.perf_counter() - started) / (renders * len(lines)) * 1e6
+    print(f"Render, per line: {cached_us:.2f} us with the session's slot values cached, "
+          f"{uncached_us:.2f} us formatting them every time")
+
+    phrases = {
+        (template.text, language)
+        for (state, scenario, language), template in CATALOG.items() if not template.slots
+    }
+    whole_phrases = {(segment, language) for text, language in phrases for segment in split_segments(text)}
+    cacheable = static_segments()
+    private = [SAMPLE_ORDER["line_details"]["sub_number"], SAMPLE_ORDER["device"]["name"], CUSTOMER_NAME,
+               values["monthly"], values["total"]]
+    leaked = [segment for segment, _ in cacheable if any(value in segment for value in private)]
+
+    print("Characters of a call's speech served from the TTS cache:")
+    ok = not leaked and cached_us < uncached_us
+    for language in ("en", "ar"):
+        # The greeting comes before the language choice and is spoken as English
+        segments = [
+            (segment, "en" if state == AgentState.INIT else language)
+            for state, scenario in lines
+            for segment in split_segments(render(state, scenario, language, values))
+        ]
+        total = sum(len(segment) for segment, _ in segments)
+        before = sum(len(segment) for segment, spoken in segments if (segment, spoken) in whole_phrases)
+        after = sum(len(segment) for segment, spoken in segments if (segment, spoken) in cacheable)
+        print(f"  {language}: {total} characters, fixed phrases only {before} ({before / total:.0%}), "
+              f"every segment without slots {after} ({after / total:.0%})")
+        ok = ok and after > before
+
+    print(f"{len(cacheable)} cacheable segments ({len(whole_phrases)} from fixed phrases); "
+          f"segments containing order or customer details: {len(leaked)}")
+    print("Templates: " + ("more speech reused, no customer data cached" if ok else "FAILED"))
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Benchmark: session store size over a (compressed) day of mostly abandoned calls.
+
+Calls arrive in waves; a fifth of them end with DELETE /session, the rest are
+simply abandoned. Without eviction the store grows with every call. With the
+idle TTL, the max-sessions cap and the sweeper it stays bounded, and every
+evicted session is handed to the persistence callback exactly once.
+
+Every store evicts by last save: a session that is only read (say, polled
+for its state by a client that stopped talking) past the idle TTL is
+evicted like any other.
+
+Usage (from backend/):
+    python -m benchmarks.session_eviction [waves] [calls_per_wave]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.fakes import FakeRedis
+from benchmarks.llm_concurrency import SAMPLE_ORDER
+
+IDLE_TTL = 0.3
+MAX_SESSIONS = 200
+WAVE_GAP = 0.1
+
+
+async def call_state() -> dict:
+    """State of a call abandoned after authentication (no Claude round trip needed)"""
+    from app.services.ai_agent import ZainVoiceAgent
+
+    agent = ZainVoiceAgent(SAMPLE_ORDER, "template")
+    for text in ("hello", "English please", "My name is Ali Hassan and my CPR is 850101234"):
+        await agent.process_input(text)
+    return agent.to_state()
+
+
+async def run_day(store, waves: int, calls_per_wave: int, evicting: bool) -> dict:
+    from app.services.session_store import sweep_sessions
+
+    template = await call_state()
+    persisted = []
+    peak = 0
+    for wave in range(waves):
+        for call in range(calls_per_wave):
+            session_id = f"call-{wave}-{call}"
+            await store.put(session_id, dict(template, id=session_id))
+            if call % 5 == 0:
+                await store.delete(session_id)
+        if evicting:
+            await sweep_sessions(store, persisted.extend)
+        peak = max(peak, (await store.stats())[0])
+        await asyncio.sleep(WAVE_GAP)
+    if evicting:
+        await asyncio.sleep(IDLE_TTL)
+        await sweep_sessions(store, persisted.extend)
+    count, total_bytes = await store.stats()
+    ids = [state["id"] for state in persisted]
+    await store.close()
+    return {"peak": peak, "live": count, "bytes": total_bytes,
+            "persisted": len(ids), "duplicates": len(ids) - len(set(ids))}
+
+
+async def read_without_saving(store) -> bool:
+    """Whether a session read but not saved for longer than the TTL is evicted"""
+    from app.services.session_store import sweep_sessions
+
+    persisted = []
+    await store.put("read-only", {"id": "read-only"})
+    reads_until = time.monotonic() + 1.5 * IDLE_TTL
+    while time.monotonic() < reads_until:
+        await store.get("read-only")
+        await asyncio.sleep(IDLE_TTL / 10)
+    await sweep_sessions(store, persisted.extend)
+    gone = await store.get("read-only") is None
+    await store.close()
+    return gone and [state["id"] for state in persisted] == ["read-only"]
+
+
+def main():
+    os.environ.setdefault("CLAUDE_API_KEY", "fake-key")
+    from app.services.metrics import metrics
+    from app.services.session_store import MemorySessionStore, RedisSessionStore, SQLiteSessionStore
+
+    waves = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    calls_per_wave = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    abandoned = waves * (calls_per_wave - len(range(0, calls_per_wave, 5)))
+    print(f"{waves} waves x {calls_per_wave} calls, {abandoned} abandoned "
+          f"(idle TTL {IDLE_TTL}s, cap {MAX_SESSIONS})")
+
+    with FakeRedis() as redis, tempfile.TemporaryDirectory() as tmp:
+        runs = [
+            ("memory, no eviction", MemorySessionStore(idle_ttl=float("inf"), max_sessions=sys.maxsize), False),
+            ("memory", MemorySessionStore(IDLE_TTL, MAX_SESSIONS), True),
+            ("sqlite", SQLiteSessionStore(os.path.join(tmp, "sessions.db"), IDLE_TTL, MAX_SESSIONS), True),
+            ("redis", RedisSessionStore(redis.url, idle_ttl=IDLE_TTL, max_sessions=MAX_SESSIONS), True),
+        ]
+        ok = True
+        for label, store, evicting in runs:
+            started = time.perf_counter()
+            result = asyncio.run(run_day(store, waves, calls_per_wave, evicting))
+            elapsed = time.perf_counter() - started
+            size = f"{result['bytes'] / 1024:8.1f} KB" if result["bytes"] is not None else "       n/a"
+            print(f"  {label:<20} peak {result['peak']:5d}  live at end {result['live']:5d}  {size}  "
+                  f"persisted {result['persisted']:5d}  ({elapsed:.1f}s)")
+            if evicting:
+                ok = ok and result["peak"] <= MAX_SESSIONS and result["live"] == 0 \
+                    and result["persisted"] == abandoned and result["duplicates"] == 0
+
+        read_only = {
+            "memory": MemorySessionStore(IDLE_TTL, MAX_SESSIONS),
+            "sqlite": SQLiteSessionStore(os.path.join(tmp, "read_only.db"), IDLE_TTL, MAX_SESSIONS),
+            "redis": RedisSessionStore(redis.url, idle_ttl=IDLE_TTL, max_sessions=MAX_SESSIONS),
+        }
+        evicted = {label: asyncio.run(read_without_saving(store)) for label, store in read_only.items()}
+        print("  read, not saved past the TTL: "
+              + ", ".join(f"{label} {'evicted' if gone else 'KEPT'}" for label, gone in evicted.items()))
+        ok = ok and all(evicted.values())
+
+    gauges = metrics.snapshot()["gauges"]
+    print(f"Gauges: sessions.live={gauges.get('sessions.live')} "
+          f"sessions.bytes_per_session={gauges.get('sessions.bytes_per_session')}")
+    print("Evicting stores: " + ("bounded, every abandoned call persisted once, evicted by last save"
+                                 if ok else "FAILED"))
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Multi-worker test: start calls and spray their turns round-robin across
+separate app worker processes, once per session store backend.
+
+Each call is started on one worker and every following request goes to the
+next worker, as a load balancer in front of ``gunicorn --workers N`` may do.
+With the in-process store most turns get "Session not found"; with a shared
+store every call must reach CLOSE with its full history, whichever worker
+served each turn.
+
+Usage (from backend/):
+    python -m benchmarks.session_spray [workers] [calls]
+"""
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.fakes import FakeRedis, FakeServer, _free_port, make_fake_anthropic_app
+from benchmarks.llm_concurrency import SAMPLE_ORDER
+
+# One full call, INIT to CLOSE, decided locally (no Claude round trip needed)
+SCRIPT = [
+    "hello",
+    "English please",
+    "My name is Ali Hassan and my CPR is 850101234",
+    "yes that's correct",
+    "yes",
+    "ok",
+    "no thanks",
+    "ok"
+]
+
+
+def start_workers(count: int, env: dict) -> list:
+    workers = []
+    for _ in range(count):
+        port = _free_port()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+             "--port", str(port), "--log-level", "warning"],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        workers.append((process, f"http://127.0.0.1:{port}"))
+    for process, url in workers:
+        deadline = time.time() + 30
+        while True:
+            try:
+                if httpx.get(f"{url}/health").status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.time() > deadline or process.poll() is not None:
+                raise RuntimeError(f"Worker at {url} did not start")
+            time.sleep(0.1)
+    return workers
+
+
+async def run_call(client: httpx.AsyncClient, urls: list, call: int, latencies: list) -> dict:
+    worker = call % len(urls)
+    response = await client.post(f"{urls[worker]}/api/start-call", json={"order_data": SAMPLE_ORDER})
+    session_id = response.json()["session_id"]
+
+    failed = 0
+    for text in SCRIPT:
+        worker = (worker + 1) % len(urls)
+        started = time.perf_counter()
+        response = await client.post(f"{urls[worker]}/api/session/{session_id}/process", json={"text": text})
+        latencies.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            failed += 1
+
+    worker = (worker + 1) % len(urls)
+    session = await client.get(f"{urls[worker]}/api/session/{session_id}")
+    final_state = session.json().get("state") if session.status_code == 200 else None
+    # The history every worker wrote to, as yet another worker sees it
+    worker = (worker + 1) % len(urls)
+    history = await client.get(f"{urls[worker]}/api/session/{session_id}/history", params={"limit": 1})
+    total = history.json()["total"] if history.status_code == 200 else 0
+    return {"failed": failed, "state": final_state, "history": total}
+
+
+async def spray(urls: list, calls: int) -> tuple:
+    latencies = []
+    async with httpx.AsyncClient(timeout=30) as client:
+        results = await asyncio.gather(*(run_call(client, urls, call, latencies) for call in range(calls)))
+    return results, latencies
+
+
+def run_backend(backend: str, url: str, workers: int, calls: int, anthropic_url: str) -> bool:
+    env = dict(os.environ, SESSION_STORE=backend, SESSION_STORE_URL=url,
+               ANTHROPIC_BASE_URL=anthropic_url, CLAUDE_API_KEY="fake-key", DATABASE_URL="")
+    processes = start_workers(workers, env)
+    try:
+        results, latencies = asyncio.run(spray([url for _, url in processes], calls))
+    finally:
+        for process, _ in processes:
+            process.terminate()
+        for process, _ in processes:
+            process.wait(timeout=10)
+
+    turns = calls * len(SCRIPT)
+    failed = sum(result["failed"] for result in results)
+    complete = sum(1 for result in results
+                   if result["state"] == "CLOSE" and result["history"] == 2 * len(SCRIPT))
+    latencies.sort()
+    print(f"  {backend:<7} failed turns {failed:4d}/{turns}   complete calls {complete:3d}/{calls}   "
+          f"turn p50 {statistics.median(latencies):6.1f} ms   p95 {latencies[int(len(latencies) * 0.95) - 1]:6.1f} ms")
+    return failed == 0 and complete == calls
+
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    calls = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    print(f"Spraying {calls} calls x {len(SCRIPT)} turns across {workers} workers")
+    with FakeServer(make_fake_anthropic_app(latency=0.05)) as anthropic, FakeRedis() as redis, \
+            tempfile.TemporaryDirectory() as tmp:
+        run_backend("memory", "", workers, calls, anthropic.url)
+        shared_ok = all([
+            run_backend("sqlite", os.path.join(tmp, "sessions.db"), workers, calls, anthropic.url),
+            run_backend("redis", redis.url, workers, calls, anthropic.url)
+        ])
+
+    print("Shared stores: " + ("every call completed across workers" if shared_ok else "FAILED"))
+    if not shared_ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Benchmark: speculative speech prefetch.
+
+Calls go through ``respond`` (the voice WebSocket's turn handler) with a
+fake ElevenLabs client whose latency grows with the text and whose audio is
+realistically sized, and a warm TTS cache for the fixed phrases. The client
+plays the audio in real time. Each caller authenticates, hears the order
+read-back, confirms, hears the financial breakdown and declines the
+accessories, answering ``listen`` seconds after each reply has played. Some
+callers hang up after "let me check your eligibility".
+
+Replies with order details start with a cached fixed sentence, so their
+first audio is immediate either way; what the caller can hear is silence
+after it, while the sentence with their details is synthesized. Runs every
+call with prefetch off and on and reports the silence in each reply (before
+the first audio and between segments), the prefetch hit rate, and the TTS
+characters synthesized ahead, ready in time and wasted.
+
+Usage (from backend/):
+    python -m benchmarks.speculation [calls] [listen_seconds] [hangup_rate] [tts_latency]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.fakes import FakeElevenLabs
+from benchmarks.llm_concurrency import SAMPLE_ORDER
+
+TURNS = [
+    ("Ali Hassan, 850101234", "authenticated"),
+    ("okay", "order read-back"),
+    ("yes", "checking eligibility"),
+    ("sure", "financial breakdown"),
+    ("no thanks", "accessories declined")
+]
+HANGUP_AFTER = 3  # turns, for the callers who hang up
+
+
+class Socket:
+    """Plays the audio it is sent in real time and records the silences"""
+
+    def __init__(self):
+        self.started = 0.0
+        self.playing_until = None  # When the audio received so far finishes playing
+        self.silence = 0.0
+        self.audio = asyncio.Event()
+
+    def reply(self) -> None:
+        """The caller finished their turn: silence until the reply's first audio"""
+        self.started = time.perf_counter()
+        self.playing_until = None
+        self.silence = 0.0
+        self.audio.clear()
+
+    async def send_json(self, message):
+        pass
+
+    async def send_text(self, text):
+        pass
+
+    async def send_bytes(self, data):
+        from app.services.speech_pipeline import TTS_BYTES_PER_SECOND
+
+        now = time.perf_counter()
+        if self.playing_until is None or now > self.playing_until:
+            self.silence += now - (self.playing_until or self.started)
+            self.playing_until = now
+        self.playing_until += len(data) / TTS_BYTES_PER_SECOND
+        self.audio.set()
+        await asyncio.sleep(0)
+
+
+async def call(index: int, listen: float, hangup: bool) -> list:
+    """Milliseconds of silence (before and during) each reply of one call"""
+    from app.models.agent import AgentState
+    from app.routers.voice_agent import save_agent
+    from app.routers.websocket_handler import Outbox, respond
+    from app.services.ai_agent import ZainVoiceAgent
+    from app.services.speculation import discard_prefetch
+
+    agent = ZainVoiceAgent(SAMPLE_ORDER, f"speculation-{index}")
+    agent.language = "ar" if index % 2 else "en"
+    agent.state = AgentState.AUTH
+    await save_agent(agent)  # as started by POST /start-call
+    socket = Socket()
+    outbox = Outbox(socket)
+    silences = []
+    for turn, (said, _) in enumerate(TURNS, 1):
+        if hangup and turn > HANGUP_AFTER:
+            break
+        socket.reply()
+        await respond(outbox, agent, said, None)
+        await socket.audio.wait()  # sent by the outbox's sender task
+        while not outbox.queue.empty():
+            await asyncio.sleep(0.01)
+        silences.append(socket.silence * 1000)
+        # The caller hears the rest of the reply, then answers
+        await asyncio.sleep(max(socket.playing_until - time.perf_counter(), 0) + listen)
+    discard_prefetch(agent.session_id)  # the WebSocket closing
+    await outbox.close()
+    return silences
+
+
+async def run_calls(calls: int, listen: float, hangup_rate: float) -> list:
+    hangups = round(1 / hangup_rate) if hangup_rate else 0
+    return await asyncio.gather(*(
+        call(i, listen, bool(hangups) and i % hangups == hangups - 1) for i in range(calls)
+    ))
+
+
+def run(enabled: bool, calls: int, listen: float, hangup_rate: float, tts) -> dict:
+    from app.services import speculation
+    from app.services.metrics import metrics
+
+    metrics.reset()
+    speculation.SPECULATIVE_PREFETCH = enabled
+    tts.characters = 0
+    results = asyncio.run(run_calls(calls, listen, hangup_rate))
+    per_turn = [[ms[turn] for ms in results if len(ms) > turn] for turn in range(len(TURNS))]
+    return {
+        "silence": [sum(times) / len(times) for times in per_turn],
+        "billed": tts.characters,
+        "hits": metrics.counter("speculation.hits"),
+        "misses": metrics.counter("speculation.misses"),
+        "discarded": metrics.counter("speculation.discarded"),
+        "hit_rate": metrics.snapshot()["derived"]["speculation.hit_rate"],
+        "prefetched": metrics.counter("speculation.characters"),
+        "ready": metrics.counter("speculation.hit_characters"),
+        "wasted": metrics.counter("speculation.wasted_characters")
+    }
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    listen = float(sys.argv[2]) if len(sys.argv) > 2 else 1.5
+    hangup_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.2
+    tts_latency = float(sys.argv[4]) if len(sys.argv) > 4 else 1.5
+    os.environ["TTS_CACHE_DIR"] = tempfile.mkdtemp(prefix="speculation_bench_")
+    from app.services import voice_service
+    from app.services.vendor_io import shutdown_vendor_io
+
+    tts = FakeElevenLabs(base_latency=tts_latency, per_char=0.01, audio_bytes_per_char=1000)
+    voice_service.elevenlabs_client = tts
+    voice_service.ELEVENLABS_VOICE_ID = "fake-voice"
+    run(False, 2, 0, 0, tts)  # fixed phrases into the TTS cache
+
+    print(f"{calls} calls, caller answers {listen:.1f} s after each reply, {hangup_rate:.0%} hang up "
+          f"after turn {HANGUP_AFTER}; fake TTS {tts.base_latency * 1000:.0f} ms + {tts.per_char * 1000:.0f} ms/char")
+    off = run(False, calls, listen, hangup_rate, tts)
+    on = run(True, calls, listen, hangup_rate, tts)
+    asyncio.run(shutdown_vendor_io())
+
+    print(f"  {'reply':<22} {'prefetch off':>12} {'prefetch on':>12}   (ms of silence)")
+    for turn, (_, reply) in enumerate(TURNS):
+        print(f"  {reply:<22} {off['silence'][turn]:>12.0f} {on['silence'][turn]:>12.0f}")
+    print(f"  predictions: {on['hits']:.0f} hits, {on['misses']:.0f} misses, {on['discarded']:.0f} discarded "
+          f"at hang-up (hit rate {on['hit_rate']:.0%})")
+    print(f"  TTS characters: {off['billed']} billed without prefetch, {on['billed']} with; "
+          f"{on['prefetched']:.0f} synthesized ahead, {on['ready']:.0f} of them ready when the reply was given, "
+          f"{on['wasted']:.0f} wasted ({on['wasted'] / max(on['prefetched'], 1):.0%})")
+
+    readback, financials = 1, 3
+    ok = (
+        on["silence"][readback] < off["silence"][readback] / 2
+        and on["silence"][financials] <= off["silence"][financials] + 50  # timer noise
+        and on["billed"] - off["billed"] == on["wasted"]
+    )
+    print("Speculative prefetch: " + ("no wait for the caller's details, waste accounted" if ok else "FAILED"))
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
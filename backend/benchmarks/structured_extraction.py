@@ -0,0 +1,192 @@
+"""
+Benchmark: identity extraction, JSON in free text vs a validated tool call.
+
+A fake Messages API plays a model that answers sloppily some of the time.
+Asked for "ONLY valid JSON" (``text_messy_rate``) it wraps the object in
+prose or code fences, adds notes with braces, uses single quotes or trailing
+commas, or answers in a sentence. Forced to call ``record_identity`` its
+answer is always a JSON object, but it sometimes (``tool_messy_rate``)
+breaks the schema: a spaced, numeric or Arabic-Indic CPR, digits in the
+name, an extra field. The rates are assumptions; pass your own. Both are
+replayed over callers who give their name in Arabic script (so the local
+extractor defers to Claude) and repeat it when asked again:
+
+1. scraped: the previous code path, slicing from the first "{" to the last
+   "}" and falling back to {} on any parse error
+2. tool: ``ask_claude_tool`` with ``validate_identity`` and one retry that
+   sends the validation error back as the tool result
+
+Reports parse failures per extraction request, retries, and the caller
+turns and Claude calls each authenticated call took.
+
+Usage (from backend/):
+    python -m benchmarks.structured_extraction [calls] [text_messy_rate] [tool_messy_rate]
+"""
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+
+from benchmarks.fakes import FakeServer, make_fake_anthropic_app
+from benchmarks.llm_concurrency import SAMPLE_ORDER
+
+MAX_TURNS = 4  # caller turns before the call is counted as not authenticated
+NAME = "Ali Hassan"
+CPR = SAMPLE_ORDER["customer"]["cpr"]
+
+# (first turn, what the caller says when asked for the name again)
+CALLERS = [
+    ("اسمي علي حسن والرقم 850101234", "علي حسن"),
+    ("معاك علي حسن، رقمي ٨٥٠١٠١٢٣٤", "اسمي علي حسن"),
+    ("انا علي حسن، الرقم ثمانية خمسة صفر واحد صفر واحد اثنين ثلاثة اربعة", "علي حسن"),
+    ("هلا، علي حسن معاك ورقم الهوية 850101234", "اسمي علي حسن")
+]
+
+
+def messy_text(answer: dict, rng: random.Random) -> str:
+    """JSON the way a model asked for "ONLY valid JSON" sometimes writes it"""
+    clean = json.dumps(answer, ensure_ascii=False)
+    return rng.choice([
+        f"Sure! Here is the extracted information:\n{clean}",
+        f"```json\n{clean}\n```",
+        f"{clean}\n\n(The {{cpr}} field was normalized to ASCII digits.)",
+        str(answer),
+        clean[:-1] + ",}",
+        f"The customer's name is {answer['name']} and their CPR is {answer['cpr'] or 'not stated'}."
+    ])
+
+
+def messy_arguments(answer: dict, rng: random.Random) -> dict:
+    """``record_identity`` arguments that break the schema"""
+    cpr = answer["cpr"] or CPR
+    return rng.choice([
+        {**answer, "cpr": f"{cpr[:3]} {cpr[3:6]} {cpr[6:]}"},
+        {**answer, "cpr": int(cpr)},
+        {**answer, "cpr": cpr.translate(str.maketrans("0123456789", "٠١٢٣٤٥٦٧٨٩"))},
+        {**answer, "confidence": "high"},
+        {"name": f"{answer['name']} {cpr}", "cpr": answer["cpr"]}
+    ])
+
+
+def make_responder(text_messy_rate: float, tool_messy_rate: float, seed: int = 7):
+    from app.services.auth_extractor import extract_digits
+
+    rng = random.Random(seed)
+
+    def respond(body: dict) -> list:
+        prompt = body["messages"][0]["content"]
+        said = extract_digits(re.search(r'text: "(.*)"', prompt).group(1))
+        answer = {"name": NAME, "cpr": CPR if said == CPR else None}
+        if body.get("tools"):
+            arguments = messy_arguments(answer, rng) if rng.random() < tool_messy_rate else answer
+            return [{"type": "tool_use", "id": f"toolu_{rng.getrandbits(32):08x}",
+                     "name": body["tools"][0]["name"], "input": arguments}]
+        messy = rng.random() < text_messy_rate
+        return [{"type": "text", "text": messy_text(answer, rng) if messy else json.dumps(answer)}]
+
+    return respond
+
+
+def scraping_agent():
+    """An agent that extracts the identity as it did before the tool (same counters)"""
+    from app.services.ai_agent import ZainVoiceAgent
+    from app.services.metrics import metrics
+
+    class ScrapingAgent(ZainVoiceAgent):
+        async def extract_identity_with_claude(self, user_input):
+            prompt = f"""Extract customer information from this text: "{user_input}"
+
+Return JSON with:
+- name (full name if mentioned, otherwise null)
+- cpr (ID number if mentioned, 9 digits, otherwise null)
+
+Only include fields that are clearly stated. Return ONLY valid JSON."""
+            try:
+                extracted_text = await self.ask_claude(prompt, max_tokens=200)
+                metrics.increment("llm.tool_calls")
+                if "{" in extracted_text:
+                    json_start = extracted_text.find("{")
+                    json_end = extracted_text.rfind("}") + 1
+                    return json.loads(extracted_text[json_start:json_end])
+                metrics.increment("llm.tool_invalid")
+                return {}
+            except Exception:
+                metrics.increment("llm.tool_invalid")
+                return {}
+
+    return ScrapingAgent
+
+
+async def authenticate(agent_class, index: int) -> tuple:
+    """(authenticated, caller turns) for one call"""
+    from app.models.agent import AgentState
+
+    first, repeat = CALLERS[index % len(CALLERS)]
+    agent = agent_class(SAMPLE_ORDER, f"extract-{index}")
+    agent.language = "ar"
+    agent.state = AgentState.AUTH
+    for turn in range(1, MAX_TURNS + 1):
+        await agent.process_input(first if turn == 1 else repeat)
+        if agent.state != AgentState.AUTH:
+            return agent.customer_authenticated, turn
+    return False, MAX_TURNS
+
+
+async def replay(agent_class, calls: int) -> list:
+    from app.services.llm_client import shutdown_llm_client
+
+    results = [await authenticate(agent_class, i) for i in range(calls)]
+    await shutdown_llm_client()
+    return results
+
+
+def run(mode: str, calls: int, text_messy_rate: float, tool_messy_rate: float) -> dict:
+    from app.services.ai_agent import ZainVoiceAgent
+    from app.services.metrics import metrics
+
+    metrics.reset()
+    agent_class = scraping_agent() if mode == "scraped" else ZainVoiceAgent
+    app = make_fake_anthropic_app(latency=0.005, respond=make_responder(text_messy_rate, tool_messy_rate))
+    with FakeServer(app) as server:
+        os.environ["ANTHROPIC_BASE_URL"] = server.url
+        results = asyncio.run(replay(agent_class, calls))
+
+    authenticated = [turns for ok, turns in results if ok]
+    return {
+        "requests": metrics.counter("llm.tool_calls"),
+        "invalid": metrics.counter("llm.tool_invalid"),
+        "retries": metrics.counter("llm.tool_retries"),
+        "authenticated": len(authenticated),
+        "turns": sum(authenticated) / len(authenticated) if authenticated else float("inf"),
+        "llm_calls": metrics.counter("llm.calls") / max(len(authenticated), 1)
+    }
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    text_messy_rate = float(sys.argv[2]) if len(sys.argv) > 2 else 0.3
+    tool_messy_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.1
+    os.environ.setdefault("CLAUDE_API_KEY", "fake-key")
+
+    print(f"{calls} calls; fake model writes messy JSON {text_messy_rate:.0%} of the time, "
+          f"breaks the tool schema {tool_messy_rate:.0%} of the time")
+    print(f"  {'extraction':<10} {'requests':>8} {'parse failures':>15} {'retries':>8} "
+          f"{'authenticated':>14} {'turns/auth':>11} {'Claude calls/auth':>18}")
+    results = {}
+    for mode in ("scraped", "tool"):
+        result = results[mode] = run(mode, calls, text_messy_rate, tool_messy_rate)
+        print(f"  {mode:<10} {result['requests']:>8.0f} {result['invalid']:>6.0f} "
+              f"({result['invalid'] / result['requests']:>5.1%}) {result['retries']:>8.0f} "
+              f"{result['authenticated']:>14} {result['turns']:>11.2f} {result['llm_calls']:>18.2f}")
+
+    scraped, tool = results["scraped"], results["tool"]
+    ok = tool["turns"] < scraped["turns"] and tool["authenticated"] >= scraped["authenticated"]
+    print("Structured extraction: " + ("fewer repeated turns per authenticated call" if ok else "FAILED"))
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
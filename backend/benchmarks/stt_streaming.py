@@ -0,0 +1,168 @@
+"""
+Benchmark: end of speech to first response, batch vs streaming speech-to-text.
+
+A scripted call through the real /ws/voice handler with ogg-opus frames sent
+at recording pace (one timeslice every TIMESLICE_SECONDS), against a fake
+Claude endpoint and fake TTS, once per speech-to-text mode:
+
+- batch: Whisper (faked with ``whisper_latency``) gets the whole utterance
+  after the FINAL frame,
+- streaming: a fake streaming backend hears the audio as it arrives, sends
+  partial transcripts and finalizes ``final_latency`` after FINAL; the
+  language choice and the order read-back reply are ambiguous, so Claude
+  classifies them and is started on the stable partial.
+
+Reports the time from the FINAL frame to the text reply and to the first
+audio frame, split into turns Claude classified and the rest, plus a second
+short call whose partial is revised at the end (the early start is wasted
+and the final transcript decides).
+
+Usage (from backend/):
+    python -m benchmarks.stt_streaming [whisper_latency] [final_latency] [llm_latency]
+"""
+import json
+import os
+import statistics
+import sys
+import time
+
+from benchmarks.fakes import (
+    FakeElevenLabs, FakeServer, FakeStreamingSTT, FakeWhisper, fake_recording, make_fake_anthropic_app
+)
+from benchmarks.llm_concurrency import SAMPLE_ORDER
+
+UTTERANCE_BYTES = 12000
+TIMESLICE_BYTES = 2000
+TIMESLICE_SECONDS = 0.1
+
+# INIT to CLOSE; the turns marked True are ambiguous and go to Claude
+CALL = [
+    ("whichever is easier", True),
+    ("My name is Ali Hassan and my CPR is 850101234", False),
+    ("yes", False),
+    ("hmm alright let's do it", True),
+    ("ok", False),
+    ("no thanks", False),
+    ("ok", False)
+]
+# Partial "um" starts a Claude classification; the final transcript is settled locally
+REVISED = [("um|um english please", False)]
+
+
+def run_call(client, script: list) -> dict:
+    from app.services.voice_protocol import CODEC_IDS, FLAG_FINAL, FRAME_AUDIO_IN, pack_frame
+
+    turns = []
+    result = {"partials": 0, "state": None}
+    codec = CODEC_IDS["ogg-opus"]
+    seq = 0
+
+    def read_turn(ws, ended=None):
+        turn = {}
+        while True:
+            message = ws.receive()
+            if message.get("bytes") is not None:
+                turn.setdefault("audio", time.perf_counter())
+                continue
+            data = json.loads(message["text"])
+            if data["type"] == "transcript_partial":
+                result["partials"] += 1
+            elif data["type"] == "text":
+                turn["text"] = time.perf_counter()
+                result["state"] = data["state"]
+                turn["transcript"] = data.get("transcript")
+            elif data["type"] == "audio_end":
+                if ended is not None:
+                    turns.append({
+                        "response_ms": (turn["text"] - ended) * 1000,
+                        "audio_ms": (turn["audio"] - ended) * 1000,
+                        "transcript": turn["transcript"]
+                    })
+                return
+
+    session_id = client.post("/api/start-call", json={"order_data": SAMPLE_ORDER}).json()["session_id"]
+    with client.websocket_connect(f"/ws/voice/{session_id}?protocol=1&codecs=ogg-opus") as ws:
+        ws.receive()  # ready
+        read_turn(ws)  # greeting
+        for text, ambiguous in script:
+            audio = fake_recording(text, UTTERANCE_BYTES, container=b"OggS")
+            for offset in range(0, len(audio), TIMESLICE_BYTES):
+                ws.send_bytes(pack_frame(FRAME_AUDIO_IN, seq, codec, audio[offset:offset + TIMESLICE_BYTES]))
+                seq += 1
+                time.sleep(TIMESLICE_SECONDS)
+            ws.send_bytes(pack_frame(FRAME_AUDIO_IN, seq, codec, b"", FLAG_FINAL))
+            seq += 1
+            read_turn(ws, ended=time.perf_counter())
+            turns[-1]["ambiguous"] = ambiguous
+    client.delete(f"/api/session/{session_id}")
+    result["turns"] = turns
+    return result
+
+
+def summarize(label: str, turns: list) -> None:
+    for kind, selected in (("classified by Claude", [t for t in turns if t["ambiguous"]]),
+                           ("other turns", [t for t in turns if not t["ambiguous"]])):
+        print(f"  {label:<10} {kind:<21} text reply {statistics.median(t['response_ms'] for t in selected):6.0f} ms"
+              f"   first audio {statistics.median(t['audio_ms'] for t in selected):6.0f} ms   (median of {len(selected)})")
+
+
+def main():
+    whisper_latency = float(sys.argv[1]) if len(sys.argv) > 1 else 0.4
+    final_latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.1
+    llm_latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0.5
+
+    with FakeServer(make_fake_anthropic_app(latency=llm_latency, reply="confirm")) as server:
+        os.environ["ANTHROPIC_BASE_URL"] = server.url
+        os.environ.setdefault("CLAUDE_API_KEY", "fake-key")
+        os.environ["SESSION_STORE"] = "memory"
+        os.environ["TTS_CACHE_ENABLED"] = "false"
+        from fastapi.testclient import TestClient
+        from app.main import app
+        from app.services import voice_service
+        from app.services.metrics import metrics
+        from app.services.stt_stream import set_stt_backend
+
+        voice_service.elevenlabs_client = FakeElevenLabs(base_latency=0.05, per_char=0, chunks=2)
+        voice_service.openai_client = FakeWhisper(latency=whisper_latency)
+        streaming = FakeStreamingSTT(final_latency=final_latency)
+
+        print(f"Whisper {whisper_latency * 1000:.0f} ms, streaming finalize {final_latency * 1000:.0f} ms, "
+              f"Claude {llm_latency * 1000:.0f} ms; {len(CALL)} turns of {UTTERANCE_BYTES} bytes "
+              f"at {TIMESLICE_BYTES} bytes per {TIMESLICE_SECONDS * 1000:.0f} ms")
+        print("From the FINAL frame (end of speech) to:")
+        with TestClient(app) as client:
+            set_stt_backend(None)
+            batch = run_call(client, CALL)
+            summarize("batch", batch["turns"])
+
+            set_stt_backend(streaming)
+            before = {name: metrics.counter(name) for name in ("stt.early_starts", "stt.early_hits", "stt.early_misses")}
+            stream = run_call(client, CALL)
+            summarize("streaming", stream["turns"])
+            revised = run_call(client, REVISED)
+            set_stt_backend(None)
+        early = {name: metrics.counter(name) - value for name, value in before.items()}
+
+    print(f"Streaming: {stream['partials'] + revised['partials']} partial transcripts sent, "
+          f"{early['stt.early_starts']:.0f} early classifications started, "
+          f"{early['stt.early_hits']:.0f} used, {early['stt.early_misses']:.0f} wasted "
+          f"(revised call final transcript: {revised['turns'][0]['transcript']!r}, state {revised['state']})")
+
+    def median(result, key):
+        return statistics.median(t[key] for t in result["turns"])
+
+    ok = (
+        batch["state"] == stream["state"] == "CLOSE"
+        and [t["transcript"] for t in batch["turns"]] == [t["transcript"] for t in stream["turns"]]
+        and batch["partials"] == 0 and stream["partials"] > 0
+        and early["stt.early_hits"] == 2 and early["stt.early_misses"] == 1
+        and revised["state"] == "AUTH"
+        and median(stream, "response_ms") < median(batch, "response_ms")
+    )
+    print("Streaming speech-to-text: " + ("same turns, answered sooner" if ok else "FAILED"))
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
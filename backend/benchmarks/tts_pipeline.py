@@ -0,0 +1,79 @@
+"""
+Benchmark: whole-utterance TTS vs sentence-level pipelined TTS for a multi-line answer.
+
+Uses the eligibility financial breakdown against a fake ElevenLabs client whose
+latency grows with input length, and reports time to first audio byte and
+time to last byte for both paths. The pipeline is also run paced to playback
+(as the voice WebSocket runs it) with realistically sized audio played in
+real time, reporting the silence the caller hears between segments.
+
+Usage (from backend/):
+    python -m benchmarks.tts_pipeline
+"""
+import asyncio
+import os
+import time
+
+from benchmarks.fakes import FakeElevenLabs
+from benchmarks.llm_concurrency import SAMPLE_ORDER
+
+
+async def measure(stream) -> tuple:
+    started = time.perf_counter()
+    first = None
+    async for _ in stream:
+        if first is None:
+            first = time.perf_counter() - started
+    return first * 1000, (time.perf_counter() - started) * 1000
+
+
+async def measure_paced(text: str, segments: list) -> tuple:
+    """(first byte ms, last byte ms, ms of silence after the first audio) paced to real-time playback"""
+    from app.services.speech_pipeline import TTS_BYTES_PER_SECOND, Playback, stream_segments
+    
+    playback = Playback(text)
+    started = time.perf_counter()
+    first = playing_until = None
+    silence = 0.0
+    async for segment, chunk in stream_segments(segments, "en", pace=playback.pace):
+        now = time.perf_counter()
+        if first is None:
+            first = playing_until = now
+        elif now > playing_until:
+            silence += now - playing_until
+            playing_until = now
+        playing_until += len(chunk) / TTS_BYTES_PER_SECOND
+        playback.chunk(segment, len(chunk))
+    return (first - started) * 1000, (time.perf_counter() - started) * 1000, silence * 1000
+
+
+async def main():
+    from app.models.agent import AgentState
+    from app.services import voice_service
+    from app.services.ai_agent import ZainVoiceAgent
+    from app.services.speech_pipeline import split_segments, stream_segments
+    
+    voice_service.elevenlabs_client = FakeElevenLabs()
+    agent = ZainVoiceAgent(SAMPLE_ORDER, "bench-pipeline", claude_client=object())
+    agent.language = "en"
+    agent.state = AgentState.ELIGIBILITY_CHECK
+    text = await agent.handle_eligibility_check("yes")
+    segments = split_segments(text)
+    
+    serial = await measure(voice_service.stream_text_to_speech(text, "en"))
+    pipelined = await measure(stream_segments(segments, "en"))
+    
+    print(f"Response: {len(text)} chars in {len(segments)} segments")
+    print(f"Whole utterance: first byte {serial[0]:.0f} ms, last byte {serial[1]:.0f} ms")
+    print(f"Pipelined:       first byte {pipelined[0]:.0f} ms, last byte {pipelined[1]:.0f} ms")
+    print(f"Perceived latency cut: {serial[0] - pipelined[0]:.0f} ms")
+    
+    voice_service.elevenlabs_client = FakeElevenLabs(base_latency=1.5, per_char=0.01, audio_bytes_per_char=1000)
+    paced = await measure_paced(text, segments)
+    print(f"Paced, real-size audio: first byte {paced[0]:.0f} ms, last byte {paced[1]:.0f} ms, "
+          f"{paced[2]:.0f} ms of silence between segments")
+
+
+if __name__ == "__main__":
+    os.environ["TTS_CACHE_ENABLED"] = "false"  # Every segment synthesized, as for order details
+    asyncio.run(main())
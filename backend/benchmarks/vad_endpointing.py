@@ -0,0 +1,247 @@
+"""
+Tuning and accuracy check for the server-side VAD/endpointer.
+
+Fixtures are deterministic 16 kHz recordings synthesized here: voiced
+syllables (harmonic stacks with a pitch glide and an amplitude envelope)
+grouped into words, with pauses inside each utterance (or, for long
+continuous utterances, only shallow dips between syllables), over different
+backgrounds (quiet room, office pink noise, mains hum, car rumble) and with
+distractors that must not start a turn (a click, a cough). Ground truth is
+known exactly, so for each endpointer setting the benchmark reports:
+
+- fixtures where every utterance was found once (no splits at the pauses,
+  no merges, nothing from the distractors) and no speech was clipped,
+- how long after the end of speech the utterance was dispatched,
+- bytes sent to speech-to-text against uploading the whole stream.
+
+Then one fixture is streamed through the /ws/voice handler as pcm16 frames
+with fake speech-to-text, to check each detected utterance becomes a turn.
+
+Usage (from backend/):
+    python -m benchmarks.vad_endpointing
+"""
+import json
+import os
+import sys
+
+import numpy as np
+
+from benchmarks.fakes import FakeElevenLabs, FakeWhisper
+from benchmarks.llm_concurrency import SAMPLE_ORDER
+
+RATE = 16000
+CHUNK_MS = 100  # client frame size when streaming
+CLIP_TOLERANCE = 0.04  # seconds of soft onset/offset the VAD may miss
+
+
+def voiced(rng, seconds: float) -> np.ndarray:
+    """A harmonic stack with a rising pitch"""
+    t = np.arange(max(2, round(seconds * RATE))) / RATE
+    f0 = rng.uniform(100, 220) * (1 + 0.1 * t / t[-1])
+    phase = 2 * np.pi * np.cumsum(f0) / RATE
+    return sum(np.sin(k * phase) / k for k in range(1, 16))
+
+
+def speech(rng, seconds: float, level_db: float, dip: float = 0.0) -> np.ndarray:
+    """
+    Words of voiced syllables with short pauses between words.
+
+    With ``dip`` the voice never stops: one continuous carrier whose amplitude
+    only falls to ``dip`` of the syllables' between them, as in connected speech.
+    """
+    envelope = []
+    total = 0
+    while total < seconds * RATE:
+        for _ in range(rng.integers(1, 4)):
+            envelope.append(np.hanning(int(rng.uniform(0.12, 0.25) * RATE)) ** 0.5)
+            envelope.append(np.zeros(int(rng.uniform(0.02, 0.06) * RATE)))
+        envelope.append(np.zeros(int(rng.uniform(0.08, 0.3) * RATE)))  # between words
+        total = sum(len(part) for part in envelope)
+    envelope = np.concatenate(envelope[:-1])
+    if dip:
+        signal = voiced(rng, len(envelope) / RATE) * (dip + (1 - dip) * envelope)
+    else:
+        # A fresh pitch per syllable
+        signal = np.zeros(len(envelope))
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], envelope > 0, [0])).astype(int)))
+        for start, end in zip(edges[::2], edges[1::2]):
+            signal[start:end] = voiced(rng, (end - start) / RATE)[:end - start] * envelope[start:end]
+    rms = np.sqrt(np.mean(signal[signal != 0] ** 2))
+    return signal / rms * 32768 * 10 ** (level_db / 20)
+
+
+def background(rng, kind: str, samples: int) -> np.ndarray:
+    white = rng.standard_normal(samples)
+    if kind == "quiet":
+        noise, level = white, -65
+    elif kind == "office":
+        spectrum = np.fft.rfft(white) / np.sqrt(np.arange(1, samples // 2 + 2))
+        noise, level = np.fft.irfft(spectrum, samples), -45
+    elif kind == "hum":
+        t = np.arange(samples) / RATE
+        noise = sum(np.sin(2 * np.pi * 50 * k * t) / k for k in (1, 3, 5)) + 0.1 * white
+        level = -42
+    else:  # car: low-frequency rumble
+        noise, level = np.cumsum(white) - np.convolve(np.cumsum(white), np.ones(400) / 400, "same"), -36
+    return noise / np.sqrt(np.mean(noise ** 2)) * 32768 * 10 ** (level / 20)
+
+
+def make_fixture(seed: int, kind: str, distractor: str = None, dip: float = 0.0,
+                 speech_first: bool = False) -> tuple:
+    """
+    (pcm bytes, [(speech start s, speech end s), ...]); ``dip`` makes 4-5 s
+    continuous utterances, ``speech_first`` starts the stream with the first
+    one (a caller talking as soon as it opens, as after a barge-in)
+    """
+    rng = np.random.default_rng(seed)
+    parts, truth, cursor = [], [], 0
+
+    def gap(seconds):
+        nonlocal cursor
+        parts.append(np.zeros(int(seconds * RATE)))
+        cursor += len(parts[-1])
+
+    lead = rng.uniform(0.8, 1.5)
+    if not speech_first:
+        gap(lead)
+    for turn in range(3):
+        seconds = rng.uniform(4.0, 5.0) if dip else rng.uniform(1.0, 2.5)
+        voice = speech(rng, seconds, rng.uniform(-28, -18), dip)
+        truth.append((cursor / RATE, (cursor + len(voice)) / RATE))
+        parts.append(voice)
+        cursor += len(voice)
+        gap(rng.uniform(1.2, 2.0))
+        if distractor and turn == 0:
+            if distractor == "click":
+                burst = np.zeros(int(0.01 * RATE))
+                burst[::7] = 20000
+            else:  # cough: 150 ms broadband burst
+                burst = rng.standard_normal(int(0.15 * RATE)) * 6000 * np.hanning(int(0.15 * RATE))
+            parts.append(burst)
+            cursor += len(burst)
+            gap(1.0)
+    signal = np.concatenate(parts)
+    signal = signal + background(rng, kind, len(signal))
+    return np.clip(signal, -32768, 32767).astype("<i2").tobytes(), truth
+
+
+FIXTURES = [
+    ("quiet room", 1, "quiet", None),
+    ("quiet room + click", 2, "quiet", "click"),
+    ("office", 3, "office", None),
+    ("office + cough", 4, "office", "cough"),
+    ("mains hum", 5, "hum", None),
+    ("car", 6, "car", None),
+    ("car + click", 7, "car", "click"),
+    ("quiet room, long continuous", 8, "quiet", None, 0.3),
+    ("office, long continuous", 9, "office", None, 0.3),
+    ("car, long continuous", 10, "car", None, 0.3),
+    ("quiet room, speech first", 11, "quiet", None, 0.0, True),
+    ("office, speech first", 12, "office", None, 0.0, True),
+    ("car, speech first", 13, "car", None, 0.0, True),
+    ("office, long continuous, speech first", 14, "office", None, 0.3, True),
+]
+
+
+def evaluate(pcm: bytes, truth: list, **settings) -> dict:
+    from app.services.vad import Endpointer
+
+    endpointer = Endpointer(**settings)
+    chunk = RATE * 2 * CHUNK_MS // 1000
+    detected, delays, uploaded = [], [], 0
+    for offset in range(0, len(pcm), chunk):
+        for utterance in endpointer.feed(pcm[offset:offset + chunk]):
+            start, end = (position / 2 / RATE for position in endpointer.last_span)
+            detected.append((start, end))
+            uploaded += len(utterance)
+            dispatched = min(offset + chunk, len(pcm)) / 2 / RATE
+            spoken = [t_end for t_start, t_end in truth if start <= t_start + CLIP_TOLERANCE and t_end <= end + 0.5]
+            if spoken:
+                delays.append(dispatched - spoken[-1])
+    last = endpointer.flush()
+    if last is not None:
+        detected.append(tuple(position / 2 / RATE for position in endpointer.last_span))
+        uploaded += len(last)
+    correct = len(detected) == len(truth) and all(
+        start <= t_start + CLIP_TOLERANCE and end >= t_end - CLIP_TOLERANCE
+        for (start, end), (t_start, t_end) in zip(detected, truth)
+    )
+    return {"correct": correct, "detected": len(detected), "delays": delays,
+            "uploaded": uploaded, "stream": len(pcm)}
+
+
+def tune() -> bool:
+    from app.services import vad
+
+    fixtures = [(label, *make_fixture(*spec)) for label, *spec in FIXTURES]
+    default = (vad.VAD_THRESHOLD_DB, vad.VAD_END_SILENCE_MS)
+    print(f"{len(fixtures)} fixtures, {sum(len(truth) for _, _, truth in fixtures)} utterances, "
+          f"{sum(len(pcm) for _, pcm, _ in fixtures) / 2 / RATE:.0f} s of audio")
+    print(f"  {'threshold':>9} {'end silence':>11}  {'fixtures ok':>11}  {'dispatch after speech':>21}  {'uploaded':>8}")
+    default_ok, failures = False, []
+    for threshold in (6, 12, 18):
+        for end_silence in (300, 500, 800):
+            results = [evaluate(pcm, truth, threshold_db=threshold, end_silence_ms=end_silence)
+                       for _, pcm, truth in fixtures]
+            ok = sum(result["correct"] for result in results)
+            delays = [delay for result in results for delay in result["delays"]]
+            uploaded = sum(r["uploaded"] for r in results) / sum(r["stream"] for r in results)
+            mark = "  <- default" if (threshold, end_silence) == default else ""
+            print(f"  {threshold:>7}dB {end_silence:>9}ms  {ok:>5}/{len(results):<5}  "
+                  f"{np.mean(delays) * 1000 if delays else float('nan'):>18.0f} ms  {uploaded:>8.0%}{mark}")
+            if (threshold, end_silence) == default:
+                default_ok = ok == len(results)
+                failures = [label for (label, _, _), r in zip(fixtures, results) if not r["correct"]]
+    if failures:
+        print(f"  default settings missed: {', '.join(failures)}")
+    return default_ok
+
+
+def websocket_turns() -> bool:
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.services import voice_service
+    from app.services.voice_protocol import CODEC_IDS, FRAME_AUDIO_IN, pack_frame
+
+    pcm, truth = make_fixture(3, "office")
+    voice_service.elevenlabs_client = FakeElevenLabs(base_latency=0, per_char=0, chunks=2)
+    whisper = voice_service.openai_client = FakeWhisper(
+        transcripts=["English please", "My name is Ali Hassan and my CPR is 850101234", "yes that's correct"]
+    )
+    transcripts, states = [], []
+    chunk = RATE * 2 * CHUNK_MS // 1000
+    with TestClient(app) as client:
+        session_id = client.post("/api/start-call", json={"order_data": SAMPLE_ORDER}).json()["session_id"]
+        with client.websocket_connect(f"/ws/voice/{session_id}?protocol=1&codecs=pcm16") as ws:
+            for seq, offset in enumerate(range(0, len(pcm), chunk)):
+                ws.send_bytes(pack_frame(FRAME_AUDIO_IN, seq, CODEC_IDS["pcm16"], pcm[offset:offset + chunk]))
+            while len(transcripts) < len(truth):
+                message = ws.receive()
+                if message.get("text") is None:
+                    continue
+                data = json.loads(message["text"])
+                if data["type"] == "text" and "transcript" in data:
+                    transcripts.append(data["transcript"])
+                    states.append(data["state"])
+        client.delete(f"/api/session/{session_id}")
+    sent = sum(size for _, size in whisper.files)
+    print(f"WebSocket pcm16 stream: {len(pcm)} bytes streamed, {len(whisper.files)} utterances "
+          f"sent to speech-to-text as {sorted({name for name, _ in whisper.files})} ({sent} bytes), "
+          f"states {' -> '.join(states)}")
+    return len(whisper.files) == len(truth) and sent < len(pcm) and all(
+        name == "audio.wav" for name, _ in whisper.files)
+
+
+def main():
+    os.environ.setdefault("CLAUDE_API_KEY", "fake-key")
+    os.environ["SESSION_STORE"] = "memory"
+    os.environ["TTS_CACHE_ENABLED"] = "false"
+    ok = tune()
+    ok = websocket_turns() and ok
+    print("Endpointing: " + ("every fixture correct with the defaults" if ok else "FAILED"))
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Benchmark: speech vendor calls, asyncio's default executor vs the vendor scheduler.
+
+The real OpenAI and ElevenLabs SDK clients talk to a local fake server
+(``make_fake_speech_app``) with fixed vendor latency, so every request is a
+genuinely blocking HTTP call on a thread.
+
+1. STT throughput: ``sessions`` callers each transcribing utterances back to
+   back, through ``asyncio.to_thread`` (the previous code path, bounded by
+   the default executor's min(32, CPUs + 4) threads) and through
+   ``speech_to_text`` on the vendor scheduler. Reports requests per second
+   and the peak ``vendor.stt.queued`` gauge.
+2. TTS first byte during an STT burst: on the shared default executor a
+   burst of transcriptions delays speech; on the vendor pool with
+   per-vendor limits it does not.
+3. Per-session ordering: one caller's three utterances submitted together,
+   the longest first; reports the order they complete in.
+4. Cancelled callers: two of a full vendor's callers are cancelled while
+   their blocking calls run, and more callers arrive; reports the peak
+   number of calls running at once against the vendor limit.
+
+Usage (from backend/):
+    python -m benchmarks.vendor_io [stt_latency] [tts_latency]
+"""
+import asyncio
+import io
+import os
+import sys
+import time
+
+from benchmarks.fakes import FakeServer, fake_recording, make_fake_speech_app
+
+ROUNDS = 4  # utterances per caller
+UTTERANCE_BYTES = 16000
+
+
+async def transcribe_to_thread(audio: bytes) -> str:
+    """The call as it was made before the scheduler"""
+    from app.services import voice_service
+
+    audio_file = io.BytesIO(audio)
+    audio_file.name = "audio.webm"
+    transcript = await asyncio.to_thread(voice_service.openai_client.audio.transcriptions.create,
+                                         model="whisper-1", file=audio_file, language="en")
+    return transcript.text
+
+
+async def first_chunk_to_thread(text: str) -> bytes:
+    """The first TTS chunk as it was read before the scheduler"""
+    from app.services import voice_service
+
+    audio_generator = voice_service.elevenlabs_client.text_to_speech.stream(
+        voice_id=voice_service.ELEVENLABS_VOICE_ID, text=text, model_id=voice_service.TTS_MODEL_ID
+    )
+    chunk = await asyncio.to_thread(next, audio_generator, None)
+    await asyncio.to_thread(audio_generator.close)
+    return chunk
+
+
+async def first_chunk_scheduled(text: str) -> bytes:
+    from app.services.voice_service import stream_text_to_speech
+
+    speech = stream_text_to_speech(text)
+    chunk = await speech.__anext__()
+    await speech.aclose()
+    return chunk
+
+
+async def transcribe_scheduled(audio: bytes, session_id: str = None) -> str:
+    from app.services.voice_service import speech_to_text
+    return await speech_to_text(audio, "en", "webm", session_id)
+
+
+async def peak_gauge(name: str, done: asyncio.Event) -> float:
+    from app.services.metrics import metrics
+
+    peak = 0.0
+    while not done.is_set():
+        peak = max(peak, metrics.snapshot()["gauges"].get(name, 0.0))
+        await asyncio.sleep(0.01)
+    return peak
+
+
+async def stt_throughput(transcribe, sessions: int) -> dict:
+    audio = fake_recording("English please", UTTERANCE_BYTES)
+
+    async def caller(index: int) -> None:
+        for _ in range(ROUNDS):
+            assert await transcribe(audio, f"session-{index}") == "English please"
+
+    done = asyncio.Event()
+    sampler = asyncio.create_task(peak_gauge("vendor.stt.queued", done))
+    started = time.perf_counter()
+    await asyncio.gather(*(caller(i) for i in range(sessions)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    return {"rps": sessions * ROUNDS / elapsed, "queued": await sampler}
+
+
+async def tts_first_byte(transcribe, first_chunk, burst: int) -> float:
+    audio = fake_recording("English please", UTTERANCE_BYTES)
+    transcriptions = [asyncio.create_task(transcribe(audio, f"burst-{i}")) for i in range(burst)]
+    await asyncio.sleep(0.05)  # the burst is in flight
+    started = time.perf_counter()
+    await first_chunk("Can I please have your full name?")
+    first_byte_ms = (time.perf_counter() - started) * 1000
+    await asyncio.gather(*transcriptions)
+    return first_byte_ms
+
+
+async def completion_order(session_id) -> list:
+    from app.services.voice_service import speech_to_text
+
+    finished = []
+
+    async def utterance(text: str, size: int) -> None:
+        finished.append(await speech_to_text(fake_recording(text, size), "en", "webm", session_id))
+
+    # Submitted in this order; the fake server takes longer for bigger uploads
+    await asyncio.gather(utterance("first", 96000), utterance("second", 48000), utterance("third", 4000))
+    return finished
+
+
+async def peak_after_cancel(limit: int) -> int:
+    """Most blocking calls running at once when callers are cancelled mid-call"""
+    from app.services.vendor_io import VendorScheduler
+
+    running = peak = 0
+
+    def call() -> None:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        time.sleep(0.3)
+        running -= 1
+
+    scheduler = VendorScheduler(threads=4 * limit, limits={"stt": limit, "tts": limit})
+    callers = [asyncio.create_task(scheduler.run("stt", call)) for _ in range(2 * limit)]
+    await asyncio.sleep(0.1)  # the first ``limit`` calls are running
+    for caller in callers[:limit]:
+        caller.cancel()
+    await asyncio.sleep(0.05)
+    callers += [asyncio.create_task(scheduler.run("stt", call)) for _ in range(limit)]
+    await asyncio.gather(*callers, return_exceptions=True)
+    scheduler.shutdown()
+    return peak
+
+
+def main():
+    stt_latency = float(sys.argv[1]) if len(sys.argv) > 1 else 0.3
+    tts_latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+    os.environ["TTS_CACHE_ENABLED"] = "false"
+    from elevenlabs import ElevenLabs
+    from openai import OpenAI
+    from app.services import voice_service
+    from app.services.vendor_io import STT_MAX_CONCURRENCY, TTS_MAX_CONCURRENCY, VENDOR_IO_THREADS, shutdown_vendor_io
+
+    app = make_fake_speech_app(stt_latency=stt_latency, stt_per_kb=0.005, tts_latency=tts_latency)
+    with FakeServer(app) as server:
+        voice_service.openai_client = OpenAI(api_key="fake-key", base_url=f"{server.url}/v1", max_retries=0)
+        voice_service.elevenlabs_client = ElevenLabs(api_key="fake-key", base_url=server.url)
+        voice_service.ELEVENLABS_VOICE_ID = "fake-voice"
+
+        print(f"Fake Whisper {stt_latency * 1000:.0f} ms, fake ElevenLabs {tts_latency * 1000:.0f} ms to first byte; "
+              f"{os.cpu_count()} CPUs, vendor pool {VENDOR_IO_THREADS} threads, "
+              f"limits STT {STT_MAX_CONCURRENCY} / TTS {TTS_MAX_CONCURRENCY}")
+        print(f"1. STT throughput, each caller sending {ROUNDS} utterances back to back:")
+        print(f"  {'callers':>7}  {'to_thread':>13}  {'scheduler':>13}  peak queued")
+        results = {}
+        for sessions in (1, 4, 16, 32):
+            baseline = asyncio.run(stt_throughput(lambda audio, session: transcribe_to_thread(audio), sessions))
+            scheduled = asyncio.run(stt_throughput(transcribe_scheduled, sessions))
+            results[sessions] = (baseline["rps"], scheduled["rps"])
+            print(f"  {sessions:>7}  {baseline['rps']:>9.1f} r/s  {scheduled['rps']:>9.1f} r/s  "
+                  f"{scheduled['queued']:>11.0f}")
+
+        burst = 2 * STT_MAX_CONCURRENCY
+        shared = asyncio.run(tts_first_byte(lambda audio, session: transcribe_to_thread(audio),
+                                            first_chunk_to_thread, burst))
+        separate = asyncio.run(tts_first_byte(transcribe_scheduled, first_chunk_scheduled, burst))
+        print(f"2. TTS first byte while {burst} transcriptions are in flight: "
+              f"to_thread {shared:.0f} ms, scheduler {separate:.0f} ms")
+
+        unordered = asyncio.run(completion_order(None))
+        ordered = asyncio.run(completion_order("caller"))
+        print(f"3. One caller's utterances complete as {unordered} without a session, {ordered} with one")
+        asyncio.run(shutdown_vendor_io())
+
+    limit = 2
+    peak = asyncio.run(peak_after_cancel(limit))
+    print(f"4. Calls running at once after cancelling callers mid-call: {peak} (limit {limit})")
+
+    ok = (
+        results[16][1] > 4 * results[1][1]
+        and results[16][1] > results[16][0]
+        and separate < shared
+        and ordered == ["first", "second", "third"] and unordered != ordered
+        and peak <= limit
+    )
+    print("Vendor scheduler: " + ("throughput scales with callers, speech isn't starved, per-caller order kept, "
+                                  "limits hold when callers are cancelled"
+                                  if ok else "FAILED"))
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
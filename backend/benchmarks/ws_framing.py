@@ -0,0 +1,157 @@
+"""
+Benchmark: voice WebSocket audio, base64-in-JSON vs binary frames.
+
+1. Codec cost per utterance: bytes on the wire and CPU time to encode
+   (client) and decode (server) a recorded utterance, legacy JSON+base64
+   against the binary frame protocol (250 ms MediaRecorder timeslices).
+2. A scripted call through the real /ws/voice handler, once per protocol,
+   with fake speech-to-text and TTS: audio bytes and messages per turn in
+   both directions, from the server's ws.* metrics. Checks every turn was
+   answered, the call reached CLOSE and the negotiated container (ogg) was
+   passed through to speech-to-text untouched.
+
+Usage (from backend/):
+    python -m benchmarks.ws_framing [utterance_kb]
+"""
+import base64
+import json
+import os
+import sys
+import time
+
+from benchmarks.fakes import FakeElevenLabs, FakeWhisper, fake_recording
+from benchmarks.llm_concurrency import SAMPLE_ORDER
+from benchmarks.session_spray import SCRIPT
+
+ROUNDS = 300
+TIMESLICE_BYTES = 2000  # ~250 ms of 64 kbps Opus
+
+
+def legacy_roundtrip(audio: bytes) -> int:
+    message = json.dumps({"type": "audio", "audio": base64.b64encode(audio).decode("ascii")})
+    decoded = base64.b64decode(json.loads(message)["audio"])
+    assert len(decoded) == len(audio)
+    return len(message.encode("utf-8"))
+
+
+def framed_roundtrip(audio: bytes) -> int:
+    from app.services.voice_protocol import CODEC_IDS, FLAG_FINAL, FRAME_AUDIO_IN, BinaryFraming, pack_frame
+
+    framing = BinaryFraming(["webm-opus"])
+    codec = CODEC_IDS["webm-opus"]
+    view = memoryview(audio)
+    slices = range(0, len(audio), TIMESLICE_BYTES)
+    wire = 0
+    result = []
+    for seq, offset in enumerate(slices):
+        final = FLAG_FINAL if seq == len(slices) - 1 else 0
+        frame = pack_frame(FRAME_AUDIO_IN, seq, codec, view[offset:offset + TIMESLICE_BYTES], final)
+        wire += len(frame)
+        result = framing.receive(frame)
+    assert len(result) == 1 and len(result[0].utterance) == len(audio)
+    return wire
+
+
+def codec_cost(size: int) -> None:
+    audio = fake_recording("English please", size)
+    print(f"Utterance of {size / 1024:.0f} KB, {ROUNDS} rounds (client encode + server decode)")
+    for label, roundtrip in (("base64 JSON", legacy_roundtrip), ("binary frames", framed_roundtrip)):
+        started = time.process_time()
+        for _ in range(ROUNDS):
+            wire = roundtrip(audio)
+        cpu_us = (time.process_time() - started) / ROUNDS * 1e6
+        print(f"  {label:<14} {wire:>8} bytes on the wire ({wire / size - 1:+.1%})   {cpu_us:8.1f} us CPU")
+
+
+def run_call(client, url: str, send_turn) -> dict:
+    from app.services.metrics import metrics
+
+    before = {name: metrics.counter(name) for name in
+              ("ws.audio_in_bytes", "ws.audio_out_bytes", "ws.legacy_audio_messages", "ws.frames_in")}
+    received = {"messages": 0, "transcripts": 0, "state": None, "ready": None}
+
+    def read_until_audio_end(ws):
+        while True:
+            message = ws.receive()
+            received["messages"] += 1
+            if message.get("text") is None:
+                continue
+            data = json.loads(message["text"])
+            if data["type"] == "ready":
+                received["ready"] = data
+            elif data["type"] == "text":
+                received["state"] = data["state"]
+                received["transcripts"] += "transcript" in data
+            elif data["type"] == "audio_end":
+                return
+
+    session_id = client.post("/api/start-call", json={"order_data": SAMPLE_ORDER}).json()["session_id"]
+    with client.websocket_connect(url.format(session_id=session_id)) as ws:
+        read_until_audio_end(ws)  # greeting
+        for seq, text in enumerate(SCRIPT[1:]):
+            send_turn(ws, seq, text)
+            read_until_audio_end(ws)
+    client.delete(f"/api/session/{session_id}")
+    received.update({name: metrics.counter(name) - value for name, value in before.items()})
+    return received
+
+
+def main():
+    os.environ.setdefault("CLAUDE_API_KEY", "fake-key")
+    os.environ["SESSION_STORE"] = "memory"
+    os.environ["TTS_CACHE_ENABLED"] = "false"
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.services import voice_service
+    from app.services.voice_protocol import CODEC_IDS, FLAG_FINAL, FRAME_AUDIO_IN, pack_frame
+
+    size = int(float(sys.argv[1]) * 1024) if len(sys.argv) > 1 else 40 * 1024
+    codec_cost(size)
+
+    voice_service.elevenlabs_client = FakeElevenLabs(base_latency=0, per_char=0, chunks=4)
+    whisper = voice_service.openai_client = FakeWhisper()
+    turns = len(SCRIPT) - 1
+
+    def send_legacy(ws, seq, text):
+        ws.send_text(json.dumps({"type": "audio",
+                                 "audio": base64.b64encode(fake_recording(text, size)).decode("ascii")}))
+
+    def send_framed(ws, seq, text):
+        audio = fake_recording(text, size, container=b"OggS")
+        codec = CODEC_IDS["ogg-opus"]
+        for offset in range(0, len(audio), TIMESLICE_BYTES):
+            ws.send_bytes(pack_frame(FRAME_AUDIO_IN, send_framed.seq, codec,
+                                     audio[offset:offset + TIMESLICE_BYTES]))
+            send_framed.seq += 1
+        ws.send_bytes(pack_frame(FRAME_AUDIO_IN, send_framed.seq, codec, b"", FLAG_FINAL))
+        send_framed.seq += 1
+    send_framed.seq = 0
+
+    print(f"Scripted call, {turns} spoken turns")
+    with TestClient(app) as client:
+        legacy = run_call(client, "/ws/voice/{session_id}", send_legacy)
+        legacy_files = whisper.files[:]
+        framed = run_call(client, "/ws/voice/{session_id}?protocol=1&codecs=ogg-opus,webm-opus", send_framed)
+        framed_files = whisper.files[len(legacy_files):]
+
+    for label, result in (("base64 JSON", legacy), ("binary frames", framed)):
+        print(f"  {label:<14} in {result['ws.audio_in_bytes'] / turns:>8.0f} B/turn   "
+              f"out {result['ws.audio_out_bytes'] / (turns + 1):>6.0f} B/turn   "
+              f"messages received {result['messages'] / (turns + 1):4.1f}/turn   final state {result['state']}")
+
+    ok = (
+        legacy["state"] == framed["state"] == "CLOSE"
+        and legacy["transcripts"] == framed["transcripts"] == turns
+        and legacy["ws.legacy_audio_messages"] == turns and framed["ws.legacy_audio_messages"] == 0
+        and framed["ready"] is not None and framed["ready"]["audio_in"] == ["ogg-opus", "webm-opus"]
+        and all(name == "audio.webm" for name, _ in legacy_files)
+        and all(name == "audio.ogg" and length == size for name, length in framed_files)
+        and framed["ws.audio_in_bytes"] < legacy["ws.audio_in_bytes"]
+    )
+    print("Binary framing: " + ("every turn answered, codec passed through" if ok else "FAILED"))
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
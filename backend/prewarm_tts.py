@@ -0,0 +1,37 @@
+"""
+Pre-warm the TTS audio cache with every fixed phrase the agent speaks
+Run this at deploy time so the first calls on each worker skip synthesis
+"""
+import asyncio
+from dotenv import load_dotenv
+
+load_dotenv()
+
+async def prewarm():
+    """Synthesize every static phrase segment into the shared cache"""
+    from app.services.metrics import metrics
+    from app.services.tts_cache import TTS_CACHE_DIR, static_segments
+    from app.services.voice_service import elevenlabs_client, text_to_speech
+    
+    if not elevenlabs_client:
+        print("ERROR: ELEVENLABS_API_KEY not configured in .env file")
+        exit(1)
+    
+    segments = sorted(static_segments())
+    print(f"Pre-warming {len(segments)} phrase segments into {TTS_CACHE_DIR}...")
+    failed = 0
+    for text, language in segments:
+        try:
+            audio = await text_to_speech(text, language)
+            print(f"  [{language}] {len(audio):>7} bytes  {text[:60]}")
+        except Exception as e:
+            failed += 1
+            print(f"  [{language}] FAILED  {text[:60]}: {e}")
+    
+    cached = metrics.counter("tts_cache.memory_hits") + metrics.counter("tts_cache.disk_hits")
+    print(f"\nDone: {len(segments) - failed} ready ({cached:.0f} already cached), {failed} failed")
+    if failed:
+        exit(1)
+
+if __name__ == "__main__":
+    asyncio.run(prewarm())
@@ -0,0 +1,31 @@
+import copy
+
+import pytest
+
+from app.services import session_store
+from app.services.session_store import MemorySessionStore
+from app.services.stt_stream import set_stt_backend
+from benchmarks.fakes import FakeStreamingSTT
+from benchmarks.llm_concurrency import SAMPLE_ORDER
+
+
+@pytest.fixture
+def order():
+    return copy.deepcopy(SAMPLE_ORDER)
+
+
+@pytest.fixture
+def store(monkeypatch):
+    """A fresh in-process session store, installed as the worker's"""
+    store = MemorySessionStore()
+    monkeypatch.setattr(session_store, "_store", store)
+    return store
+
+
+@pytest.fixture
+def stt_backend():
+    """The fake streaming speech-to-text backend, installed for the test"""
+    backend = FakeStreamingSTT(final_latency=0)
+    set_stt_backend(backend)
+    yield backend
+    set_stt_backend(None)
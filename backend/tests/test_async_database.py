@@ -0,0 +1,107 @@
+"""
+Request-path database work on the async engine: round trips overlap instead
+of blocking the event loop, as they do on the sync engine.
+"""
+import asyncio
+import gc
+import os
+import time
+
+from sqlalchemy import func
+
+from app.db_service import AsyncDatabaseService, DatabaseService
+from app.models.db_models import AgentSession, ConversationMessage
+from benchmarks.db_async import heartbeat
+from benchmarks.db_write_behind import make_database
+
+ROUND_TRIP = 0.1
+CALLS = 3
+
+
+async def sync_call(database, index: int) -> None:
+    db = database.SessionLocal()
+    try:
+        service = DatabaseService(db)
+        order = service.create_order({"order_id": f"sync-{index}", "customer": {"name": "Ali Hassan"}})
+        session = service.create_session(order.id, f"sync-{index}")
+        service.add_message(session.session_id, "user", "hello", "INIT", session_db_id=session.id)
+        service.end_session(session.session_id, session.id)
+    finally:
+        db.close()
+
+
+async def async_call(database, index: int) -> None:
+    async with database.AsyncSessionLocal() as db:
+        service = AsyncDatabaseService(db)
+        order = await service.create_order({"order_id": f"async-{index}", "customer": {"name": "Ali Hassan"}})
+        session = await service.create_session(order.id, f"async-{index}")
+        await service.add_message(session.session_id, "user", "hello", "INIT", session_db_id=session.id)
+        await service.end_session(session.session_id, session.id)
+
+
+def run_calls(databases: list, call) -> tuple:
+    """Run CALLS concurrent calls, one per database; returns (longest loop stall, wall time, round trips)"""
+    latencies = [database.async_latency if call is async_call else database.latency for database in databases]
+
+    async def main():
+        lags, stop = [], asyncio.Event()
+        monitor = asyncio.create_task(heartbeat(lags, stop))
+        await asyncio.gather(*(call(database, i) for i, database in enumerate(databases)))
+        stop.set()
+        await monitor
+        for database in databases:
+            await database.async_engine.dispose()
+        return max(lags) / 1000
+
+    for latency in latencies:
+        latency.active = True
+    # A full collection over the rest of the suite's garbage would show up
+    # as a loop stall of its own
+    gc.collect()
+    gc.disable()
+    started = time.perf_counter()
+    try:
+        longest_stall = asyncio.run(main())
+    finally:
+        gc.enable()
+    elapsed = time.perf_counter() - started
+    for latency in latencies:
+        latency.active = False
+    return longest_stall, elapsed, sum(latency.count for latency in latencies)
+
+
+def written(database, prefix: str, calls: int) -> bool:
+    db = database.SessionLocal()
+    try:
+        ended = db.query(func.count(AgentSession.id)).filter(
+            AgentSession.session_id.like(f"{prefix}-%"), AgentSession.is_active.is_(False)
+        ).scalar()
+        messages = db.query(func.count(ConversationMessage.id)).join(AgentSession) \
+            .filter(AgentSession.session_id.like(f"{prefix}-%")).scalar()
+        return ended == calls and messages == calls
+    finally:
+        db.close()
+
+
+def databases(tmp_path, label: str) -> list:
+    # One file per call: SQLite's single write lock would otherwise make the
+    # async calls take turns, which Postgres (row locks) does not
+    return [make_database(os.path.join(tmp_path, f"{label}-{i}.db"), ROUND_TRIP, pool_size=1)
+            for i in range(CALLS)]
+
+
+def test_sync_engine_blocks_the_event_loop(tmp_path):
+    dbs = databases(tmp_path, "sync")
+    longest_stall, elapsed, round_trips = run_calls(dbs, sync_call)
+    assert longest_stall >= ROUND_TRIP
+    # Nothing overlaps
+    assert elapsed >= round_trips * ROUND_TRIP
+    assert all(written(database, "sync", 1) for database in dbs)
+
+
+def test_async_engine_overlaps_round_trips(tmp_path):
+    dbs = databases(tmp_path, "async")
+    longest_stall, elapsed, round_trips = run_calls(dbs, async_call)
+    assert longest_stall < ROUND_TRIP
+    assert elapsed < round_trips * ROUND_TRIP / 2
+    assert all(written(database, "async", 1) for database in dbs)
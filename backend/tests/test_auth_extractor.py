@@ -0,0 +1,65 @@
+"""
+Authentication: which CPR digits a turn contributes, and when the caller's
+words match the name on the order.
+"""
+import asyncio
+
+import pytest
+
+from app.models.agent import AgentState
+from app.services.ai_agent import ZainVoiceAgent
+from app.services.auth_extractor import cpr_digits, names_match
+
+
+@pytest.mark.parametrize("turn", ["I have 2 lines", "I live in house 12 on road 3", "Ali Hassan, 3 phones"])
+def test_numbers_in_passing_are_not_cpr_digits(turn):
+    assert cpr_digits(turn, "Ali Hassan") == ""
+
+
+@pytest.mark.parametrize("turn, digits", [
+    ("8501", "8501"),
+    ("my cpr is 8501", "8501"),
+    ("eight five oh one", "8501"),
+    ("Ali Hassan 850101", "850101"),
+    ("My name is Ali Hassan and I have 2 lines, CPR 850101234", "850101234"),
+])
+def test_mostly_digit_turns_and_whole_numbers_are_cpr_digits(turn, digits):
+    assert cpr_digits(turn, "Ali Hassan") == digits
+
+
+def test_any_digits_count_after_a_cpr_prompt():
+    assert cpr_digits("it starts with 2 I think", "Ali Hassan", prompted=True) == "2"
+
+
+@pytest.mark.parametrize("provided, matched", [
+    ("Ali", False),
+    ("Hassan", False),
+    ("Ali Mohammed", False),
+    ("Ali Hassan", True),
+    ("ali hasan", True),
+])
+def test_a_two_part_name_needs_both_parts(provided, matched):
+    assert names_match(provided, "Ali Hassan") is matched
+
+
+def test_a_longer_name_needs_two_parts_and_half_of_them():
+    assert names_match("Ali Hassan", "Ali Hassan Abdulla Mohamed")
+    assert not names_match("Ali", "Ali Hassan Abdulla")
+    assert names_match("Ali", "Ali")
+
+
+def test_numbers_said_in_passing_do_not_reach_the_cpr(order):
+    name = order["customer"]["name"]
+    cpr = order["customer"]["cpr"]
+
+    async def run():
+        agent = ZainVoiceAgent(order, "call-1")
+        await agent.process_input("hello")
+        await agent.process_input("English please")
+        await agent.process_input(f"I'm {name}, I have 2 lines with you")
+        await agent.process_input(cpr)
+        return agent
+
+    agent = asyncio.run(run())
+    assert agent.customer_name
+    assert agent.state != AgentState.AUTH
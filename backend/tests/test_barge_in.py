@@ -0,0 +1,76 @@
+"""
+Barge-in on the voice WebSocket: the reply recorded for an interrupted turn is
+the part the caller heard, counted from the audio written to the socket, not
+the audio still queued for it.
+"""
+import asyncio
+import threading
+
+import pytest
+
+from app.routers.voice_agent import save_agent
+from app.routers.websocket_handler import Outbox, Turns, respond
+from app.services import tts_cache, voice_service
+from app.services.ai_agent import ZainVoiceAgent
+from app.services.speech_pipeline import split_segments
+from app.services.voice_protocol import negotiate
+from benchmarks.fakes import FakeWebSocket
+
+
+class StalledClient(FakeWebSocket):
+    """Takes the first audio frame, then stops reading (the socket's buffers are full)"""
+
+    async def send_bytes(self, data):
+        if any(isinstance(message, bytes) for message in self.sent):
+            await asyncio.Event().wait()
+        self.sent.append(data)
+
+
+class SlowSecondSegment:
+    """ElevenLabs stand-in: the first segment at once, the second one's first chunk and then nothing"""
+
+    def __init__(self):
+        self.text_to_speech = self
+        self.hang_up = threading.Event()
+
+    def stream(self, voice_id=None, text: str = "", model_id=None, **kwargs):
+        yield b"ID3" + text.encode()
+        if not text.startswith("Sure"):
+            self.hang_up.wait(5)
+            yield b"ID3 rest"
+
+
+@pytest.fixture(autouse=True)
+def tts(monkeypatch):
+    client = SlowSecondSegment()
+    monkeypatch.setattr(voice_service, "elevenlabs_client", client)
+    monkeypatch.setattr(tts_cache, "TTS_CACHE_ENABLED", False)
+    yield client
+    client.hang_up.set()
+
+
+def test_interrupted_turn_records_only_what_was_heard(order, store):
+    async def run():
+        agent = ZainVoiceAgent(order, "call-1")
+        await agent.process_input("hello")
+        await save_agent(agent)
+        websocket = StalledClient()
+        outbox = Outbox(websocket)
+        turns = Turns(outbox)
+        turns.start(respond, outbox, agent, "English please", negotiate("1", "ogg-opus"))
+        while not any(isinstance(message, bytes) for message in websocket.sent):
+            await asyncio.sleep(0.01)
+        # The first segment and the start of the second are queued by now;
+        # the caller has only received the first frame
+        await asyncio.sleep(1.0)
+        assert await turns.interrupt()
+        await outbox.close()
+        return agent, websocket
+
+    agent, websocket = asyncio.run(run())
+    reply = agent.conversation_history[-1]
+    first, *rest = split_segments("Sure, we'll continue in English. Can I please have your full name?")
+    assert reply.role == "assistant"
+    assert reply.content and first.startswith(reply.content) and reply.content != first
+    assert not any(segment.split()[0] in reply.content for segment in rest)
+    assert len(agent.conversation_history) == 4
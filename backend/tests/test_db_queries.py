@@ -0,0 +1,93 @@
+"""
+Statements per turn: an agent carrying its session's primary key writes
+without looking the session up, on every persistence path.
+"""
+import asyncio
+import os
+from collections import Counter
+
+import pytest
+
+from app.db_service import AsyncDatabaseService, DatabaseService
+from app.services.ai_agent import ZainVoiceAgent
+from app.services.db_writer import DatabaseWriter
+from benchmarks.db_queries import StatementCounter, converse, queue_call
+from benchmarks.db_write_behind import create_calls, make_database
+from benchmarks.session_spray import SCRIPT
+
+
+@pytest.fixture
+def database(tmp_path):
+    database = make_database(os.path.join(tmp_path, "queries.db"), 0)
+    yield database
+    asyncio.run(database.async_engine.dispose())
+    database.engine.dispose()
+
+
+def test_sync_turns_insert_and_update_only(database):
+    counter = StatementCounter(database.engine)
+    db = database.SessionLocal()
+    try:
+        service = DatabaseService(db)
+        order = service.create_order({"order_id": "queries-sync", "customer": {"name": "Ali Hassan"}})
+        session = service.create_session(order.id, "queries-sync")
+        turns = asyncio.run(converse(session.session_id, session.id, service, counter))
+    finally:
+        db.close()
+    assert turns == [Counter({"INSERT": 2, "UPDATE": 1})] * len(SCRIPT)
+
+
+def test_async_turns_insert_and_update_only(database):
+    counter = StatementCounter(database.async_engine)
+
+    async def run():
+        async with database.AsyncSessionLocal() as db:
+            service = AsyncDatabaseService(db)
+            order = await service.create_order({"order_id": "queries-async", "customer": {"name": "Ali Hassan"}})
+            session = await service.create_session(order.id, "queries-async")
+            return await converse(session.session_id, session.id, service, counter)
+
+    assert asyncio.run(run()) == [Counter({"INSERT": 2, "UPDATE": 1})] * len(SCRIPT)
+
+
+def test_state_without_the_key_looks_the_session_up_once_per_request(database):
+    counter = StatementCounter(database.engine)
+    session_id = create_calls(database.SessionLocal, 1)[0]
+    db = database.SessionLocal()
+    try:
+        turns = asyncio.run(converse(session_id, None, None, counter,
+                                     fresh_service=lambda: DatabaseService(db)))
+    finally:
+        db.close()
+    assert turns == [Counter({"SELECT": 1, "INSERT": 2, "UPDATE": 1})] * len(SCRIPT)
+
+
+@pytest.mark.parametrize("carried", [True, False])
+def test_writer_flush_batches_every_call(database, carried):
+    counter = StatementCounter(database.async_engine)
+    session_ids = create_calls(database.SessionLocal, 5)
+    db = database.SessionLocal()
+    try:
+        service = DatabaseService(db)
+        keys = {session_id: service.session_pk(session_id) if carried else None for session_id in session_ids}
+    finally:
+        db.close()
+
+    async def run():
+        writer = DatabaseWriter(session_factory=database.AsyncSessionLocal)
+        await asyncio.gather(*(queue_call(session_id, keys[session_id], writer) for session_id in session_ids))
+        counter.take()
+        await writer.flush()
+        return counter.take()
+
+    expected = Counter({"INSERT": 1, "UPDATE": 1})
+    if not carried:
+        expected["SELECT"] = 1
+    assert asyncio.run(run()) == expected
+
+
+def test_session_key_survives_the_session_store(order):
+    agent = ZainVoiceAgent(order, "call-1")
+    agent.session_db_id, agent.order_db_id = "session-pk", "order-pk"
+    restored = ZainVoiceAgent.from_state(agent.to_state())
+    assert (restored.session_db_id, restored.order_db_id) == ("session-pk", "order-pk")
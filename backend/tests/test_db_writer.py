@@ -0,0 +1,37 @@
+"""
+Write-behind writer: a row the database rejects is quarantined, and the log
+names the session and the error without the row's contents.
+"""
+import asyncio
+import logging
+import os
+
+from app.services.db_writer import DatabaseWriter
+from benchmarks.db_write_behind import create_calls, make_database
+
+TRANSCRIPT = "My CPR is 850101234"
+
+
+def test_quarantine_logs_the_session_not_the_row(tmp_path, caplog):
+    database = make_database(os.path.join(tmp_path, "writer.db"), 0)
+    session_id = create_calls(database.SessionLocal, 1)[0]
+
+    async def run():
+        writer = DatabaseWriter(session_factory=database.AsyncSessionLocal)
+        writer.add_message(session_id, "user", TRANSCRIPT, None)  # state is NOT NULL
+        flushes = 0
+        while writer.pending() and flushes < 2 * writer.max_attempts:
+            await writer.flush()
+            flushes += 1
+        await database.async_engine.dispose()
+        return writer.pending()
+
+    with caplog.at_level(logging.WARNING, logger="app.services.db_writer"):
+        pending = asyncio.run(run())
+    database.engine.dispose()
+
+    assert pending == 0
+    quarantined = [record.getMessage() for record in caplog.records if "Quarantined" in record.getMessage()]
+    assert len(quarantined) == 1
+    assert session_id in quarantined[0] and "message" in quarantined[0] and "IntegrityError" in quarantined[0]
+    assert all("850101234" not in record.getMessage() for record in caplog.records)
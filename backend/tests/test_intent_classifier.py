@@ -0,0 +1,30 @@
+"""
+Local intent classifier: the labels it may settle a turn on without Claude,
+and the negated replies it must leave to Claude without a misleading guess.
+"""
+import pytest
+
+from app.services.intent_classifier import (
+    INTENT_CONFIDENCE_THRESHOLD, classify_language, classify_order_intent
+)
+from benchmarks.intent_fast_path import EXPECTED
+
+CLASSIFIERS = {"language": classify_language, "order": classify_order_intent}
+
+
+@pytest.mark.parametrize("kind, reply, expected", EXPECTED, ids=[reply for _, reply, _ in EXPECTED])
+def test_fast_path_label(kind, reply, expected):
+    label, confidence = CLASSIFIERS[kind](reply)
+    assert (label if confidence >= INTENT_CONFIDENCE_THRESHOLD else None) == expected
+
+
+@pytest.mark.parametrize("reply", ["nothing to change", "no need to change", "لا تغير شي"])
+def test_negated_change_is_not_guessed_as_modify(reply):
+    # The label is also the fallback if Claude fails, so "don't change" must not read as "modify"
+    assert classify_order_intent(reply) == (None, 0.0)
+
+
+@pytest.mark.parametrize("reply", ["no", "لا"])
+def test_bare_no_still_leans_modify(reply):
+    label, confidence = classify_order_intent(reply)
+    assert label == "modify" and confidence < INTENT_CONFIDENCE_THRESHOLD
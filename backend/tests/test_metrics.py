@@ -0,0 +1,32 @@
+"""
+GET /metrics: served only with the configured token.
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+def test_metrics_are_not_served_without_a_configured_token(client, monkeypatch):
+    monkeypatch.setattr(main, "METRICS_TOKEN", "")
+    assert client.get("/metrics", headers={"Authorization": "Bearer "}).status_code == 404
+
+
+@pytest.mark.parametrize("headers", [{}, {"Authorization": "Bearer wrong"}, {"Authorization": "secret"}])
+def test_metrics_need_the_token(client, monkeypatch, headers):
+    monkeypatch.setattr(main, "METRICS_TOKEN", "secret")
+    response = client.get("/metrics", headers=headers)
+    assert response.status_code == 401
+    assert "counters" not in response.text
+
+
+def test_metrics_with_the_token(client, monkeypatch):
+    monkeypatch.setattr(main, "METRICS_TOKEN", "secret")
+    response = client.get("/metrics", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
+    assert "counters" in response.json()
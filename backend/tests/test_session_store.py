@@ -0,0 +1,180 @@
+"""
+Session store: a call saved by one worker is served by another, and saves
+made on a stale or ended session are refused instead of overwriting it.
+"""
+import asyncio
+
+import pytest
+
+from app.models.agent import AgentState
+from app.routers.voice_agent import refresh_agent, save_agent
+from app.services.ai_agent import ZainVoiceAgent
+from app.services.session_store import (
+    RedisSessionStore, SessionConflict, SQLiteSessionStore
+)
+from benchmarks.fakes import FakeRedis
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def workers(request, tmp_path):
+    """Build two workers' stores sharing one backend (call it inside the test's event loop)"""
+    if request.param == "sqlite":
+        path = str(tmp_path / "sessions.db")
+        yield lambda: (SQLiteSessionStore(path), SQLiteSessionStore(path))
+    else:
+        with FakeRedis() as redis:
+            yield lambda: (RedisSessionStore(redis.url), RedisSessionStore(redis.url))
+
+
+async def close(*stores):
+    for store in stores:
+        await store.close()
+
+
+def test_call_continues_on_another_worker(workers, order):
+    async def run():
+        first, second = workers()
+        agent = ZainVoiceAgent(order, "call-1")
+        assert await first.put("call-1", agent.to_state()) == 1
+
+        on_second = ZainVoiceAgent.from_state(await second.get("call-1"))
+        await on_second.process_input("hello")
+        await on_second.process_input("English please")
+        assert await second.put("call-1", on_second.to_state()) == 2
+
+        back_on_first = ZainVoiceAgent.from_state(await first.get("call-1"))
+        await close(first, second)
+        return on_second, back_on_first
+
+    on_second, back_on_first = asyncio.run(run())
+    assert back_on_first.revision == 2
+    assert back_on_first.state == AgentState.AUTH
+    assert back_on_first.language == "en"
+    assert [msg.content for msg in back_on_first.conversation_history] == \
+        [msg.content for msg in on_second.conversation_history]
+    assert len(back_on_first.conversation_history) == 4
+
+
+def test_stale_save_is_refused(workers, order):
+    async def run():
+        first, second = workers()
+        await first.put("call-1", ZainVoiceAgent(order, "call-1").to_state())
+        process = ZainVoiceAgent.from_state(await first.get("call-1"))
+        websocket = ZainVoiceAgent.from_state(await second.get("call-1"))
+
+        await process.process_input("hello")
+        await first.put("call-1", process.to_state())
+        with pytest.raises(SessionConflict):
+            await second.put("call-1", websocket.to_state())
+        stored = await second.get("call-1")
+        await close(first, second)
+        return stored
+
+    stored = asyncio.run(run())
+    assert stored["rev"] == 2
+    assert len(stored["h"]) == 2
+
+
+def test_save_after_delete_is_refused(workers, order):
+    async def run():
+        first, second = workers()
+        await first.put("call-1", ZainVoiceAgent(order, "call-1").to_state())
+        agent = ZainVoiceAgent.from_state(await first.get("call-1"))
+        assert await second.delete("call-1")
+        with pytest.raises(SessionConflict):
+            await first.put("call-1", agent.to_state())
+        stored = await second.get("call-1")
+        await close(first, second)
+        return stored
+
+    assert asyncio.run(run()) is None
+
+
+def test_save_agent_keeps_both_turns_on_conflict(store, order):
+    async def run():
+        await store.put("call-1", ZainVoiceAgent(order, "call-1").to_state())
+        process = ZainVoiceAgent.from_state(await store.get("call-1"))
+        websocket = ZainVoiceAgent.from_state(await store.get("call-1"))
+
+        await process.process_input("hello")
+        assert await save_agent(process)
+        await websocket.process_input("hi there")
+        assert await save_agent(websocket)
+        return websocket, await store.get("call-1")
+
+    websocket, stored = asyncio.run(run())
+    assert stored["rev"] == 3 == websocket.revision
+    assert [entry[1] for entry in stored["h"]][0::2] == ["hello", "hi there"]
+    assert len(stored["h"]) == 4
+
+
+def test_save_agent_does_not_bring_back_an_ended_call(store, order):
+    async def run():
+        await store.put("call-1", ZainVoiceAgent(order, "call-1").to_state())
+        agent = ZainVoiceAgent.from_state(await store.get("call-1"))
+        await agent.process_input("hello")
+        await store.delete("call-1")
+        return await save_agent(agent), await store.get("call-1")
+
+    saved, stored = asyncio.run(run())
+    assert saved is False
+    assert stored is None
+
+
+def test_refresh_agent_picks_up_turns_served_elsewhere(store, order):
+    async def run():
+        await store.put("call-1", ZainVoiceAgent(order, "call-1").to_state())
+        websocket = ZainVoiceAgent.from_state(await store.get("call-1"))
+        process = ZainVoiceAgent.from_state(await store.get("call-1"))
+        await process.process_input("hello")
+        await save_agent(process)
+
+        refreshed = await refresh_agent(websocket)
+        await store.delete("call-1")
+        return websocket, refreshed, await refresh_agent(websocket)
+
+    websocket, refreshed, after_delete = asyncio.run(run())
+    assert refreshed is True
+    assert websocket.state == AgentState.LANGUAGE_SELECT
+    assert websocket.revision == 2
+    assert len(websocket.conversation_history) == 2
+    assert after_delete is False
+
+
+def test_redis_eviction_keeps_a_session_saved_after_the_index_read(order):
+    with FakeRedis() as redis:
+        async def run():
+            sweeper = RedisSessionStore(redis.url, idle_ttl=0.05)
+            worker = RedisSessionStore(redis.url, idle_ttl=0.05)
+            agent = ZainVoiceAgent(order, "call-1")
+            agent.revision = await worker.put("call-1", agent.to_state())
+            await asyncio.sleep(0.1)
+
+            read = sweeper._pipeline
+
+            async def save_after_index_read(commands):
+                replies = await read(commands)
+                if commands[0][0] == b"ZRANGEBYSCORE":
+                    # The call takes a turn on another worker while the sweeper
+                    # holds its (now stale) list of idle sessions
+                    await agent.process_input("hello")
+                    agent.revision = await worker.put("call-1", agent.to_state())
+                return replies
+
+            sweeper._pipeline = save_after_index_read
+            kept = await sweeper.evict()
+            sweeper._pipeline = read
+            await agent.process_input("English please")
+            agent.revision = await worker.put("call-1", agent.to_state())
+
+            await asyncio.sleep(0.1)
+            evicted = await sweeper.evict()
+            after = await worker.get("call-1")
+            await close(sweeper, worker)
+            return kept, agent.revision, evicted, after
+
+        kept, revision, evicted, after = asyncio.run(run())
+    assert kept == []
+    assert revision == 3
+    assert [state["rev"] for state in evicted] == [3]
+    assert after is None
@@ -0,0 +1,126 @@
+"""
+Speculative prefetch: the predicted reply's segments are synthesized with the
+pipeline's lookahead, committed when the agent gives that reply and discarded
+(its TTS spend counted as wasted) when it doesn't.
+"""
+import asyncio
+import types
+
+import pytest
+
+from app.services import speculation
+from app.services.metrics import metrics
+from app.services.speculation import discard_prefetch, start_prefetch, take_prefetch
+from app.services.speech_pipeline import TTS_PIPELINE_LOOKAHEAD, split_segments
+
+PREDICTED = ("Your order is the iPhone 15 Pro 256GB on Wiyana 9. "
+             "It is 24 months at 25 BD a month. "
+             "Your first bill will be 31 BD including VAT.")
+COUNTERS = ("speculation.characters", "speculation.hits", "speculation.hit_characters",
+            "speculation.misses", "speculation.wasted_characters")
+
+
+class FakeTTS:
+    """``stream_text_to_speech`` whose segments finish only once released"""
+
+    def __init__(self):
+        self.released = {}
+        self.requested = []
+        self.in_flight = self.peak = 0
+
+    def release(self, text: str) -> None:
+        self.released.setdefault(text, asyncio.Event()).set()
+
+    async def __call__(self, text: str, language: str = "en"):
+        self.requested.append(text)
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await self.released.setdefault(text, asyncio.Event()).wait()
+            yield f"audio:{text}".encode()
+        finally:
+            self.in_flight -= 1
+
+
+@pytest.fixture
+def tts(monkeypatch):
+    tts = FakeTTS()
+    monkeypatch.setattr(speculation, "stream_text_to_speech", tts)
+    monkeypatch.setattr(speculation, "SPECULATIVE_PREFETCH", True)
+    return tts
+
+
+def agent():
+    return types.SimpleNamespace(session_id="call-1", language="en", predict_response=lambda: PREDICTED)
+
+
+def counted(run):
+    before = {name: metrics.counter(name) for name in COUNTERS}
+    result = asyncio.run(run())
+    return result, {name: metrics.counter(name) - before[name] for name in COUNTERS}
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_matching_reply_commits_the_prefetch(tts):
+    segments = split_segments(PREDICTED)
+
+    async def run():
+        start_prefetch(agent())
+        tts.release(segments[0])
+        await settle()
+        prefetch = take_prefetch("call-1", PREDICTED, "en")
+        for segment in segments[1:]:
+            tts.release(segment)
+        audio = [b"".join([chunk async for chunk in prefetch.speak(segment, "en")]) for segment in segments]
+        prefetch.close()
+        return prefetch, audio
+
+    (prefetch, audio), counts = counted(run)
+    assert prefetch is not None
+    assert audio == [f"audio:{segment}".encode() for segment in segments]
+    # Synthesized alongside each other, in order, never more than the pipeline would
+    assert tts.requested == segments
+    assert tts.peak == min(TTS_PIPELINE_LOOKAHEAD, len(segments))
+    assert counts["speculation.hits"] == 1
+    # Only the segment that was ready when the reply was given counts as a hit
+    assert counts["speculation.hit_characters"] == len(segments[0])
+    assert counts["speculation.characters"] == sum(len(segment) for segment in segments)
+    assert counts["speculation.wasted_characters"] == 0
+
+
+def test_other_reply_discards_the_prefetch(tts):
+    segments = split_segments(PREDICTED)
+
+    async def run():
+        start_prefetch(agent())
+        await settle()
+        missed = take_prefetch("call-1", "Sorry, could you repeat that?", "en")
+        await settle()
+        return missed
+
+    missed, counts = counted(run)
+    assert missed is None
+    assert counts["speculation.misses"] == 1
+    assert counts["speculation.hits"] == 0
+    # Billed: the segments sent to TTS before the prediction was dropped
+    sent = sum(len(segment) for segment in segments[:TTS_PIPELINE_LOOKAHEAD])
+    assert counts["speculation.characters"] == sent
+    assert counts["speculation.wasted_characters"] == sent
+    assert tts.in_flight == 0
+
+
+def test_ended_call_discards_the_prefetch(tts):
+    async def run():
+        start_prefetch(agent())
+        await settle()
+        discard_prefetch("call-1")
+        await settle()
+        return take_prefetch("call-1", PREDICTED, "en")
+
+    taken, counts = counted(run)
+    assert taken is None
+    assert counts["speculation.wasted_characters"] == counts["speculation.characters"] > 0
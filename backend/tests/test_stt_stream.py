@@ -0,0 +1,106 @@
+"""
+Streaming speech-to-text on a framed connection: partial transcripts go to the
+client, a stable one starts the agent's Claude classification, and the
+utterance is finalized once it ends.
+"""
+import asyncio
+
+import pytest
+
+from app.models.agent import AgentState
+from app.routers.voice_agent import save_agent
+from app.routers.websocket_handler import LiveTranscript, Outbox, Turns
+from app.services import voice_service
+from app.services.ai_agent import ZainVoiceAgent
+from app.services.metrics import metrics
+from app.services.voice_protocol import CODEC_IDS, FLAG_FINAL, FRAME_AUDIO_IN, negotiate, pack_frame
+from benchmarks.fakes import FakeElevenLabs, FakeWebSocket, fake_recording
+
+UTTERANCE_BYTES = 6000
+CHUNK_BYTES = 2000
+EARLY = ("stt.early_starts", "stt.early_hits", "stt.early_misses")
+
+
+@pytest.fixture(autouse=True)
+def tts(monkeypatch):
+    monkeypatch.setattr(voice_service, "elevenlabs_client", FakeElevenLabs(base_latency=0, per_char=0, chunks=1))
+
+
+async def call(order, store, transcript: str) -> tuple:
+    """
+    Say one utterance on a framed connection at language selection; returns
+    what the client received, the agent, its Claude prompts and whether
+    classification started before the utterance ended
+    """
+    agent = ZainVoiceAgent(order, "call-1")
+    await agent.process_input("hello")
+    await save_agent(agent)
+    prompts = []
+
+    async def ask_claude(prompt, max_tokens=10):
+        prompts.append(prompt)
+        await asyncio.sleep(0.05)
+        return "english"
+
+    agent.ask_claude = ask_claude
+    websocket = FakeWebSocket()
+    outbox = Outbox(websocket)
+    turns = Turns(outbox)
+    framing = negotiate("1", "ogg-opus")
+    live = LiveTranscript(outbox, agent, framing, turns)
+    codec = CODEC_IDS["ogg-opus"]
+
+    audio = fake_recording(transcript, UTTERANCE_BYTES, container=b"OggS")
+    for offset in range(0, len(audio), CHUNK_BYTES):
+        for update in framing.receive(pack_frame(FRAME_AUDIO_IN, framing.in_seq, codec,
+                                                 audio[offset:offset + CHUNK_BYTES])):
+            await live.update(update)
+    started_early = agent._early is not None
+    for update in framing.receive(pack_frame(FRAME_AUDIO_IN, framing.in_seq, codec, b"", FLAG_FINAL)):
+        await live.update(update)
+    await turns.task
+    while not outbox.queue.empty():
+        await asyncio.sleep(0.01)
+    live.close()
+    await outbox.close()
+    return websocket, agent, prompts, started_early
+
+
+def counted(run):
+    before = {name: metrics.counter(name) for name in EARLY}
+    result = asyncio.run(run())
+    return result, {name: metrics.counter(name) - before[name] for name in EARLY}
+
+
+def test_partials_are_sent_and_a_stable_one_starts_classification(order, store, stt_backend):
+    (websocket, agent, prompts, started_early), counts = counted(
+        lambda: call(order, store, "whichever is easier")
+    )
+    partials = websocket.messages("transcript_partial")
+    assert [(p["text"], p["stable"]) for p in partials] == [
+        ("whichever is", False), ("whichever is easier", True)
+    ]
+    # Classification started before the utterance ended, and its answer was used
+    assert started_early
+    assert counts == {"stt.early_starts": 1, "stt.early_hits": 1, "stt.early_misses": 0}
+    assert len(prompts) == 1
+    # Finalized once, after the FINAL frame
+    assert (stt_backend.opened, stt_backend.finished) == (1, 1)
+    [reply] = websocket.messages("text")
+    assert reply["transcript"] == "whichever is easier"
+    assert agent.state == AgentState.AUTH
+    assert websocket.messages("audio_end")
+
+
+def test_revised_transcript_drops_the_early_classification(order, store, stt_backend):
+    (websocket, agent, prompts, started_early), counts = counted(
+        lambda: call(order, store, "um|um english please")
+    )
+    assert [p["text"] for p in websocket.messages("transcript_partial")] == ["um"]
+    assert started_early
+    assert counts == {"stt.early_starts": 1, "stt.early_hits": 0, "stt.early_misses": 1}
+    # The final transcript is settled locally; only the wasted early prompt went to Claude
+    assert len(prompts) == 1
+    [reply] = websocket.messages("text")
+    assert reply["transcript"] == "um english please"
+    assert agent.state == AgentState.AUTH
@@ -0,0 +1,33 @@
+"""
+Endpointing on the synthetic fixture recordings: every utterance found once,
+none clipped, distractors ignored, including streams that open mid-speech.
+"""
+import pytest
+
+from app.services.vad import Endpointer
+from benchmarks.vad_endpointing import FIXTURES, RATE, evaluate, make_fixture
+
+
+@pytest.mark.parametrize("spec", [spec for _, *spec in FIXTURES], ids=[label for label, *_ in FIXTURES])
+def test_fixture_endpointed_with_defaults(spec):
+    pcm, truth = make_fixture(*spec)
+    result = evaluate(pcm, truth)
+    assert result["correct"], f"{result['detected']} utterances detected, {len(truth)} spoken"
+    assert result["uploaded"] < result["stream"]
+
+
+def test_speech_at_stream_start_does_not_become_the_floor():
+    pcm, truth = make_fixture(12, "office", speech_first=True)
+    assert truth[0][0] == 0
+    endpointer = Endpointer()
+    spans = []
+    chunk = RATE * 2 // 10
+    for offset in range(0, len(pcm), chunk):
+        for _ in endpointer.feed(pcm[offset:offset + chunk]):
+            spans.append(tuple(position / 2 / RATE for position in endpointer.last_span))
+    if endpointer.flush() is not None:
+        spans.append(tuple(position / 2 / RATE for position in endpointer.last_span))
+    assert len(spans) == len(truth)
+    assert spans[0][0] == 0
+    for (start, end), (spoken_start, spoken_end) in zip(spans, truth):
+        assert start <= spoken_start and end >= spoken_end
@@ -0,0 +1,100 @@
+"""
+Vendor scheduler: a TTS stream cancelled while a read is still running on
+its thread is closed once that read returns, and only then is its slot freed.
+"""
+import asyncio
+import threading
+
+from app.services import voice_service
+from app.services.metrics import metrics
+from app.services.vendor_io import VendorScheduler
+
+
+class BlockingStream:
+    """
+    An SDK-style audio iterator whose second read blocks until ``unblock`` is
+    set. The client keeps its streams (as a connection pool would), so only an
+    explicit ``close`` ends one.
+    """
+
+    def __init__(self):
+        self.reading = threading.Event()
+        self.unblock = threading.Event()
+        self.closed = threading.Event()
+        self.streams = []
+        self.text_to_speech = self
+
+    def stream(self, voice_id=None, text: str = "", model_id=None, **kwargs):
+        audio = self._audio()
+        self.streams.append(audio)
+        return audio
+
+    def _audio(self):
+        try:
+            yield b"ID3 first"
+            self.reading.set()
+            self.unblock.wait(5)
+            yield b"ID3 second"
+        finally:
+            self.closed.set()
+
+
+def test_cancelled_stream_is_closed_after_the_read_returns(monkeypatch):
+    client = BlockingStream()
+    monkeypatch.setattr(voice_service, "elevenlabs_client", client)
+    scheduler = VendorScheduler(threads=2, limits={"stt": 1, "tts": 1})
+    monkeypatch.setattr(voice_service, "get_vendor_scheduler", lambda: scheduler)
+
+    async def run():
+        speech = voice_service.stream_text_to_speech("Let me check that for you.")
+
+        async def listen():
+            async for _ in speech:
+                pass
+
+        listener = asyncio.create_task(listen())
+        await asyncio.to_thread(client.reading.wait, 5)
+        listener.cancel()
+        await asyncio.gather(listener, return_exceptions=True)
+        await speech.aclose()
+        # The read is still running: the stream stays open and the slot held
+        closed_early = client.closed.is_set()
+        held = metrics.snapshot()["gauges"]["vendor.tts.active"]
+
+        client.unblock.set()
+        await asyncio.to_thread(client.closed.wait, 5)
+        for _ in range(100):
+            if not metrics.snapshot()["gauges"]["vendor.tts.active"]:
+                break
+            await asyncio.sleep(0.01)
+        return closed_early, held, metrics.snapshot()["gauges"]["vendor.tts.active"]
+
+    try:
+        closed_early, held, released = asyncio.run(run())
+    finally:
+        scheduler.shutdown()
+    assert (closed_early, held) == (False, 1)
+    assert client.closed.is_set()
+    assert released == 0
+
+
+def test_finished_stream_is_closed_before_the_slot_is_released(monkeypatch):
+    client = BlockingStream()
+    client.unblock.set()
+    monkeypatch.setattr(voice_service, "elevenlabs_client", client)
+    scheduler = VendorScheduler(threads=2, limits={"stt": 1, "tts": 1})
+    monkeypatch.setattr(voice_service, "get_vendor_scheduler", lambda: scheduler)
+
+    async def run():
+        speech = voice_service.stream_text_to_speech("Let me check that for you.")
+        first = await speech.__anext__()
+        await speech.aclose()
+        # The slot is only released once the stream is closed
+        await asyncio.wait_for(scheduler._vendor_slots("tts").acquire(), 5)
+        return first
+
+    try:
+        assert asyncio.run(run()) == b"ID3 first"
+    finally:
+        scheduler.shutdown()
+    assert client.closed.is_set()
@@ -0,0 +1,64 @@
+"""
+Binary audio framing: frames round-trip through pack/parse, and utterances
+are assembled from the frames the client sends.
+"""
+import pytest
+
+from app.services.voice_protocol import (
+    CODEC_IDS, FLAG_FINAL, FRAME_AUDIO_IN, FRAME_AUDIO_OUT, HEADER, ProtocolError, negotiate, pack_frame,
+    parse_frame
+)
+
+OGG = CODEC_IDS["ogg-opus"]
+
+
+@pytest.mark.parametrize("frame_type, seq, codec, payload, flags", [
+    (FRAME_AUDIO_IN, 0, OGG, b"OggS audio", 0),
+    (FRAME_AUDIO_IN, 7, CODEC_IDS["pcm16"], b"", FLAG_FINAL),
+    (FRAME_AUDIO_OUT, 2 ** 32 - 1, CODEC_IDS["mpeg"], b"ID3" * 1000, 0),
+])
+def test_frames_round_trip(frame_type, seq, codec, payload, flags):
+    data = pack_frame(frame_type, seq, codec, payload, flags)
+    assert len(data) == HEADER.size + len(payload)
+    frame = parse_frame(data)
+    assert (frame.type, frame.seq, frame.codec, frame.flags) == (frame_type, seq, codec, flags)
+    assert bytes(frame.payload) == payload
+
+
+def test_sequence_numbers_wrap():
+    assert parse_frame(pack_frame(FRAME_AUDIO_IN, 2 ** 32, OGG, b"")).seq == 0
+
+
+@pytest.mark.parametrize("data", [
+    b"\x01\x01",  # shorter than the header
+    HEADER.pack(2, FRAME_AUDIO_IN, OGG, 0, 0),  # another protocol version
+    pack_frame(FRAME_AUDIO_IN, 0, 99, b""),  # unknown codec
+])
+def test_malformed_frames_are_rejected(data):
+    with pytest.raises(ProtocolError):
+        parse_frame(data)
+
+
+def test_utterance_is_assembled_from_its_frames():
+    framing = negotiate("1", "ogg-opus")
+    updates = framing.receive(pack_frame(FRAME_AUDIO_IN, 0, OGG, b"OggS one "))
+    updates += framing.receive(pack_frame(FRAME_AUDIO_IN, 1, OGG, b"two"))
+    updates += framing.receive(pack_frame(FRAME_AUDIO_IN, 2, OGG, b"", FLAG_FINAL))
+    assert [(bytes(update.chunk), update.utterance) for update in updates] == [
+        (b"OggS one ", None), (b"two", None), (b"", b"OggS one two")
+    ]
+
+
+def test_final_frame_without_audio_is_no_utterance():
+    framing = negotiate("1", "ogg-opus")
+    assert framing.receive(pack_frame(FRAME_AUDIO_IN, 0, OGG, b"", FLAG_FINAL)) == []
+    # The next utterance is unaffected
+    framing.receive(pack_frame(FRAME_AUDIO_IN, 1, OGG, b"OggS hello"))
+    [update] = framing.receive(pack_frame(FRAME_AUDIO_IN, 2, OGG, b"", FLAG_FINAL))
+    assert update.utterance == b"OggS hello"
+
+
+def test_codec_must_be_negotiated():
+    framing = negotiate("1", "ogg-opus")
+    with pytest.raises(ProtocolError):
+        framing.receive(pack_frame(FRAME_AUDIO_IN, 0, CODEC_IDS["webm-opus"], b"audio"))
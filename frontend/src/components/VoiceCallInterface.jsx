@@ -2,6 +2,7 @@ import React, { useState, useEffect, useRef } from 'react'
 import axios from 'axios'
 import { Phone, PhoneOff, Mic, MicOff, Volume2, Loader2, MessageCircle } from 'lucide-react'
 import { API_BASE_URL, WS_BASE_URL } from '../config'
+import { CODECS, FLAG_FINAL, FRAME_AUDIO_IN, FRAME_AUDIO_OUT, packFrame, parseFrame, recordableCodecs } from '../voiceProtocol'
 
 function VoiceCallInterface({ orderData, isActive, sessionId, onCallStarted, onCallEnded }) {
   const [callActive, setCallActive] = useState(isActive)
@@ -12,11 +13,17 @@ function VoiceCallInterface({ orderData, isActive, sessionId, onCallStarted, onC
   const [inputText, setInputText] = useState('')
   const [currentSessionId, setCurrentSessionId] = useState(sessionId)
   const [isRecording, setIsRecording] = useState(false)
+  // What the caller is saying, while speech-to-text is still listening
+  const [partialTranscript, setPartialTranscript] = useState('')
   
   const conversationEndRef = useRef(null)
   const mediaRecorderRef = useRef(null)
   const audioChunksRef = useRef([])
   const wsRef = useRef(null)
+  const audioStreamRef = useRef(null)
+  const playingAudioRef = useRef(null)
+  // Negotiated binary framing ({ codec, seq }), null for the legacy protocol
+  const framingRef = useRef(null)
 
   useEffect(() => {
     conversationEndRef.current?.scrollIntoView({ behavior: 'smooth' })
@@ -49,11 +56,83 @@ function VoiceCallInterface({ orderData, isActive, sessionId, onCallStarted, onC
     }
   }
 
+  // Streamed TTS playback: chunks are appended to a MediaSource as they arrive
+  // so playback starts on the first chunk; browsers without MSE support for
+  // audio/mpeg buffer the utterance and play it on audio_end.
+  const startAudioStream = () => {
+    if (window.MediaSource && MediaSource.isTypeSupported('audio/mpeg')) {
+      const mediaSource = new MediaSource()
+      const stream = { mediaSource, sourceBuffer: null, queue: [], ended: false }
+      mediaSource.addEventListener('sourceopen', () => {
+        stream.sourceBuffer = mediaSource.addSourceBuffer('audio/mpeg')
+        stream.sourceBuffer.addEventListener('updateend', () => flushAudioStream(stream))
+        flushAudioStream(stream)
+      })
+      playAudio(new Audio(URL.createObjectURL(mediaSource)))
+      return stream
+    }
+    return { chunks: [], ended: false }
+  }
+
+  const playAudio = (audio) => {
+    playingAudioRef.current = audio
+    audio.play().catch(err => console.error('Error playing audio:', err))
+  }
+
+  // Barge-in: the caller is talking, cut the agent off
+  const stopPlayback = () => {
+    audioStreamRef.current = null
+    if (playingAudioRef.current) {
+      playingAudioRef.current.pause()
+      playingAudioRef.current = null
+    }
+  }
+
+  const flushAudioStream = (stream) => {
+    if (!stream.sourceBuffer || stream.sourceBuffer.updating) return
+    if (stream.queue.length > 0) {
+      stream.sourceBuffer.appendBuffer(stream.queue.shift())
+    } else if (stream.ended && stream.mediaSource.readyState === 'open') {
+      stream.mediaSource.endOfStream()
+    }
+  }
+
+  const appendAudioChunk = (chunk) => {
+    if (!audioStreamRef.current) {
+      audioStreamRef.current = startAudioStream()
+    }
+    const stream = audioStreamRef.current
+    if (stream.chunks) {
+      stream.chunks.push(chunk)
+    } else {
+      stream.queue.push(chunk)
+      flushAudioStream(stream)
+    }
+  }
+
+  const endAudioStream = () => {
+    const stream = audioStreamRef.current
+    audioStreamRef.current = null
+    if (!stream) return
+    stream.ended = true
+    if (stream.chunks) {
+      playAudio(new Audio(URL.createObjectURL(new Blob(stream.chunks, { type: 'audio/mpeg' }))))
+    } else {
+      flushAudioStream(stream)
+    }
+  }
+
   const connectWebSocket = (sessionId) => {
-    // Use configured WebSocket URL
-    const wsUrl = `${WS_BASE_URL}/ws/voice/${sessionId}`
+    // Use configured WebSocket URL; offer binary audio framing with the
+    // codecs this browser can record (the server answers with "ready")
+    const codecs = recordableCodecs()
+    const wsUrl = codecs.length > 0
+      ? `${WS_BASE_URL}/ws/voice/${sessionId}?protocol=1&codecs=${codecs.join(',')}`
+      : `${WS_BASE_URL}/ws/voice/${sessionId}`
+    framingRef.current = null
     
     const ws = new WebSocket(wsUrl)
+    ws.binaryType = 'arraybuffer'
     wsRef.current = ws
 
     ws.onopen = () => {
@@ -61,15 +140,27 @@ function VoiceCallInterface({ orderData, isActive, sessionId, onCallStarted, onC
     }
 
     ws.onmessage = async (event) => {
-      if (event.data instanceof Blob) {
-        // Audio data
-        const audio = new Audio(URL.createObjectURL(event.data))
-        audio.play().catch(err => console.error('Error playing audio:', err))
+      if (event.data instanceof ArrayBuffer) {
+        if (framingRef.current) {
+          // Framed audio chunk: strip the header without copying
+          const frame = parseFrame(event.data)
+          if (frame.type === FRAME_AUDIO_OUT) {
+            appendAudioChunk(frame.payload)
+          }
+        } else {
+          // Streamed audio chunk (announced by an audio_chunk header)
+          appendAudioChunk(event.data)
+        }
       } else {
         // Text data
         try {
           const data = JSON.parse(event.data)
-          if (data.type === 'text') {
+          if (data.type === 'ready') {
+            framingRef.current = { codec: data.audio_in[0], seq: 0 }
+          } else if (data.type === 'transcript_partial') {
+            setPartialTranscript(data.text)
+          } else if (data.type === 'text') {
+            setPartialTranscript('')
             if (data.message) {
               addMessage('assistant', data.message)
             }
@@ -79,6 +170,16 @@ function VoiceCallInterface({ orderData, isActive, sessionId, onCallStarted, onC
             if (data.state) {
               setCurrentState(data.state)
             }
+          } else if (data.type === 'audio_end') {
+            if (data.interrupted) {
+              // The server stopped mid-reply: keep only what was heard
+              stopPlayback()
+              if (data.heard !== undefined) {
+                replaceLastAssistantMessage(data.heard)
+              }
+            } else {
+              endAudioStream()
+            }
           } else if (data.type === 'error') {
             addMessage('system', data.message)
           }
@@ -155,32 +256,60 @@ function VoiceCallInterface({ orderData, isActive, sessionId, onCallStarted, onC
     }])
   }
 
+  const replaceLastAssistantMessage = (content) => {
+    setConversation(prev => {
+      const index = prev.map(message => message.role).lastIndexOf('assistant')
+      if (index < 0) return prev
+      return prev.map((message, i) => (i === index ? { ...message, content } : message))
+    })
+  }
+
   const startRecording = async () => {
+    stopPlayback()
     try {
       const stream = await navigator.mediaDevices.getUserMedia({ audio: true })
-      const mediaRecorder = new MediaRecorder(stream)
+      const framing = framingRef.current
+      const mediaRecorder = framing
+        ? new MediaRecorder(stream, { mimeType: CODECS[framing.codec].mimeType })
+        : new MediaRecorder(stream)
       mediaRecorderRef.current = mediaRecorder
       audioChunksRef.current = []
 
+      const sendFrame = (payload, flags) => {
+        if (wsRef.current && wsRef.current.readyState === WebSocket.OPEN) {
+          wsRef.current.send(packFrame(FRAME_AUDIO_IN, framing.seq++, framing.codec, payload, flags))
+        }
+      }
+
       mediaRecorder.ondataavailable = (event) => {
         if (event.data.size > 0) {
-          audioChunksRef.current.push(event.data)
+          if (framing) {
+            // Stream each timeslice as it is recorded
+            sendFrame(event.data, 0)
+          } else {
+            audioChunksRef.current.push(event.data)
+          }
         }
       }
 
       mediaRecorder.onstop = async () => {
-        const audioBlob = new Blob(audioChunksRef.current, { type: 'audio/webm' })
-        
-        // Send audio via WebSocket
-        if (wsRef.current && wsRef.current.readyState === WebSocket.OPEN) {
-          wsRef.current.send(audioBlob)
+        if (framing) {
+          // Empty FINAL frame: the utterance is complete
+          sendFrame(null, FLAG_FINAL)
+        } else {
+          const audioBlob = new Blob(audioChunksRef.current, { type: 'audio/webm' })
+          
+          // Send audio via WebSocket
+          if (wsRef.current && wsRef.current.readyState === WebSocket.OPEN) {
+            wsRef.current.send(audioBlob)
+          }
         }
         
         // Stop all tracks
         stream.getTracks().forEach(track => track.stop())
       }
 
-      mediaRecorder.start()
+      mediaRecorder.start(framing ? 250 : undefined)
       setIsRecording(true)
     } catch (error) {
       console.error('Error starting recording:', error)
@@ -269,6 +398,13 @@ function VoiceCallInterface({ orderData, isActive, sessionId, onCallStarted, onC
                 </div>
               </div>
             ))}
+            {partialTranscript && (
+              <div className="flex justify-end">
+                <div className="max-w-[80%] rounded-lg p-3 bg-indigo-100 text-indigo-800">
+                  <p className="text-sm italic whitespace-pre-wrap">{partialTranscript}</p>
+                </div>
+              </div>
+            )}
             <div ref={conversationEndRef} />
           </div>
         )}
@@ -0,0 +1,41 @@
+// Binary audio framing for the voice WebSocket (see backend/app/services/voice_protocol.py).
+// Every audio message is an 8-byte header followed by the payload:
+// version, type, codec, flags (1 byte each), then a big-endian uint32 sequence number.
+
+export const PROTOCOL_VERSION = 1
+export const FRAME_AUDIO_IN = 1
+export const FRAME_AUDIO_OUT = 2
+export const FLAG_FINAL = 0x01
+export const HEADER_SIZE = 8
+
+export const CODECS = {
+  'webm-opus': { id: 1, mimeType: 'audio/webm;codecs=opus' },
+  'ogg-opus': { id: 2, mimeType: 'audio/ogg;codecs=opus' }
+}
+
+// Codecs this browser can record, in order of preference
+export const recordableCodecs = () =>
+  Object.keys(CODECS).filter(name => window.MediaRecorder && MediaRecorder.isTypeSupported(CODECS[name].mimeType))
+
+// Header + payload as a Blob, so the recorded chunk is not copied
+export const packFrame = (type, seq, codec, payload, flags = 0) => {
+  const header = new DataView(new ArrayBuffer(HEADER_SIZE))
+  header.setUint8(0, PROTOCOL_VERSION)
+  header.setUint8(1, type)
+  header.setUint8(2, CODECS[codec].id)
+  header.setUint8(3, flags)
+  header.setUint32(4, seq >>> 0)
+  return new Blob(payload ? [header.buffer, payload] : [header.buffer])
+}
+
+// Header fields and a view of the payload (no copy)
+export const parseFrame = (buffer) => {
+  const header = new DataView(buffer, 0, HEADER_SIZE)
+  return {
+    type: header.getUint8(1),
+    codec: header.getUint8(2),
+    flags: header.getUint8(3),
+    seq: header.getUint32(4),
+    payload: new Uint8Array(buffer, HEADER_SIZE)
+  }
+}